@@ -1,9 +1,10 @@
 # app/config.py
+import json
 import os
 import tempfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, List
 
 def _env_bool(name: str, default: bool = False) -> bool:
     val = os.getenv(name)
@@ -15,6 +16,32 @@ def _env_csv(name: str, default: str = "*") -> List[str]:
     raw = os.getenv(name, default)
     return [x.strip() for x in raw.split(",") if x.strip()]
 
+# USD per 1M tokens (input/output); per_image is used when an image call reports no usage
+_DEFAULT_MODEL_PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-image-1": {"input": 10.0, "output": 40.0, "per_image": 0.063},
+}
+
+def _env_json(name: str, default: Any) -> Any:
+    raw = os.getenv(name)
+    return json.loads(raw) if raw else default
+
+def _env_kv(name: str, default: str, cast: Callable[[str], Any]) -> Dict[str, Any]:
+    """Parse "a=1,b=2" into {"a": cast("1"), "b": cast("2")}; env entries override the defaults."""
+    out: Dict[str, Any] = {}
+    for raw in (default, os.getenv(name, "")):
+        for item in raw.split(","):
+            k, sep, v = item.partition("=")
+            if sep and k.strip() and v.strip():
+                out[k.strip()] = cast(v.strip())
+    return out
+
+def _env_kv_ints(name: str, default: str) -> Dict[str, int]:
+    return _env_kv(name, default, int)
+
+def _env_kv_floats(name: str, default: str) -> Dict[str, float]:
+    return _env_kv(name, default, float)
+
 @dataclass(frozen=True)
 class Config:
     # OpenAI
@@ -43,6 +70,37 @@ class Config:
     prune_artifact_after_upload: bool       # delete the PDF/ZIP local file after upload
     sweep_jobs_on_startup: bool             # optional: run a sweep on app startup
     sweep_ttl_hours: int                    # delete jobs older than this if final exists
+    preload_sdks: bool                      # import/construct OpenAI + GCP clients at startup instead of on first use
+    max_upload_bytes: int                   # cap for streamed image uploads
+    script_chunk_threshold: int             # page_count above this -> outline + parallel chunks
+    script_chunk_pages: int                 # pages per chunk in chunked script generation
+    llm_cache_enabled: bool                 # cache text completions (memory LRU + disk)
+    llm_cache_memory_items: int             # max entries in the in-process LRU tier
+    llm_cache_ttls: Dict[str, int]          # seconds per endpoint namespace ("default" fallback)
+    raw_archive_enabled: bool               # keep raw LLM completions for debugging
+    raw_archive_segment_bytes: int          # rotate the current .jsonl.gz segment above this size
+    raw_archive_segment_seconds: int        # ...or when it is older than this
+    raw_archive_max_bytes: int              # total local budget; oldest segments are dropped first
+    raw_archive_max_age_hours: int          # drop local segments older than this
+    raw_archive_offload: bool               # upload closed segments to gs://<bucket>/raw_archive/
+    text_max_concurrency: int               # shared cap on in-flight text-model calls per process
+    text_requests_per_minute: int           # shared pacing for text-model calls (0 = unpaced)
+    batch_concurrency: int                  # default per-request fan-out for batch endpoints
+    model_prices: Dict[str, Dict[str, float]]  # cost estimates for usage reports (MODEL_PRICES_JSON)
+    ref_assets_concurrency: int             # lookbook entities rendered in parallel per ref-assets run
+    asset_fetch_timeout_s: float            # per-request read timeout when downloading reference images
+    asset_fetch_retries: int                # attempts per reference image source before giving up
+    cover_max_refs: int                     # reference images attached to a cover edit (face ref included)
+    ref_contact_sheets: bool                # tile page refs into <=2 captioned contact sheets instead of N files
+    metrics_enabled: bool                   # collect /metrics (Prometheus text format)
+    metrics_dir: str                        # per-process metric snapshots, shared by all gunicorn workers
+    metrics_flush_seconds: float            # how often each process writes its snapshot
+    metrics_loop_lag_interval: float        # seconds between event-loop lag probes; 0 = off
+    trace_exporter: str                     # where finished spans go: none | file | stdout
+    trace_file: str                         # JSON-lines span log for TRACE_EXPORTER=file
+    trace_file_max_bytes: int               # rotate trace_file to trace_file.1 past this size
+    trace_sample_rate: float                # share of new traces recorded (incoming traceparent flags win)
+    trace_sample_routes: Dict[str, float]   # per path-prefix sample rates, e.g. status polling
 
 def load_config() -> Config:
     return Config(
@@ -64,17 +122,52 @@ def load_config() -> Config:
         prune_pages_after_final = _env_bool("PRUNE_PAGES_AFTER_FINAL", True),
         prune_artifact_after_upload = _env_bool("PRUNE_ARTIFACTS_AFTER_UPLOAD", False),
         sweep_jobs_on_startup = _env_bool("SWEEP_JOBS_ON_STARTUPS", False),
-        sweep_ttl_hours = int(os.getenv("SWEEP_TTL_HOURS", 24))
+        sweep_ttl_hours = int(os.getenv("SWEEP_TTL_HOURS", 24)),
+        preload_sdks = _env_bool("PRELOAD_SDKS", False),
+        max_upload_bytes = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024,
+        script_chunk_threshold = int(os.getenv("SCRIPT_CHUNK_THRESHOLD", "12")),
+        script_chunk_pages = int(os.getenv("SCRIPT_CHUNK_PAGES", "6")),
+        llm_cache_enabled = _env_bool("LLM_CACHE", True),
+        llm_cache_memory_items = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256")),
+        llm_cache_ttls = _env_kv_ints(
+            "LLM_CACHE_TTLS", "default=3600,story_ideas=3600,cover_script=86400,full_script=86400"
+        ),
+        raw_archive_enabled = _env_bool("RAW_ARCHIVE", True),
+        raw_archive_segment_bytes = int(os.getenv("RAW_ARCHIVE_SEGMENT_MB", "4")) * 1024 * 1024,
+        raw_archive_segment_seconds = int(os.getenv("RAW_ARCHIVE_SEGMENT_SECONDS", "3600")),
+        raw_archive_max_bytes = int(os.getenv("RAW_ARCHIVE_MAX_MB", "32")) * 1024 * 1024,
+        raw_archive_max_age_hours = int(os.getenv("RAW_ARCHIVE_MAX_AGE_HOURS", "72")),
+        raw_archive_offload = _env_bool("RAW_ARCHIVE_GCS", False),
+        text_max_concurrency = int(os.getenv("TEXT_MAX_CONCURRENCY", "16")),
+        text_requests_per_minute = int(os.getenv("TEXT_RPM", "500")),
+        batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "8")),
+        model_prices = _env_json("MODEL_PRICES_JSON", _DEFAULT_MODEL_PRICES),
+        ref_assets_concurrency = int(os.getenv("REF_ASSETS_CONCURRENCY", "4")),
+        asset_fetch_timeout_s = float(os.getenv("ASSET_FETCH_TIMEOUT_S", "30")),
+        asset_fetch_retries = int(os.getenv("ASSET_FETCH_RETRIES", "3")),
+        cover_max_refs = int(os.getenv("COVER_MAX_REFS", "10")),
+        ref_contact_sheets = _env_bool("REF_CONTACT_SHEETS", False),
+        metrics_enabled = _env_bool("METRICS", True),
+        metrics_dir = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "comics-metrics")),
+        metrics_flush_seconds = float(os.getenv("METRICS_FLUSH_SECONDS", "5")),
+        metrics_loop_lag_interval = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.25")),
+        trace_exporter = os.getenv("TRACE_EXPORTER", "none").strip().lower(),
+        trace_file = os.getenv("TRACE_FILE", os.path.join(tempfile.gettempdir(), "comics-traces.jsonl")),
+        trace_file_max_bytes = int(os.getenv("TRACE_FILE_MAX_BYTES", str(20 * 1024 * 1024))),
+        trace_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+        trace_sample_routes = _env_kv_floats(
+            "TRACE_SAMPLE_ROUTES", "/metrics=0,/api/v1/generate/comic/status=0.05"
+        ),
     )
 
-# Load once and ensure output directory exists
+# Load once; output dirs are created where they're first written
 config = load_config()
-config.base_output_dir.mkdir(parents=True, exist_ok=True)
 
 def make_job_dir(prefix: str = "job_") -> Path:
     """
     Create a unique working directory under base_output_dir for a single request/job.
     Returns the Path to that directory.
     """
+    config.base_output_dir.mkdir(parents=True, exist_ok=True)
     path_str = tempfile.mkdtemp(prefix=prefix, dir=str(config.base_output_dir))
     return Path(path_str)
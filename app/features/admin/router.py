@@ -1,5 +1,8 @@
+import asyncio
 from fastapi import APIRouter
+from app.lib import llm_cache, raw_archive, usage
 from app.lib.cleanup import sweep_finished_jobs
+from app.lib.scheduler import text_scheduler
 from app.lib.paths import data_dir
 from app.config import config
 
@@ -10,3 +13,26 @@ async def sweep():
     base = data_dir()
     removed = sweep_finished_jobs(base, ttl_hours=config.sweep_ttl_hours)
     return {"removed": removed, "base_dir": base}
+
+@router.get("/llm-cache/stats")
+async def llm_cache_stats():
+    return llm_cache.stats()
+
+@router.get("/usage")
+async def usage_totals():
+    """Process-wide model call totals by kind:model since startup."""
+    return usage.process_totals()
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    return {"text": text_scheduler.stats()}
+
+@router.delete("/llm-cache")
+async def llm_cache_clear(disk: bool = False):
+    llm_cache.clear(disk=disk)
+    return {"cleared": True, "disk": disk}
+
+@router.get("/raw/{job_id}")
+async def raw_records(job_id: str, kind: str | None = None):
+    records = await asyncio.to_thread(raw_archive.find_records, job_id, kind)
+    return {"job_id": job_id, "count": len(records), "records": records}
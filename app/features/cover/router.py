@@ -1,16 +1,15 @@
 import base64
 import hashlib
-import json
 import os
 import shutil
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from fastapi.responses import FileResponse
 
-from app.features.lookbook_ref_assets.service import _load_lookbook, _save_lookbook
 from app.features.lookbook_seed.schemas import ReferenceAsset
-from app.lib.gcs_inventory import upload_to_gcs, upload_json_to_gcs  # <-- NEW import
-from .schemas import GenerateCoverRequest
-from .service import generate_comic_cover
+from app.features.lookbook_seed.store import lookbook_store
+from app.lib.gcs_inventory import copy_gcs_object, download_gcs_object_to_file, gcs_object_generation, upload_to_gcs
+from .schemas import GenerateCoverRequest, SelectCoverRequest
+from .service import generate_comic_cover, generate_comic_cover_candidates
 from app.config import config
 from app.lib.fs import make_job_dir
 from app.logger import get_logger
@@ -25,6 +24,50 @@ def _slugify(s: str) -> str:
     import re
     return re.sub(r"[^a-zA-Z0-9]+", "_", (s or "").strip().lower()).strip("_") or "x"
 
+def _next_cover_revs(rev_path: str, count: int) -> list[int]:
+    """Reserve `count` cover_v{n} numbers (cover.rev holds the last one used)."""
+    rev = 0
+    if os.path.exists(rev_path):
+        try:
+            rev = int(open(rev_path).read().strip())
+        except Exception:
+            rev = 0
+    with open(rev_path, "w") as f:
+        f.write(str(rev + count))
+    return list(range(rev + 1, rev + count + 1))
+
+def _sync_lookbook_cover_refs(job_id: str, workdir: str, info_canonical: dict) -> None:
+    if not os.path.exists(os.path.join(workdir, "lookbook.json")):
+        return
+
+    def _sync_cover_refs(lb) -> bool:
+        # For every entity, ensure a type="cover" asset exists and has gs_uri set to the canonical object
+        updated = False
+        for ent in [*lb.characters, *lb.locations, *lb.props]:
+            ras = getattr(ent, "reference_assets", None) or []
+            found = False
+            for ra in ras:
+                if getattr(ra, "type", "") == "cover":
+                    if getattr(ra, "gs_uri", None) != info_canonical["gs_uri"]:
+                        ra.gs_uri = info_canonical["gs_uri"]
+                        updated = True
+                    # optional: refresh url to the fresh signed URL
+                    ra.url = info_canonical.get("signed_url", ra.url)
+                    found = True
+                    break
+            if not found:
+                ras.append(ReferenceAsset(type="cover",
+                                          url=info_canonical.get("signed_url"),
+                                          gs_uri=info_canonical["gs_uri"]))
+                setattr(ent, "reference_assets", ras)
+                updated = True
+        return updated
+
+    try:
+        lookbook_store.update(job_id, _sync_cover_refs, workdir=workdir)
+    except Exception as e:
+        log.warning(f"Failed to sync lookbook cover refs: {e}")
+
 @router.post("/generate/comic/cover")
 async def cover_endpoint(req: GenerateCoverRequest, background_tasks: BackgroundTasks):
     # 1) Resolve job dir
@@ -33,6 +76,7 @@ async def cover_endpoint(req: GenerateCoverRequest, background_tasks: Background
         workdir = ensure_job_dir(job_id)
     else:
         job_id, workdir = make_job_dir_with_id()
+        req.job_id = job_id
 
     cover_png = os.path.join(workdir, "cover.png")            # canonical local path
     hash_path = os.path.join(workdir, "cover.hash")           # stores last fingerprint
@@ -40,10 +84,13 @@ async def cover_endpoint(req: GenerateCoverRequest, background_tasks: Background
 
     # 2) Fingerprint the inputs for idempotency
     # (include whether an image ref was supplied; not the bytes themselves)
+    if req.image_asset_id:
+        ref_tag = f"asset:{req.image_asset_id}"
+    else:
+        ref_tag = "has_ref" if bool(req.image_base64) else "no_ref"
     fp = hashlib.sha256(
         "|".join([
-            req.title, req.tagline, req.cover_art_description, req.user_theme,
-            "has_ref" if bool(req.image_base64) else "no_ref"
+            req.title, req.tagline, req.cover_art_description, req.user_theme, ref_tag
         ]).encode("utf-8")
     ).hexdigest()
 
@@ -67,80 +114,51 @@ async def cover_endpoint(req: GenerateCoverRequest, background_tasks: Background
             }
         }
 
-    # 4) Generate (or regenerate) the cover image locally
-    out_path = os.path.join(workdir, "cover.tmp.png")
-    try:
-        generate_comic_cover(req=req, out_path=out_path, workdir=workdir)
-    except Exception as e:
-        raise HTTPException(500, f"Cover generation failed: {e}")
+    canonical_obj = f"jobs/{job_id}/cover.png"
+    candidates = []
+    if req.candidates > 1:
+        # 4+5) k candidates from one image request, each kept as cover_v{n}.png;
+        # the first is promoted to cover.png (pick another via /cover/select)
+        revs = _next_cover_revs(rev_path, req.candidates)
+        tmp_paths = [os.path.join(workdir, f"cover_v{rev}.tmp.png") for rev in revs]
+        try:
+            generate_comic_cover_candidates(req=req, out_paths=tmp_paths, workdir=workdir)
+        except Exception as e:
+            raise HTTPException(500, f"Cover generation failed: {e}")
+        for rev, tmp in zip(revs, tmp_paths):
+            local = os.path.join(workdir, f"cover_v{rev}.png")
+            os.replace(tmp, local)
+            info = upload_to_gcs(local, object_name=f"jobs/{job_id}/cover_v{rev}.png", subdir="jobs")
+            candidates.append({"version": rev, **info})
+
+        shutil.copyfile(os.path.join(workdir, f"cover_v{revs[0]}.png"), cover_png)
+        with open(hash_path, "w") as f:
+            f.write(fp)
+        info_canonical = copy_gcs_object(f"jobs/{job_id}/cover_v{revs[0]}.png", canonical_obj)
+    else:
+        # 4) Generate (or regenerate) the cover image locally
+        out_path = os.path.join(workdir, "cover.tmp.png")
+        try:
+            generate_comic_cover(req=req, out_path=out_path, workdir=workdir)
+        except Exception as e:
+            raise HTTPException(500, f"Cover generation failed: {e}")
 
-    # atomically set/replace canonical cover
-    os.replace(out_path, cover_png)
-    with open(hash_path, "w") as f:
-        f.write(fp)
+        # atomically set/replace canonical cover
+        os.replace(out_path, cover_png)
+        with open(hash_path, "w") as f:
+            f.write(fp)
 
-    # 5) Upload canonical cover.png
-    canonical_obj = f"jobs/{job_id}/cover.png"
-    info_canonical = upload_to_gcs(cover_png, object_name=canonical_obj, subdir="jobs")
-
-    # 6) If versioned, also write a new version object cover_v{n}.png
-    if req.versioned:
-        rev = 1
-        if os.path.exists(rev_path):
-            try:
-                rev = int(open(rev_path).read().strip()) + 1
-            except Exception:
-                rev = 1
-        with open(rev_path, "w") as f:
-            f.write(str(rev))
-
-        versioned_obj = f"jobs/{job_id}/cover_v{rev}.png"
-        _ = upload_to_gcs(cover_png, object_name=versioned_obj, subdir="jobs")
+        # 5) Upload canonical cover.png
+        info_canonical = upload_to_gcs(cover_png, object_name=canonical_obj, subdir="jobs")
 
-    # 7) OPTIONAL: keep lookbook cover refs in sync (if lookbook already exists)
-    lb_path = os.path.join(workdir, "lookbook.json")
-    if os.path.exists(lb_path):
-        try:
-            lb = _load_lookbook(lb_path)
-            # For every entity, ensure a type="cover" asset exists and has gs_uri set to the canonical object
-            updated = False
-            def _touch_assets(lst):
-                nonlocal updated
-                for ent in lst:
-                    ras = getattr(ent, "reference_assets", None) or []
-                    found = False
-                    for ra in ras:
-                        if getattr(ra, "type", "") == "cover":
-                            if getattr(ra, "gs_uri", None) != info_canonical["gs_uri"]:
-                                ra.gs_uri = info_canonical["gs_uri"]
-                                updated = True
-                            # optional: refresh url to the fresh signed URL
-                            ra.url = info_canonical.get("signed_url", ra.url)
-                            found = True
-                            break
-                    if not found:
-                        ras.append(ReferenceAsset(type="cover",
-                                                  url=info_canonical.get("signed_url"),
-                                                  gs_uri=info_canonical["gs_uri"]))
-                        setattr(ent, "reference_assets", ras)
-                        updated = True
+        # 6) If versioned, also write a new version object cover_v{n}.png
+        if req.versioned:
+            rev = _next_cover_revs(rev_path, 1)[0]
+            versioned_obj = f"jobs/{job_id}/cover_v{rev}.png"
+            _ = upload_to_gcs(cover_png, object_name=versioned_obj, subdir="jobs")
 
-            _touch_assets(getattr(lb, "characters", []))
-            _touch_assets(getattr(lb, "locations", []))
-            _touch_assets(getattr(lb, "props", []))
-
-            if updated:
-                _save_lookbook(lb_path, lb)
-                upload_json_to_gcs(
-                    data=json.loads(lb.model_dump_json()),
-                    object_name=f"jobs/{job_id}/lookbook.json",
-                    subdir="jobs",
-                    filename_hint="lookbook.json",
-                    cache_control="no-cache",
-                    make_signed_url=True,
-                )
-        except Exception as e:
-            log.warning(f"Failed to sync lookbook cover refs: {e}")
+    # 7) OPTIONAL: keep lookbook cover refs in sync (if lookbook already exists)
+    _sync_lookbook_cover_refs(job_id, workdir, info_canonical)
 
     # 8) Build seed payload (so the next step can seed/update lookbook using the stable gs://)
     seed_request = {
@@ -158,6 +176,7 @@ async def cover_endpoint(req: GenerateCoverRequest, background_tasks: Background
         "job_id": job_id,
         "cover": info_canonical,
         "cover_image_url": info_canonical.get("signed_url"),
+        "candidates": candidates,
         "seed_request": seed_request,
         "meta": {
             "user_theme": req.user_theme,
@@ -166,3 +185,36 @@ async def cover_endpoint(req: GenerateCoverRequest, background_tasks: Background
             "tagline": req.tagline
         }
     }
+
+
+@router.post("/generate/comic/cover/select")
+async def select_cover_endpoint(req: SelectCoverRequest):
+    """
+    Promote cover_v{n}.png (from a `candidates` or `versioned` run) to
+    cover.png without generating anything: a GCS copy, a local copy for the
+    page renderer, and a lookbook cover-ref refresh.
+    """
+    job_id = req.job_id
+    workdir = ensure_job_dir(job_id)
+    cover_png = os.path.join(workdir, "cover.png")
+    versioned_obj = f"jobs/{job_id}/cover_v{req.version}.png"
+    local = os.path.join(workdir, f"cover_v{req.version}.png")
+
+    if os.path.exists(local):
+        shutil.copyfile(local, f"{cover_png}.part")
+    else:
+        gs_uri = f"gs://{config.gcs_bucket}/{versioned_obj}"
+        if not gcs_object_generation(gs_uri):
+            raise HTTPException(404, f"cover_v{req.version}.png not found for job {job_id}")
+        download_gcs_object_to_file(gs_uri, f"{cover_png}.part")
+    os.replace(f"{cover_png}.part", cover_png)
+
+    info_canonical = copy_gcs_object(versioned_obj, f"jobs/{job_id}/cover.png")
+    _sync_lookbook_cover_refs(job_id, workdir, info_canonical)
+
+    return {
+        "job_id": job_id,
+        "version": req.version,
+        "cover": info_canonical,
+        "cover_image_url": info_canonical.get("signed_url"),
+    }
@@ -9,6 +9,12 @@ class GenerateCoverRequest(BaseModel):
     title: str
     tagline: str
     image_base64: Optional[str] = Field(None, description="Optional PNG/JPEG base64")
+    image_asset_id: Optional[str] = Field(None, description="asset_id from /assets/upload (preferred over image_base64)")
     return_mode: Literal["signed_url", "inline", "base64"] = "signed_url"
     overwrite: bool = True                              # NEW: overwrite cover.png if inputs changed
     versioned: bool = False                             # NEW: also write cover_v{n}.png when inputs change
+    candidates: int = Field(1, ge=1, le=4, description="Covers per request; each is kept as cover_v{n}.png, the first becomes cover.png")
+
+class SelectCoverRequest(BaseModel):
+    job_id: str
+    version: int = Field(..., ge=1, description="n of the cover_v{n}.png to promote to cover.png")
@@ -1,19 +1,23 @@
 # app/features/cover/service.py
 import base64
+import contextvars
 import os
-import urllib.request
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
 from app.config import config
-from app.lib.imaging import maybe_decode_image_to_path
+from app.lib.imaging import image_candidates, maybe_decode_image_to_path
+from app.lib.uploads import resolve_upload
+from app.lib import tracing, usage
 from app.lib.openai_client import client
 from app.logger import get_logger
 
 # Lookbook access + GCS helper
-from app.features.lookbook_ref_assets.service import _load_lookbook  # reuse
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.store import lookbook_store
 from app.features.lookbook_seed.schemas import LookbookDoc, ReferenceAsset
-from app.lib.gcs_inventory import download_gcs_object_to_file
+from app.lib.assets import run_resolver
 
 from .schemas import GenerateCoverRequest
 from .prompt import build_cover_prompt
@@ -21,77 +25,81 @@ from .prompt import build_cover_prompt
 log = get_logger(__name__)
 
 
-def _dl_to(path: str, url: str) -> str:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    if url.startswith("gs://"):
-        download_gcs_object_to_file(url, path)
-    else:
-        with urllib.request.urlopen(url) as r, open(path, "wb") as f:
-            f.write(r.read())
-    return path
+# best asset types per kind, in preference order
+_COVER_REF_TYPES = {
+    "character": ("portrait", "turnaround"),
+    "location": ("wide",),
+    "prop": ("detail",),
+}
+_KIND_WEIGHT = {"character": 0, "location": 1, "prop": 2}
+_MAIN_ROLES = ("protagonist", "main", "hero", "lead")
 
 
-def _collect_cover_refs(workdir: str, lb: LookbookDoc) -> Tuple[List[str], List[str], List[str], List[str]]:
+def _rank_cover_refs(lbx: LookbookIndex, description: str, cap: int) -> List[Tuple[str, str, ReferenceAsset]]:
+    """
+    Pick at most `cap` (kind, id, asset) to attach, best first:
+    entities named in the cover description, then main characters, then the
+    rest; characters before locations before props. Lookbook order breaks ties.
+    """
+    text = (description or "").lower()
+    scored = []
+    for pos, (_id, kind, ent) in enumerate(lbx):
+        a = lbx.best_asset(_id, _COVER_REF_TYPES.get(kind, ()))
+        if not a or not (a.gs_uri or a.url):
+            continue
+        name = lbx.name(_id).lower()
+        mentioned = bool(name and name in text) or _id.lower() in text
+        main = kind == "character" and (getattr(ent, "role", None) or "").lower() in _MAIN_ROLES
+        scored.append(((not mentioned, not main, _KIND_WEIGHT.get(kind, 9), pos), kind, _id, a))
+    scored.sort(key=lambda x: x[0])
+    return [(kind, _id, a) for _, kind, _id, a in scored[:max(0, cap)]]
+
+
+def _collect_cover_refs(
+    workdir: str,
+    lb: LookbookDoc,
+    *,
+    description: str = "",
+    cap: Optional[int] = None,
+) -> Tuple[List[str], List[str], List[str], List[str]]:
     """
     From lookbook.json, gather best-available reference images for:
       - characters: prefer portrait, then turnaround
       - locations : wide
       - props     : detail
 
+    Only the top `cap` refs (see _rank_cover_refs) are fetched, concurrently,
+    through the job's asset cache (unchanged objects are not re-downloaded).
+
     Returns: (ref_paths, character_names, location_names, prop_names)
     """
-    ref_paths: List[str] = []
-    char_names: List[str] = []
-    loc_names: List[str] = []
-    prop_names: List[str] = []
+    lbx = LookbookIndex(lb)
+    picked = _rank_cover_refs(lbx, description, config.cover_max_refs if cap is None else cap)
+    if not picked:
+        return [], [], [], []
+
+    assets = run_resolver(workdir)
+    with tracing.span("cover.refs", refs=len(picked)), \
+            ThreadPoolExecutor(max_workers=min(8, len(picked)), thread_name_prefix="cover-refs") as pool:
+        # copy_context: downloads nest under cover.refs in the trace
+        futures = [pool.submit(contextvars.copy_context().run, assets.resolve, ref) for _, _, ref in picked]
+        paths = [f.result() for f in futures]
 
-    def best_asset(assets: List[ReferenceAsset], wanted: List[str]) -> ReferenceAsset | None:
-        for w in wanted:
-            for a in assets or []:
-                if getattr(a, "type", None) == w:
-                    return a
-        return None
-
-    # Characters
-    for c in lb.characters or []:
-        a = best_asset(c.reference_assets, ["portrait", "turnaround"])
-        if a and (a.gs_uri or a.url):
-            out = os.path.join(workdir, "cover_refs", f"char_{c.id}.png")
-            src = a.gs_uri or a.url
-            try:
-                _dl_to(out, src)
-                ref_paths.append(out)
-                char_names.append(c.display_name or c.id)
-            except Exception as e:
-                log.warning(f"Failed downloading char ref for {c.id}: {e}")
-
-    # Locations
-    for l in lb.locations or []:
-        a = best_asset(l.reference_assets, ["wide"])
-        if a and (a.gs_uri or a.url):
-            out = os.path.join(workdir, "cover_refs", f"loc_{l.id}.png")
-            src = a.gs_uri or a.url
-            try:
-                _dl_to(out, src)
-                ref_paths.append(out)
-                loc_names.append(l.name or l.id)
-            except Exception as e:
-                log.warning(f"Failed downloading location ref for {l.id}: {e}")
-
-    # Props
-    for p in lb.props or []:
-        a = best_asset(p.reference_assets, ["detail"])
-        if a and (a.gs_uri or a.url):
-            out = os.path.join(workdir, "cover_refs", f"prop_{p.id}.png")
-            src = a.gs_uri or a.url
-            try:
-                _dl_to(out, src)
-                ref_paths.append(out)
-                prop_names.append(p.name or p.id)
-            except Exception as e:
-                log.warning(f"Failed downloading prop ref for {p.id}: {e}")
-
-    return ref_paths, char_names, loc_names, prop_names
+    ref_paths: List[str] = []
+    names: Dict[str, List[str]] = {"character": [], "location": [], "prop": []}
+    # attach grouped (characters, locations, props) so the prompt's name lists line up
+    for kind in ("character", "location", "prop"):
+        for (k, _id, _), path in zip(picked, paths):
+            if k != kind:
+                continue
+            if not path:
+                log.warning(f"Failed downloading {kind} ref for {_id}")
+                continue
+            ref_paths.append(path)
+            names[kind].append(lbx.name(_id))
+    log.debug(f"[cover] attached {len(ref_paths)} lookbook refs; downloads: {assets.stats}")
+
+    return ref_paths, names["character"], names["location"], names["prop"]
 
 
 def _make_prompt_with_lookbook(
@@ -112,20 +120,31 @@ def _make_prompt_with_lookbook(
     prop_names: List[str] = []
     ref_paths: List[str] = []
 
+    # If user supplied a direct face ref (main), it goes first (highest priority).
+    # This preserves backwards-compatibility and makes likeness lock tighter.
+    # An uploaded asset (by id) wins over inline base64.
+    face_ref_path = None
+    if req.image_asset_id:
+        face_ref_path = resolve_upload(req.image_asset_id, job_id=req.job_id, workdir=workdir)
+        if not face_ref_path:
+            raise HTTPException(400, f"Unknown image_asset_id {req.image_asset_id}")
+    if not face_ref_path:
+        face_ref_path = maybe_decode_image_to_path(req.image_base64, workdir)
+    if face_ref_path:
+        ref_paths.append(face_ref_path)
+
     if has_lb:
         try:
-            lb = _load_lookbook(lb_path)
-            refs, char_names, loc_names, prop_names = _collect_cover_refs(workdir, lb)
+            lb = lookbook_store.load(req.job_id, workdir=workdir)
+            refs, char_names, loc_names, prop_names = _collect_cover_refs(
+                workdir, lb,
+                description=req.cover_art_description,
+                cap=config.cover_max_refs - len(ref_paths),  # the face ref takes a slot
+            )
             ref_paths.extend(refs)
         except Exception as e:
             log.warning(f"Could not load/use lookbook refs: {e}")
 
-    # If user supplied a direct face ref (main), prepend it to refs (highest priority).
-    # This preserves backwards-compatibility and makes likeness lock tighter.
-    face_ref_path = maybe_decode_image_to_path(req.image_base64, workdir)
-    if face_ref_path:
-        ref_paths.insert(0, face_ref_path)
-
     prompt = build_cover_prompt(
         title=req.title,
         tagline=req.tagline,
@@ -138,24 +157,28 @@ def _make_prompt_with_lookbook(
     return prompt, ref_paths
 
 
-def generate_comic_cover(req: GenerateCoverRequest, *, out_path: str, workdir: str) -> str:
+def generate_comic_cover_candidates(req: GenerateCoverRequest, *, out_paths: List[str], workdir: str) -> List[str]:
     """
-    Generate the cover using multiple lookbook reference images when available.
+    Generate len(out_paths) cover candidates in one image request (prompt and
+    reference uploads paid once) using multiple lookbook reference images
+    when available.
     - If we have any refs -> images.edit with a LIST of files
     - Else -> images.generate
     """
     prompt, ref_paths = _make_prompt_with_lookbook(workdir=workdir, req=req)
     log.debug(f"cover prompt is: {prompt}")
 
-    try:
+    def _request(n: int):
         if ref_paths:
             files = [open(p, "rb") for p in ref_paths]
             try:
-                resp = client.images.edit(
+                return usage.tracked(
+                    "image.edit", client.images.edit,
+                    tags={"job_id": req.job_id, "stage": "cover"},
                     model=config.openai_image_model,
                     prompt=prompt,
                     size=config.image_size,
-                    n=1,
+                    n=n,
                     image=files,  # list of files: likeness + style guidance
                 )
             finally:
@@ -164,20 +187,28 @@ def generate_comic_cover(req: GenerateCoverRequest, *, out_path: str, workdir: s
                         f.close()
                     except Exception:
                         pass
-        else:
-            # No references at all → plain generate
-            resp = client.images.generate(
-                model=config.openai_image_model,
-                prompt=prompt,
-                size=config.image_size,
-                n=1,
-            )
+        # No references at all → plain generate
+        return usage.tracked(
+            "image.generate", client.images.generate,
+            tags={"job_id": req.job_id, "stage": "cover"},
+            model=config.openai_image_model,
+            prompt=prompt,
+            size=config.image_size,
+            n=n,
+        )
 
-        b64 = resp.data[0].b64_json
-        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-        with open(out_path, "wb") as f:
-            f.write(base64.b64decode(b64))
-        return out_path
+    try:
+        b64s = image_candidates(_request, len(out_paths))
+        for b64, out_path in zip(b64s, out_paths):
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(base64.b64decode(b64))
+        return out_paths
 
     except Exception as e:
         raise HTTPException(500, f"Cover generation failed: {e}")
+
+
+def generate_comic_cover(req: GenerateCoverRequest, *, out_path: str, workdir: str) -> str:
+    """Single cover (see generate_comic_cover_candidates)."""
+    return generate_comic_cover_candidates(req, out_paths=[out_path], workdir=workdir)[0]
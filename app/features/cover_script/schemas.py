@@ -10,6 +10,7 @@ class CoverScriptRequest(BaseModel):
     page_count: int = Field(..., description="Total page count")
     theme: str = Field(..., description="Core comic theme")
     user_answers_list: Dict[str, str] = Field(default_factory=dict, description="Comedic Q&A pairs (question → answer)")
+    force: bool = Field(False, description="Skip the response cache and call the model")
 
 # --- Lookbook seeding helpers (aligns with /lookbook/seed-from-cover) ---
 
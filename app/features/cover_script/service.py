@@ -1,6 +1,8 @@
 import json, re, unicodedata
 from pydantic import ValidationError
+from app.lib import llm_cache, usage
 from app.lib.openai_client import client
+from app.lib.scheduler import text_scheduler
 from .schemas import CoverScriptRequest, CoverScriptResponse
 from .prompt import build_cover_script_prompt
 
@@ -89,30 +91,45 @@ def _normalize_entity_ids(data: dict) -> dict:
     remap("props", "prop_")
     return data
 
-async def generate_cover_script(req: CoverScriptRequest) -> CoverScriptResponse:
-    traits = ", ".join(f"{q} - {a}" for q, a in req.user_answers_list.items()) if req.user_answers_list else ""
-    prompt = build_cover_script_prompt(
-        title=req.title, synopsis=req.synopsis, name=req.name,
-        gender=req.gender, page_count=req.page_count, theme=req.theme, traits=traits
-    )
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        messages=[
-            {"role": "system", "content": SYSTEM},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    raw = (resp.choices[0].message.content or "").strip()
+def _parse(raw: str, main_name: str) -> CoverScriptResponse:
+    """Model text -> response, with char_main ensured and entity IDs slugged; raises ValueError."""
     try:
         data = json.loads(raw)
     except json.JSONDecodeError as e:
         raise ValueError(f"Model did not return valid JSON: {e}\nRaw: {raw}") from e
 
-    data = _ensure_char_main(data, req.name)
+    data = _ensure_char_main(data, main_name)
     data = _normalize_entity_ids(data)
 
     try:
         return CoverScriptResponse(**data)
     except ValidationError as e:
         raise ValueError(f"Model JSON failed validation: {e}\nData: {data}") from e
+
+async def generate_cover_script(req: CoverScriptRequest) -> CoverScriptResponse:
+    traits = ", ".join(f"{q} - {a}" for q, a in req.user_answers_list.items()) if req.user_answers_list else ""
+    prompt = build_cover_script_prompt(
+        title=req.title, synopsis=req.synopsis, name=req.name,
+        gender=req.gender, page_count=req.page_count, theme=req.theme, traits=traits
+    )
+    def _call() -> str:
+        with text_scheduler.slot():
+            resp = usage.tracked(
+                "chat", client.chat.completions.create,
+                tags={"stage": "cover_script"},
+                model="gpt-4o-mini",
+                temperature=0.7,
+                messages=[
+                    {"role": "system", "content": SYSTEM},
+                    {"role": "user", "content": prompt},
+                ],
+            )
+        return (resp.choices[0].message.content or "").strip()
+
+    raw = await text_scheduler.run(
+        llm_cache.cached_completion,
+        "cover_script",
+        model="gpt-4o-mini", system=SYSTEM, prompt=prompt, temperature=0.7,
+        call=_call, force=req.force, validate=lambda text: _parse(text, req.name),
+    )
+    return _parse(raw, req.name)
@@ -1,4 +1,4 @@
-from .schemas import FullScriptRequest
+from .schemas import FullScriptRequest, OutlinePage
 from typing import Dict, List, Tuple
 
 def _fmt_label(it: Dict[str, str]) -> str:
@@ -83,3 +83,69 @@ FINAL CHECKLIST BEFORE YOU OUTPUT:
 RETURN:
 - A single JSON object that conforms to the provided JSON Schema (arrays present even if empty).
 """.strip()
+
+def build_outline_prompt(
+    req: FullScriptRequest,
+    known: Dict[str, List[Dict[str, str]]],
+) -> str:
+    traits = ", ".join([f"{q} - {a}" for q, a in (req.user_answers_list or {}).items()]) if getattr(req, "user_answers_list", None) else ""
+    known_block = (
+        "KNOWN ENTITIES (reuse these IDs when they fit):\n"
+        + _format_known("Characters", known.get("characters", []))
+        + _format_known("Locations",  known.get("locations",  []))
+        + _format_known("Props",      known.get("props",      []))
+    )
+    return f"""
+Plan a {req.page_count}-page comic as a page-by-page OUTLINE (no panels, no dialogue yet).
+
+CONTEXT INPUTS:
+- Story Summary: "{req.story_summary}"
+- Comic Title: "{req.title}"
+- Comic Tagline: "{req.tagline}"
+- Main Character Name: "{req.user_name}" (ID: char_main)
+- Main Character Gender: "{req.user_gender}"
+- Core Theme: "{req.user_theme}"
+- Comedic Traits: "{traits}"
+
+{known_block}
+
+RULES:
+- pages: exactly {req.page_count}, numbered 1..{req.page_count}; one beat (1–2 sentences) per page with a clear arc.
+- Fix every recurring entity ID NOW (char_* / loc_* / prop_*); later writers must reuse them verbatim.
+- Favor KNOWN IDs; add new IDs only for recurring entities. One-off extras get no ID.
+- Use "" for location_id only when no setting applies.
+
+RETURN:
+- A single JSON object that conforms to the provided JSON Schema.
+""".strip()
+
+def _format_outline(pages: List[OutlinePage]) -> str:
+    lines = []
+    for p in pages:
+        ids = ", ".join([x for x in [p.location_id, *p.characters, *p.props] if x]) or "-"
+        lines.append(f"  {p.page_number}. {p.beat} [ids: {ids}]")
+    return "\n".join(lines)
+
+def build_full_script_chunk_prompt(
+    req: FullScriptRequest,
+    known: Dict[str, List[Dict[str, str]]],
+    outline: List[OutlinePage],
+    start: int,
+    end: int,
+) -> str:
+    """
+    Full-script prompt restricted to pages [start, end] of a shared outline.
+    Appended as an override, like the short-mode brevity block.
+    """
+    return (
+        build_full_script_prompt(req, known)
+        + "\n\nCHUNK OVERRIDE (takes precedence over OUTPUT SHAPE page count):\n"
+        f"- Write ONLY pages {start}–{end} of {req.page_count} ({end - start + 1} pages), "
+        f"numbered {start}..{end}.\n"
+        "- Follow the shared OUTLINE below exactly; pages outside your range are written by others.\n"
+        "- Reuse the outline's IDs verbatim; do not invent new recurring IDs.\n"
+        "- Leave lookbook_delta arrays empty.\n"
+        "OUTLINE:\n"
+        f"{_format_outline(outline)}"
+    )
+
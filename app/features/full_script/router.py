@@ -1,26 +1,31 @@
 from fastapi import APIRouter
-import json, os
+from fastapi.responses import StreamingResponse
+import asyncio, json, os
 from typing import Any, Dict
 from app.logger import get_logger
 from app.lib.paths import ensure_job_dir, make_job_dir_with_id
 from app.lib.gcs_inventory import upload_json_to_gcs
+from app.lib.scheduler import text_scheduler
 
 from .schemas import FullScriptRequest, FullScriptPagesResponse
-from .service import generate_full_script
+from .service import generate_full_script, iter_full_script
 
-# reuse lookbook helpers & models
-from app.features.lookbook_ref_assets.service import _load_lookbook as _lb_load, _save_lookbook as _lb_save
 from app.features.lookbook_seed.schemas import LookbookDoc, LookbookCharacter, LookbookLocation, LookbookProp
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.store import lookbook_store
 
 router = APIRouter(prefix="/api/v1", tags=["full-script"])
 log = get_logger(__name__)
 
-def _apply_delta_to_lookbook(lb: LookbookDoc, script_delta) -> LookbookDoc:
-    def present(lst, _id): return any(getattr(x, "id", None) == _id for x in lst)
+def _apply_delta_to_lookbook(lb: LookbookDoc, script_delta) -> bool:
+    """Add entities the script introduced; True if anything was added."""
+    lbx = LookbookIndex(lb)
+    before = len(lb.characters) + len(lb.locations) + len(lb.props)
 
     for c in script_delta.characters_to_add or []:
-        if not present(lb.characters, c.id):
-            lb.characters.append(
+        if c.id not in lbx:
+            lbx.add(
+                "character",
                 LookbookCharacter(
                     id=c.id,
                     display_name=c.display_name,
@@ -32,8 +37,9 @@ def _apply_delta_to_lookbook(lb: LookbookDoc, script_delta) -> LookbookDoc:
             )
 
     for l in script_delta.locations_to_add or []:
-        if not present(lb.locations, l.id):
-            lb.locations.append(
+        if l.id not in lbx:
+            lbx.add(
+                "location",
                 LookbookLocation(
                     id=l.id,
                     name=l.name,
@@ -44,8 +50,9 @@ def _apply_delta_to_lookbook(lb: LookbookDoc, script_delta) -> LookbookDoc:
             )
 
     for p in script_delta.props_to_add or []:
-        if not present(lb.props, p.id):
-            lb.props.append(
+        if p.id not in lbx:
+            lbx.add(
+                "prop",
                 LookbookProp(
                     id=p.id,
                     name=p.name,
@@ -54,29 +61,36 @@ def _apply_delta_to_lookbook(lb: LookbookDoc, script_delta) -> LookbookDoc:
                     created_from="script_v1",
                 )
             )
-    return lb
+    return len(lb.characters) + len(lb.locations) + len(lb.props) > before
 
-@router.post("/generate/comic/full-script", status_code=201)
-async def full_script_create_job(req: FullScriptRequest) -> Dict[str, Any]:
-    """
-    Generate the full script using the existing lookbook (if job_id given).
-    Save script.json (pages only) to GCS.
-    Apply lookbook_delta (derived from recurring usage) to lookbook.json and upload it.
-    Return job_id, script GCS, lookbook_delta, and lookbook GCS pointers.
-    """
-    if req.job_id:
-        job_id = req.job_id
-        workdir = ensure_job_dir(job_id)
-    else:
-        job_id, workdir = make_job_dir_with_id()
-        req.job_id = job_id
+def _write_script_json(workdir: str, pages, *, partial: bool = False) -> dict:
+    script_only: Dict[str, Any] = {"pages": [p.model_dump() for p in pages]}
+    if partial:
+        script_only["partial"] = True
+    path = os.path.join(workdir, "script.json")
+    tmp = f"{path}.part"
+    with open(tmp, "w") as f:
+        json.dump(script_only, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return script_only
 
-    script: FullScriptPagesResponse = await generate_full_script(req)
+def _discard_partial_script(workdir: str) -> None:
+    """Drop a truncated streaming script.json so nothing renders from it."""
+    path = os.path.join(workdir, "script.json")
+    try:
+        with open(path, "r") as f:
+            if not json.load(f).get("partial"):
+                return
+        os.remove(path)
+    except (OSError, ValueError) as e:
+        log.warning(f"could not discard partial {path}: {e}")
 
-    # Save script.json (pages only)
-    script_only = {"pages": [p.model_dump() for p in script.pages]}
-    with open(os.path.join(workdir, "script.json"), "w") as f:
-        json.dump(script_only, f, ensure_ascii=False, indent=2)
+def _persist_script(job_id: str, workdir: str, script: FullScriptPagesResponse) -> Dict[str, Any]:
+    """
+    Save script.json (pages only) locally + GCS, apply the derived
+    lookbook_delta to lookbook.json and upload it. Returns the response body.
+    """
+    script_only = _write_script_json(workdir, script.pages)
 
     # Upload script.json
     try:
@@ -93,21 +107,15 @@ async def full_script_create_job(req: FullScriptRequest) -> Dict[str, Any]:
         script_gcs = None
 
     # Apply derived delta to lookbook and upload
-    lb = _lb_load(os.path.join(workdir, "lookbook.json")) or LookbookDoc()
-    lb = _apply_delta_to_lookbook(lb, script.lookbook_delta)
-    _lb_save(os.path.join(workdir, "lookbook.json"), lb)
-
     try:
-        lookbook_gcs = upload_json_to_gcs(
-            data=json.loads(lb.model_dump_json()),
-            object_name=f"jobs/{job_id}/lookbook.json",
-            subdir="jobs",
-            filename_hint="lookbook.json",
-            cache_control="no-cache",
-            make_signed_url=True,
+        _, lookbook_gcs = lookbook_store.update(
+            job_id,
+            # revision 0: no lookbook yet, write one even if the delta is empty
+            lambda lb: _apply_delta_to_lookbook(lb, script.lookbook_delta) or lb.revision == 0,
+            workdir=workdir, create=True,
         )
     except Exception as e:
-        log.exception(f"Failed to upload lookbook.json to GCS: {e}")
+        log.exception(f"Failed to update lookbook.json: {e}")
         lookbook_gcs = None
 
     return {
@@ -120,3 +128,59 @@ async def full_script_create_job(req: FullScriptRequest) -> Dict[str, Any]:
             "note": "Use lookbook_delta IDs (or any missing types) with force=true to create reference assets."
         },
     }
+
+def _resolve_job(req: FullScriptRequest) -> tuple[str, str]:
+    if req.job_id:
+        return req.job_id, ensure_job_dir(req.job_id)
+    job_id, workdir = make_job_dir_with_id()
+    req.job_id = job_id
+    return job_id, workdir
+
+@router.post("/generate/comic/full-script", status_code=201)
+async def full_script_create_job(req: FullScriptRequest) -> Dict[str, Any]:
+    """
+    Generate the full script using the existing lookbook (if job_id given).
+    Save script.json (pages only) to GCS.
+    Apply lookbook_delta (derived from recurring usage) to lookbook.json and upload it.
+    Return job_id, script GCS, lookbook_delta, and lookbook GCS pointers.
+    """
+    job_id, workdir = _resolve_job(req)
+    script: FullScriptPagesResponse = await generate_full_script(req)
+    return _persist_script(job_id, workdir, script)
+
+@router.post("/generate/comic/full-script/stream", status_code=201)
+async def full_script_stream(req: FullScriptRequest) -> StreamingResponse:
+    """
+    Streaming variant (NDJSON). Emits {"event":"page","page":{...}} as each page
+    closes in the model's token stream, rewriting script.json (with
+    "partial": true) after every page so downstream stages can start early.
+    The comic worker won't render a partial script (409, Cloud Tasks retries);
+    if the stream errors or the client goes away, the partial file is removed.
+    Ends with {"event":"done", ...same body as the non-streaming endpoint}
+    or {"event":"error","detail":...}.
+    """
+    job_id, workdir = _resolve_job(req)
+
+    async def _events():
+        pages = []
+        done = False
+        try:
+            # each delta is pulled on the text scheduler's threads, so a long
+            # stream holds its model slot but no thread between deltas
+            async for kind, payload in text_scheduler.iterate(iter_full_script(req)):
+                if kind == "page":
+                    pages.append(payload)
+                    _write_script_json(workdir, pages, partial=True)
+                    yield json.dumps({"event": "page", "job_id": job_id, "page": payload.model_dump()}) + "\n"
+                else:
+                    body = await asyncio.to_thread(_persist_script, job_id, workdir, payload)
+                    done = True
+                    yield json.dumps({"event": "done", **body}) + "\n"
+        except Exception as e:
+            log.exception(f"[{job_id}] full-script stream failed: {e}")
+            yield json.dumps({"event": "error", "job_id": job_id, "detail": str(e)}) + "\n"
+        finally:
+            if pages and not done:
+                _discard_partial_script(workdir)
+
+    return StreamingResponse(_events(), media_type="application/x-ndjson", status_code=201)
@@ -56,6 +56,18 @@ class FullScriptPagesResponse(BaseModel):
     pages: list[Page]
     lookbook_delta: LookbookDelta = LookbookDelta()
 
+# ----- Outline (phase 1 of chunked generation) -----
+
+class OutlinePage(BaseModel):
+    page_number: int
+    beat: str                                             # 1–2 sentences: what happens on this page
+    location_id: str = ""
+    characters: list[str] = Field(default_factory=list)
+    props: list[str] = Field(default_factory=list)
+
+class ScriptOutline(BaseModel):
+    pages: list[OutlinePage]
+
 class FullScriptRequest(BaseModel):
     job_id: str | None = None
     title: str
@@ -68,3 +80,4 @@ class FullScriptRequest(BaseModel):
     user_answers_list: Dict[str, str] = Field(default_factory=dict)
     min_panels_per_page: int = 3
     max_panels_per_page: int = 6
+    force: bool = Field(False, description="Skip the response cache and call the model")
@@ -1,29 +1,33 @@
 from collections import defaultdict
 from pydantic import ValidationError
-import json, os, hashlib, time
-from typing import Dict, List, Tuple, Set
+import asyncio, time
+from typing import Any, Dict, Iterator, List, Tuple, Set
+from app.lib import llm_cache, raw_archive, usage
+from app.lib.json_tools import JsonArrayStreamParser
 from app.lib.openai_client import client
+from app.lib.scheduler import text_scheduler
 from app.config import config
-from .schemas import FullScriptRequest, FullScriptPagesResponse, LookbookDelta, CharacterToAdd, LocationToAdd, PropToAdd
-from .prompt import build_full_script_prompt
+from app.logger import get_logger
+from .schemas import (
+    FullScriptRequest, FullScriptPagesResponse, LookbookDelta, CharacterToAdd, LocationToAdd, PropToAdd, Page,
+    OutlinePage, ScriptOutline,
+)
+from .prompt import build_full_script_prompt, build_full_script_chunk_prompt, build_outline_prompt
+from . import service_repair as repair
 
 # load lookbook to reuse IDs
-from app.lib.paths import job_dir
 from app.features.lookbook_seed.schemas import LookbookDoc
+from app.features.lookbook_seed.store import lookbook_store
 
-RAW_DIR = "app/output/full_script_raw"
+log = get_logger(__name__)
 
 # -------- Lookbook I/O --------
 
 def _load_lookbook(job_id: str | None) -> LookbookDoc | None:
     if not job_id:
         return None
-    path = os.path.join(job_dir(job_id), "lookbook.json")
-    if not os.path.exists(path):
-        return None
     try:
-        with open(path, "r") as f:
-            return LookbookDoc.model_validate(json.load(f))
+        return lookbook_store.load(job_id)
     except Exception:
         return None
 
@@ -118,6 +122,19 @@ def _full_script_json_schema() -> dict:
         "lookbook_delta": lookbook_delta,
     })
 
+def _outline_json_schema() -> dict:
+    def obj(props: dict) -> dict:
+        return {"type": "object", "additionalProperties": False, "properties": props, "required": list(props.keys())}
+
+    page = obj({
+        "page_number": {"type": "integer", "minimum": 1},
+        "beat": {"type": "string", "minLength": 1},
+        "location_id": {"type": "string", "pattern": r"^(|loc_[a-z0-9_]+)$"},
+        "characters": {"type": "array", "items": {"type": "string", "pattern": r"^char_[a-z0-9_]+$"}},
+        "props": {"type": "array", "items": {"type": "string", "pattern": r"^prop_[a-z0-9_]+$"}},
+    })
+    return obj({"pages": {"type": "array", "minItems": 1, "items": page}})
+
 SYSTEM_MSG = (
     "You are a top-tier comic writer & storyboard artist. "
     "Return ONLY a single JSON object that strictly conforms to the provided JSON Schema. "
@@ -135,25 +152,23 @@ def _extract_json_str(raw: str) -> str:
         return raw[s:e+1]
     return raw
 
-def _save_raw(job_id: str | None, payload: str, suffix: str):
-    os.makedirs(RAW_DIR, exist_ok=True)
-    stamp = time.strftime("%Y%m%d-%H%M%S")
-    jid = job_id or "nojob"
-    h = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:8]
-    path = os.path.join(RAW_DIR, f"{jid}-{stamp}-{suffix}-{h}.txt")
-    try:
-        with open(path, "w") as f:
-            f.write(payload)
-    except Exception:
-        pass
-    return path
+def _save_raw(job_id: str | None, payload: str, suffix: str) -> None:
+    # queued; written off the request path to the rotating raw archive
+    raw_archive.archive("full_script", job_id, payload, tag=suffix)
 
-def _max_tokens_for(req: FullScriptRequest) -> int:
+def _max_tokens_for(req: FullScriptRequest, pages: int | None = None) -> int:
     # generous, but bounded
-    return min(8192, 600 * max(1, req.page_count) + 800)
-
-async def _call_llm(prompt: str, max_tokens: int, short_mode: bool = False) -> str:
-    schema = _full_script_json_schema()
+    return min(8192, 600 * max(1, pages or req.page_count) + 800)
+
+def _llm_kwargs(
+    prompt: str,
+    max_tokens: int,
+    short_mode: bool = False,
+    *,
+    schema: dict | None = None,
+    schema_name: str = "FullScriptPagesResponse",
+) -> dict:
+    schema = schema or _full_script_json_schema()
     final_prompt = prompt
     if short_mode:
         final_prompt += (
@@ -162,16 +177,75 @@ async def _call_llm(prompt: str, max_tokens: int, short_mode: bool = False) -> s
             "- If at risk of overflow, abbreviate descriptions.\n"
             "- Always return VALID JSON per the schema."
         )
-
-    resp = client.chat.completions.create(
+    return dict(
         model=getattr(config, "openai_text_model", "gpt-4o-mini"),
         temperature=0.25,
         max_tokens=max_tokens,
-        response_format={"type": "json_schema","json_schema":{"name":"FullScriptPagesResponse","schema": schema,"strict": True}},
+        response_format={"type": "json_schema","json_schema":{"name":schema_name,"schema": schema,"strict": True}},
         messages=[{"role": "system", "content": SYSTEM_MSG},{"role": "user", "content": final_prompt}],
     )
-    content = resp.choices[0].message.content or ""
-    return content.strip()
+
+def _cache_args(kwargs: dict) -> dict:
+    system, user = kwargs["messages"]
+    return dict(
+        model=kwargs["model"],
+        system=system["content"],
+        prompt=user["content"],
+        temperature=kwargs["temperature"],
+        schema=kwargs["response_format"],
+        max_tokens=kwargs["max_tokens"],
+    )
+
+# what each schema_name's callers parse with; only output that passes is cached
+_RESPONSE_MODELS = {"FullScriptPagesResponse": FullScriptPagesResponse, "ScriptOutline": ScriptOutline}
+
+def _validator(schema_name: str):
+    model = _RESPONSE_MODELS[schema_name]
+    return lambda raw: model.model_validate_json(_extract_json_str(raw))
+
+async def _call_llm(
+    prompt: str,
+    max_tokens: int,
+    short_mode: bool = False,
+    *,
+    schema: dict | None = None,
+    schema_name: str = "FullScriptPagesResponse",
+    force: bool = False,
+) -> str:
+    kwargs = _llm_kwargs(prompt, max_tokens, short_mode, schema=schema, schema_name=schema_name)
+
+    def _call() -> str:
+        with text_scheduler.slot():
+            resp = usage.tracked("chat", client.chat.completions.create, **kwargs)
+        return (resp.choices[0].message.content or "").strip()
+
+    # run the blocking SDK call (and cache I/O) in a thread so chunk calls can overlap
+    return await text_scheduler.run(
+        llm_cache.cached_completion,
+        "full_script",
+        call=_call,
+        force=force,
+        validate=_validator(schema_name),
+        **_cache_args(kwargs),
+    )
+
+def _stream_llm(prompt: str, max_tokens: int, job_id: str | None = None) -> Iterator[str]:
+    """
+    Same request as _call_llm, but yields content deltas as the tokens arrive.
+    """
+    with text_scheduler.slot():
+        stream = usage.tracked_stream(
+            "chat.stream", client.chat.completions.create,
+            tags={"job_id": job_id, "stage": "full_script"},
+            stream=True, stream_options={"include_usage": True},
+            **_llm_kwargs(prompt, max_tokens),
+        )
+        for chunk in stream:
+            if not getattr(chunk, "choices", None):
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
 
 # -------- recurrence thresholds & delta derivation --------
 
@@ -274,8 +348,8 @@ def _derive_delta(script: FullScriptPagesResponse, known: Dict[str, List[Dict[st
         CharacterToAdd(
             id=cid,
             display_name=_slug_to_title(cid, "char_"),
-            role=None,
-            visual_stub=None,
+            role="",
+            visual_stub="",
             needs_concept_sheet=True,
         )
         for cid in rec_chars
@@ -293,7 +367,7 @@ def _derive_delta(script: FullScriptPagesResponse, known: Dict[str, List[Dict[st
         PropToAdd(
             id=pid,
             name=_slug_to_title(pid, "prop_"),
-            visual_stub=None,
+            visual_stub="",
             needs_concept_sheet=True,
         )
         for pid in rec_props
@@ -305,28 +379,180 @@ def _derive_delta(script: FullScriptPagesResponse, known: Dict[str, List[Dict[st
         props_to_add=props_to_add,
     )
 
+# -------- targeted repair --------
+
+async def _salvage_or_repair(
+    req: FullScriptRequest,
+    known: Dict[str, List[Dict[str, str]]],
+    raw: str,
+    start: int,
+    end: int,
+    outline: List[OutlinePage] | None = None,
+) -> List[Page]:
+    """
+    Pages start..end from `raw`, keeping whatever is usable and regenerating
+    only the missing/invalid page ranges with a focused chunk prompt. One
+    repair round; raises ValueError if pages are still missing after it.
+    """
+    pages = repair.salvage_pages(raw, start, end)
+    gaps = repair.missing_ranges(pages, start, end)
+    if not gaps:
+        return [pages[n] for n in range(start, end + 1)]
+
+    log.warning(f"[full-script] pages {start}-{end}: kept {len(pages)}, regenerating {gaps}")
+    outline = outline or repair.outline_from_pages(pages, req.page_count)
+
+    async def _fill(s: int, e: int) -> Dict[int, Page]:
+        prompt = build_full_script_chunk_prompt(req, known, outline, s, e)
+        raw_fix = await _call_llm(prompt, max_tokens=_max_tokens_for(req, pages=e - s + 1), force=req.force)
+        _save_raw(req.job_id, raw_fix, f"repair{s}-{e}")
+        return repair.salvage_pages(raw_fix, s, e)
+
+    for fixed in await asyncio.gather(*[_fill(s, e) for s, e in gaps]):
+        pages.update(fixed)
+
+    still = repair.missing_ranges(pages, start, end)
+    if still:
+        raise ValueError(f"full-script repair failed; pages still missing: {still}")
+    return [pages[n] for n in range(start, end + 1)]
+
+# -------- chunked generation (outline -> parallel page ranges) --------
+
+def _chunk_ranges(page_count: int, chunk_pages: int) -> List[Tuple[int, int]]:
+    size = max(1, chunk_pages)
+    return [(s, min(s + size - 1, page_count)) for s in range(1, page_count + 1, size)]
+
+async def _generate_outline(req: FullScriptRequest, known: Dict[str, List[Dict[str, str]]]) -> List[OutlinePage]:
+    raw = await _call_llm(
+        build_outline_prompt(req, known),
+        max_tokens=min(4096, 120 * req.page_count + 400),
+        schema=_outline_json_schema(),
+        schema_name="ScriptOutline",
+        force=req.force,
+    )
+    _save_raw(req.job_id, raw, "outline")
+    outline = ScriptOutline.model_validate_json(_extract_json_str(raw)).pages
+    # pad/trim so every page in 1..N has a beat, even if the model miscounted
+    by_no = {p.page_number: p for p in outline}
+    return [
+        by_no.get(n) or OutlinePage(page_number=n, beat="Continue the story naturally.")
+        for n in range(1, req.page_count + 1)
+    ]
+
+async def _generate_chunk(
+    req: FullScriptRequest,
+    known: Dict[str, List[Dict[str, str]]],
+    outline: List[OutlinePage],
+    start: int,
+    end: int,
+) -> List[Page]:
+    prompt = build_full_script_chunk_prompt(req, known, outline, start, end)
+    max_tokens = _max_tokens_for(req, pages=end - start + 1)
+    tag = f"chunk{start}-{end}"
+
+    raw = await _call_llm(prompt, max_tokens=max_tokens, force=req.force)
+    _save_raw(req.job_id, raw, tag)
+    return await _salvage_or_repair(req, known, raw, start, end, outline=outline)
+
+def _renumber(pages: List[Page]) -> List[Page]:
+    for i, page in enumerate(pages, 1):
+        page.page_number = i
+        for j, panel in enumerate(page.panels, 1):
+            panel.panel_number = j
+    return pages
+
+async def _generate_chunked(
+    req: FullScriptRequest,
+    known: Dict[str, List[Dict[str, str]]],
+) -> FullScriptPagesResponse:
+    """
+    Two-phase engine for long comics: one cheap outline call fixes beats and
+    entity IDs, then page ranges are written concurrently against that shared
+    outline and merged in order. Latency ~ outline + slowest chunk.
+    """
+    outline = await _generate_outline(req, known)
+    ranges = _chunk_ranges(req.page_count, config.script_chunk_pages)
+    log.info(f"[full-script] chunked generation: {req.page_count} pages in {len(ranges)} chunks")
+
+    chunks = await asyncio.gather(*[_generate_chunk(req, known, outline, s, e) for s, e in ranges])
+    merged = _renumber([p for chunk in chunks for p in chunk])
+    return FullScriptPagesResponse.model_validate({"pages": [p.model_dump() for p in merged]})
+
 # -------- public entry --------
 
 async def generate_full_script(req: FullScriptRequest) -> FullScriptPagesResponse:
+    # outline/chunk/repair calls inherit these tags (gather + to_thread copy the context)
+    with usage.usage_context(job_id=req.job_id, stage="full_script"):
+        return await _generate_full_script(req)
+
+async def _generate_full_script(req: FullScriptRequest) -> FullScriptPagesResponse:
     lb = _load_lookbook(req.job_id)
     known = _index_lookbook(lb)
 
+    if req.page_count > config.script_chunk_threshold:
+        script = await _generate_chunked(req, known)
+        script.lookbook_delta = _derive_delta(script, known)
+        return script
+
     prompt = build_full_script_prompt(req, known)
     max_tokens = _max_tokens_for(req)
 
-    raw = await _call_llm(prompt, max_tokens=max_tokens, short_mode=False)
+    raw = await _call_llm(prompt, max_tokens=max_tokens, short_mode=False, force=req.force)
     _save_raw(getattr(req, "job_id", None), raw, "try1")
     cleaned = _extract_json_str(raw)
 
     try:
         script = FullScriptPagesResponse.model_validate_json(cleaned)
-    except Exception:
-        # short retry
-        raw2 = await _call_llm(prompt, max_tokens=max_tokens, short_mode=True)
-        _save_raw(getattr(req, "job_id", None), raw2, "try2")
-        cleaned2 = _extract_json_str(raw2)
-        script = FullScriptPagesResponse.model_validate_json(cleaned2)
+    except Exception as e:
+        log.warning(f"[full-script] strict validation failed, salvaging: {e}")
+        pages = await _salvage_or_repair(req, known, raw, 1, req.page_count)
+        script = FullScriptPagesResponse(pages=pages)
 
     # Derive delta from actual usage (recurring-only) and overwrite any model-provided delta
     script.lookbook_delta = _derive_delta(script, known)
     return script
+
+def iter_full_script(req: FullScriptRequest) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming variant of generate_full_script.
+    Yields ("page", Page) for every page as soon as its JSON object closes in
+    the token stream, then a final ("done", FullScriptPagesResponse) with the
+    derived lookbook_delta. If the tail of the stream is truncated, the pages
+    that did arrive intact are kept. A cached completion is replayed through
+    the same parser, so callers see identical events either way.
+    """
+    lb = _load_lookbook(req.job_id)
+    known = _index_lookbook(lb)
+
+    prompt = build_full_script_prompt(req, known)
+    max_tokens = _max_tokens_for(req)
+    key = llm_cache.cache_key(**_cache_args(_llm_kwargs(prompt, max_tokens)))
+    cached = None if req.force else llm_cache.lookup("full_script", key)
+    parser = JsonArrayStreamParser("pages")
+    pages: List[Page] = []
+
+    t0 = time.perf_counter()
+    deltas = [cached] if cached is not None else _stream_llm(prompt, max_tokens=max_tokens, job_id=req.job_id)
+    for delta in deltas:
+        for obj in parser.feed(delta):
+            try:
+                page = Page.model_validate(obj)
+            except ValidationError as e:
+                log.warning(f"[full-script stream] dropping invalid page object: {e}")
+                continue
+            pages.append(page)
+            yield "page", page
+
+    _save_raw(getattr(req, "job_id", None), parser.text, "stream")
+    try:
+        script = FullScriptPagesResponse.model_validate_json(_extract_json_str(parser.text))
+        if cached is None:
+            llm_cache.store("full_script", key, parser.text, latency_ms=(time.perf_counter() - t0) * 1000.0)
+    except Exception as e:
+        if not pages:
+            raise ValueError(f"full-script stream produced no valid pages: {e}") from e
+        log.warning(f"[full-script stream] final JSON invalid; keeping {len(pages)} streamed pages: {e}")
+        script = FullScriptPagesResponse(pages=pages)
+
+    script.lookbook_delta = _derive_delta(script, known)
+    yield "done", script
@@ -1 +1,126 @@
-# app/features/full_script/service.py (near the top, after imports)
+# app/features/full_script/service_repair.py
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.lib.json_tools import JsonArrayStreamParser
+from .schemas import OutlinePage, Page, Panel
+
+# Salvage for completions that fail strict validation: keep every page that
+# can be read, fix mechanical problems locally, and report which page numbers
+# still need a (focused) regeneration.
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+def _text(v: Any) -> str:
+    return str(v).strip() if isinstance(v, (str, int, float)) else ""
+
+def _int(v: Any) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+def _ids(v: Any, prefix: str) -> List[str]:
+    if not isinstance(v, list):
+        return []
+    return [x for x in v if isinstance(x, str) and x.startswith(prefix)]
+
+def _loc(v: Any) -> str:
+    return v if isinstance(v, str) and v.startswith("loc_") else ""
+
+def _page_objects(raw: str) -> List[Any]:
+    """
+    Every page object recoverable from `raw`: the whole document if it parses
+    (after dropping trailing commas), otherwise each complete object of the
+    "pages" array, which tolerates stray prose and a truncated tail.
+    """
+    text = _TRAILING_COMMA_RE.sub(r"\1", raw or "")
+    s, e = text.find("{"), text.rfind("}")
+    if s != -1 and e > s:
+        try:
+            doc = json.loads(text[s:e + 1])
+            if isinstance(doc, dict) and isinstance(doc.get("pages"), list):
+                return doc["pages"]
+        except json.JSONDecodeError:
+            pass
+    return JsonArrayStreamParser("pages").feed(text)
+
+def coerce_page(obj: Any) -> Optional[Page]:
+    """
+    Build a Page from a loosely-shaped dict: missing/null text keys become "",
+    malformed ID lists are filtered, panels are renumbered. Panels without an
+    art_description are dropped; a page with no usable panel returns None.
+    """
+    if not isinstance(obj, dict) or not isinstance(obj.get("panels"), list):
+        return None
+    panels: List[Panel] = []
+    for p in obj["panels"]:
+        if not isinstance(p, dict) or not _text(p.get("art_description")):
+            continue
+        panels.append(Panel(
+            panel_number=len(panels) + 1,
+            art_description=_text(p.get("art_description")),
+            dialogue=_text(p.get("dialogue")),
+            narration=_text(p.get("narration")),
+            sfx=_text(p.get("sfx")),
+            characters=_ids(p.get("characters"), "char_"),
+            props=_ids(p.get("props"), "prop_"),
+            location_id=_loc(p.get("location_id")),
+        ))
+    if not panels:
+        return None
+    return Page(
+        page_number=_int(obj.get("page_number")),
+        panels=panels,
+        location_id=_loc(obj.get("location_id")),
+        characters=_ids(obj.get("characters"), "char_"),
+        props=_ids(obj.get("props"), "prop_"),
+    )
+
+def salvage_pages(raw: str, start: int, end: int) -> Dict[int, Page]:
+    """
+    Usable pages of `raw` keyed by page number within [start, end].
+    If the model's numbering is unusable (duplicates, out of range, 1-based
+    inside a chunk), pages are renumbered by position instead.
+    """
+    pages = [p for p in (coerce_page(o) for o in _page_objects(raw)) if p is not None]
+    nums = [p.page_number for p in pages]
+    if len(set(nums)) != len(nums) or not all(start <= n <= end for n in nums):
+        pages = pages[: end - start + 1]
+        for i, p in enumerate(pages):
+            p.page_number = start + i
+    return {p.page_number: p for p in pages}
+
+def missing_ranges(pages: Dict[int, Page], start: int, end: int) -> List[Tuple[int, int]]:
+    """Contiguous runs of page numbers in [start, end] not present in `pages`."""
+    runs: List[Tuple[int, int]] = []
+    for n in range(start, end + 1):
+        if n in pages:
+            continue
+        if runs and runs[-1][1] == n - 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+def outline_from_pages(pages: Dict[int, Page], page_count: int) -> List[OutlinePage]:
+    """
+    Stand-in outline for repair prompts: the pages we kept, summarized, so the
+    regenerated ones stay continuous with their neighbours.
+    """
+    out: List[OutlinePage] = []
+    for n in range(1, page_count + 1):
+        page = pages.get(n)
+        if page is None:
+            out.append(OutlinePage(page_number=n, beat="(to write) bridge naturally between the neighbouring pages."))
+            continue
+        beat = " / ".join(p.art_description[:100] for p in page.panels[:2])
+        out.append(OutlinePage(
+            page_number=n,
+            beat=beat,
+            location_id=page.location_id or "",
+            characters=page.characters,
+            props=page.props,
+        ))
+    return out
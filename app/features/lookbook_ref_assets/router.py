@@ -5,8 +5,11 @@ from app.config import config
 from app.lib.paths import ensure_job_dir, job_dir
 from app.lib.gcs_inventory import upload_json_to_gcs, download_gcs_object_to_file
 from app.lib.cloud_tasks import create_task
-from .schemas import CleanAssetsRequest, CleanAssetsResponse, GenerateRefAssetsRequest, GenerateRefAssetsResponse
-from .service import clean_lookbook_assets, generate_ref_assets
+from .schemas import (
+    CleanAssetsRequest, CleanAssetsResponse, GenerateRefAssetsRequest, GenerateRefAssetsResponse,
+    SelectCandidateRequest, SelectCandidateResponse,
+)
+from .service import clean_lookbook_assets, generate_ref_assets, select_candidate
 
 router = APIRouter(prefix="/api/v1", tags=["lookbook"])
 log = get_logger(__name__)
@@ -77,6 +80,23 @@ async def worker_ref_assets(job_id: str, request: Request) -> GenerateRefAssetsR
         raise HTTPException(500, "worker ref-assets failed")
 
 
+@router.post("/lookbook/select-candidate", response_model=SelectCandidateResponse)
+async def lookbook_select_candidate(req: SelectCandidateRequest) -> SelectCandidateResponse:
+    """
+    Promote one of the {type}_v{n}.png candidates made with `candidates > 1`
+    to the entity's reference. Cheap: a GCS copy and a lookbook write.
+    """
+    try:
+        return select_candidate(req)
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        log.exception(f"lookbook select-candidate failed: {e}")
+        raise HTTPException(500, "lookbook select-candidate failed")
+
+
 @router.post("/lookbook/clean-assets", response_model=CleanAssetsResponse)
 async def lookbook_clean_assets(req: CleanAssetsRequest) -> CleanAssetsResponse:
     try:
@@ -13,6 +13,11 @@ class GenerateRefAssetsRequest(BaseModel):
     force: bool = Field(False, description="Regenerate even if assets already exist for the requested types")
     asset_types: Dict[str, List[str]] = Field(default_factory=dict)
     user_theme: Optional[str] = Field(None, description="Global style to match (same as cover)")
+    candidates: int = Field(
+        1, ge=1, le=4,
+        description="Images per generated type. >1 stores {type}_v{n}.png candidates and promotes the first; "
+                    "pick another with /lookbook/select-candidate."
+    )
 
     # ✅ Keep only per-ID reference overrides (single URI or list).
     reference_images_by_id: Dict[str, Union[str, List[str]]] = Field(
@@ -27,6 +32,7 @@ class RefAssetResultItem(BaseModel):
     id: str
     kind: Kind
     generated: List[ReferenceAsset] = Field(default_factory=list)
+    candidates: List[ReferenceAsset] = Field(default_factory=list)  # every candidate made (incl. the promoted one)
     skipped_types: List[str] = Field(default_factory=list)
     message: Optional[str] = None
 
@@ -35,6 +41,20 @@ class GenerateRefAssetsResponse(BaseModel):
     results: List[RefAssetResultItem]
     lookbook_gcs: Optional[GCSInfo] = None
 
+# --- Candidate selection ---
+
+class SelectCandidateRequest(BaseModel):
+    job_id: str
+    id: str
+    type: str
+    version: int
+
+class SelectCandidateResponse(BaseModel):
+    job_id: str
+    id: str
+    selected: ReferenceAsset
+    lookbook_gcs: Optional[GCSInfo] = None
+
 # --- Cleanup API ---
 
 class CleanAssetsRequest(BaseModel):
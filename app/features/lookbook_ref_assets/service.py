@@ -1,20 +1,33 @@
 # app/features/lookbook_ref_assets/service.py
 import base64
+import contextvars
 import glob
-import json
 import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Set, Tuple, Union
 
+from fastapi import HTTPException
+
 from app.logger import get_logger
 from app.config import config
+from app.lib import usage
 from app.lib.openai_client import client
 from app.lib.paths import job_dir
-from app.lib.gcs_inventory import download_gcs_object_to_file, upload_to_gcs, upload_json_to_gcs
+from app.lib.assets import AssetResolver, run_resolver
+from app.lib.gcs_inventory import copy_gcs_object, upload_to_gcs
+from app.lib.imaging import image_candidates
 
 from app.features.lookbook_seed.schemas import (
     LookbookDoc, ReferenceAsset
 )
-from .schemas import CleanAssetsRequest, CleanAssetsResponse, CleanAssetsResultItem, GenerateRefAssetsRequest, GenerateRefAssetsResponse, RefAssetResultItem
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.store import lookbook_store
+from .schemas import (
+    CleanAssetsRequest, CleanAssetsResponse, CleanAssetsResultItem, GenerateRefAssetsRequest,
+    GenerateRefAssetsResponse, RefAssetResultItem, SelectCandidateRequest, SelectCandidateResponse,
+)
 from .prompt import (
     character_portrait_prompt, character_turnaround_prompt,
     location_wide_prompt, prop_detail_prompt
@@ -24,51 +37,6 @@ log = get_logger(__name__)
 
 # ---- Helpers ----
 
-def _infer_job_id_from_lb_path(lb_path: str) -> Optional[str]:
-    """
-    Expecting .../jobs/<job_id>/lookbook.json (your existing layout).
-    Returns <job_id> if it can be inferred, else None.
-    """
-    d = os.path.dirname(lb_path)                 # .../jobs/<job_id>
-    parent = os.path.basename(os.path.dirname(d))# jobs
-    jid = os.path.basename(d)                    # <job_id>
-    if parent == "jobs" and jid:
-        return jid
-    # fallback: if your layout ever changes, try just returning the dir name
-    return jid or None
-
-def _load_lookbook(lb_path: str) -> LookbookDoc:
-    """
-    Load lookbook.json. If it's not on disk, try to fetch it from GCS:
-    gs://<bucket>/jobs/<job_id>/lookbook.json
-    """
-    if not os.path.exists(lb_path):
-        # Try GCS fallback
-        bucket = getattr(config, "gcs_bucket", None) or getattr(config, "gcs_bucket_name", None)
-        job_id = _infer_job_id_from_lb_path(lb_path)
-        if bucket and job_id:
-            os.makedirs(os.path.dirname(lb_path), exist_ok=True)
-            gs_uri = f"gs://{bucket}/jobs/{job_id}/lookbook.json"
-            try:
-                log.debug(f"[lookbook] local missing; downloading {gs_uri} → {lb_path}")
-                download_gcs_object_to_file(gs_uri, lb_path)
-            except Exception as e:
-                raise FileNotFoundError(
-                    f"lookbook.json not found locally and failed to download from {gs_uri}: {e}"
-                ) from e
-        else:
-            # No way to resolve; preserve the old error message
-            raise FileNotFoundError("lookbook.json not found; seed it first")
-
-    with open(lb_path, "r") as f:
-        data = json.load(f)
-    return LookbookDoc.model_validate(data)
-
-def _save_lookbook(lb_path: str, doc: LookbookDoc) -> None:
-    os.makedirs(os.path.dirname(lb_path), exist_ok=True)
-    with open(lb_path, "w") as f:
-        json.dump(json.loads(doc.model_dump_json()), f, ensure_ascii=False, indent=2)
-
 def _detect_kind(_id: str) -> str:
     if _id.startswith("char_"):
         return "character"
@@ -112,24 +80,6 @@ def _types_for_id(_id: str, kind: str, req_map: Dict[str, List[str]]) -> List[st
 def _has_type(existing_assets: List[ReferenceAsset], t: str) -> bool:
     return any(a.type == t for a in (existing_assets or []))
 
-def _char_names(doc: LookbookDoc, cid: str) -> Tuple[str, Dict]:
-    for c in doc.characters:
-        if c.id == cid:
-            return c.display_name, c.visual_canon
-    return cid, {}
-
-def _loc_names(doc: LookbookDoc, lid: str) -> Tuple[str, Dict]:
-    for l in doc.locations:
-        if l.id == lid:
-            return l.name, l.visual_canon
-    return lid, {}
-
-def _prop_names(doc: LookbookDoc, pid: str) -> Tuple[str, Dict]:
-    for p in doc.props:
-        if p.id == pid:
-            return p.name, p.visual_canon
-    return pid, {}
-
 def _ensure_list_ref_assets(obj) -> List[ReferenceAsset]:
     assets = getattr(obj, "reference_assets", None)
     if assets is None:
@@ -192,14 +142,25 @@ def _safe(s: str) -> str:
 
 # ---- Image generation ----
 
-def _gen_image(prompt: str) -> str:
-    resp = client.images.generate(
+def _image_request(prompt: str, ref_image_path: Optional[str], n: int):
+    """One images.edit (with the ref file) or images.generate call asking for n images."""
+    if ref_image_path:
+        with open(ref_image_path, "rb") as ref_f:
+            return usage.tracked(
+                "image.edit", client.images.edit,
+                model=getattr(config, "openai_image_model", "gpt-image-1"),
+                prompt=prompt,
+                size=getattr(config, "image_size", "1024x1024"),
+                n=n,
+                image=ref_f,
+            )
+    return usage.tracked(
+        "image.generate", client.images.generate,
         model=getattr(config, "openai_image_model", "gpt-image-1"),
         prompt=prompt,
         size=getattr(config, "image_size", "1024x1024"),
-        n=1,
+        n=n,
     )
-    return resp.data[0].b64_json
 
 def _gen_image_with_optional_ref(prompt: str, ref_image_path: Optional[str]) -> str:
     """
@@ -208,29 +169,62 @@ def _gen_image_with_optional_ref(prompt: str, ref_image_path: Optional[str]) ->
     Returns base64 PNG.
     """
     try:
-        if ref_image_path:
-            with open(ref_image_path, "rb") as ref_f:
-                resp = client.images.edit(
-                    model=getattr(config, "openai_image_model", "gpt-image-1"),
-                    prompt=prompt,
-                    size=getattr(config, "image_size", "1024x1024"),
-                    n=1,
-                    image=ref_f,
-                )
-            return resp.data[0].b64_json
-        return _gen_image(prompt)
+        return _image_request(prompt, ref_image_path, 1).data[0].b64_json
+    except Exception as e:
+        raise RuntimeError(f"image gen failed: {e}") from e
+
+def _gen_image_candidates(prompt: str, ref_image_path: Optional[str], n: int) -> List[str]:
+    """n base64 PNGs, in one request when the model supports it."""
+    try:
+        return image_candidates(lambda k: _image_request(prompt, ref_image_path, k), n)
     except Exception as e:
         raise RuntimeError(f"image gen failed: {e}") from e
 
+# ---- Candidates (versioned {type}_v{n}.png) ----
+
+_VERSION_RE = re.compile(r"_v(\d+)\.png$")
+
+def _next_version(obj, id_folder: str, t: str) -> int:
+    """First unused n for {t}_v{n}.png (local files and lookbook records)."""
+    used = [0]
+    for path in glob.glob(os.path.join(id_folder, f"{t}_v*.png")):
+        m = _VERSION_RE.search(path)
+        if m:
+            used.append(int(m.group(1)))
+    for a in [*(getattr(obj, "reference_assets", None) or []), *(getattr(obj, "candidates", None) or [])]:
+        if a.type == t and a.version:
+            used.append(a.version)
+    return max(used) + 1
+
+def _promote_candidate(job_id: str, workdir: str, _id: str, cand: ReferenceAsset) -> Tuple[ReferenceAsset, Optional[str]]:
+    """
+    Make candidate `cand` the entity's {type}.png: server-side GCS copy of
+    {type}_v{n}.png plus a local copy when we have the file. Nothing is
+    re-generated. Returns (stable ReferenceAsset, local stable path or None).
+    """
+    t, v = cand.type, cand.version
+    id_folder = os.path.join(workdir, "lookbook", _id)
+    src_local = os.path.join(id_folder, f"{t}_v{v}.png")
+    dst_local: Optional[str] = os.path.join(id_folder, f"{t}.png")
+    if os.path.exists(src_local):
+        shutil.copyfile(src_local, f"{dst_local}.part")
+        os.replace(f"{dst_local}.part", dst_local)
+    else:
+        # don't leave the previous selection around under the stable name
+        if os.path.exists(dst_local):
+            os.remove(dst_local)
+        dst_local = None
+
+    prefix = f"jobs/{job_id}/lookbook/{_id}"
+    info = copy_gcs_object(f"{prefix}/{t}_v{v}.png", f"{prefix}/{t}.png")
+    ref = ReferenceAsset(
+        type=t,
+        url=info.get("public_url") or info.get("gcs_url") or info.get("signed_url"),
+        gs_uri=info.get("gs_uri"),
+        version=v,
+    )
+    return ref, dst_local
 
-def _char_meta(doc: LookbookDoc, cid: str):
-    """Return (display_name, visual_canon, gender_or_none)"""
-    for c in doc.characters:
-        if c.id == cid:
-            vc = c.visual_canon or {}
-            gender = getattr(c, "gender", None) or vc.get("gender")
-            return c.display_name, vc, gender
-    return cid, {}, None
 
 def _find_asset(assets_list: List[ReferenceAsset], t: str) -> Optional[ReferenceAsset]:
     for a in assets_list or []:
@@ -238,201 +232,230 @@ def _find_asset(assets_list: List[ReferenceAsset], t: str) -> Optional[Reference
             return a
     return None
 
-def _download_to(tmp_dir: str, url_or_gs: str, filename: str) -> Optional[str]:
-    if not url_or_gs:
-        return None
-    os.makedirs(tmp_dir, exist_ok=True)
-    out = os.path.join(tmp_dir, filename)
-    try:
-        if url_or_gs.startswith("gs://"):
-            download_gcs_object_to_file(url_or_gs, out)
-        else:
-            import urllib.request
-            with urllib.request.urlopen(url_or_gs) as r, open(out, "wb") as f:
-                f.write(r.read())
-        return out
-    except Exception as e:
-        log.warning(f"[ref-assets] download failed {url_or_gs}: {e}")
-        return None
-
-# ---- Main entrypoint ----
-
-def generate_ref_assets(req: GenerateRefAssetsRequest) -> GenerateRefAssetsResponse:
+def _generate_for_entity(
+    req: GenerateRefAssetsRequest,
+    lbx: LookbookIndex,
+    workdir: str,
+    _id: str,
+    kind: str,
+    obj,
+    assets: AssetResolver,
+) -> RefAssetResultItem:
     """
-    Generate (or regenerate) reference assets for the given Lookbook IDs, using
-    **per-ID base64** reference images when provided.
-
-    Overwrite mode:
-    - When `force=True` OR caller explicitly requested types for an ID, we overwrite
-      those types: write to stable names (e.g., portrait.png) and replace the
-      matching entry in reference_assets.
-    - When `force=False` and the type already exists, we skip.
+    All requested types for one entity, in order (character portrait before
+    turnaround, which uses it as reference). Only mutates this entity's
+    reference_assets, so entities can run in parallel.
     """
-    workdir = job_dir(req.job_id)
-    lb_path = os.path.join(workdir, "lookbook.json")
-    doc = _load_lookbook(lb_path)
+    result = RefAssetResultItem(id=_id, kind=kind, generated=[], skipped_types=[])
 
-    results: List[RefAssetResultItem] = []
+    if obj is None:
+        result.message = "ID not found in lookbook"
+        return result
 
-    # Build an index from lookbook
-    idx = {
-        **{c.id: ("character", c) for c in doc.characters},
-        **{l.id: ("location", l) for l in doc.locations},
-        **{p.id: ("prop", p) for p in doc.props},
-    }
+    want_types = _types_for_id(_id, kind, req.asset_types)
+    if not want_types:
+        result.message = "No asset types requested for this ID"
+        return result
 
-    tmpdir = os.path.join(workdir, "lookbook", "_tmp")
+    assets_list: List[ReferenceAsset] = _ensure_list_ref_assets(obj)
+    id_folder = os.path.join(workdir, "lookbook", _id)
 
-    for _id in req.ids:
-        kind, obj = idx.get(_id, (_detect_kind(_id), None))
-        result = RefAssetResultItem(id=_id, kind=kind, generated=[], skipped_types=[])
+    # ---- choose a general fallback reference (usually from cover) ----
+    # (entities sharing a cover share one download through the run's resolver)
+    entity_cover_ra = _find_asset(assets_list, "cover")
+    general_ref_path = assets.resolve(entity_cover_ra) if entity_cover_ra else None
 
-        if obj is None:
-            result.message = "ID not found in lookbook"
-            results.append(result)
-            continue
+    # ---- ensure character types run in a safe order: portrait -> turnaround ----
+    if kind == "character":
+        order = {"portrait": 0, "turnaround": 1}
+        want_types.sort(key=lambda t: order.get(t, 99))
 
-        want_types = _types_for_id(_id, kind, req.asset_types)
-        if not want_types:
-            result.message = "No asset types requested for this ID"
-            results.append(result)
-            continue
+    # track the portrait we generate (or already have)
+    portrait_local_path: Optional[str] = None
+    if kind == "character" and _find_asset(assets_list, "portrait") and "turnaround" in want_types:
+        # if a portrait already exists, fetch it to use as ref for turnaround
+        portrait_local_path = assets.resolve(_find_asset(assets_list, "portrait"))
 
-        assets_list: List[ReferenceAsset] = _ensure_list_ref_assets(obj)
-        id_folder = os.path.join(workdir, "lookbook", _id)
-        tmpdir = os.path.join(workdir, "lookbook", "_tmp")
+    for t in want_types:
+        already = _has_type(assets_list, t)
+        will_overwrite = req.force or (_id in req.asset_types and t in req.asset_types[_id])
 
-        # ---- choose a general fallback reference (usually from cover) ----
-        entity_cover_ra = _find_asset(assets_list, "cover")
-        general_ref = (getattr(entity_cover_ra, "gs_uri", None) or getattr(entity_cover_ra, "url", None))
-        general_ref_path = _download_to(tmpdir, general_ref, f"{_id}_cover_ref.png") if general_ref else None
+        if already and not will_overwrite:
+            result.skipped_types.append(t)
+            continue
 
-        # ---- ensure character types run in a safe order: portrait -> turnaround ----
+        # ----- build prompt (with gender if available) -----
+        name, canon = lbx.name(_id), lbx.canon(_id)
         if kind == "character":
-            order = {"portrait": 0, "turnaround": 1}
-            want_types.sort(key=lambda t: order.get(t, 99))
-
-        # track the portrait we generate (or already have)
-        portrait_local_path: Optional[str] = None
-        if kind == "character" and _find_asset(assets_list, "portrait") and "turnaround" in want_types:
-            # if a portrait already exists, fetch it to use as ref for turnaround
-            existing_portrait = _find_asset(assets_list, "portrait")
-            portrait_ref = getattr(existing_portrait, "gs_uri", None) or getattr(existing_portrait, "url", None)
-            portrait_local_path = _download_to(tmpdir, portrait_ref, f"{_id}_portrait_ref.png")
-
-        for t in want_types:
-            already = _has_type(assets_list, t)
-            will_overwrite = req.force or (_id in req.asset_types and t in req.asset_types[_id])
-
-            if already and not will_overwrite:
-                result.skipped_types.append(t)
-                continue
-
-            # ----- build prompt (with gender if available) -----
-            if kind == "character":
-                name, canon, gender = _char_meta(doc, _id)
-                if t == "portrait":
-                    prompt = character_portrait_prompt(name, canon, req.user_theme, gender)
-                elif t == "turnaround":
-                    prompt = character_turnaround_prompt(name, canon, req.user_theme, gender)
-                else:
-                    prompt = character_portrait_prompt(name, canon, req.user_theme, gender) + f" (variant: {t})"
-
-            elif kind == "location":
-                name, canon = _loc_names(doc, _id)
-                prompt = location_wide_prompt(name, canon, req.user_theme) if t == "wide" \
-                       else location_wide_prompt(name, canon, req.user_theme) + f" (variant: {t})"
-
-            elif kind == "prop":
-                name, canon = _prop_names(doc, _id)
-                prompt = prop_detail_prompt(name, canon, req.user_theme) if t == "detail" \
-                       else prop_detail_prompt(name, canon, req.user_theme) + f" (variant: {t})"
+            gender = getattr(obj, "gender", None) or canon.get("gender")
+            if t == "portrait":
+                prompt = character_portrait_prompt(name, canon, req.user_theme, gender)
+            elif t == "turnaround":
+                prompt = character_turnaround_prompt(name, canon, req.user_theme, gender)
             else:
-                result.skipped_types.append(t)
-                result.message = (result.message + "; unknown kind" if result.message else "unknown kind")
-                continue
+                prompt = character_portrait_prompt(name, canon, req.user_theme, gender) + f" (variant: {t})"
+
+        elif kind == "location":
+            prompt = location_wide_prompt(name, canon, req.user_theme) if t == "wide" \
+                   else location_wide_prompt(name, canon, req.user_theme) + f" (variant: {t})"
 
-            # ----- choose the best reference for THIS type -----
-            ref_for_this: Optional[str] = None
-            if kind == "character" and t == "turnaround":
-                # strongest: the just-generated portrait
-                if portrait_local_path and os.path.exists(portrait_local_path):
-                    ref_for_this = portrait_local_path
-                # otherwise: a previously existing portrait
-                elif _find_asset(assets_list, "portrait"):
-                    if not portrait_local_path:
-                        existing_portrait = _find_asset(assets_list, "portrait")
-                        pr = getattr(existing_portrait, "gs_uri", None) or getattr(existing_portrait, "url", None)
-                        portrait_local_path = _download_to(tmpdir, pr, f"{_id}_portrait_ref.png")
-                    ref_for_this = portrait_local_path or general_ref_path
-                else:
-                    ref_for_this = general_ref_path  # last resort
+        elif kind == "prop":
+            prompt = prop_detail_prompt(name, canon, req.user_theme) if t == "detail" \
+                   else prop_detail_prompt(name, canon, req.user_theme) + f" (variant: {t})"
+        else:
+            result.skipped_types.append(t)
+            result.message = (result.message + "; unknown kind" if result.message else "unknown kind")
+            continue
+
+        # ----- choose the best reference for THIS type -----
+        ref_for_this: Optional[str] = None
+        if kind == "character" and t == "turnaround":
+            # strongest: the just-generated portrait
+            if portrait_local_path and os.path.exists(portrait_local_path):
+                ref_for_this = portrait_local_path
+            # otherwise: a previously existing portrait
+            elif _find_asset(assets_list, "portrait"):
+                if not portrait_local_path:
+                    portrait_local_path = assets.resolve(_find_asset(assets_list, "portrait"))
+                ref_for_this = portrait_local_path or general_ref_path
             else:
-                # portrait: if caller provided a per-id ref_image (handled earlier in your code), use it
-                # else fall back to general cover ref if available
-                ref_for_this = general_ref_path
+                ref_for_this = general_ref_path  # last resort
+        else:
+            # portrait: if caller provided a per-id ref_image (handled earlier in your code), use it
+            # else fall back to general cover ref if available
+            ref_for_this = general_ref_path
 
-            # ----- generate (edit if ref present) -----
-            try:
-                b64 = _gen_image_with_optional_ref(prompt, ref_for_this)
+        # ----- generate (edit if ref present) -----
+        try:
+            if req.candidates > 1:
+                # k candidates in one request -> {t}_v{n}.png each; the first is promoted to {t}.png
+                with usage.usage_context(job_id=req.job_id, stage="ref_assets"):
+                    b64s = _gen_image_candidates(prompt, ref_for_this, req.candidates)
+                first = _next_version(obj, id_folder, t)
+                cands: List[ReferenceAsset] = []
+                for v, b64 in enumerate(b64s, start=first):
+                    cand_path = os.path.join(id_folder, f"{t}_v{v}.png")
+                    _save_b64_png(b64, cand_path)
+                    info = _upload_image(cand_path, f"jobs/{req.job_id}/lookbook/{_id}/{t}_v{v}.png")
+                    cands.append(ReferenceAsset(
+                        type=t,
+                        url=info.get("public_url") or info.get("gcs_url") or info.get("signed_url"),
+                        gs_uri=info.get("gs_uri"),
+                        version=v,
+                    ))
+                result.candidates.extend(cands)
+                ref, local_path = _promote_candidate(req.job_id, workdir, _id, cands[0])
+            else:
+                with usage.usage_context(job_id=req.job_id, stage="ref_assets"):
+                    b64 = _gen_image_with_optional_ref(prompt, ref_for_this)
 
                 local_path = os.path.join(id_folder, f"{t}.png")  # overwrite-stable
                 _save_b64_png(b64, local_path)
 
                 object_name = f"jobs/{req.job_id}/lookbook/{_id}/{t}.png"
                 info = _upload_image(local_path, object_name)
-
-                # replace prior entry of same type
-                assets_list[:] = [a for a in assets_list if a.type != t]
                 ref = ReferenceAsset(
                     type=t,
                     url=info.get("public_url") or info.get("gcs_url") or info.get("signed_url"),
                     gs_uri=info.get("gs_uri"),
                 )
-                assets_list.append(ref)
-                result.generated.append(ref)
 
-                # remember portrait for later turnaround in this same run
-                if kind == "character" and t == "portrait":
-                    portrait_local_path = local_path
+            # replace prior entry of same type
+            assets_list[:] = [a for a in assets_list if a.type != t]
+            assets_list.append(ref)
+            result.generated.append(ref)
+
+            # remember portrait for later turnaround in this same run
+            if kind == "character" and t == "portrait":
+                portrait_local_path = local_path
 
-            except Exception as e:
-                log.exception(f"Failed generating asset for id={_id}, type={t}: {e}")
-                result.message = (result.message + f"; {t} failed" if result.message else f"{t} failed")
+        except Exception as e:
+            log.exception(f"Failed generating asset for id={_id}, type={t}: {e}")
+            result.message = (result.message + f"; {t} failed" if result.message else f"{t} failed")
 
-        results.append(result)
+    return result
 
-    # Persist + upload lookbook
-    _save_lookbook(lb_path, doc)
-    try:
-        gcs_info = upload_json_to_gcs(
-            data=json.loads(doc.model_dump_json()),
-            object_name=f"jobs/{req.job_id}/lookbook.json",
-            subdir="jobs",
-            filename_hint="lookbook.json",
-            cache_control="no-cache",
-            make_signed_url=True,
-        )
-    except Exception as e:
-        log.exception(f"Failed to upload lookbook.json to GCS: {e}")
-        gcs_info = None
+
+# ---- Main entrypoint ----
+
+def generate_ref_assets(req: GenerateRefAssetsRequest) -> GenerateRefAssetsResponse:
+    """
+    Generate (or regenerate) reference assets for the given Lookbook IDs, using
+    **per-ID base64** reference images when provided.
+
+    Overwrite mode:
+    - When `force=True` OR caller explicitly requested types for an ID, we overwrite
+      those types: write to stable names (e.g., portrait.png) and replace the
+      matching entry in reference_assets.
+    - When `force=False` and the type already exists, we skip.
+    """
+    workdir = job_dir(req.job_id)
+    # work on a snapshot; only the produced assets are merged back at the end
+    doc = lookbook_store.load(req.job_id, workdir=workdir)
+
+    lbx = LookbookIndex(doc)
+    assets = run_resolver(workdir)
+
+    # entities are independent; the only ordering (portrait -> turnaround) is inside one entity
+    def _one(_id: str) -> RefAssetResultItem:
+        kind, obj = lbx.get(_id) or (_detect_kind(_id), None)
+        return _generate_for_entity(req, lbx, workdir, _id, kind, obj, assets)
+
+    workers = max(1, min(config.ref_assets_concurrency, len(req.ids)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ref-assets") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _one, _id) for _id in req.ids]
+        results: List[RefAssetResultItem] = [f.result() for f in futures]
+    log.debug(f"[ref-assets] {req.job_id} reference downloads: {assets.stats}")
+
+    # Merge into the current lookbook: other writers (cover sync, page workers)
+    # may have changed it while the images were rendering.
+    produced = {r.id: r for r in results if r.generated or r.candidates}
+
+    def _merge(fresh: LookbookDoc) -> bool:
+        fx = LookbookIndex(fresh)
+        for _id, r in produced.items():
+            if _id not in fx:
+                continue
+            for ref in r.generated:
+                fx.put_asset(_id, ref)
+            if r.candidates:
+                fx.add_candidates(_id, r.candidates)
+        return bool(produced)
+
+    _, gcs_info = lookbook_store.update(req.job_id, _merge, workdir=workdir)
 
     return GenerateRefAssetsResponse(job_id=req.job_id, results=results, lookbook_gcs=gcs_info)
 
-# --- Cleanup API ---
+# --- Candidate selection ---
+
+def select_candidate(req: SelectCandidateRequest) -> SelectCandidateResponse:
+    """
+    Promote a stored candidate ({type}_v{n}.png) to the entity's {type}
+    reference: a GCS copy and a lookbook write, no image generation.
+    Dependent assets (e.g. a turnaround made from the old portrait) are left
+    alone; regenerate them explicitly if needed.
+    """
+    workdir = job_dir(req.job_id)
+    lbx = LookbookIndex(lookbook_store.load(req.job_id, workdir=workdir))
+    if req.id not in lbx:
+        raise HTTPException(404, f"{req.id} not found in lookbook")
+    cand = next((c for c in lbx.candidates(req.id, req.type) if c.version == req.version), None)
+    if cand is None:
+        raise HTTPException(404, f"no {req.type} candidate v{req.version} for {req.id}")
+
+    ref, _ = _promote_candidate(req.job_id, workdir, req.id, cand)
 
-def _entity_by_id(doc: LookbookDoc, _id: str):
-    for c in doc.characters:
-        if c.id == _id:
-            return "character", c
-    for l in doc.locations:
-        if l.id == _id:
-            return "location", l
-    for p in doc.props:
-        if p.id == _id:
-            return "prop", p
-    return "unknown", None
+    def _select(doc: LookbookDoc) -> bool:
+        fx = LookbookIndex(doc)
+        if req.id not in fx:
+            return False
+        fx.put_asset(req.id, ref)
+        return True
 
+    _, gcs_info = lookbook_store.update(req.job_id, _select, workdir=workdir)
+    return SelectCandidateResponse(job_id=req.job_id, id=req.id, selected=ref, lookbook_gcs=gcs_info)
+
+# --- Cleanup API ---
 
 def _delete_local_files(workdir: str, entity_id: str, types: Set[str]) -> None:
     base = os.path.join(workdir, "lookbook", entity_id)
@@ -506,100 +529,104 @@ def _count_local_matches(workdir: str, _id: str, t: str) -> int:
         len(glob.glob(os.path.join(folder, f"{t}_v*.png")))
     )
 
-def _remove_entity(doc, kind: str, _id: str) -> bool:
-    if kind == "character":
-        lst = doc.characters
-    elif kind == "location":
-        lst = doc.locations
-    elif kind == "prop":
-        lst = doc.props
-    else:
-        return False
-    for i, e in enumerate(lst):
-        if getattr(e, "id", None) == _id:
-            del lst[i]
-            return True
-    return False
-
 def clean_lookbook_assets(req: CleanAssetsRequest) -> CleanAssetsResponse:
     workdir = job_dir(req.job_id)
-    lb_path = os.path.join(workdir, "lookbook.json")
-    doc = _load_lookbook(lb_path)
 
     results: List[CleanAssetsResultItem] = []
-    changed = False
+    file_deletes: List[Tuple[str, Set[str], CleanAssetsResultItem]] = []
+
+    def _clean(doc: LookbookDoc) -> bool:
+        # lookbook edits only; may be re-run on a fresh doc, so start over each time
+        results.clear()
+        file_deletes.clear()
+        changed = False
+        lbx = LookbookIndex(doc)
+
+        for _id in req.ids:
+            kind, ent = lbx.get(_id) or ("unknown", None)
+            item = CleanAssetsResultItem(id=_id, kind=kind)
+
+            if not ent:
+                item.notes.append("ID not found in lookbook")
+                results.append(item)
+                continue
 
-    for _id in req.ids:
-        kind, ent = _entity_by_id(doc, _id)
-        item = CleanAssetsResultItem(id=_id, kind=kind)
+            # What types did the caller ask to remove for this ID?
+            requested_raw = req.asset_types.get(_id, [])
+            if not requested_raw:
+                item.notes.append("No types requested (or present)")
+                results.append(item)
+                continue
 
-        if not ent:
-            item.notes.append("ID not found in lookbook")
-            results.append(item)
-            continue
+            # Expand "*" to all known types; optionally drop "cover"
+            if "*" in requested_raw:
+                desired_types = set(ALL_ASSET_TYPES)
+            else:
+                desired_types = set(requested_raw)
 
-        # What types did the caller ask to remove for this ID?
-        requested_raw = req.asset_types.get(_id, [])
-        if not requested_raw:
-            item.notes.append("No types requested (or present)")
-            results.append(item)
-            continue
+            if not req.include_cover:
+                desired_types.discard("cover")
 
-        # Expand "*" to all known types; optionally drop "cover"
-        if "*" in requested_raw:
-            desired_types = set(ALL_ASSET_TYPES)
-        else:
-            desired_types = set(requested_raw)
+            if not desired_types:
+                item.notes.append("Nothing to remove for this id")
+                results.append(item)
+                continue
 
-        if not req.include_cover:
-            desired_types.discard("cover")
+            # Types that are present in lookbook (these we remove from reference_assets)
+            ras: List[ReferenceAsset] = getattr(ent, "reference_assets", []) or []
+            existing_types = {a.type for a in ras}
+            lookbook_types_to_remove = desired_types & existing_types
+
+            # --- DRY RUN: show what would happen (files + lookbook) ---
+            if req.dry_run and req.prune_empty_entities:
+                # If entity would have zero assets after removal, say so
+                would_assets = [a for a in ras if a.type not in lookbook_types_to_remove]
+                if len(would_assets) == 0:
+                    item.notes.append("Would remove entity from lookbook (no reference_assets remain)")
+
+            # --- REAL RUN: actually prune if requested ---
+            if (not req.dry_run) and req.prune_empty_entities:
+                ras_now = getattr(ent, "reference_assets", []) or []
+                if len(ras_now) == 0:
+                    if lbx.remove(_id):
+                        changed = True
+                        item.notes.append("Removed entity from lookbook (no reference_assets remain)")
+
+            if req.dry_run:
+                # Count local matches even if lookbook has none (orphan files)
+                for t in sorted(desired_types):
+                    local_count = _count_local_matches(workdir, _id, t)
+                    in_lb = "yes" if t in existing_types else "no"
+                    lb_action = "remove from lookbook" if t in lookbook_types_to_remove else "no lookbook ref"
+                    item.notes.append(f"[{t}] local={local_count} | in_lookbook={in_lb} → {lb_action}")
+
+                # We still fill removed_types for visibility (only those in lookbook)
+                item.removed_types = sorted(list(lookbook_types_to_remove))
+                results.append(item)
+                continue
 
-        if not desired_types:
-            item.notes.append("Nothing to remove for this id")
-            results.append(item)
-            continue
+            # --- REAL RUN: mutate lookbook if needed ---
+            if lookbook_types_to_remove and lbx.remove_asset_types(_id, lookbook_types_to_remove):
+                changed = True
+            # the versioned files go too, so forget their candidate records
+            if lbx.drop_candidates(_id, desired_types):
+                changed = True
 
-        # Types that are present in lookbook (these we remove from reference_assets)
-        ras: List[ReferenceAsset] = getattr(ent, "reference_assets", []) or []
-        existing_types = {a.type for a in ras}
-        lookbook_types_to_remove = desired_types & existing_types
-
-        # --- DRY RUN: show what would happen (files + lookbook) ---
-        if req.dry_run and req.prune_empty_entities:
-            # If entity would have zero assets after removal, say so
-            would_assets = [a for a in ras if a.type not in lookbook_types_to_remove]
-            if len(would_assets) == 0:
-                item.notes.append("Would remove entity from lookbook (no reference_assets remain)")
-
-        # --- REAL RUN: actually prune if requested ---
-        if (not req.dry_run) and req.prune_empty_entities:
-            ras_now = getattr(ent, "reference_assets", []) or []
-            if len(ras_now) == 0:
-                if _remove_entity(doc, kind, _id):
-                    changed = True
-                    item.notes.append("Removed entity from lookbook (no reference_assets remain)")
-
-        if req.dry_run:
-            # Count local matches even if lookbook has none (orphan files)
-            for t in sorted(desired_types):
-                local_count = _count_local_matches(workdir, _id, t)
-                in_lb = "yes" if t in existing_types else "no"
-                lb_action = "remove from lookbook" if t in lookbook_types_to_remove else "no lookbook ref"
-                item.notes.append(f"[{t}] local={local_count} | in_lookbook={in_lb} → {lb_action}")
-
-            # We still fill removed_types for visibility (only those in lookbook)
+            # files are deleted after the lookbook is committed
+            file_deletes.append((_id, desired_types, item))
             item.removed_types = sorted(list(lookbook_types_to_remove))
             results.append(item)
-            continue
 
-        # --- REAL RUN: mutate lookbook if needed ---
-        if lookbook_types_to_remove:
-            new_assets = [a for a in ras if a.type not in lookbook_types_to_remove]
-            if len(new_assets) != len(ras):
-                setattr(ent, "reference_assets", new_assets)
-                changed = True
+        return changed and not req.dry_run
 
-        # Always attempt to delete local & GCS files for desired_types (even if not in lookbook)
+    gcs_info = None
+    if req.dry_run:
+        _clean(lookbook_store.load(req.job_id, workdir=workdir))
+    else:
+        _, gcs_info = lookbook_store.update(req.job_id, _clean, workdir=workdir)
+
+    # Always attempt to delete local & GCS files for desired_types (even if not in lookbook)
+    for _id, desired_types, item in file_deletes:
         if req.delete_local:
             _delete_local_files(workdir, _id, desired_types)
 
@@ -610,23 +637,4 @@ def clean_lookbook_assets(req: CleanAssetsRequest) -> CleanAssetsResponse:
                 # If your gcs delete helper isn't available in this env
                 item.notes.append("GCS deletion helper not found; skipped GCS deletes")
 
-        item.removed_types = sorted(list(lookbook_types_to_remove))
-        results.append(item)
-
-    # Save and upload lookbook if we changed it and not dry-run
-    gcs_info = None
-    if changed and not req.dry_run:
-        _save_lookbook(lb_path, doc)
-        try:
-            gcs_info = upload_json_to_gcs(
-                data=json.loads(doc.model_dump_json()),
-                object_name=f"jobs/{req.job_id}/lookbook.json",
-                subdir="jobs",
-                filename_hint="lookbook.json",
-                cache_control="no-cache",
-                make_signed_url=True,
-            )
-        except Exception as e:
-            log.warning(f"Failed uploading lookbook.json after clean: {e}")
-
     return CleanAssetsResponse(job_id=req.job_id, results=results, lookbook_gcs=gcs_info)
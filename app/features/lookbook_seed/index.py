@@ -0,0 +1,193 @@
+# app/features/lookbook_seed/index.py
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .schemas import LookbookCharacter, LookbookDoc, LookbookLocation, LookbookProp, ReferenceAsset
+
+Entity = Union[LookbookCharacter, LookbookLocation, LookbookProp]
+
+KINDS = ("character", "location", "prop")
+
+# keys of visual_canon that go into page/cover prompts
+PROMPT_CANON_KEYS = (
+    "face", "hair", "body", "palette", "costume_variants",
+    "emblems", "key_props", "lighting", "negative_traits", "notes",
+)
+
+
+def compact_canon(canon: Optional[dict]) -> dict:
+    """Keep lookbook slices compact for prompts."""
+    if not canon:
+        return {}
+    return {k: v for k, v in canon.items() if k in PROMPT_CANON_KEYS}
+
+
+class LookbookIndex:
+    """
+    O(1) view over a LookbookDoc: id -> (kind, entity), id -> {asset type ->
+    first asset of that type}, and compact prompt canons computed once.
+
+    The doc stays the source of truth (it is what the store saves). Mutate
+    through the methods here so the maps stay in step; after editing
+    entities directly, call reindex(id) (or rebuild()).
+    """
+
+    def __init__(self, doc: LookbookDoc):
+        self.doc = doc
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        self._by_id: Dict[str, Tuple[str, Entity]] = {}
+        self._assets: Dict[str, Dict[str, ReferenceAsset]] = {}
+        self._canon: Dict[str, dict] = {}
+        for kind in KINDS:
+            for ent in self._list(kind):
+                # first occurrence wins, like the old linear scans
+                if ent.id not in self._by_id:
+                    self._by_id[ent.id] = (kind, ent)
+                    self._index_entity(ent)
+
+    def _list(self, kind: str) -> List[Entity]:
+        return {"character": self.doc.characters, "location": self.doc.locations, "prop": self.doc.props}[kind]
+
+    def _index_entity(self, ent: Entity) -> None:
+        by_type: Dict[str, ReferenceAsset] = {}
+        for a in ent.reference_assets or []:
+            by_type.setdefault(a.type, a)
+        self._assets[ent.id] = by_type
+        self._canon.pop(ent.id, None)
+
+    # -------- lookups --------
+
+    def __contains__(self, _id: str) -> bool:
+        return _id in self._by_id
+
+    def __iter__(self) -> Iterator[Tuple[str, str, Entity]]:
+        for _id, (kind, ent) in self._by_id.items():
+            yield _id, kind, ent
+
+    def get(self, _id: str) -> Optional[Tuple[str, Entity]]:
+        return self._by_id.get(_id)
+
+    def entity(self, _id: str, kind: Optional[str] = None) -> Optional[Entity]:
+        hit = self._by_id.get(_id)
+        if hit is None or (kind and hit[0] != kind):
+            return None
+        return hit[1]
+
+    def kind(self, _id: str) -> Optional[str]:
+        hit = self._by_id.get(_id)
+        return hit[0] if hit else None
+
+    def name(self, _id: str) -> str:
+        ent = self.entity(_id)
+        if ent is None:
+            return _id
+        return getattr(ent, "display_name", None) or getattr(ent, "name", None) or _id
+
+    def canon(self, _id: str) -> dict:
+        ent = self.entity(_id)
+        return (ent.visual_canon or {}) if ent is not None else {}
+
+    def compact_canon(self, _id: str) -> dict:
+        if _id not in self._canon:
+            self._canon[_id] = compact_canon(self.canon(_id))
+        return self._canon[_id]
+
+    def asset(self, _id: str, t: str) -> Optional[ReferenceAsset]:
+        return self._assets.get(_id, {}).get(t)
+
+    def best_asset(self, _id: str, wanted: Iterable[str]) -> Optional[ReferenceAsset]:
+        by_type = self._assets.get(_id, {})
+        for t in wanted:
+            if t in by_type:
+                return by_type[t]
+        return None
+
+    def candidates(self, _id: str, t: Optional[str] = None) -> List[ReferenceAsset]:
+        ent = self.entity(_id)
+        if ent is None:
+            return []
+        return [c for c in ent.candidates or [] if t is None or c.type == t]
+
+    def has_type(self, _id: str, t: str) -> bool:
+        return t in self._assets.get(_id, {})
+
+    def has_any_assets(self, _id: str) -> bool:
+        return bool(self._assets.get(_id))
+
+    # -------- mutations (keep the maps consistent) --------
+
+    def reindex(self, _id: str) -> None:
+        ent = self.entity(_id)
+        if ent is not None:
+            self._index_entity(ent)
+
+    def add(self, kind: str, ent: Entity) -> Entity:
+        """Append a new entity (no-op returning the existing one if the id is taken)."""
+        existing = self.entity(ent.id)
+        if existing is not None:
+            return existing
+        self._list(kind).append(ent)
+        self._by_id[ent.id] = (kind, ent)
+        self._index_entity(ent)
+        return ent
+
+    def remove(self, _id: str) -> bool:
+        hit = self._by_id.pop(_id, None)
+        if hit is None:
+            return False
+        kind, ent = hit
+        lst = self._list(kind)
+        lst[:] = [e for e in lst if e is not ent]
+        self._assets.pop(_id, None)
+        self._canon.pop(_id, None)
+        return True
+
+    def put_asset(self, _id: str, ref: ReferenceAsset) -> None:
+        """Replace every asset of ref.type on the entity with `ref`."""
+        ent = self.entity(_id)
+        if ent is None:
+            raise KeyError(_id)
+        ent.reference_assets = [a for a in (ent.reference_assets or []) if a.type != ref.type] + [ref]
+        self._index_entity(ent)
+
+    def remove_asset_types(self, _id: str, types: Iterable[str]) -> bool:
+        ent = self.entity(_id)
+        if ent is None:
+            return False
+        types = set(types)
+        before = ent.reference_assets or []
+        after = [a for a in before if a.type not in types]
+        if len(after) == len(before):
+            return False
+        ent.reference_assets = after
+        self._index_entity(ent)
+        return True
+
+    def add_candidates(self, _id: str, refs: Iterable[ReferenceAsset]) -> None:
+        """Record alternatives; a (type, version) already present is replaced."""
+        ent = self.entity(_id)
+        if ent is None:
+            raise KeyError(_id)
+        refs = list(refs)
+        keys = {(r.type, r.version) for r in refs}
+        ent.candidates = [c for c in (ent.candidates or []) if (c.type, c.version) not in keys] + refs
+
+    def drop_candidates(self, _id: str, types: Iterable[str]) -> bool:
+        ent = self.entity(_id)
+        if ent is None:
+            return False
+        types = set(types)
+        before = ent.candidates or []
+        after = [c for c in before if c.type not in types]
+        ent.candidates = after
+        return len(after) != len(before)
+
+    def set_canon(self, _id: str, canon: dict) -> None:
+        ent = self.entity(_id)
+        if ent is None:
+            raise KeyError(_id)
+        ent.visual_canon = canon
+        self._canon.pop(_id, None)
@@ -9,6 +9,7 @@ class ReferenceAsset(BaseModel):
     type: str  # e.g., "cover"
     url: Optional[str] = None            # signed/public https URL (may expire)
     gs_uri: Optional[str] = None         # stable gs://bucket/object
+    version: Optional[int] = None        # n of the {type}_v{n}.png candidate this came from
 
 # Canon is intentionally loose — enriched later by concept sheets
 class LookbookCharacter(BaseModel):
@@ -17,6 +18,7 @@ class LookbookCharacter(BaseModel):
     role: Optional[str] = None
     visual_canon: Dict[str, str] = Field(default_factory=dict)
     reference_assets: List[ReferenceAsset] = Field(default_factory=list)
+    candidates: List[ReferenceAsset] = Field(default_factory=list)  # unselected alternatives (versioned)
     created_from: str = "cover_v1"
 
 class LookbookLocation(BaseModel):
@@ -24,6 +26,7 @@ class LookbookLocation(BaseModel):
     name: str
     visual_canon: Dict[str, str] = Field(default_factory=dict)
     reference_assets: List[ReferenceAsset] = Field(default_factory=list)
+    candidates: List[ReferenceAsset] = Field(default_factory=list)  # unselected alternatives (versioned)
     created_from: str = "cover_v1"
 
 class LookbookProp(BaseModel):
@@ -31,10 +34,12 @@ class LookbookProp(BaseModel):
     name: str
     visual_canon: Dict[str, str] = Field(default_factory=dict)
     reference_assets: List[ReferenceAsset] = Field(default_factory=list)
+    candidates: List[ReferenceAsset] = Field(default_factory=list)  # unselected alternatives (versioned)
     created_from: str = "cover_v1"
 
 class LookbookDoc(BaseModel):
     version: str = "1.0.0"
+    revision: int = 0  # bumped on every LookbookStore write
     characters: List[LookbookCharacter] = Field(default_factory=list)
     locations: List[LookbookLocation] = Field(default_factory=list)
     props: List[LookbookProp] = Field(default_factory=list)
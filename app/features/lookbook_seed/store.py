@@ -0,0 +1,225 @@
+# app/features/lookbook_seed/store.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev boxes: in-process locking only
+    fcntl = None
+
+from fastapi import HTTPException
+
+from app.config import config
+from app.logger import get_logger
+from app.lib import metrics
+from app.lib.paths import job_dir
+from .schemas import LookbookDoc
+
+log = get_logger(__name__)
+
+LOOKBOOK_FILE = "lookbook.json"
+
+# Single owner of jobs/<job_id>/lookbook.json.
+#
+# Reads are served from a parsed-doc cache keyed by the file's (mtime, size),
+# so repeated loads during a job don't re-parse. Writes go through update(),
+# which runs a mutate(doc) callback under a per-job lock, writes the file
+# atomically, bumps doc.revision and uploads with an if_generation_match
+# precondition. If another instance won the race, the remote doc is pulled
+# and mutate() is re-applied on top of it (merge-and-retry), so concurrent
+# writers (ref assets, page workers, cover sync, full script) no longer drop
+# each other's changes.
+
+Mutator = Callable[[LookbookDoc], Optional[bool]]
+
+
+class LookbookStore:
+    def __init__(self, *, max_attempts: int = 5):
+        self.max_attempts = max_attempts
+        self.remote = bool(config.gcs_bucket)  # tests / local runs switch this off
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._docs: Dict[str, Tuple[int, int, LookbookDoc]] = {}  # path -> (mtime_ns, size, doc)
+        self._synced: Dict[str, int] = {}                           # path -> GCS generation we last saw
+
+    # -------- paths / locking --------
+
+    def path(self, job_id: str, workdir: Optional[str] = None) -> str:
+        return os.path.join(workdir or job_dir(job_id), LOOKBOOK_FILE)
+
+    def object_name(self, job_id: str) -> str:
+        return f"jobs/{job_id}/{LOOKBOOK_FILE}"
+
+    @contextmanager
+    def _locked(self, path: str):
+        with self._guard:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            # other gunicorn workers on the same disk
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.lock", "a") as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    # -------- local file --------
+
+    def _read_local(self, path: str) -> Optional[LookbookDoc]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        hit = self._docs.get(path)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            metrics.cache_result("lookbook", True)
+            return hit[2]
+        metrics.cache_result("lookbook", False)
+        with open(path, "r") as f:
+            doc = LookbookDoc.model_validate(json.load(f))
+        self._docs[path] = (st.st_mtime_ns, st.st_size, doc)
+        return doc
+
+    def _write_local(self, path: str, doc: LookbookDoc) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "w") as f:
+            json.dump(json.loads(doc.model_dump_json()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        st = os.stat(path)
+        self._docs[path] = (st.st_mtime_ns, st.st_size, doc.model_copy(deep=True))
+
+    # -------- GCS --------
+
+    def _remote_generation(self, job_id: str) -> Tuple[bool, Optional[int]]:
+        """(reachable, generation); generation None means the object doesn't exist yet."""
+        if not self.remote:
+            return False, None
+        from app.lib.gcs_inventory import gcs_object_generation
+        try:
+            return True, gcs_object_generation(f"gs://{config.gcs_bucket}/{self.object_name(job_id)}")
+        except Exception as e:
+            log.warning(f"[lookbook] GCS metadata lookup failed for {job_id}, using local copy: {e}")
+            return False, None
+
+    def _pull(self, job_id: str, path: str, generation: int) -> None:
+        from app.lib.gcs_inventory import download_gcs_object_to_file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.dl"
+        download_gcs_object_to_file(f"gs://{config.gcs_bucket}/{self.object_name(job_id)}", tmp, generation=generation)
+        os.replace(tmp, path)
+        self._synced[path] = generation
+
+    def _sync_from_remote(self, job_id: str, path: str) -> Tuple[bool, Optional[int]]:
+        reachable, gen = self._remote_generation(job_id)
+        if reachable and gen is not None and (gen != self._synced.get(path) or not os.path.exists(path)):
+            log.debug(f"[lookbook] pulling gs generation {gen} for {job_id}")
+            self._pull(job_id, path, gen)
+        return reachable, gen
+
+    def _push(self, job_id: str, doc: LookbookDoc, if_generation_match: Optional[int]) -> Dict[str, Any]:
+        from app.lib.gcs_inventory import upload_json_to_gcs
+        return upload_json_to_gcs(
+            data=json.loads(doc.model_dump_json()),
+            object_name=self.object_name(job_id),
+            subdir="jobs",
+            filename_hint=LOOKBOOK_FILE,
+            cache_control="no-cache",
+            make_signed_url=True,
+            if_generation_match=if_generation_match,
+        )
+
+    # -------- public API --------
+
+    def load(self, job_id: str, *, workdir: Optional[str] = None, default: Optional[LookbookDoc] = None) -> LookbookDoc:
+        """
+        Parsed lookbook (a private copy; mutate through update()). Falls back to
+        GCS when the local file is missing; raises FileNotFoundError if neither
+        exists and no default is given.
+        """
+        path = self.path(job_id, workdir)
+        doc = self._read_local(path)
+        if doc is None:
+            with self._locked(path):
+                self._sync_from_remote(job_id, path)
+                doc = self._read_local(path)
+        if doc is None:
+            if default is not None:
+                return default
+            raise FileNotFoundError("lookbook.json not found; seed it first")
+        return doc.model_copy(deep=True)
+
+    def update(
+        self,
+        job_id: str,
+        mutate: Mutator,
+        *,
+        workdir: Optional[str] = None,
+        create: bool = False,
+        upload: bool = True,
+    ) -> Tuple[LookbookDoc, Optional[Dict[str, Any]]]:
+        """
+        Read-modify-write. `mutate(doc)` edits the doc in place and may run more
+        than once (on a GCS conflict it is re-applied to the winner's doc), so it
+        must derive everything from the doc it is given. Returning False means
+        "nothing changed": no write, no upload.
+
+        Returns (saved doc, GCS upload info or None).
+        """
+        path = self.path(job_id, workdir)
+        with self._locked(path):
+            for attempt in range(1, self.max_attempts + 1):
+                reachable, gen = self._sync_from_remote(job_id, path)
+                current = self._read_local(path)
+                if current is None and not create:
+                    raise FileNotFoundError("lookbook.json not found; seed it first")
+                doc = current.model_copy(deep=True) if current is not None else LookbookDoc()
+
+                if mutate(doc) is False:
+                    return doc, None
+
+                doc.revision = (current.revision if current is not None else 0) + 1
+                self._write_local(path, doc)
+                if not (upload and self.remote):
+                    return doc, None
+
+                try:
+                    # 0 = "must not exist yet"; None (GCS unreachable) = blind write as before
+                    info = self._push(job_id, doc, (gen or 0) if reachable else None)
+                except Exception as e:
+                    if _is_precondition_failed(e):
+                        log.info(f"[lookbook] {job_id} changed remotely (attempt {attempt}); merging and retrying")
+                        metrics.RETRIES.inc(op="lookbook_conflict")
+                        continue
+                    log.warning(f"[lookbook] upload failed for {job_id} (rev {doc.revision}): {e}")
+                    return doc, None
+
+                if info.get("generation"):
+                    self._synced[path] = int(info["generation"])
+                return doc, info
+
+        raise HTTPException(409, f"lookbook for job {job_id} kept changing; gave up after {self.max_attempts} attempts")
+
+    def invalidate(self, job_id: str, *, workdir: Optional[str] = None) -> None:
+        path = self.path(job_id, workdir)
+        self._docs.pop(path, None)
+        self._synced.pop(path, None)
+
+
+def _is_precondition_failed(e: Exception) -> bool:
+    try:
+        from google.api_core.exceptions import PreconditionFailed
+    except ImportError:
+        return getattr(e, "code", None) == 412
+    return isinstance(e, PreconditionFailed)
+
+
+lookbook_store = LookbookStore()
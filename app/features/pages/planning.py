@@ -0,0 +1,199 @@
+# app/features/pages/planning.py
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.features.full_script.schemas import Page
+from app.features.lookbook_ref_assets.schemas import GenerateRefAssetsRequest
+from app.features.lookbook_ref_assets.service import generate_ref_assets
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.store import lookbook_store
+from app.logger import get_logger
+
+log = get_logger(__name__)
+
+# Pre-flight for the page renderer. Before any page is drawn we walk the whole
+# script once: per-page entity IDs, the lookbook slice each page will send,
+# and which IDs are unknown or lack reference images. Everything missing is
+# generated in ONE generate_ref_assets call (entities render in parallel), and
+# the result is written to <workdir>/plan.json. The renderer then only reads
+# the plan, so it never stalls mid-chain and script problems surface at once.
+
+PLAN_FILE = "plan.json"
+PLAN_VERSION = 1
+
+# -------------------------------------------------------------------
+# Page entity collection + lookbook slice building
+# -------------------------------------------------------------------
+
+def _collect_page_ids(page: Page) -> Set[str]:
+    ids: Set[str] = set()
+    if getattr(page, "location_id", None):
+        if page.location_id:
+            ids.add(page.location_id)
+    for c in (getattr(page, "characters", None) or []):
+        if c:
+            ids.add(c)
+    for p in (getattr(page, "props", None) or []):
+        if p:
+            ids.add(p)
+    for pnl in page.panels:
+        for c in (getattr(pnl, "characters", None) or []):
+            if c:
+                ids.add(c)
+        if getattr(pnl, "location_id", None):
+            if pnl.location_id:
+                ids.add(pnl.location_id)
+        for pr in (getattr(pnl, "props", None) or []):
+            if pr:
+                ids.add(pr)
+    return ids
+
+def _build_lookbook_slice(lbx: LookbookIndex, ids: Set[str]) -> dict:
+    out = {"characters": [], "locations": [], "props": []}
+    for _id in ids:
+        hit = lbx.get(_id)
+        if hit is None:
+            continue
+        kind, obj = hit
+        refs = (getattr(obj, "reference_assets", []) or [])[:3]
+        entry = {
+            "id": _id,
+            "display_name": lbx.name(_id),
+            "visual_canon": lbx.compact_canon(_id),
+            "reference_assets": [
+                {
+                    "type": r.type,
+                    "url": getattr(r, "url", None),
+                    "gs_uri": getattr(r, "gs_uri", None),
+                }
+                for r in refs
+            ],
+        }
+        out[kind + "s"].append(entry)
+    return out
+
+# -------------------------------------------------------------------
+# Plan
+# -------------------------------------------------------------------
+
+def plan_path(workdir: str) -> str:
+    return os.path.join(workdir, PLAN_FILE)
+
+def load_plan(workdir: str) -> Optional[Dict[str, Any]]:
+    path = plan_path(workdir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"[plan] unreadable {path}: {e}")
+        return None
+
+def _save_plan(workdir: str, plan: Dict[str, Any]) -> None:
+    path = plan_path(workdir)
+    tmp = f"{path}.part"
+    with open(tmp, "w") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def _page_key(pages: List[Page]) -> List[List[str]]:
+    return [sorted(_collect_page_ids(p)) for p in pages]
+
+def _missing_refs(lbx: LookbookIndex, ids: Iterable[str]) -> Dict[str, str]:
+    missing: Dict[str, str] = {}
+    for _id in ids:
+        if _id not in lbx:
+            missing[_id] = "not_found_in_lookbook"
+        elif not lbx.has_any_assets(_id):
+            missing[_id] = "no_reference_assets"
+    return missing
+
+def build_plan(
+    job_id: str,
+    workdir: str,
+    pages: List[Page],
+    *,
+    generate_missing: bool = True,
+    reuse: bool = True,
+) -> Dict[str, Any]:
+    """
+    Plan every page up front and persist it. With `generate_missing`, IDs that
+    exist in the lookbook but have no reference images get them now, in a
+    single batched call. A saved plan is reused when it was made for the same
+    pages and the lookbook hasn't been written since (worker retries).
+
+    Raises FileNotFoundError if the job has no lookbook.
+    """
+    lbx = LookbookIndex(lookbook_store.load(job_id, workdir=workdir))
+    page_ids = _page_key(pages)
+
+    if reuse:
+        prev = load_plan(workdir)
+        if (
+            prev
+            and prev.get("version") == PLAN_VERSION
+            and prev.get("lookbook_revision") == lbx.doc.revision
+            and [p["ids"] for p in prev.get("pages", [])] == page_ids
+        ):
+            log.debug(f"[plan] reusing plan for {job_id} (lookbook rev {lbx.doc.revision})")
+            return prev
+
+    t0 = time.perf_counter()
+    all_ids = sorted({_id for ids in page_ids for _id in ids})
+    missing = _missing_refs(lbx, all_ids)
+
+    generated: List[str] = []
+    need_gen = [_id for _id, why in missing.items() if why == "no_reference_assets"]
+    if need_gen and generate_missing:
+        log.info(f"[plan] {job_id}: generating ref assets for {len(need_gen)} entities up front: {need_gen}")
+        try:
+            generate_ref_assets(GenerateRefAssetsRequest(job_id=job_id, ids=need_gen, force=False))
+            lbx = LookbookIndex(lookbook_store.load(job_id, workdir=workdir))
+        except Exception as e:
+            log.exception(f"[plan] ref asset generation failed for {need_gen}: {e}")
+            for _id in need_gen:
+                missing[_id] = "ref_assets_generation_failed"
+        else:
+            still = _missing_refs(lbx, need_gen)
+            generated = [_id for _id in need_gen if _id not in still]
+            for _id in generated:
+                missing.pop(_id, None)
+            missing.update(still)
+
+    plan_pages: List[Dict[str, Any]] = []
+    for n, ids in enumerate(page_ids, start=1):
+        blocked = {_id: missing[_id] for _id in ids if _id in missing}
+        plan_pages.append({
+            "page": n,
+            "ids": ids,
+            "slice": _build_lookbook_slice(lbx, ids),
+            "blocked": blocked,
+        })
+
+    blocked_pages = [p["page"] for p in plan_pages if p["blocked"]]
+    plan = {
+        "version": PLAN_VERSION,
+        "job_id": job_id,
+        "created_at": time.time(),
+        "lookbook_revision": lbx.doc.revision,
+        "ok": not missing,
+        "problems": missing,
+        "generated": generated,
+        "first_blocked_page": blocked_pages[0] if blocked_pages else None,
+        "blocked_pages": blocked_pages,
+        "duration_s": round(time.perf_counter() - t0, 3),
+        "pages": plan_pages,
+    }
+    _save_plan(workdir, plan)
+    if missing:
+        log.warning(f"[plan] {job_id}: {len(missing)} IDs unusable, pages {blocked_pages} blocked: {missing}")
+    return plan
+
+def plan_summary(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Manifest-sized view of a plan."""
+    return {k: plan.get(k) for k in ("ok", "problems", "generated", "first_blocked_page", "blocked_pages", "lookbook_revision")}
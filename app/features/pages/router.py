@@ -3,7 +3,8 @@ from __future__ import annotations
 
 import json
 import os
-import shutil
+import time
+import zipfile
 from typing import List
 
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
@@ -27,7 +28,10 @@ from app.lib.jobs import (
 from app.lib.cloud_tasks import create_task, delete_task
 from app.lib.imaging import resolve_cover_ref_b64_or_gcs, resolve_or_download_cover_ref
 from app.lib.gcs_inventory import download_gcs_object_to_file, upload_json_to_gcs, upload_to_gcs
+from app.lib.uploads import resolve_upload
 from app.lib.pdf import make_pdf
+from app.lib import timings, tracing, usage
+from app.features.pages.planning import build_plan, load_plan, plan_summary
 from app.features.pages.service import render_pages_chained
 
 router = APIRouter(prefix="/api/v1", tags=["comic"])
@@ -49,6 +53,7 @@ async def enqueue_comic_job(req: ComicRequest) -> dict:
         workdir = ensure_job_dir(job_id)  # creates if missing
     else:
         job_id, workdir = make_job_dir_with_id()
+    tracing.annotate(job_id=job_id)
 
     # persist locally for debugging / resume
     req_path = os.path.join(workdir, "request.json")
@@ -99,6 +104,8 @@ async def worker_process(job_id: str, request: Request) -> JSONResponse:
     - Builds and uploads final artifact if all pages done
     """
     log.debug(f"worker process called for job id: {job_id}")
+    job_t0 = time.perf_counter()
+    job_t: dict = {}
     workdir = job_dir(job_id)
     os.makedirs(workdir, exist_ok=True)
     mf_path = manifest_path(workdir)
@@ -114,6 +121,10 @@ async def worker_process(job_id: str, request: Request) -> JSONResponse:
         # Malformed body is a permanent caller error
         raise HTTPException(status_code=400, detail="invalid JSON body")
 
+    # Cloud Tasks forwards the traceparent header; a hand-replayed payload may only carry it in the body
+    tracing.adopt(body.get("traceparent"))
+    tracing.annotate(job_id=job_id)
+
     request_gcs = body.get("request_gcs")
 
     # ensure request.json exists locally
@@ -145,22 +156,37 @@ async def worker_process(job_id: str, request: Request) -> JSONResponse:
     if current_count != len(pages):
         seed_manifest_pending(mf_path, total_pages=len(pages))
 
-    # resolve cover image
-    cover_ref_path = resolve_cover_ref_b64_or_gcs(req.image_ref, job_id=req.job_id, workdir=workdir)
+    # resolve cover image (uploaded asset first, then inline base64 / GCS cover)
+    cover_ref_path = resolve_upload(req.image_asset_id, job_id=req.job_id, workdir=workdir)
+    if not cover_ref_path:
+        cover_ref_path = resolve_cover_ref_b64_or_gcs(req.image_ref, job_id=req.job_id, workdir=workdir)
     if not cover_ref_path or not os.path.exists(cover_ref_path):
         raise HTTPException(200, "Invalid or missing cover image reference")
 
     total_pages = len(req.pages)
 
+    # pre-flight: page slices + all missing ref assets in one batch, before page 1
+    try:
+        with tracing.span("comic.plan", job_id=job_id, pages=total_pages), timings.timed("plan", into=job_t):
+            plan = build_plan(job_id, workdir, req.pages)
+    except FileNotFoundError as e:
+        log.error(f"[{job_id}] cannot plan pages: {e}")
+        raise HTTPException(200, str(e))
+    mf = load_manifest(mf_path)
+    mf["plan"] = plan_summary(plan)
+    save_manifest(mf_path, mf)
+
     # render sequentially
-    render_pages_chained(
-        job_id=job_id,
-        req=req,
-        workdir=workdir,
-        cover_image_ref=cover_ref_path,
-        manifest_file=mf_path,
-        gcs_prefix=f"jobs/{job_id}",
-    )
+    with tracing.span("comic.render", job_id=job_id, pages=total_pages), timings.timed("render", into=job_t):
+        render_pages_chained(
+            job_id=job_id,
+            req=req,
+            workdir=workdir,
+            cover_image_ref=cover_ref_path,
+            manifest_file=mf_path,
+            gcs_prefix=f"jobs/{job_id}",
+            plan=plan,
+        )
 
     # collect all local pages
     local_files: List[str] = []
@@ -169,39 +195,86 @@ async def worker_process(job_id: str, request: Request) -> JSONResponse:
         if os.path.exists(p):
             local_files.append(p)
 
-    # finalize if all present
+    # finalize if all present (re-read: the renderer updated the pages)
+    mf = load_manifest(mf_path)
     if len(local_files) == total_pages and mf.get("final") is None:
-        if req.return_pdf:
-            out_path = os.path.join(workdir, "comic.pdf")
-            make_pdf(local_files, pdf_name=out_path)
-            mime = "application/pdf"
-            objname = f"jobs/{job_id}/comic.pdf"
-        else:
-            zip_base = os.path.join(workdir, "pages")
-            shutil.make_archive(zip_base, "zip", workdir)
-            out_path = f"{zip_base}.zip"
-            mime = "application/zip"
-            objname = f"jobs/{job_id}/pages.zip"
+        with tracing.span("comic.finalize", job_id=job_id, pages=total_pages), timings.timed("finalize", into=job_t):
+            if req.return_pdf:
+                out_path = os.path.join(workdir, "comic.pdf")
+                make_pdf(local_files, pdf_name=out_path)
+                mime = "application/pdf"
+                objname = f"jobs/{job_id}/comic.pdf"
+            else:
+                # pages only: archiving workdir itself would also read back the growing pages.zip
+                out_path = os.path.join(workdir, "pages.zip")
+                with zipfile.ZipFile(out_path, "w", zipfile.ZIP_STORED) as zf:
+                    for p in local_files:
+                        zf.write(p, arcname=os.path.basename(p))
+                mime = "application/zip"
+                objname = f"jobs/{job_id}/pages.zip"
+
+            try:
+                info = upload_to_gcs(out_path, object_name=objname)
+                mf["final"] = {"mime": mime, "gcs": info}
+            except Exception as e:
+                mf["final"] = {"mime": mime, "local": out_path, "upload_error": str(e)}
+
+            summary = usage.summarize(usage.load_job_usage(workdir))
+            mf["usage"] = {"total": summary["total"], "by_stage": summary["by_stage"]}
+            save_manifest(mf_path, mf)
+
+            # cleanup if configured
+            try:
+                prune_job_dir(
+                    workdir,
+                    remove_pages=config.prune_pages_after_final,
+                    remove_artifacts=config.prune_artifact_after_upload,
+                )
+            except Exception as e:
+                log.warning(f"failed to prune {workdir}: {e}")
+
+    # this run's stage times; per-page breakdowns live under pages.<n>.timings
+    mf = load_manifest(mf_path)
+    mf["timings"] = timings.rounded({**job_t, "total_ms": (time.perf_counter() - job_t0) * 1000.0})
+    save_manifest(mf_path, mf)
 
-        try:
-            info = upload_to_gcs(out_path, object_name=objname)
-            mf["final"] = {"mime": mime, "gcs": info}
-        except Exception as e:
-            mf["final"] = {"mime": mime, "local": out_path, "upload_error": str(e)}
+    return JSONResponse({"job_id": job_id, "ok": True})
 
-        save_manifest(mf_path, mf)
+@router.get("/generate/comic/plan/{job_id}")
+async def comic_plan(job_id: str) -> dict:
+    """
+    The pre-flight page plan: per-page entity IDs and lookbook slices, which
+    refs were generated up front, and which IDs/pages are blocked.
+    """
+    plan = load_plan(job_dir(job_id))
+    if plan is None:
+        raise HTTPException(404, f"no plan for job_id {job_id}")
+    return plan
 
-        # cleanup if configured
-        try:
-            prune_job_dir(
-                workdir,
-                remove_pages=config.prune_pages_after_final,
-                remove_artifacts=config.prune_artifact_after_upload,
-            )
-        except Exception as e:
-            log.warning(f"failed to prune {workdir}: {e}")
+@router.get("/generate/comic/usage/{job_id}")
+async def comic_usage_report(job_id: str) -> dict:
+    """
+    Cost/latency report for a job: every tracked model call (cover script,
+    script, cover, ref assets, pages) summed by stage, model and page.
+    Cost is an estimate from config.model_prices.
+    """
+    workdir = job_dir(job_id)
+    records = usage.load_job_usage(workdir)
+    if not records and not os.path.exists(manifest_path(workdir)):
+        raise HTTPException(404, f"unknown job_id {job_id}")
+    return {"job_id": job_id, **usage.summarize(records)}
 
-    return JSONResponse({"job_id": job_id, "ok": True})
+@router.get("/generate/comic/profile/{job_id}")
+async def comic_profile(job_id: str) -> dict:
+    """
+    Where a job's time went: per-stage percentiles across pages (refs, prompt,
+    model per attempt, decode, upload, sign, total) plus the job's plan /
+    render / finalize / total times, all in milliseconds.
+    """
+    mf_path = manifest_path(job_dir(job_id))
+    if not os.path.exists(mf_path):
+        raise HTTPException(404, f"unknown job_id {job_id}")
+    return {"job_id": job_id, **timings.profile(load_manifest(mf_path))}
 
 @router.post("/generate/comic/stop/{job_id}")
 async def stop_comic_job(job_id: str) -> dict:
@@ -265,6 +338,9 @@ def _resolve_pages_or_fail(
     if os.path.exists(local_path):
         with open(local_path, "r") as f:
             data = json.load(f)
+        if data.get("partial"):
+            # a full-script stream is still writing it; retry once it's done
+            raise HTTPException(409, f"script for job {job_id} is still being generated")
         pages = [Page(**p) for p in data.get("pages", [])]
         if pages:
             return pages
@@ -18,4 +18,8 @@ class ComicRequest(BaseModel):
         None,
         description="PNG/JPEG base64 (raw or data URL). Optional; will fall back to gs://.../cove.png",
     )
+    image_asset_id: Optional[str] = Field(
+        None,
+        description="asset_id from /assets/upload; takes precedence over image_ref",
+    )
     return_mode: Literal["inline", "base64", "signed_url"] = "inline"
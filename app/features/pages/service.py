@@ -2,147 +2,31 @@
 from __future__ import annotations
 
 import base64
-import hashlib
 import json
 import os
-import re
-from typing import Dict, List, Optional, Set, Tuple
-from urllib.parse import unquote, urlparse
+import time
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
-import requests
 
 from app.config import config
 from app.features.full_script.schemas import Page, Panel
-from app.features.lookbook_ref_assets.schemas import GenerateRefAssetsRequest
-from app.features.lookbook_ref_assets.service import generate_ref_assets
-from app.features.lookbook_seed.schemas import LookbookDoc
+from app.features.pages.planning import build_plan
 from app.features.pages.schemas import ComicRequest
-from app.lib.gcs_inventory import download_gcs_object_to_file, upload_to_gcs
+from app.lib.assets import AssetResolver, run_resolver
+from app.lib.gcs_inventory import upload_to_gcs
+from app.lib.imaging import SHEET_COLS, SHEET_ROWS, compose_contact_sheets, drop_near_duplicates, image_signature, sheet_label
 from app.lib.jobs import load_manifest, mark_page_status
+from app.lib import metrics, timings, tracing, usage
 from app.lib.openai_client import client
 from app.logger import get_logger
 
 log = get_logger(__name__)
 
 # -------------------------------------------------------------------
-# Lookbook IO + indexing
+# Page entity collection + lookbook slice building: see planning.py
 # -------------------------------------------------------------------
 
-def _lookbook_path(workdir: str) -> str:
-    return os.path.join(workdir, "lookbook.json")
-
-def _load_lookbook(workdir: str) -> LookbookDoc:
-    lb_path = _lookbook_path(workdir)
-    if not os.path.exists(lb_path):
-        raise FileNotFoundError("lookbook.json not found. Seed it with /lookbook/seed-from-cover first.")
-    with open(lb_path, "r") as f:
-        data = json.load(f)
-    return LookbookDoc.model_validate(data)
-
-def _index_lookbook(doc: LookbookDoc) -> Dict[str, Tuple[str, object]]:
-    """
-    Build id -> (kind, object) where kind in {"character","location","prop"}.
-    """
-    idx: Dict[str, Tuple[str, object]] = {}
-    for c in doc.characters:
-        idx[c.id] = ("character", c)
-    for l in doc.locations:
-        idx[l.id] = ("location", l)
-    for p in doc.props:
-        idx[p.id] = ("prop", p)
-    return idx
-
-# -------------------------------------------------------------------
-# Page entity collection + lookbook slice building
-# -------------------------------------------------------------------
-
-def _collect_page_ids(page: Page) -> Set[str]:
-    ids: Set[str] = set()
-    if getattr(page, "location_id", None):
-        if page.location_id:
-            ids.add(page.location_id)
-    for c in (getattr(page, "characters", None) or []):
-        if c:
-            ids.add(c)
-    for p in (getattr(page, "props", None) or []):
-        if p:
-            ids.add(p)
-    for pnl in page.panels:
-        for c in (getattr(pnl, "characters", None) or []):
-            if c:
-                ids.add(c)
-        if getattr(pnl, "location_id", None):
-            if pnl.location_id:
-                ids.add(pnl.location_id)
-        for pr in (getattr(pnl, "props", None) or []):
-            if pr:
-                ids.add(pr)
-    return ids
-
-def _has_any_ref_assets(obj) -> bool:
-    return bool(getattr(obj, "reference_assets", []) or [])
-
-def _ensure_ref_assets_for_ids(
-    job_id: str,
-    workdir: str,
-    doc: LookbookDoc,
-    ids: Set[str],
-) -> Tuple[LookbookDoc, Dict[str, str]]:
-    """
-    Ensure each used ID has at least one reference asset.
-    - If an ID is missing from the lookbook entirely -> mark missing.
-    - If present but has 0 refs -> call gen-ref-assets (force=False).
-    Returns (possibly reloaded lookbook, missing map).
-    """
-    idx = _index_lookbook(doc)
-    missing: Dict[str, str] = {}
-
-    # IDs that don't exist
-    for _id in ids:
-        if _id not in idx:
-            missing[_id] = "not_found_in_lookbook"
-
-    # Generate for entries with no refs
-    need_gen = []
-    for _id in ids:
-        if _id in idx:
-            _, obj = idx[_id]
-            if not _has_any_ref_assets(obj):
-                need_gen.append(_id)
-
-    if need_gen:
-        try:
-            req = GenerateRefAssetsRequest(job_id=job_id, ids=need_gen, force=False)
-            generate_ref_assets(req)  # updates lookbook.json on disk/GCS
-            doc = _load_lookbook(workdir)  # reload
-        except Exception as e:
-            log.exception(f"auto-generate ref assets failed for {need_gen}: {e}")
-            for _id in need_gen:
-                missing[_id] = "ref_assets_generation_failed"
-
-    # Final verify
-    idx = _index_lookbook(doc)
-    for _id in ids:
-        if _id in idx:
-            _, obj = idx[_id]
-            if not _has_any_ref_assets(obj):
-                missing[_id] = "no_reference_assets"
-
-    return doc, missing
-
-def _compact_canon(canon: dict) -> dict:
-    """
-    Keep lookbook slice compact for prompts.
-    """
-    if not canon:
-        return {}
-    keys = [
-        "face", "hair", "body", "palette", "costume_variants",
-        "emblems", "key_props", "lighting", "negative_traits", "notes"
-    ]
-    return {k: v for k, v in canon.items() if k in keys}
-
 # def _build_lookbook_slice(doc: LookbookDoc, ids: Set[str]) -> dict:
 #     """
 #     Build a small, page-scoped lookbook fragment:
@@ -168,30 +52,6 @@ def _compact_canon(canon: dict) -> dict:
 #         out[kind + "s"].append(entry)
 #     return out
 
-def _build_lookbook_slice(doc: LookbookDoc, ids: Set[str]) -> dict:
-    idx = _index_lookbook(doc)
-    out = {"characters": [], "locations": [], "props": []}
-    for _id in ids:
-        if _id not in idx:
-            continue
-        kind, obj = idx[_id]
-        refs = (getattr(obj, "reference_assets", []) or [])[:3]
-        entry = {
-            "id": _id,
-            "display_name": getattr(obj, "display_name", None) or getattr(obj, "name", None) or _id,
-            "visual_canon": _compact_canon(getattr(obj, "visual_canon", {}) or {}),
-            "reference_assets": [
-                {
-                    "type": r.type,
-                    "url": getattr(r, "url", None),
-                    "gs_uri": getattr(r, "gs_uri", None),
-                }
-                for r in refs
-            ],
-        }
-        out[kind + "s"].append(entry)
-    return out
-
 def _collect_entity_names(lookbook_slice: dict) -> Tuple[List[str], List[str], List[str]]:
     chars = [c.get("display_name", c.get("id", "")) for c in lookbook_slice.get("characters", [])]
     locs  = [l.get("display_name", l.get("id", "")) for l in lookbook_slice.get("locations", [])]
@@ -203,162 +63,74 @@ def _collect_entity_names(lookbook_slice: dict) -> Tuple[List[str], List[str], L
     return chars, locs, props
 
 # -------------------------------------------------------------------
-# Ref image resolution / caching
+# Ref image collection (downloads/caching: app/lib/assets.py)
 # -------------------------------------------------------------------
 
-def _cache_dir(workdir: str) -> str:
-    d = os.path.join(workdir, "ref_cache")
-    os.makedirs(d, exist_ok=True)
-    return d
-
-def _safe_name(u: str) -> str:
-    h = hashlib.sha1(u.encode("utf-8")).hexdigest()[:12]
-    base = os.path.basename(urlparse(u).path) or "ref.png"
-    return f"{h}_{base}"
+# entity-specific sheets beat the shared cover (a whole scene, same file on every entity)
+_REF_TYPE_RANK = {"portrait": 0, "wide": 0, "detail": 0, "turnaround": 1, "cover": 9}
+_LOW_INFO = 1.0  # grey-level entropy (bits) below which an image is nearly blank
 
-def _resolve_asset_url_to_path(url: str, workdir: str) -> Optional[str]:
+def _rank_and_dedupe_refs(candidates: List[dict], *, max_per_entity: int, total_cap: int) -> List[dict]:
     """
-    Save gs:// or http(s) asset to local cache and return path.
+    Pick which refs to attach:
+      1. per entity, most specific type first (cover last), richer image first
+      2. visiting entities round-robin (everyone's best ref before anyone's
+         second), drop near-duplicate content (same picture via other URLs,
+         the shared cover) by perceptual hash
+      3. keep max_per_entity per entity and total_cap overall
+    The survivors are returned in the original attach order.
     """
-    try:
-        cdir = _cache_dir(workdir)
-        local = os.path.join(cdir, _safe_name(url))
-        if os.path.exists(local) and os.path.getsize(local) > 0:
-            return local
-
-        if url.startswith("gs://"):
-            download_gcs_object_to_file(url, local)
-            return local if os.path.exists(local) and os.path.getsize(local) > 0 else None
-
-        if url.startswith("http://") or url.startswith("https://"):
-            r = requests.get(url, timeout=30)
-            r.raise_for_status()
-            with open(local, "wb") as f:
-                f.write(r.content)
-            return local if os.path.getsize(local) > 0 else None
-
-    except Exception as e:
-        log.warning(f"failed to resolve asset url -> path: {url} ({e})")
-    return None
-
-def _cache_dir(workdir: str) -> str:
-    d = os.path.join(workdir, "_ref_cache")
-    os.makedirs(d, exist_ok=True)
-    return d
-
-def _safe_name(s: str) -> str:
-    s = (s or "").strip()
-    s = re.sub(r"[^A-Za-z0-9_.\-]+", "_", s)
-    return s[:160] or "ref"
-
-def _https_to_gs(url: str) -> str | None:
-    """
-    Convert common GCS HTTPS forms to gs://bucket/key
-    Works for:
-      https://storage.googleapis.com/<bucket>/<key>[?...]
-      https://<bucket>.storage.googleapis.com/<key>[?...]
-      https://storage.cloud.google.com/<bucket>/<key>[?...]
-    """
-    try:
-        u = urlparse(url)
-        host = u.netloc.lower()
-        path = unquote(u.path)
-
-        if host == "storage.googleapis.com":
-            # /bucket/key...
-            parts = path.lstrip("/").split("/", 1)
-            if len(parts) == 2:
-                bucket, key = parts
-                return f"gs://{bucket}/{key}"
-
-        if host.endswith(".storage.googleapis.com"):
-            # bucket.storage.googleapis.com/key...
-            bucket = host.split(".storage.googleapis.com", 1)[0]
-            key = path.lstrip("/")
-            if bucket and key:
-                return f"gs://{bucket}/{key}"
-
-        if host == "storage.cloud.google.com":
-            # /bucket/key...
-            parts = path.lstrip("/").split("/", 1)
-            if len(parts) == 2:
-                bucket, key = parts
-                return f"gs://{bucket}/{key}"
-    except Exception:
-        pass
-    return None
-
-def _resolve_asset_ref_to_path(ref: dict, workdir: str) -> str | None:
-    """
-    Prefer gs://; fall back to HTTP; if HTTP fails, convert to gs:// and try again.
-    `ref` may contain {"url": "...", "gs_uri": "..."}.
-    """
-    gs = (ref.get("gs_uri") or "").strip()
-    url = (ref.get("url") or "").strip()
-    cache = _cache_dir(workdir)
-
-    print("gs is", gs)
-    # Try gs:// first (most reliable)
-    if gs:
-        print("yoyo0")
-        local = os.path.join(cache, _safe_name(gs) + ".png")
-        if os.path.exists(local) and os.path.getsize(local) > 0:
-            print("yoyo1")
-            return local
-        try:
-            print("yoyo2")
-            download_gcs_object_to_file(gs, local)
-            return local if os.path.getsize(local) > 0 else None
-        except Exception as e:
-            print("yoyo3")
-            log.warning(f"failed gs fetch {gs}: {e}")
-
-    # Try HTTP second
-    if url.startswith("http://") or url.startswith("https://"):
-        local = os.path.join(cache, _safe_name(url) + ".png")
-        if os.path.exists(local) and os.path.getsize(local) > 0:
-            return local
-        try:
-            r = requests.get(url, timeout=30)
-            r.raise_for_status()
-            with open(local, "wb") as f:
-                f.write(r.content)
-            if os.path.getsize(local) > 0:
-                return local
-        except requests.HTTPError as e:
-            # On 400/403 likely expired signed URL → convert to gs:// and retry
-            alt_gs = _https_to_gs(url)
-            if alt_gs:
-                try:
-                    local2 = os.path.join(cache, _safe_name(alt_gs) + ".png")
-                    download_gcs_object_to_file(alt_gs, local2)
-                    return local2 if os.path.getsize(local2) > 0 else None
-                except Exception as e2:
-                    log.warning(f"fallback gs fetch failed {alt_gs}: {e2}")
-            else:
-                log.warning(f"http fetch failed and no gs fallback for {url}: {e}")
-        except Exception as e:
-            log.warning(f"http fetch failed {url}: {e}")
+    by_entity: Dict[str, List[dict]] = {}
+    for it in candidates:
+        by_entity.setdefault(it["id"], []).append(it)
+
+    def _info(it: dict) -> float:
+        sig = image_signature(it["path"])
+        return sig["info"] if sig else 0.0
+
+    ranked: List[Tuple[tuple, dict]] = []
+    for items in by_entity.values():
+        items.sort(key=lambda it: (_info(it) < _LOW_INFO, _REF_TYPE_RANK.get(it["type"], 2), -_info(it), it["order"]))
+        for nth, it in enumerate(items):
+            ranked.append(((nth, items[0]["order"]), it))
+    ranked.sort(key=lambda x: x[0])
+
+    per_entity: Dict[str, int] = {}
+    picked: List[dict] = []
+    for it in drop_near_duplicates([it for _, it in ranked]):
+        if per_entity.get(it["id"], 0) >= max_per_entity:
+            continue
+        per_entity[it["id"]] = per_entity.get(it["id"], 0) + 1
+        picked.append(it)
+        if len(picked) >= total_cap:
+            break
+    return sorted(picked, key=lambda it: it["order"])
 
-    return None
 
 def _collect_ref_paths_for_slice(
     *,
-    workdir: str,
+    assets: AssetResolver,
     lookbook_slice: dict,
     max_per_entity: int = 2,
     total_cap: int = 10,
+    sheets_dir: Optional[str] = None,
 ) -> Tuple[List[str], str]:
+    """
+    Local ref files for a page slice (in images.edit order) plus the prompt
+    block binding each one to its entity. With `sheets_dir`, the refs are
+    tiled into at most two captioned contact sheets and the block binds
+    tiles (A1, A2, ...) instead of files.
+    """
     candidates = []
-    print("lookbook_slice", lookbook_slice)
     def add_from(group_key: str):
         group = lookbook_slice.get(group_key, []) or []
         for entry in group:
             ent_id = (entry.get("id") or "").strip()
             name   = (entry.get("display_name") or entry.get("name") or ent_id).strip()
             refs   = entry.get("reference_assets", []) or []
-            for r in refs[:max_per_entity]:
-                p = _resolve_asset_ref_to_path(r or {}, workdir)
+            # all of the entity's refs are candidates; max_per_entity applies after dedupe
+            for r in refs:
+                p = assets.resolve(r or {})
                 if p:
                     candidates.append({
                         "path": p,
@@ -366,36 +138,53 @@ def _collect_ref_paths_for_slice(
                         "name": name,
                         "type": (r or {}).get("type", "") or "ref",
                         "group": group_key,
+                        "order": len(candidates),
                     })
 
     add_from("characters")
     add_from("locations")
     add_from("props")
-    print("candidates are ", candidates)
 
-    # dedup & cap
-    seen = set()
-    uniq = []
-    for it in candidates:
-        if it["path"] in seen:
-            continue
-        seen.add(it["path"])
-        uniq.append(it)
-    uniq = uniq[:total_cap]
+    uniq = _rank_and_dedupe_refs(candidates, max_per_entity=max_per_entity, total_cap=total_cap)
 
     ordered_paths = [it["path"] for it in uniq]
 
     # ordered block
     if not ordered_paths:
         return [], ""
-    indices: dict[str, list[int]] = {}
+
+    # labels: "1".."N" for separate files, or "A1".."B6" for tiles on contact sheets
+    labels = [str(i) for i in range(1, len(uniq) + 1)]
+    header = "**ATTACHED REFERENCE IMAGES (ORDERED):**\n"
+    sheets = None
+    if sheets_dir and len(uniq) > 1:
+        try:
+            sheets = compose_contact_sheets(
+                [{"path": it["path"], "caption": f"{sheet_label(i)}  {it['name']} ({it['type']})"} for i, it in enumerate(uniq)],
+                sheets_dir,
+            )
+        except Exception as e:
+            log.warning(f"contact sheet failed, attaching files instead: {e}")
+    if sheets:
+        covered = sum(len(sh["tiles"]) for sh in sheets)
+        uniq = uniq[:covered]
+        labels = [sheet_label(i) for i in range(covered)]
+        ordered_paths = [sh["path"] for sh in sheets]
+        attached = " and ".join(f"image {i} = sheet {sh['letter']}" for i, sh in enumerate(sheets, 1))
+        header = (
+            "**ATTACHED REFERENCE SHEETS (ORDERED):**\n"
+            f"Attached {attached}. Each sheet is a {SHEET_COLS}x{SHEET_ROWS} grid of captioned tiles, read "
+            "left-to-right, top-to-bottom (A1 = top-left of sheet A); each tile is one reference image.\n"
+        )
+
+    indices: dict[str, list[str]] = {}
     lines = []
-    for i, it in enumerate(uniq, 1):
-        lines.append(f"[{i}] {it['id']} • {it['type']} — {it['name']} ({it['group'][:-1]})")
-        indices.setdefault(it["id"], []).append(i)
+    for label, it in zip(labels, uniq):
+        lines.append(f"[{label}] {it['id']} • {it['type']} — {it['name']} ({it['group'][:-1]})")
+        indices.setdefault(it["id"], []).append(label)
 
     def bind_line(it):
-        idxs = ",".join(str(i) for i in indices.get(it["id"], []))
+        idxs = ",".join(indices.get(it["id"], []))
         g = it["group"]
         if g == "characters":
             return f"- {it['name']} ({it['id']}) ⇢ use refs [{idxs}] for facial likeness, hair, outfit."
@@ -412,7 +201,7 @@ def _collect_ref_paths_for_slice(
                 added.add(it["id"])
 
     ordered_block = (
-        "**ATTACHED REFERENCE IMAGES (ORDERED):**\n"
+        header
         + "\n".join(lines)
         + "\n\n**BINDING (MANDATORY):**\n"
         + "\n".join(bindings)
@@ -661,25 +450,30 @@ def render_pages_chained(
     cover_image_ref: str,
     manifest_file: str,
     gcs_prefix: Optional[str] = None,
+    plan: Optional[dict] = None,
 ) -> List[str]:
     """
     Sequentially generate pages where page N uses:
       - previous rendered page (or cover for page 1) as first ref
       - plus lookbook reference images for the page's used IDs
 
-    If a required ID is missing from the lookbook or lacks refs, the chain
-    is blocked and the manifest marks which IDs need attention.
+    Entity IDs, lookbook slices and missing refs come from the pre-flight
+    plan (built here if the caller didn't). The chain stops at the first page
+    the plan marks blocked, and the manifest says which IDs need attention.
     """
     results: List[str] = []
     prev_ref = cover_image_ref
     out_prefix = os.path.join(workdir, "page")
 
-    # Load lookbook initially
-    try:
-        lookbook = _load_lookbook(workdir)
-    except FileNotFoundError as e:
-        log.error(str(e))
-        return results
+    if plan is None:
+        try:
+            plan = build_plan(job_id, workdir, req.pages)
+        except FileNotFoundError as e:
+            log.error(str(e))
+            return results
+
+    # one resolver for the whole chain: a character on every page is fetched once
+    assets = run_resolver(workdir)
 
     for idx, page in enumerate(req.pages):
         # cancellation check
@@ -689,147 +483,172 @@ def render_pages_chained(
             break
 
         page_no = idx + 1
+        with tracing.span("page.render", job_id=job_id, page=page_no) as page_span, timings.collect() as page_t:
+            page_t0 = time.perf_counter()
+
+            def _timings() -> dict:
+                return timings.rounded({**page_t, "total_ms": (time.perf_counter() - page_t0) * 1000.0})
 
-        # Collect IDs for this page
-        ids = _collect_page_ids(page)
+            planned = plan["pages"][idx]
+            ids = set(planned["ids"])
 
-        # Ensure refs exist (auto-generate when possible)
-        lookbook, missing = _ensure_ref_assets_for_ids(job_id, workdir, lookbook, ids)
-        if missing:
+            if planned["blocked"]:
+                mark_page_status(
+                    manifest_file,
+                    page_no,
+                    "blocked_missing_refs",
+                    {"ids": sorted(planned["blocked"].keys()), "reasons": planned["blocked"]},
+                )
+                log.warning(f"[page {page_no}] blocked; missing lookbook refs: {planned['blocked']}")
+                page_span.set(status="blocked_missing_refs")
+                break
+
+            # Page-scoped lookbook slice (from the plan) + prev context
+            slice_obj = planned["slice"]
+            prev_ctx = _prev_context_from_page(req.pages[idx - 1]) if idx > 0 else None
+
+            # Gather local ref files: previous page first + lookbook refs
+            with tracing.span("page.refs", page=page_no) as sp, timings.timed("refs"):
+                lookbook_ref_paths, lookbook_ref_paths_desc = _collect_ref_paths_for_slice(
+                    assets=assets,
+                    lookbook_slice=slice_obj,
+                    max_per_entity=2,
+                    total_cap=10,
+                    sheets_dir=os.path.join(workdir, "_ref_sheets") if config.ref_contact_sheets else None,
+                )
+                sp.set(refs=len(lookbook_ref_paths))
+            image_paths_to_send = lookbook_ref_paths
+            # Prompt (cover-style sections)
+            with tracing.span("page.prompt", page=page_no) as sp, timings.timed("prompt"):
+                prompt = _build_page_prompt(req=req, page=page, lookbook_slice=slice_obj, ref_order_block=lookbook_ref_paths_desc)
+                sp.set(chars=len(prompt))
+
+            # manifest: mark running + diagnostics
+            panel_cast = _entities_by_panel(page)
             mark_page_status(
                 manifest_file,
                 page_no,
-                "blocked_missing_refs",
-                {"ids": sorted(list(missing.keys())), "reasons": missing},
-            )
-            log.warning(f"[page {page_no}] blocked; missing lookbook refs: {missing}")
-            break
-
-        # Build page-scoped lookbook slice + prev context
-        slice_obj = _build_lookbook_slice(lookbook, ids)
-        prev_ctx = _prev_context_from_page(req.pages[idx - 1]) if idx > 0 else None
-
-        # Gather local ref files: previous page first + lookbook refs
-        lookbook_ref_paths, lookbook_ref_paths_desc = _collect_ref_paths_for_slice(
-            workdir=workdir,
-            lookbook_slice=slice_obj,
-            max_per_entity=2,
-            total_cap=10,
-        )
-        image_paths_to_send = lookbook_ref_paths
-        # Prompt (cover-style sections)
-        prompt = _build_page_prompt(req=req, page=page, lookbook_slice=slice_obj, ref_order_block=lookbook_ref_paths_desc)
-
-        # manifest: mark running + diagnostics
-        panel_cast = _entities_by_panel(page)
-        mark_page_status(
-            manifest_file,
-            page_no,
-            "running",
-            {
-                "prompt_chars": len(prompt),
-                "prev_ref": prev_ref,
-                "ids_used": sorted(list(ids)),
-                "panel_cast": panel_cast,
-                "prev_context": prev_ctx or {},
-                "refs_used": {
-                    "characters": [r["url"] for c in slice_obj["characters"] for r in c["reference_assets"]],
-                    "locations":  [r["url"] for l in slice_obj["locations"]  for r in l["reference_assets"]],
-                    "props":      [r["url"] for p in slice_obj["props"]      for r in p["reference_assets"]],
+                "running",
+                {
+                    "prompt_chars": len(prompt),
+                    "prev_ref": prev_ref,
+                    "ids_used": sorted(list(ids)),
+                    "panel_cast": panel_cast,
+                    "prev_context": prev_ctx or {},
+                    "refs_used": {
+                        "characters": [r["url"] for c in slice_obj["characters"] for r in c["reference_assets"]],
+                        "locations":  [r["url"] for l in slice_obj["locations"]  for r in l["reference_assets"]],
+                        "props":      [r["url"] for p in slice_obj["props"]      for r in p["reference_assets"]],
+                    },
+                    "ref_paths_resolved": image_paths_to_send,
                 },
-                "ref_paths_resolved": image_paths_to_send,
-            },
-        )
-
-        filename = f"{out_prefix}-{page_no}.png"
-        tmpname = f"{filename}.part"
-        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            )
 
-        model = config.openai_image_model
-        size = config.image_size
-        retries = 3
-        delay = 2.0
-        last_error = None
+            filename = f"{out_prefix}-{page_no}.png"
+            tmpname = f"{filename}.part"
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
 
-        def _open_files(paths: List[str]):
-            return [open(p, "rb") for p in paths if p and os.path.exists(p)]
+            model = config.openai_image_model
+            size = config.image_size
+            retries = 3
+            delay = 2.0
+            last_error = None
+            outcome = "failed"
 
-        for attempt in range(1, retries + 1):
-            try:
-                mark_page_status(manifest_file, page_no, "running", {"attempts": attempt})
+            def _open_files(paths: List[str]):
+                return [open(p, "rb") for p in paths if p and os.path.exists(p)]
 
-                files = _open_files(image_paths_to_send)
+            for attempt in range(1, retries + 1):
                 try:
-                    resp = client.images.edit(
-                        model=model,
-                        prompt=prompt,
-                        size=size,
-                        n=1,
-                        image=files,
-                    )
-                finally:
-                    for f in files:
-                        try:
-                            f.close()
-                        except Exception:
-                            pass
-
-                b64 = resp.data[0].b64_json
-                with open(tmpname, "wb") as f:
-                    f.write(base64.b64decode(b64))
-                    f.flush()
-                    os.fsync(f.fileno())
-                os.replace(tmpname, filename)
+                    mark_page_status(manifest_file, page_no, "running", {"attempts": attempt})
 
-                mark_page_status(
-                    manifest_file,
-                    page_no,
-                    "rendered",
-                    {
-                        "attempts": attempt,
-                        "local": filename,
-                        "used_ref_paths": image_paths_to_send,
-                    },
-                )
-
-                if gcs_prefix:
+                    files = _open_files(image_paths_to_send)
                     try:
-                        object_name = f"{gcs_prefix}/pages/page-{page_no}.png"
-                        info = upload_to_gcs(filename, object_name=object_name)
-                        mark_page_status(
-                            manifest_file,
-                            page_no,
-                            "done",
-                            {"attempts": attempt, "uploaded": True, "gcs": info, "local": filename},
-                        )
-                    except Exception as up_e:
-                        log.exception(f"GCS upload failed for page {page_no}: {up_e}")
-                        mark_page_status(
-                            manifest_file,
-                            page_no,
-                            "rendered",
-                            {
-                                "attempts": attempt,
-                                "uploaded": False,
-                                "upload_error": str(up_e),
-                                "local": filename,
-                            },
-                        )
-
-                results.append(filename)
-                prev_ref = filename  # chain
-                break
-
-            except Exception as e:
-                last_error = str(e)
-                log.warning(f"[page {page_no}] generate failed attempt {attempt}/{retries}: {e}")
-                if attempt < retries:
-                    import random, time
-                    time.sleep((delay * (2 ** (attempt - 1))) + random.uniform(0, 0.5))
+                        with timings.timed("model", each=True):
+                            resp = usage.tracked(
+                                "image.edit", client.images.edit,
+                                attempt=attempt,
+                                tags={"job_id": job_id, "stage": "page", "page": page_no},
+                                model=model,
+                                prompt=prompt,
+                                size=size,
+                                n=1,
+                                image=files,
+                            )
+                    finally:
+                        for f in files:
+                            try:
+                                f.close()
+                            except Exception:
+                                pass
+
+                    with tracing.span("page.decode", page=page_no), timings.timed("decode"):
+                        b64 = resp.data[0].b64_json
+                        with open(tmpname, "wb") as f:
+                            f.write(base64.b64decode(b64))
+                            f.flush()
+                            os.fsync(f.fileno())
+                        os.replace(tmpname, filename)
+
+                    mark_page_status(
+                        manifest_file,
+                        page_no,
+                        "rendered",
+                        {
+                            "attempts": attempt,
+                            "local": filename,
+                            "used_ref_paths": image_paths_to_send,
+                            "timings": _timings(),
+                        },
+                    )
+                    outcome = "rendered"
 
-        if not os.path.exists(filename):
-            # final failure for this page; stop chain
-            mark_page_status(manifest_file, page_no, "failed", {"last_error": last_error})
-            break
+                    if gcs_prefix:
+                        try:
+                            object_name = f"{gcs_prefix}/pages/page-{page_no}.png"
+                            info = upload_to_gcs(filename, object_name=object_name)
+                            mark_page_status(
+                                manifest_file,
+                                page_no,
+                                "done",
+                                {"attempts": attempt, "uploaded": True, "gcs": info, "local": filename, "timings": _timings()},
+                            )
+                            outcome = "done"
+                        except Exception as up_e:
+                            log.exception(f"GCS upload failed for page {page_no}: {up_e}")
+                            mark_page_status(
+                                manifest_file,
+                                page_no,
+                                "rendered",
+                                {
+                                    "attempts": attempt,
+                                    "uploaded": False,
+                                    "upload_error": str(up_e),
+                                    "local": filename,
+                                    "timings": _timings(),
+                                },
+                            )
+
+                    results.append(filename)
+                    prev_ref = filename  # chain
+                    break
+
+                except Exception as e:
+                    last_error = str(e)
+                    log.warning(f"[page {page_no}] generate failed attempt {attempt}/{retries}: {e}")
+                    if attempt < retries:
+                        import random
+                        metrics.RETRIES.inc(op="page")
+                        with timings.timed("backoff"):
+                            time.sleep((delay * (2 ** (attempt - 1))) + random.uniform(0, 0.5))
+
+            metrics.PAGE_RENDER.observe(time.perf_counter() - page_t0, status=outcome)
+            page_span.set(status=outcome, attempts=attempt)
+            if outcome == "failed":
+                page_span.fail(last_error or "render failed")
+            if not os.path.exists(filename):
+                # final failure for this page; stop chain
+                mark_page_status(manifest_file, page_no, "failed", {"last_error": last_error, "timings": _timings()})
+                break
 
     return results
@@ -0,0 +1 @@
+# app/features/pipeline/__init__.py
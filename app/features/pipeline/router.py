@@ -0,0 +1,106 @@
+# app/features/pipeline/router.py
+import json
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.config import config
+from app.logger import get_logger
+from app.lib.cloud_tasks import create_task
+from app.lib.gcs_inventory import download_gcs_object_to_file, upload_json_to_gcs
+from app.lib.paths import ensure_job_dir, job_dir, make_job_dir_with_id
+
+from .schemas import PipelineRequest, PipelineStatus
+from .service import load_state, run_pipeline, save_state
+
+router = APIRouter(prefix="/api/v1", tags=["pipeline"])
+log = get_logger(__name__)
+
+def _enqueue(job_id: str, request_gcs: str) -> str:
+    task = create_task(
+        queue=config.tasks_queue,
+        url=f"{config.public_base_url}/api/v1/tasks/worker/pipeline/{job_id}",
+        payload={"job_id": job_id, "request_gcs": request_gcs},
+        schedule_in_seconds=0,
+    )
+    return task.name
+
+@router.post("/generate/pipeline", status_code=202)
+async def enqueue_pipeline(req: PipelineRequest) -> dict:
+    """
+    One call for the whole book: cover-script → seed → {cover, full-script}
+    → ref assets → comic, run as a stage DAG by a Cloud Task worker.
+    Poll status_url; the final `comic` stage hands off to /generate/comic.
+    """
+    if req.job_id:
+        job_id, workdir = req.job_id, ensure_job_dir(req.job_id)
+    else:
+        job_id, workdir = make_job_dir_with_id()
+        req.job_id = job_id
+
+    with open(os.path.join(workdir, "pipeline_request.json"), "w") as f:
+        json.dump(req.model_dump(), f, indent=2)
+    req_info = upload_json_to_gcs(
+        req.model_dump(),
+        object_name=f"jobs/{job_id}/pipeline_request.json",
+        make_signed_url=False,
+    )
+
+    state = load_state(job_id, workdir)
+    state["status"] = "queued"
+    state["task_name"] = _enqueue(job_id, req_info["gs_uri"])
+    save_state(job_id, workdir, state)
+    return {
+        "job_id": job_id,
+        "status_url": f"/api/v1/generate/pipeline/status/{job_id}",
+        "resume_url": f"/api/v1/generate/pipeline/resume/{job_id}",
+        "worker_url": f"/api/v1/tasks/worker/pipeline/{job_id}",  # local testing
+    }
+
+@router.post("/tasks/worker/pipeline/{job_id}")
+async def worker_pipeline(job_id: str, request: Request) -> dict:
+    """
+    Cloud Task target. Resumable: stages already done are skipped. A failed
+    stage answers 500 so Cloud Tasks retries from there.
+    """
+    workdir = job_dir(job_id)
+    req_path = os.path.join(workdir, "pipeline_request.json")
+    if not os.path.exists(req_path):
+        try:
+            body = await request.json()
+        except Exception:
+            raise HTTPException(400, "invalid JSON body")
+        if not body.get("request_gcs"):
+            raise HTTPException(400, "missing request_gcs")
+        download_gcs_object_to_file(body["request_gcs"], req_path)
+
+    with open(req_path, "r") as f:
+        req = PipelineRequest(**json.load(f))
+
+    state = await run_pipeline(job_id, workdir, req)
+    if state["status"] != "done":
+        raise HTTPException(500, f"pipeline {job_id} failed; will resume on retry")
+    return {"job_id": job_id, "ok": True}
+
+@router.get("/generate/pipeline/status/{job_id}", response_model=PipelineStatus)
+async def pipeline_status(job_id: str) -> PipelineStatus:
+    workdir = job_dir(job_id)
+    state = load_state(job_id, workdir)
+    comic = None
+    comic_out = os.path.join(workdir, "pipeline", "comic.json")
+    if os.path.exists(comic_out):
+        with open(comic_out, "r") as f:
+            comic = json.load(f)
+    return PipelineStatus(job_id=job_id, status=state.get("status", "queued"), stages=state.get("stages", {}), comic=comic)
+
+@router.post("/generate/pipeline/resume/{job_id}", status_code=202)
+async def resume_pipeline(job_id: str) -> dict:
+    if not config.gcs_bucket:
+        raise HTTPException(500, "GCS_BUCKET not configured")
+    workdir = job_dir(job_id)
+    state = load_state(job_id, workdir)
+    if state.get("status") == "done":
+        return {"job_id": job_id, "status": "done"}
+    state["task_name"] = _enqueue(job_id, f"gs://{config.gcs_bucket}/jobs/{job_id}/pipeline_request.json")
+    save_state(job_id, workdir, state)
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/v1/generate/pipeline/status/{job_id}"}
@@ -0,0 +1,35 @@
+# app/features/pipeline/schemas.py
+from typing import Any, Dict, Literal, Optional
+from pydantic import BaseModel, Field
+
+StageStatus = Literal["pending", "running", "done", "failed"]
+
+class PipelineRequest(BaseModel):
+    job_id: Optional[str] = None
+    # chosen story idea (from /generate/story-ideas)
+    title: str
+    synopsis: str
+    # recipient / style
+    name: str = Field(..., description="Main character name")
+    gender: Optional[str] = None
+    page_count: int = Field(..., ge=1, le=64)
+    theme: str = Field(..., description="Core comic theme / style")
+    user_answers_list: Dict[str, str] = Field(default_factory=dict, description="Comedic Q&A pairs")
+    # face reference for the cover + pages
+    image_asset_id: Optional[str] = Field(None, description="asset_id from /assets/upload")
+    image_base64: Optional[str] = Field(None, description="Optional PNG/JPEG base64 (if no asset id)")
+    return_pdf: bool = False
+    force: bool = Field(False, description="Skip the text response cache")
+
+class PipelineStageState(BaseModel):
+    status: StageStatus = "pending"
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    duration_s: Optional[float] = None
+    error: Optional[str] = None
+
+class PipelineStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    stages: Dict[str, PipelineStageState] = Field(default_factory=dict)
+    comic: Optional[Dict[str, Any]] = None          # enqueue response of the final comic stage
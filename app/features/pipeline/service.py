@@ -0,0 +1,282 @@
+# app/features/pipeline/service.py
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import config
+from app.logger import get_logger
+from app.lib import usage
+from app.lib.gcs_inventory import download_gcs_object_to_file, upload_json_to_gcs, upload_to_gcs
+
+from app.features.cover.schemas import GenerateCoverRequest
+from app.features.cover.service import generate_comic_cover
+from app.features.cover_script.schemas import CoverScriptRequest, CoverScriptResponse
+from app.features.cover_script.service import generate_cover_script
+from app.features.full_script.router import _persist_script
+from app.features.full_script.schemas import FullScriptPagesResponse, FullScriptRequest
+from app.features.full_script.service import generate_full_script
+from app.features.lookbook_ref_assets.schemas import GenerateRefAssetsRequest
+from app.features.lookbook_ref_assets.service import generate_ref_assets
+from app.features.lookbook_seed.schemas import InitialIds, SeedFromCoverRequest
+from app.features.lookbook_seed.service import seed_from_cover
+from app.features.pages.router import enqueue_comic_job
+from app.features.pages.schemas import ComicRequest
+
+from .schemas import PipelineRequest
+
+log = get_logger(__name__)
+
+# -------- DAG runner --------
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    deps: Tuple[str, ...]
+    fn: Callable[["PipelineContext"], Awaitable[Dict[str, Any]]]
+
+class PipelineContext:
+    """
+    Per-run handle: request, job dir, and stage outputs. Outputs are persisted
+    to <workdir>/pipeline/<stage>.json (+ GCS) so a resumed run can read the
+    results of stages finished by an earlier worker.
+    """
+    def __init__(self, job_id: str, workdir: str, req: PipelineRequest, *, upload: bool = True):
+        self.job_id = job_id
+        self.workdir = workdir
+        self.req = req
+        self.upload = upload
+        self.outputs: Dict[str, Dict[str, Any]] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.workdir, "pipeline", f"{name}.json")
+
+    def _object(self, name: str) -> str:
+        return f"jobs/{self.job_id}/pipeline/{name}.json"
+
+    def persist(self, name: str, out: Dict[str, Any]) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.part", "w") as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+        os.replace(f"{path}.part", path)
+        self.outputs[name] = out
+        if self.upload:
+            try:
+                upload_json_to_gcs(out, object_name=self._object(name), make_signed_url=False)
+            except Exception as e:
+                log.warning(f"[{self.job_id}] pipeline: failed to upload {name} output: {e}")
+
+    def output(self, name: str) -> Dict[str, Any]:
+        if name not in self.outputs:
+            path = self._path(name)
+            if not os.path.exists(path) and self.upload and config.gcs_bucket:
+                download_gcs_object_to_file(f"gs://{config.gcs_bucket}/{self._object(name)}", path)
+            with open(path, "r") as f:
+                self.outputs[name] = json.load(f)
+        return self.outputs[name]
+
+async def run_dag(
+    stages: List[Stage],
+    ctx: PipelineContext,
+    state: Dict[str, Any],
+    *,
+    save_state: Callable[[Dict[str, Any]], None],
+) -> Dict[str, Any]:
+    """
+    Run every stage whose deps are done, as soon as they are done; stages
+    already "done" in `state` are skipped (resume). After a failure no new
+    stages start, running ones finish and keep their outputs.
+    """
+    st = state.setdefault("stages", {})
+    for s in stages:
+        st.setdefault(s.name, {"status": "pending"})
+
+    running: Dict[asyncio.Task, Stage] = {}
+    attempted: Set[str] = set()
+    failed = False
+
+    async def _exec(s: Stage) -> None:
+        with usage.usage_context(job_id=ctx.job_id, stage=s.name):
+            out = await s.fn(ctx)
+        await asyncio.to_thread(ctx.persist, s.name, out or {})
+
+    state["status"] = "running"
+    while True:
+        if not failed:
+            for s in stages:
+                if s.name in attempted or st[s.name].get("status") == "done":
+                    continue
+                if all(st[d].get("status") == "done" for d in s.deps):
+                    attempted.add(s.name)
+                    st[s.name] = {"status": "running", "started_at": time.time()}
+                    running[asyncio.create_task(_exec(s))] = s
+                    log.info(f"[{ctx.job_id}] pipeline: start {s.name}")
+        await asyncio.to_thread(save_state, state)
+        if not running:
+            break
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            s = running.pop(task)
+            entry = st[s.name]
+            entry["finished_at"] = time.time()
+            entry["duration_s"] = round(entry["finished_at"] - entry["started_at"], 3)
+            exc = task.exception()
+            if exc is not None:
+                failed = True
+                entry.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+                log.error(f"[{ctx.job_id}] pipeline: {s.name} failed: {exc}")
+            else:
+                entry["status"] = "done"
+                log.info(f"[{ctx.job_id}] pipeline: {s.name} done in {entry['duration_s']}s")
+
+    state["status"] = "done" if all(st[s.name].get("status") == "done" for s in stages) else "failed"
+    await asyncio.to_thread(save_state, state)
+    return state
+
+# -------- stages --------
+
+def _cover_script_out(ctx: PipelineContext) -> CoverScriptResponse:
+    return CoverScriptResponse.model_validate(ctx.output("cover_script"))
+
+def _cover_entity_ids(cs: CoverScriptResponse) -> List[str]:
+    ids = cs.seed_request_template.initial_ids
+    return [*ids.characters, *ids.locations, *ids.props]
+
+def _seed_request(ctx: PipelineContext, cover: Optional[Dict[str, Any]] = None) -> SeedFromCoverRequest:
+    cs = _cover_script_out(ctx)
+    return SeedFromCoverRequest(
+        job_id=ctx.job_id,
+        cover_gs_uri=(cover or {}).get("gs_uri"),
+        cover_image_url=(cover or {}).get("signed_url"),
+        initial_ids=InitialIds(**cs.seed_request_template.initial_ids.model_dump()),
+        hints={**cs.cover_entities.hints, **cs.seed_request_template.hints},
+        user_theme=ctx.req.theme,
+        notes=cs.cover_entities.notes,
+    )
+
+async def _stage_cover_script(ctx: PipelineContext) -> Dict[str, Any]:
+    r = ctx.req
+    cs = await generate_cover_script(CoverScriptRequest(
+        title=r.title, synopsis=r.synopsis, name=r.name, gender=r.gender,
+        page_count=r.page_count, theme=r.theme, user_answers_list=r.user_answers_list, force=r.force,
+    ))
+    return cs.model_dump()
+
+async def _stage_seed(ctx: PipelineContext) -> Dict[str, Any]:
+    resp = await asyncio.to_thread(seed_from_cover, _seed_request(ctx))
+    return {"lookbook_gcs": resp.lookbook_gcs.gs_uri if resp.lookbook_gcs else None}
+
+async def _stage_cover(ctx: PipelineContext) -> Dict[str, Any]:
+    cs = _cover_script_out(ctx)
+    req = GenerateCoverRequest(
+        job_id=ctx.job_id,
+        cover_art_description=cs.cover_art_description,
+        user_theme=ctx.req.theme,
+        title=cs.title,
+        tagline=cs.tagline,
+        image_base64=ctx.req.image_base64,
+        image_asset_id=ctx.req.image_asset_id,
+    )
+    tmp_path = os.path.join(ctx.workdir, "cover.tmp.png")
+    await asyncio.to_thread(generate_comic_cover, req=req, out_path=tmp_path, workdir=ctx.workdir)
+    cover_png = os.path.join(ctx.workdir, "cover.png")
+    os.replace(tmp_path, cover_png)
+    info = await asyncio.to_thread(upload_to_gcs, cover_png, object_name=f"jobs/{ctx.job_id}/cover.png")
+    return {"gs_uri": info["gs_uri"], "signed_url": info.get("signed_url")}
+
+async def _stage_ref_assets_cover(ctx: PipelineContext) -> Dict[str, Any]:
+    # attach the cover as each seeded entity's "cover" reference, then render portraits/etc.
+    await asyncio.to_thread(seed_from_cover, _seed_request(ctx, cover=ctx.output("cover")))
+    ids = _cover_entity_ids(_cover_script_out(ctx))
+    if ids:
+        await asyncio.to_thread(
+            generate_ref_assets,
+            GenerateRefAssetsRequest(job_id=ctx.job_id, ids=ids, user_theme=ctx.req.theme),
+        )
+    return {"ids": ids}
+
+async def _stage_full_script(ctx: PipelineContext) -> Dict[str, Any]:
+    cs, r = _cover_script_out(ctx), ctx.req
+    script = await generate_full_script(FullScriptRequest(
+        job_id=ctx.job_id, title=cs.title, tagline=cs.tagline, story_summary=cs.story_summary,
+        user_name=r.name, user_gender=r.gender or "unspecified", page_count=r.page_count,
+        user_theme=r.theme, user_answers_list=r.user_answers_list, force=r.force,
+    ))
+    return script.model_dump()
+
+async def _stage_ref_assets_delta(ctx: PipelineContext) -> Dict[str, Any]:
+    # script.json + lookbook delta are written only now, after the cover-entity
+    # assets are in, so the two lookbook writers never overlap
+    script = FullScriptPagesResponse.model_validate(ctx.output("full_script"))
+    body = await asyncio.to_thread(_persist_script, ctx.job_id, ctx.workdir, script)
+    delta = script.lookbook_delta
+    ids = [x.id for x in [*delta.characters_to_add, *delta.locations_to_add, *delta.props_to_add]]
+    if ids:
+        await asyncio.to_thread(
+            generate_ref_assets,
+            GenerateRefAssetsRequest(job_id=ctx.job_id, ids=ids, user_theme=ctx.req.theme),
+        )
+    return {"ids": ids, "script_gcs": (body.get("script_gcs") or {}).get("gs_uri")}
+
+async def _stage_comic(ctx: PipelineContext) -> Dict[str, Any]:
+    cs, r = _cover_script_out(ctx), ctx.req
+    resp = await enqueue_comic_job(ComicRequest(
+        job_id=ctx.job_id,
+        comic_title=cs.title,
+        style=r.theme,
+        script_gcs_uri=ctx.output("ref_assets_delta").get("script_gcs"),
+        image_asset_id=r.image_asset_id,
+        image_ref=r.image_base64,
+        return_pdf=r.return_pdf,
+    ))
+    return resp if isinstance(resp, dict) else {"job_id": ctx.job_id, "cancelled": True}
+
+STAGES: List[Stage] = [
+    Stage("cover_script", (), _stage_cover_script),
+    Stage("seed", ("cover_script",), _stage_seed),
+    Stage("cover", ("seed",), _stage_cover),
+    Stage("full_script", ("seed",), _stage_full_script),
+    Stage("ref_assets_cover", ("cover",), _stage_ref_assets_cover),
+    Stage("ref_assets_delta", ("full_script", "ref_assets_cover"), _stage_ref_assets_delta),
+    Stage("comic", ("ref_assets_delta",), _stage_comic),
+]
+
+# -------- state persistence --------
+
+def state_path(workdir: str) -> str:
+    return os.path.join(workdir, "pipeline", "state.json")
+
+def load_state(job_id: str, workdir: str) -> Dict[str, Any]:
+    path = state_path(workdir)
+    if not os.path.exists(path) and config.gcs_bucket:
+        try:
+            download_gcs_object_to_file(f"gs://{config.gcs_bucket}/jobs/{job_id}/pipeline/state.json", path)
+        except Exception:
+            pass
+    if not os.path.exists(path):
+        return {"job_id": job_id, "status": "queued", "stages": {s.name: {"status": "pending"} for s in STAGES}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_state(job_id: str, workdir: str, state: Dict[str, Any], *, upload: bool = True) -> None:
+    path = state_path(workdir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.part", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.part", path)
+    if upload:
+        try:
+            upload_json_to_gcs(state, object_name=f"jobs/{job_id}/pipeline/state.json", make_signed_url=False)
+        except Exception as e:
+            log.warning(f"[{job_id}] pipeline: failed to upload state: {e}")
+
+async def run_pipeline(job_id: str, workdir: str, req: PipelineRequest) -> Dict[str, Any]:
+    ctx = PipelineContext(job_id, workdir, req)
+    state = load_state(job_id, workdir)
+    return await run_dag(STAGES, ctx, state, save_state=lambda s: save_state(job_id, workdir, s))
@@ -1,10 +1,27 @@
 # app/features/story_ideas/router.py
 from fastapi import APIRouter
-from .schemas import StoryIdeasRequest, StoryIdeasResponse
-from .service import generate_story_ideas
+from fastapi.responses import StreamingResponse
+from .schemas import StoryIdeasRequest, StoryIdeasResponse, StoryIdeasBatchRequest, StoryIdeasBatchResponse
+from .service import generate_story_ideas, generate_story_ideas_batch, iter_story_ideas_batch
 
 router = APIRouter(prefix="/api/v1", tags=["story-ideas"])
 
 @router.post("/generate/story-ideas", response_model=StoryIdeasResponse)
 async def story_ideas_endpoint(req: StoryIdeasRequest):
     return await generate_story_ideas(req)
+
+@router.post("/generate/story-ideas/batch", response_model=StoryIdeasBatchResponse)
+async def story_ideas_batch_endpoint(req: StoryIdeasBatchRequest):
+    """
+    Many recipients in one call. Results come back in input order with
+    per-item errors; with stream=true each item is written as an NDJSON line
+    (carrying its `index`) as soon as it completes.
+    """
+    if not req.stream:
+        return await generate_story_ideas_batch(req.requests, req.concurrency)
+
+    async def _lines():
+        async for item in iter_story_ideas_batch(req.requests, req.concurrency):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
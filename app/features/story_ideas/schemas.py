@@ -8,6 +8,7 @@ class StoryIdeasRequest(BaseModel):
     gender: Optional[str] = None
     purpose_of_gift: Optional[str] = None
     user_answers_list: Dict[str, str] = Field(default_factory=dict, description="Comedic Q&A pairs")
+    force: bool = Field(False, description="Skip the response cache and call the model")
 
 class StoryIdea(BaseModel):
     title: str
@@ -15,3 +16,19 @@ class StoryIdea(BaseModel):
 
 class StoryIdeasResponse(BaseModel):
     ideas: List[StoryIdea]
+
+class StoryIdeasBatchRequest(BaseModel):
+    requests: List[StoryIdeasRequest] = Field(..., min_length=1, max_length=500)
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="In-flight limit for this batch (default BATCH_CONCURRENCY)")
+    stream: bool = Field(False, description="Stream NDJSON items as they complete instead of one response")
+
+class StoryIdeasBatchItem(BaseModel):
+    index: int                                   # position in the request list
+    ok: bool
+    result: Optional[StoryIdeasResponse] = None
+    error: Optional[str] = None
+
+class StoryIdeasBatchResponse(BaseModel):
+    results: List[StoryIdeasBatchItem]           # input order
+    succeeded: int
+    failed: int
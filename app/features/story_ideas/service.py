@@ -1,8 +1,15 @@
 # app/features/story_ideas/service.py
+import asyncio
 import json
+from typing import AsyncIterator, List, Optional
+from app.config import config
+from app.lib import llm_cache, usage
 from app.lib.openai_client import client
 from app.lib.json_tools import extract_json_block
-from app.features.story_ideas.schemas import StoryIdeasRequest, StoryIdeasResponse, StoryIdea
+from app.lib.scheduler import text_scheduler
+from app.features.story_ideas.schemas import (
+    StoryIdeasRequest, StoryIdeasResponse, StoryIdea, StoryIdeasBatchItem, StoryIdeasBatchResponse,
+)
 
 SYSTEM = (
     "You are a witty, concise copywriter. "
@@ -13,7 +20,11 @@ SYSTEM = (
 def _traits_from_answers(user_answers_list) -> str:
     return ", ".join(f"{q} - {a}" for q, a in user_answers_list.items()) if user_answers_list else ""
 
-async def generate_story_ideas(req: StoryIdeasRequest) -> StoryIdeasResponse:
+def _parse(raw: str) -> StoryIdeasResponse:
+    data = json.loads(extract_json_block(raw))
+    return StoryIdeasResponse(ideas=[StoryIdea(**i) for i in data[:3]])
+
+def _story_ideas_sync(req: StoryIdeasRequest) -> StoryIdeasResponse:
     gender  = req.gender or "unspecified"
     purpose = req.purpose_of_gift or "general gift"
     traits  = _traits_from_answers(req.user_answers_list)
@@ -21,15 +32,60 @@ async def generate_story_ideas(req: StoryIdeasRequest) -> StoryIdeasResponse:
     from .prompt import build_story_ideas_prompt
     prompt = build_story_ideas_prompt(name=req.name, gender=gender, theme=req.theme, purpose=purpose, traits=traits)
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        temperature=0.9,
-        messages=[
-            {"role": "system", "content": SYSTEM},
-            {"role": "user", "content": prompt},
-        ],
+    def _call() -> str:
+        with text_scheduler.slot():
+            resp = usage.tracked(
+                "chat", client.chat.completions.create,
+                tags={"stage": "story_ideas"},
+                model="gpt-4o-mini",
+                temperature=0.9,
+                messages=[
+                    {"role": "system", "content": SYSTEM},
+                    {"role": "user", "content": prompt},
+                ],
+            )
+        return (resp.choices[0].message.content or "").strip()
+
+    raw = llm_cache.cached_completion(
+        "story_ideas",
+        model="gpt-4o-mini", system=SYSTEM, prompt=prompt, temperature=0.9,
+        call=_call, force=req.force,
+        validate=_parse,
     )
-    raw = (resp.choices[0].message.content or "").strip()
-    data = json.loads(extract_json_block(raw))
-    ideas = [StoryIdea(title=i["title"], synopsis=i["synopsis"]) for i in data[:3]]
-    return StoryIdeasResponse(ideas=ideas)
+    return _parse(raw)
+
+async def generate_story_ideas(req: StoryIdeasRequest) -> StoryIdeasResponse:
+    # blocking SDK call off the event loop, on the text scheduler's own threads
+    return await text_scheduler.run(_story_ideas_sync, req)
+
+# -------- batch --------
+
+async def iter_story_ideas_batch(
+    reqs: List[StoryIdeasRequest],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[StoryIdeasBatchItem]:
+    """
+    Fan out over `reqs` with at most `concurrency` in flight for this batch
+    (the shared text scheduler still caps the whole process). Yields items in
+    completion order; a failing item carries its error instead of aborting.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency or config.batch_concurrency))
+
+    async def _one(i: int, r: StoryIdeasRequest) -> StoryIdeasBatchItem:
+        async with sem:
+            try:
+                return StoryIdeasBatchItem(index=i, ok=True, result=await generate_story_ideas(r))
+            except Exception as e:
+                return StoryIdeasBatchItem(index=i, ok=False, error=f"{type(e).__name__}: {e}")
+
+    for fut in asyncio.as_completed([_one(i, r) for i, r in enumerate(reqs)]):
+        yield await fut
+
+async def generate_story_ideas_batch(
+    reqs: List[StoryIdeasRequest],
+    concurrency: Optional[int] = None,
+) -> StoryIdeasBatchResponse:
+    items = [it async for it in iter_story_ideas_batch(reqs, concurrency)]
+    items.sort(key=lambda it: it.index)
+    ok = sum(1 for it in items if it.ok)
+    return StoryIdeasBatchResponse(results=items, succeeded=ok, failed=len(items) - ok)
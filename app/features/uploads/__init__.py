@@ -0,0 +1 @@
+# app/features/uploads/__init__.py
@@ -0,0 +1,55 @@
+# app/features/uploads/router.py
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, Request, UploadFile
+
+from app.lib.paths import ensure_job_dir, make_job_dir_with_id
+from app.lib.uploads import CHUNK_SIZE, save_upload_stream
+from app.logger import get_logger
+from .schemas import UploadedAsset, UploadKind
+
+router = APIRouter(prefix="/api/v1", tags=["uploads"])
+log = get_logger(__name__)
+
+def _resolve_job_id(job_id: Optional[str]) -> str:
+    if job_id:
+        ensure_job_dir(job_id)
+        return job_id
+    new_id, _ = make_job_dir_with_id()
+    return new_id
+
+@router.post("/assets/upload", status_code=201, response_model=UploadedAsset)
+async def upload_asset_multipart(
+    image: UploadFile = File(..., description="PNG/JPEG face or reference image"),
+    job_id: Optional[str] = Form(None),
+    kind: UploadKind = Form("face"),
+) -> UploadedAsset:
+    """
+    Multipart upload. The file part is spooled by the server and copied to
+    the job's storage in chunks; the response carries an `asset_id` that
+    cover/comic requests reference instead of inlining base64.
+    """
+    jid = _resolve_job_id(job_id)
+
+    async def _chunks():
+        while True:
+            chunk = await image.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    try:
+        info = await save_upload_stream(_chunks(), job_id=jid, kind=kind)
+    finally:
+        await image.close()
+    return UploadedAsset(**info)
+
+@router.put("/assets/upload/{job_id}", status_code=201, response_model=UploadedAsset)
+async def upload_asset_raw(job_id: str, request: Request, kind: UploadKind = "face") -> UploadedAsset:
+    """
+    Raw-body upload (Content-Type: image/png or image/jpeg). The body is
+    streamed straight to disk without buffering.
+    """
+    ensure_job_dir(job_id)
+    info = await save_upload_stream(request.stream(), job_id=job_id, kind=kind)
+    return UploadedAsset(**info)
@@ -0,0 +1,16 @@
+# app/features/uploads/schemas.py
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+UploadKind = Literal["face", "reference"]
+
+class UploadedAsset(BaseModel):
+    asset_id: str = Field(..., description="Pass as image_asset_id in cover/comic requests")
+    job_id: str
+    kind: UploadKind = "face"
+    content_type: str
+    size: int
+    sha256: str
+    gs_uri: str
+    signed_url: Optional[str] = None
+    expires_in: Optional[int] = None
@@ -0,0 +1,239 @@
+# app/lib/assets.py
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from app.config import config
+from app import logger
+from app.lib import metrics
+
+log = logger.get_logger(__name__)
+
+# Reference images (lookbook assets, covers) fetched for one run. Callers ask
+# for a ReferenceAsset / {"gs_uri", "url"} and get a local path back:
+#   - gs:// wins over https (signed URLs expire); GCS https URLs are mapped
+#     back to gs:// first, the raw URL is the last resort.
+#   - each distinct source is downloaded once per resolver, even when many
+#     threads ask at the same time (ten entities sharing a cover = one fetch).
+#   - files land in a shared cache dir keyed by source (+ GCS generation, so an
+#     overwritten portrait.png is never served stale) and are reused across runs.
+#   - downloads stream to a .part file with timeouts and retries.
+
+_CHUNK = 1 << 16
+
+
+def https_to_gs(url: str) -> Optional[str]:
+    """
+    Convert common GCS HTTPS forms to gs://bucket/key
+    Works for:
+      https://storage.googleapis.com/<bucket>/<key>[?...]
+      https://<bucket>.storage.googleapis.com/<key>[?...]
+      https://storage.cloud.google.com/<bucket>/<key>[?...]
+    """
+    try:
+        u = urlparse(url)
+        host = u.netloc.lower()
+        path = unquote(u.path)
+
+        if host in ("storage.googleapis.com", "storage.cloud.google.com"):
+            # /bucket/key...
+            parts = path.lstrip("/").split("/", 1)
+            if len(parts) == 2 and parts[0] and parts[1]:
+                return f"gs://{parts[0]}/{parts[1]}"
+
+        if host.endswith(".storage.googleapis.com"):
+            # bucket.storage.googleapis.com/key...
+            bucket = host.split(".storage.googleapis.com", 1)[0]
+            key = path.lstrip("/")
+            if bucket and key:
+                return f"gs://{bucket}/{key}"
+    except Exception:
+        pass
+    return None
+
+
+def _ext_of(source: str) -> str:
+    ext = os.path.splitext(urlparse(source).path)[1].lower()
+    return ext if ext in (".png", ".jpg", ".jpeg", ".webp") else ".png"
+
+
+def _nonempty(path: str) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+class _Permanent(Exception):
+    """Retrying won't help (4xx, missing object)."""
+
+
+class AssetResolver:
+    def __init__(
+        self,
+        cache_dir: str,
+        *,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+    ):
+        self.cache_dir = cache_dir
+        self.timeout = timeout if timeout is not None else config.asset_fetch_timeout_s
+        self.retries = max(1, retries if retries is not None else config.asset_fetch_retries)
+        self._guard = threading.Lock()
+        self._keys: Dict[str, threading.Lock] = {}
+        self._resolved: Dict[str, Optional[str]] = {}
+        self.stats = {"requests": 0, "downloads": 0, "cache_hits": 0, "shared": 0, "failures": 0}
+
+    # -------- public API --------
+
+    def resolve(self, ref: Any = None, *, gs_uri: Optional[str] = None, url: Optional[str] = None) -> Optional[str]:
+        """
+        Local path for a ReferenceAsset, a {"gs_uri", "url"} dict, a plain
+        gs:// / https:// string, or explicit keywords. None if nothing worked.
+        """
+        if isinstance(ref, str):
+            gs_uri, url = (ref, url) if ref.startswith("gs://") else (gs_uri, ref)
+        elif isinstance(ref, dict):
+            gs_uri, url = gs_uri or ref.get("gs_uri"), url or ref.get("url")
+        elif ref is not None:
+            gs_uri, url = gs_uri or getattr(ref, "gs_uri", None), url or getattr(ref, "url", None)
+
+        sources = self._sources((gs_uri or "").strip(), (url or "").strip())
+        if not sources:
+            return None
+        with self._guard:
+            self.stats["requests"] += 1
+        for source in sources:
+            path = self._resolve_one(source)
+            if path:
+                return path
+        return None
+
+    # -------- internals --------
+
+    def _sources(self, gs_uri: str, url: str) -> List[str]:
+        out: List[str] = []
+        if gs_uri.startswith("gs://"):
+            out.append(gs_uri)
+        if url.startswith("gs://"):
+            out.append(url)
+        elif url.startswith(("http://", "https://")):
+            alt = https_to_gs(url)
+            if alt:
+                out.append(alt)
+            out.append(url)
+        elif url and os.path.exists(url):
+            out.append(url)  # already local
+        return list(dict.fromkeys(out))
+
+    def _resolve_one(self, source: str) -> Optional[str]:
+        if os.path.exists(source):
+            return source
+        with self._guard:
+            if source in self._resolved:
+                self.stats["shared"] += 1
+                metrics.cache_result("ref_assets", True)
+                return self._resolved[source]
+            lock = self._keys.setdefault(source, threading.Lock())
+        with lock:
+            # another thread may have finished while we waited
+            with self._guard:
+                if source in self._resolved:
+                    self.stats["shared"] += 1
+                    metrics.cache_result("ref_assets", True)
+                    return self._resolved[source]
+            path = self._fetch(source)
+            with self._guard:
+                self._resolved[source] = path
+                if path is None:
+                    self.stats["failures"] += 1
+            return path
+
+    def _local_path(self, source: str, generation: Optional[int]) -> str:
+        key = hashlib.sha1(f"{source}#{generation or ''}".encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.cache_dir, f"{key}{_ext_of(source)}")
+
+    def _fetch(self, source: str) -> Optional[str]:
+        generation = None
+        if source.startswith("gs://"):
+            from app.lib.gcs_inventory import gcs_object_generation
+            try:
+                generation = gcs_object_generation(source)
+            except Exception as e:
+                log.warning(f"[assets] stat failed for {source}: {e}")
+                return None
+            if generation is None:
+                log.warning(f"[assets] missing object {source}")
+                return None
+
+        # without a generation (plain https) the cached copy is only trusted within this run
+        local = self._local_path(source, generation)
+        if generation is not None and _nonempty(local):
+            with self._guard:
+                self.stats["cache_hits"] += 1
+            metrics.cache_result("ref_assets", True)
+            return local
+
+        metrics.cache_result("ref_assets", False)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        part = f"{local}.{threading.get_ident()}.part"
+        delay = 0.5
+        for attempt in range(1, self.retries + 1):
+            try:
+                if source.startswith("gs://"):
+                    from app.lib.gcs_inventory import download_gcs_object_to_file
+                    download_gcs_object_to_file(source, part, generation=generation)
+                else:
+                    self._stream_http(source, part)
+                if not _nonempty(part):
+                    raise _Permanent("empty body")
+                os.replace(part, local)
+                with self._guard:
+                    self.stats["downloads"] += 1
+                return local
+            except _Permanent as e:
+                log.warning(f"[assets] {source}: {e}")
+                break
+            except Exception as e:
+                if _status(e) in (400, 401, 403, 404, 410):
+                    log.warning(f"[assets] {source}: {e}")
+                    break
+                if attempt == self.retries:
+                    log.warning(f"[assets] giving up on {source} after {attempt} attempts: {e}")
+                    break
+                metrics.RETRIES.inc(op="asset_fetch")
+                time.sleep(delay)
+                delay *= 2
+            finally:
+                if os.path.exists(part):
+                    try:
+                        os.remove(part)
+                    except OSError:
+                        pass
+        return None
+
+    def _stream_http(self, url: str, dest: str) -> None:
+        import requests
+        with requests.get(url, stream=True, timeout=(min(10.0, self.timeout), self.timeout)) as r:
+            if 400 <= r.status_code < 500:
+                raise _Permanent(f"HTTP {r.status_code}")
+            r.raise_for_status()
+            with open(dest, "wb") as f:
+                for chunk in r.iter_content(_CHUNK):
+                    f.write(chunk)
+
+
+def _status(e: Exception) -> Optional[int]:
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None)
+
+
+def run_resolver(workdir: str) -> AssetResolver:
+    """Resolver for one run over a job, sharing the job's download cache."""
+    return AssetResolver(os.path.join(workdir, "_ref_cache"))
@@ -2,41 +2,65 @@
 from __future__ import annotations
 
 import json
-from google.cloud import tasks_v2
-from google.protobuf import timestamp_pb2
 import datetime
-from google.api_core.exceptions import NotFound
-
 
 from app.config import config
+from app.lib import metrics, tracing
+
+
+def __getattr__(name):
+    # google-cloud-tasks (grpc + protobuf) loads on first use, not at boot;
+    # `cloud_tasks.tasks_v2` stays reachable for callers and tests that patch it
+    if name == "tasks_v2":
+        from google.cloud import tasks_v2
+        return tasks_v2
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def create_task(*, queue: str, url: str, payload: dict, schedule_in_seconds: int = 0):
     """
     Create an HTTP task targeting FastAPI worker endpoint.
     Assumes OIDC auth is not used; protect via network/IAP/firewall as needed.
+    The current trace context travels in the `traceparent` header and, for
+    callers that replay the payload by hand, in payload["traceparent"].
     """
-    client = tasks_v2.CloudTasksClient()
-    parent = client.queue_path(config.gcp_project, config.gcp_location, queue)
-
-    body = json.dumps(payload).encode("utf-8")
-    task = {
-        "http_request": {
-            "http_method": tasks_v2.HttpMethod.POST,
-            "url": url,
-            "headers": {"Content-Type": "application/json"},
-            "body": body,
-        },
-        "dispatch_deadline": {"seconds": 1800},
-    }
-
-    if schedule_in_seconds > 0:
-        d = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=schedule_in_seconds)
-        ts = timestamp_pb2.Timestamp()
-        ts.FromDatetime(d)
-        task["schedule_time"] = ts
-
-    return client.create_task(parent=parent, task=task)
+    from google.cloud import tasks_v2
+
+    with tracing.span("tasks.enqueue", queue=queue, url=url):
+        client = tasks_v2.CloudTasksClient()
+        parent = client.queue_path(config.gcp_project, config.gcp_location, queue)
+
+        headers = {"Content-Type": "application/json"}
+        tp = tracing.traceparent()
+        if tp:
+            headers["traceparent"] = tp
+            payload = {**payload, "traceparent": tp}
+
+        body = json.dumps(payload).encode("utf-8")
+        task = {
+            "http_request": {
+                "http_method": tasks_v2.HttpMethod.POST,
+                "url": url,
+                "headers": headers,
+                "body": body,
+            },
+            "dispatch_deadline": {"seconds": 1800},
+        }
+
+        if schedule_in_seconds > 0:
+            from google.protobuf import timestamp_pb2
+            d = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=schedule_in_seconds)
+            ts = timestamp_pb2.Timestamp()
+            ts.FromDatetime(d)
+            task["schedule_time"] = ts
+
+        try:
+            created = client.create_task(parent=parent, task=task)
+        except Exception:
+            metrics.TASKS_ENQUEUED.inc(queue=queue, ok="false")
+            raise
+        metrics.TASKS_ENQUEUED.inc(queue=queue, ok="true")
+        return created
 
 def delete_task(*, project: str, location: str, queue: str, task_name: str) -> bool:
     """
@@ -44,6 +68,9 @@ def delete_task(*, project: str, location: str, queue: str, task_name: str) -> b
       projects/<proj>/locations/<loc>/queues/<queue>/tasks/<id>
     Returns True if deleted, False if it didn't exist.
     """
+    from google.api_core.exceptions import NotFound
+    from google.cloud import tasks_v2
+
     client = tasks_v2.CloudTasksClient()
     try:
         client.delete_task(name=task_name)
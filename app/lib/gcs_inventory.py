@@ -3,18 +3,26 @@ import io
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import uuid
+from contextlib import contextmanager
 from datetime import timedelta
 from fastapi import HTTPException
-from google.cloud import storage
 from pydantic import BaseModel, Field
 from app.config import config
 from app import logger
+from app.lib import metrics, timings, tracing
 
 log = logger.get_logger(__name__)
 _DATAURL_RE = re.compile(r"^data:(image/(?:png|jpeg));base64,(.*)$", re.IGNORECASE)
 
+
+@contextmanager
+def _op(op: str, target: str) -> Iterator[Dict[str, Any]]:
+    """Trace span + storage metrics around one GCS call; set info["bytes"] inside."""
+    with tracing.span(f"gcs.{op}", object=target), metrics.storage_op(op) as info:
+        yield info
+
 class GCSInfo(BaseModel):
     bucket: str
     object: str
@@ -24,10 +32,19 @@ class GCSInfo(BaseModel):
     signed_url: Optional[str] = None
     expires_in: Optional[int] = Field(default=None, description="Seconds until expiry")
 
+def __getattr__(name):
+    # google-cloud-storage loads on first use, not at boot; `gcs_inventory.storage`
+    # stays reachable for callers and tests that patch it
+    if name == "storage":
+        from google.cloud import storage
+        return storage
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 _storage = None
 def _client():
     global _storage
     if _storage is None:
+        from google.cloud import storage
         _storage = storage.Client()
     return _storage
 
@@ -72,16 +89,19 @@ def upload_to_gcs(local_path: str, *, object_name: str | None = None, subdir: st
 
     blob = bucket.blob(object_name)
     blob.cache_control = "public, max-age=31536000"
-    blob.upload_from_filename(local_path)
-
-    signed_url = blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(seconds=config.signed_url_ttl),
-        method="GET",
-        response_disposition=f'inline; filename="{os.path.basename(local_path)}"',
-        response_type="application/octet-stream",
-        credentials=_signing_creds(),
-    )
+    with _op("upload", object_name) as info, timings.timed("upload"):
+        blob.upload_from_filename(local_path)
+        info["bytes"] = os.path.getsize(local_path)
+
+    with timings.timed("sign"):
+        signed_url = blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=config.signed_url_ttl),
+            method="GET",
+            response_disposition=f'inline; filename="{os.path.basename(local_path)}"',
+            response_type="application/octet-stream",
+            credentials=_signing_creds(),
+        )
 
     return {
         "bucket": config.gcs_bucket,
@@ -111,12 +131,15 @@ def upload_json_to_gcs(
     filename_hint: str = "request.json",
     cache_control: str = "no-cache",
     make_signed_url: bool = True,
+    if_generation_match: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Serialize `data` to JSON and upload to GCS. If `object_name` is None,
     a name will be generated under `subdir` as <uuid>/<filename_hint>.
+    `if_generation_match` makes the write conditional (0 = only if absent);
+    a lost race raises google.api_core.exceptions.PreconditionFailed.
 
-    Returns a dict with bucket/object/gs_uri and optional signed_url.
+    Returns a dict with bucket/object/gs_uri/generation and optional signed_url.
     """
     if not config.gcs_bucket:
         raise HTTPException(500, "GCS_BUCKET not configured")
@@ -134,17 +157,21 @@ def upload_json_to_gcs(
     # Serialize to bytes (utf-8)
     payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
-    blob.upload_from_file(
-        io.BytesIO(payload),
-        size=len(payload),
-        content_type="application/json",
-    )
+    with _op("upload_json", object_name) as info:
+        blob.upload_from_file(
+            io.BytesIO(payload),
+            size=len(payload),
+            content_type="application/json",
+            if_generation_match=if_generation_match,
+        )
+        info["bytes"] = len(payload)
 
     result: Dict[str, Any] = {
         "bucket": config.gcs_bucket,
         "object": object_name,
         "gs_uri": f"gs://{config.gcs_bucket}/{object_name}",
         "content_type": "application/json",
+        "generation": blob.generation,
     }
 
     if make_signed_url:
@@ -160,21 +187,84 @@ def upload_json_to_gcs(
 
     return result
 
-def download_gcs_object_to_file(gs_uri: str, dest_path: str) -> None:
+def download_gcs_object_to_file(gs_uri: str, dest_path: str, *, generation: Optional[int] = None) -> None:
     """
     Download a GCS object specified as 'gs://bucket/key' to a local file path.
-    Creates parent directories as needed.
+    Creates parent directories as needed. Pin `generation` to fetch exactly
+    the object revision that was inspected earlier.
     """
     bucket_name, object_name = _parse_gs_uri(gs_uri)
 
     client = _client()
     bucket = client.bucket(bucket_name)
-    blob = bucket.blob(object_name)
+    blob = bucket.blob(object_name, generation=generation)
 
     os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
-    blob.download_to_filename(dest_path)
+    with _op("download", gs_uri) as info:
+        blob.download_to_filename(dest_path)
+        info["bytes"] = os.path.getsize(dest_path)
+
+def copy_gcs_object(src_object: str, dst_object: str, *, make_signed_url: bool = True) -> dict:
+    """
+    Server-side copy inside the configured bucket (no download/upload), e.g. to
+    promote a versioned image to its stable name. Same shape as upload_to_gcs.
+    """
+    if not config.gcs_bucket:
+        raise HTTPException(500, "GCS_BUCKET not configured")
+    bucket = _client().bucket(config.gcs_bucket)
+    with _op("copy", dst_object):
+        blob = bucket.copy_blob(bucket.blob(src_object), bucket, dst_object)
+    result = {
+        "bucket": config.gcs_bucket,
+        "object": dst_object,
+        "gs_uri": f"gs://{config.gcs_bucket}/{dst_object}",
+        "generation": blob.generation,
+        "content_type": blob.content_type or "application/octet-stream",
+    }
+    if make_signed_url:
+        result["signed_url"] = blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=config.signed_url_ttl),
+            method="GET",
+            response_disposition=f'inline; filename="{os.path.basename(dst_object)}"',
+            response_type="application/octet-stream",
+            credentials=_signing_creds(),
+        )
+        result["expires_in"] = config.signed_url_ttl
+    return result
+
+def gcs_object_generation(gs_uri: str) -> Optional[int]:
+    """
+    Metadata-only lookup of an object's generation (changes on every overwrite).
+    Returns None if the object does not exist.
+    """
+    bucket_name, object_name = _parse_gs_uri(gs_uri)
+    with _op("stat", gs_uri):
+        blob = _client().bucket(bucket_name).get_blob(object_name)
+    return int(blob.generation) if blob is not None and blob.generation else None
+
+def upload_file_to_gcs(
+    local_path: str,
+    object_name: str,
+    *,
+    content_type: Optional[str] = None,
+    cache_control: str = "no-cache",
+) -> str:
+    """
+    Plain upload without URL signing (for internal artifacts nobody downloads
+    through a browser). Returns the gs:// URI.
+    """
+    if not config.gcs_bucket:
+        raise HTTPException(500, "GCS_BUCKET not configured")
+    blob = _client().bucket(config.gcs_bucket).blob(object_name)
+    blob.cache_control = cache_control
+    with _op("upload", object_name) as info:
+        blob.upload_from_filename(local_path, content_type=content_type)
+        info["bytes"] = os.path.getsize(local_path)
+    return f"gs://{config.gcs_bucket}/{object_name}"
 
 def _get_bucket():
+    from google.cloud import storage
     client = storage.Client()
     bucket_name = getattr(config, "gcs_bucket", None) or getattr(config, "gcs_bucket_name", None)
     if not bucket_name:
@@ -193,6 +283,7 @@ def delete_gcs_object(object_name: str) -> None:
 
 def delete_objects(object_names: List[str]) -> None:
     """Best-effort batch delete; falls back to per-object if batch not supported."""
+    from google.cloud import storage
     client = storage.Client()
     bucket = _get_bucket()
     with client.batch():
@@ -1,15 +1,22 @@
 from __future__ import annotations
 import base64
+import contextvars
+import glob
+import hashlib
+import json
+import math
 import os
 import re
 import shutil
-import uuid
-from typing import Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
 
 from fastapi import HTTPException
 from app.config import config
 from app import logger
-from app.lib.gcs_inventory import _DATAURL_RE, download_gcs_object_to_file
+from app.lib.gcs_inventory import _DATAURL_RE, download_gcs_object_to_file, gcs_object_generation
 from app.lib.openai_client import client as _client
 
 log = logger.get_logger(__name__)
@@ -29,6 +36,29 @@ def _sniff_ext_from_bytes(data: bytes) -> str:
         return ".webp"
     return ""  # unknown
 
+def _payload_key(payload: str) -> str:
+    """
+    Content address for a base64 payload. Hashes the (whitespace-stripped)
+    text so a cache hit costs no decode at all.
+    """
+    return hashlib.sha256("".join(payload.split()).encode("utf-8")).hexdigest()[:20]
+
+def _existing(path: str) -> Optional[str]:
+    return path if os.path.exists(path) and os.path.getsize(path) > 0 else None
+
+def _existing_with_any_ext(base: str) -> Optional[str]:
+    for p in sorted(glob.glob(base + ".*")):
+        if not p.endswith(".part") and _existing(p):
+            return p
+    return None
+
+def _write_atomic(path: str, data: bytes) -> str:
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
 def _is_data_url(s: str) -> bool:
     # accept any data:*;base64, not only data:image/*
     return s.startswith("data:") and ";base64," in s
@@ -60,9 +90,7 @@ def _decode_data_url_to_file(data_url: str, out_path: str) -> str:
 
     base, _ = os.path.splitext(out_path)
     out_file = base + ext
-    with open(out_file, "wb") as f:
-        f.write(data)
-    return out_file
+    return _write_atomic(out_file, data)
 
 def _looks_like_raw_base64(s: str) -> bool:
     # keep your heuristic but allow whitespace
@@ -78,15 +106,17 @@ def _decode_raw_b64_to_file(b64: str, out_path: str) -> str:
     ext = _sniff_ext_from_bytes(data) or ".png"  # default to PNG if unknown
     if not out_path.lower().endswith(ext):
         out_path = out_path + ext
-    with open(out_path, "wb") as f:
-        f.write(data)
-    return out_path
+    return _write_atomic(out_path, data)
 
 def _copy_if_exists(path_or_url: str, out_path: str) -> Optional[str]:
     if os.path.exists(path_or_url):
         _, ext = os.path.splitext(path_or_url)
         if ext and not out_path.endswith(ext):
             out_path = out_path + ext
+        src = os.stat(path_or_url)
+        if _existing(out_path) and os.path.getsize(out_path) == src.st_size \
+                and os.stat(out_path).st_mtime >= src.st_mtime:
+            return out_path
         shutil.copy2(path_or_url, out_path)
         return out_path
     return None
@@ -102,14 +132,17 @@ def resolve_or_download_cover_ref(image_ref: Optional[str], workdir: str) -> Opt
     if not image_ref:
         return None
 
-    target = os.path.join(workdir, f"cover_ref_{uuid.uuid4().hex}")
-
-    if _is_data_url(image_ref):
-        return _decode_data_url_to_file(image_ref, target)
-
-    if _looks_like_raw_base64(image_ref):
+    # content-addressed: the same payload always maps to the same local file
+    if _is_data_url(image_ref) or _looks_like_raw_base64(image_ref):
+        target = os.path.join(workdir, f"cover_ref_{_payload_key(image_ref)}")
+        hit = _existing_with_any_ext(target)
+        if hit:
+            return hit
+        if _is_data_url(image_ref):
+            return _decode_data_url_to_file(image_ref, target)
         return _decode_raw_b64_to_file(image_ref, target)
 
+    target = os.path.join(workdir, f"cover_ref_{hashlib.sha1(image_ref.encode('utf-8')).hexdigest()[:20]}")
     copied = _copy_if_exists(image_ref, target)
     if copied:
         return copied
@@ -143,16 +176,24 @@ def decode_image_b64(image_b64: str) -> tuple[bytes, str]:
 def maybe_decode_image_to_path(image_base64: str | None, workdir: str) -> str | None:
     ref_path = None
     if image_base64:
+        ref_path = os.path.join(workdir, "cover_ref.png")
+        key_path = f"{ref_path}.key"
+        key = _payload_key(image_base64)
+        # same payload as last time -> reuse without decoding again
+        if _existing(ref_path) and os.path.exists(key_path):
+            with open(key_path) as f:
+                if f.read().strip() == key:
+                    return ref_path
         try:
             data, ctype = decode_image_b64(image_base64)
         except Exception as e:
             raise HTTPException(400, f"Invalid image_base64: {e}")
         if ctype not in {"image/png", "image/jpeg"}:
             raise HTTPException(400, "image must be PNG or JPEG")
-        ref_path = os.path.join(workdir, "cover_ref.png")
         # Always normalize to PNG for downstream tools
-        with open(ref_path, "wb") as f:
-            f.write(data)
+        _write_atomic(ref_path, data)
+        with open(key_path, "w") as f:
+            f.write(key)
     return ref_path
 
 _DATA_URL_RE = re.compile(r"^data:image/[\w+.-]+;base64,(?P<b64>.+)$", re.IGNORECASE | re.DOTALL)
@@ -168,6 +209,9 @@ def resolve_cover_ref_b64_or_gcs(
     1) If `image_b64` is provided, decode (supports raw b64 or data URL) -> save -> return path.
     2) Else (or if decode fails), fetch gs://{bucket}/jobs/{job_id}/cove.png -> save -> return path.
     Returns None if neither path succeeds.
+
+    Both branches are content-addressed (payload hash / GCS generation), so
+    worker retries reuse the local copy instead of decoding or downloading again.
     """
     os.makedirs(workdir, exist_ok=True)
 
@@ -178,16 +222,16 @@ def resolve_cover_ref_b64_or_gcs(
             b64 = m.group("b64") if m else image_b64.strip()
             # Normalize whitespace and padding
             b64 = "".join(b64.split())
+            out = os.path.join(workdir, f"cover_ref_{_payload_key(b64)}.png")
+            if _existing(out):
+                return out
             missing_padding = (-len(b64)) % 4
             if missing_padding:
                 b64 += "=" * missing_padding
 
             raw = base64.b64decode(b64, validate=False)
             if raw:
-                out = os.path.join(workdir, f"cover_ref_{uuid.uuid4().hex}.png")
-                with open(out, "wb") as f:
-                    f.write(raw)
-                return out
+                return _write_atomic(out, raw)
         except Exception as e:
             log.warning("Failed to decode cover image base64; will try GCS fallback: %s", e)
 
@@ -198,13 +242,236 @@ def resolve_cover_ref_b64_or_gcs(
         return None
 
     gs_uri = f"gs://{bucket}/jobs/{job_id}/cover.png"
-    out = os.path.join(workdir, f"cover_ref_{uuid.uuid4().hex}.png")
     try:
-        download_gcs_object_to_file(gs_uri, out)
-        if os.path.exists(out) and os.path.getsize(out) > 0:
+        generation = gcs_object_generation(gs_uri)
+    except Exception as e:
+        log.warning("Could not stat %s; downloading unconditionally: %s", gs_uri, e)
+        generation = None
+    out = os.path.join(workdir, f"cover_ref_gcs_{generation}.png" if generation else "cover_ref_gcs.png")
+    if generation and _existing(out):
+        return out
+    try:
+        download_gcs_object_to_file(gs_uri, f"{out}.part", generation=generation)
+        os.replace(f"{out}.part", out)
+        if _existing(out):
             return out
         log.error("Downloaded 0 bytes from %s", gs_uri)
     except Exception as e:
         log.error("Failed to download %s: %s", gs_uri, e)
 
     return None
+
+def _rejects_n(e: Exception) -> bool:
+    """A 400 from the API about the `n` parameter itself."""
+    from openai import BadRequestError
+
+    if not isinstance(e, BadRequestError):
+        return False
+    return getattr(e, "param", None) == "n" or bool(re.search(r"['\"`]n['\"`]|\bn must\b", str(e.message or "")))
+
+def image_candidates(call: Callable[[int], Any], n: int) -> List[str]:
+    """
+    `n` base64 images from one request: `call(k)` must issue a single image
+    request with n=k and return the API response. If the model rejects n > 1
+    (or returns fewer images), the rest are topped up with concurrent n=1
+    calls, so callers always get n images or an exception. Any other failure
+    (rate limit, timeout, content policy) is raised as is: fanning it out
+    would only multiply the damage.
+    """
+    n = max(1, n)
+    out: List[str] = []
+    try:
+        out = [d.b64_json for d in call(n).data if d.b64_json][:n]
+    except Exception as e:
+        if n == 1 or not _rejects_n(e):
+            raise
+        log.info("Batched image request (n=%d) rejected, falling back to single calls: %s", n, e)
+    missing = n - len(out)
+    if missing > 0:
+        with ThreadPoolExecutor(max_workers=missing, thread_name_prefix="image-cand") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, call, 1) for _ in range(missing)]
+            out += [f.result().data[0].b64_json for f in futures]
+    return out
+
+# -------- reference contact sheets --------
+
+SHEET_COLS = 3
+SHEET_ROWS = 2
+SHEET_TILE = 512         # px, square image area per tile
+SHEET_CAPTION = 44       # px caption strip under each tile
+SHEET_LETTERS = "ABCDEFGH"
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _sheet_font():
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=SHEET_CAPTION - 16)
+    except TypeError:  # Pillow < 10.1: fixed-size bitmap font
+        return ImageFont.load_default()
+
+def _render_sheet(items: List[dict], out_path: str) -> str:
+    from PIL import Image, ImageDraw
+
+    cell_h = SHEET_TILE + SHEET_CAPTION
+    rows = min(SHEET_ROWS, -(-len(items) // SHEET_COLS))
+    sheet = Image.new("RGB", (SHEET_COLS * SHEET_TILE, rows * cell_h), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = _sheet_font()
+    for i, it in enumerate(items):
+        x, y = (i % SHEET_COLS) * SHEET_TILE, (i // SHEET_COLS) * cell_h
+        with Image.open(it["path"]) as im:
+            im = im.convert("RGB")
+            im.thumbnail((SHEET_TILE - 8, SHEET_TILE - 8))
+            sheet.paste(im, (x + (SHEET_TILE - im.width) // 2, y + (SHEET_TILE - im.height) // 2))
+        draw.rectangle([x, y, x + SHEET_TILE - 1, y + cell_h - 1], outline="black", width=2)
+        try:
+            draw.text((x + 8, y + SHEET_TILE + 8), it["caption"], fill="black", font=font)
+        except UnicodeEncodeError:  # bitmap fallback font is latin-1 only
+            caption = it["caption"].encode("latin-1", "replace").decode("latin-1")
+            draw.text((x + 8, y + SHEET_TILE + 8), caption, fill="black", font=font)
+
+    tmp = f"{out_path}.part"
+    sheet.save(tmp, format="PNG", optimize=True)
+    os.replace(tmp, out_path)
+    return out_path
+
+def sheet_label(i: int) -> str:
+    """Label of the i-th (0-based) tile across sheets: A1..A6, B1..B6."""
+    per_sheet = SHEET_COLS * SHEET_ROWS
+    return f"{SHEET_LETTERS[i // per_sheet]}{i % per_sheet + 1}"
+
+def compose_contact_sheets(items: List[dict], out_dir: str, *, max_sheets: int = 2) -> List[dict]:
+    """
+    Tile reference images into at most `max_sheets` captioned contact sheets
+    (fixed SHEET_COLS x SHEET_ROWS grid, read left-to-right, top-to-bottom).
+
+    `items`: [{"path", "caption"}, ...] in attach order; anything beyond
+    max_sheets * grid is dropped. Sheets are cached in `out_dir` by the
+    content hashes + captions, so the same page refs cost nothing next time.
+
+    Returns one entry per sheet: {"path", "letter", "tiles": [item index, ...]};
+    item i sits on the tile labelled sheet_label(i).
+    """
+    per_sheet = SHEET_COLS * SHEET_ROWS
+    items = items[: per_sheet * max_sheets]
+    sheets: List[dict] = []
+    for s in range(0, len(items), per_sheet):
+        chunk = items[s:s + per_sheet]
+        key = hashlib.sha1("|".join(
+            [f"{SHEET_COLS}x{SHEET_ROWS}@{SHEET_TILE}"] + [f"{_file_digest(it['path'])}:{it['caption']}" for it in chunk]
+        ).encode("utf-8")).hexdigest()[:20]
+        out = os.path.join(out_dir, f"sheet_{key}.png")
+        if not _existing(out):
+            os.makedirs(out_dir, exist_ok=True)
+            _render_sheet(chunk, out)
+        sheets.append({
+            "path": out,
+            "letter": SHEET_LETTERS[len(sheets)],
+            "tiles": list(range(s, s + len(chunk))),
+        })
+    return sheets
+
+# -------- perceptual signatures (near-duplicate refs) --------
+
+DHASH_NEAR = 6           # differing bits (of 64) at or below which two images count as the same picture
+_SIG_SUFFIX = ".sig.json"
+_SIG_VERSION = 1
+_SIG_MEMO_MAX = 4096     # in-memory signatures kept (least recently used dropped); the sidecars hold the rest
+_sig_memo: "OrderedDict[str, tuple]" = OrderedDict()
+_sig_lock = threading.Lock()
+
+def _compute_signature(path: str) -> dict:
+    from PIL import Image
+
+    with Image.open(path) as im:
+        gray = im.convert("L")
+    # dHash: 9x8 thumbnail, one bit per horizontal neighbour comparison (72 px,
+    # so plain Python is cheaper than importing an array library)
+    px = list(gray.resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for r in range(8):
+        row = px[r * 9:(r + 1) * 9]
+        for c in range(8):
+            bits = (bits << 1) | (row[c] > row[c + 1])
+    # information value: grey-level entropy (0..8 bits) of a small thumbnail;
+    # flat or mostly-empty images score low
+    hist = gray.resize((64, 64)).histogram()
+    total = float(sum(hist)) or 1.0
+    entropy = -sum((h / total) * math.log2(h / total) for h in hist if h)
+    return {"v": _SIG_VERSION, "dhash": f"{bits:016x}", "info": round(entropy, 4)}
+
+def image_signature(path: str) -> Optional[dict]:
+    """
+    {"dhash": int, "info": float} for an image file, computed once and cached
+    next to it in `<path>.sig.json` (and in memory), keyed by size + mtime.
+    None if the file can't be read as an image.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_size, st.st_mtime_ns)
+    with _sig_lock:
+        hit = _sig_memo.get(path)
+        if hit and hit[0] == stamp:
+            _sig_memo.move_to_end(path)
+            return hit[1]
+
+    sidecar = path + _SIG_SUFFIX
+    sig = None
+    try:
+        with open(sidecar, "r") as f:
+            cached = json.load(f)
+        if cached.get("v") == _SIG_VERSION and tuple(cached.get("stamp", ())) == stamp:
+            sig = cached
+    except (OSError, ValueError):
+        pass
+    if sig is None:
+        try:
+            sig = _compute_signature(path)
+        except Exception as e:
+            log.warning("Could not fingerprint %s: %s", path, e)
+            return None
+        sig["stamp"] = list(stamp)
+        try:
+            _write_atomic(sidecar, json.dumps(sig).encode("utf-8"))
+        except OSError:
+            pass
+
+    out = {"dhash": int(sig["dhash"], 16), "info": float(sig["info"])}
+    with _sig_lock:
+        _sig_memo[path] = (stamp, out)
+        _sig_memo.move_to_end(path)
+        while len(_sig_memo) > _SIG_MEMO_MAX:
+            _sig_memo.popitem(last=False)
+    return out
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def drop_near_duplicates(items: List[dict], *, threshold: int = DHASH_NEAR) -> List[dict]:
+    """
+    Keep the first of every group of visually identical images. `items` are
+    dicts with a "path"; each kept item gets its signature under "sig" (None
+    when unreadable; those are only deduped by path).
+    """
+    kept: List[dict] = []
+    seen_paths = set()
+    hashes: List[int] = []
+    for it in items:
+        if it["path"] in seen_paths:
+            continue
+        seen_paths.add(it["path"])
+        sig = image_signature(it["path"])
+        if sig is not None:
+            if any(hamming(sig["dhash"], h) <= threshold for h in hashes):
+                continue
+            hashes.append(sig["dhash"])
+        kept.append({**it, "sig": sig})
+    return kept
@@ -5,6 +5,8 @@ import json
 import os, glob
 from typing import Dict, Any, Iterable
 
+from app.lib import metrics, tracing
+
 
 def manifest_path(workdir: str) -> str:
     return os.path.join(workdir, "manifest.json")
@@ -18,8 +20,10 @@ def load_manifest(path: str) -> Dict[str, Any]:
 
 
 def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
-    with open(path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    with tracing.span("manifest.write"):
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+    metrics.MANIFEST_WRITES.inc()
 
 
 def seed_manifest_pending(path: str, total_pages: int) -> None:
@@ -17,3 +17,84 @@ def extract_json_block(text: str) -> str:
         return m.group(0)
     m = re.search(r"\{.*\}", s, flags=re.DOTALL)
     return m.group(0) if m else s
+
+class JsonArrayStreamParser:
+    """
+    Incremental scanner for streamed model output. Feed it text deltas and it
+    returns every complete object of the top-level array under `key`
+    (e.g. {"pages": [ {...}, {...} ]}) as soon as that object's brace closes.
+    Each delta is scanned once and only the span still open (a top-level key
+    or the current array object) is buffered, so a delta costs O(len(delta)).
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._chunks: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._last_string = None
+        self._current_key = None
+        self._array_depth = None   # depth inside the target array
+        self._span: list[str] | None = None   # pieces of the open key/object, from earlier deltas
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def _close_span(self, delta: str, start: int, end: int) -> str:
+        text = "".join(self._span or ()) + delta[start:end]
+        self._span = None
+        return text
+
+    def feed(self, delta: str) -> list:
+        out = []
+        if not delta:
+            return out
+        self._chunks.append(delta)
+        start = 0   # where the open span resumes in this delta
+        for i, ch in enumerate(delta):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._array_depth is None:
+                        self._last_string = self._close_span(delta, start, i)[1:]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._array_depth is None:
+                    self._span, start = [], i
+            elif ch == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif ch == "," and self._depth == 1:
+                self._current_key = None
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._array_depth is None \
+                        and not self.done and self._current_key == self.key:
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._span, start = [], i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if ch == "}" and self._array_depth is not None and self._depth == self._array_depth \
+                        and self._span is not None:
+                    try:
+                        out.append(json.loads(self._close_span(delta, start, i + 1)))
+                    except json.JSONDecodeError:
+                        pass
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._array_depth = None
+                    self.done = True
+        if self._span is not None:
+            self._span.append(delta[start:])
+        return out
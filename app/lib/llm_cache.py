@@ -0,0 +1,202 @@
+# app/lib/llm_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config import config
+from app import logger
+from app.lib import metrics
+
+log = logger.get_logger(__name__)
+
+# Two tiers: a per-process LRU in front of JSON files under
+# <base_output_dir>/cache/llm/<namespace>/. Entries expire per namespace TTL.
+
+_lock = threading.Lock()
+_memory: "OrderedDict[Tuple[str, str], Tuple[float, str, float]]" = OrderedDict()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def cache_key(
+    *,
+    model: str,
+    system: str,
+    prompt: str,
+    temperature: float,
+    schema: Optional[dict] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Normalized hash of everything that determines the completion.
+    Whitespace runs in the prompts are collapsed so cosmetic template
+    changes (indentation, trailing newlines) don't bust the cache.
+    """
+    payload = {
+        "model": model,
+        "system": " ".join((system or "").split()),
+        "prompt": " ".join((prompt or "").split()),
+        "temperature": round(float(temperature), 3),
+        "schema": schema,
+    }
+    if max_tokens is not None:
+        # a bigger budget can finish what a smaller one truncated
+        payload["max_tokens"] = int(max_tokens)
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _ttl(namespace: str) -> int:
+    return int(config.llm_cache_ttls.get(namespace, config.llm_cache_ttls.get("default", 3600)))
+
+
+def _disk_path(namespace: str, key: str) -> str:
+    return os.path.join(config.base_output_dir, "cache", "llm", namespace, key[:2], f"{key}.json")
+
+
+_HIT_FIELDS = {"memory_hits": True, "disk_hits": True, "misses": False}
+
+
+def _bump(namespace: str, field: str, amount: float = 1) -> None:
+    s = _stats.setdefault(namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "saved_ms": 0.0})
+    s[field] += amount
+    if field in _HIT_FIELDS:
+        metrics.cache_result(f"llm:{namespace}", _HIT_FIELDS[field])
+
+
+def _remember(namespace: str, key: str, expires_at: float, content: str, latency_ms: float) -> None:
+    _memory[(namespace, key)] = (expires_at, content, latency_ms)
+    _memory.move_to_end((namespace, key))
+    while len(_memory) > config.llm_cache_memory_items:
+        _memory.popitem(last=False)
+
+
+def lookup(namespace: str, key: str) -> Optional[str]:
+    """Return the live cached content for `key`, or None (counted as a miss)."""
+    if not config.llm_cache_enabled:
+        return None
+    now = time.time()
+    with _lock:
+        hit = _memory.get((namespace, key))
+        if hit and hit[0] > now:
+            _memory.move_to_end((namespace, key))
+            _bump(namespace, "memory_hits")
+            _bump(namespace, "saved_ms", hit[2])
+            return hit[1]
+        if hit:
+            del _memory[(namespace, key)]
+
+    path = _disk_path(namespace, key)
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+    expires_at = float((entry or {}).get("created", 0)) + _ttl(namespace)
+    if entry is None or expires_at <= now:
+        if entry is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with _lock:
+            _bump(namespace, "misses")
+        return None
+
+    content = entry.get("content") or ""
+    latency_ms = float(entry.get("latency_ms", 0.0))
+    with _lock:
+        _remember(namespace, key, expires_at, content, latency_ms)
+        _bump(namespace, "disk_hits")
+        _bump(namespace, "saved_ms", latency_ms)
+    return content
+
+
+def store(namespace: str, key: str, content: str, *, latency_ms: float = 0.0) -> None:
+    if not config.llm_cache_enabled or not content:
+        return
+    created = time.time()
+    with _lock:
+        _remember(namespace, key, created + _ttl(namespace), content, latency_ms)
+
+    path = _disk_path(namespace, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.part"
+        with open(tmp, "w") as f:
+            json.dump({"created": created, "latency_ms": latency_ms, "content": content}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning(f"[llm-cache] failed to persist {namespace}/{key[:12]}: {e}")
+
+
+def cached_completion(
+    namespace: str,
+    *,
+    model: str,
+    system: str,
+    prompt: str,
+    temperature: float,
+    call: Callable[[], str],
+    schema: Optional[dict] = None,
+    max_tokens: Optional[int] = None,
+    force: bool = False,
+    validate: Optional[Callable[[str], Any]] = None,
+) -> str:
+    """
+    Return the cached completion for this exact request, or run `call()`
+    and cache its text. `force=True` skips the lookup but still refreshes
+    the entry. With `validate`, output that raises is returned but not cached,
+    so a bad completion is never replayed.
+    """
+    key = cache_key(
+        model=model, system=system, prompt=prompt, temperature=temperature, schema=schema, max_tokens=max_tokens,
+    )
+    if force:
+        with _lock:
+            _bump(namespace, "bypassed")
+    else:
+        hit = lookup(namespace, key)
+        if hit is not None:
+            log.debug(f"[llm-cache] hit {namespace}/{key[:12]}")
+            return hit
+
+    t0 = time.perf_counter()
+    content = call()
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+
+    if validate is not None:
+        try:
+            validate(content)
+        except Exception:
+            return content
+    store(namespace, key, content, latency_ms=latency_ms)
+    return content
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = {"enabled": config.llm_cache_enabled, "memory_items": len(_memory), "namespaces": {}}
+        for ns, s in _stats.items():
+            hits = s["memory_hits"] + s["disk_hits"]
+            lookups = hits + s["misses"]
+            out["namespaces"][ns] = {
+                **s,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "ttl_seconds": _ttl(ns),
+            }
+    return out
+
+
+def clear(*, disk: bool = False) -> None:
+    with _lock:
+        _memory.clear()
+        _stats.clear()
+    if disk:
+        import shutil
+        shutil.rmtree(os.path.join(config.base_output_dir, "cache", "llm"), ignore_errors=True)
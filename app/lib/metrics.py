@@ -0,0 +1,454 @@
+# app/lib/metrics.py
+from __future__ import annotations
+
+import asyncio
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev boxes
+    fcntl = None
+
+from app.config import config
+from app import logger
+
+log = logger.get_logger(__name__)
+
+# Prometheus-style metrics without the client library.
+#
+# Each process keeps its counters / gauges / histograms in memory. A daemon
+# thread writes a snapshot to <metrics_dir>/live_<pid>.json every
+# METRICS_FLUSH_SECONDS (and at exit). GET /metrics merges every snapshot and
+# renders the text exposition format, so any gunicorn worker can answer for
+# all of them:
+#   - counters and histograms are summed across processes
+#   - gauges are summed over live processes only
+# When a worker exits (gunicorn child_exit hook, or found dead at scrape
+# time), its counters/histograms are folded into dead.json so totals survive
+# max_requests restarts. on_starting() wipes the directory.
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+_dirty = False
+_flusher: Optional[threading.Thread] = None
+
+
+def _metrics_dir() -> str:
+    return config.metrics_dir
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> LabelKey:
+    return tuple((k, "" if labels.get(k) is None else str(labels.get(k))) for k in labelnames)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, Any] = {}
+        with _lock:
+            _registry[name] = self
+
+    def _touch(self) -> None:
+        global _dirty
+        _dirty = True
+        if _flusher is None:
+            _start_flusher()
+
+    def samples(self) -> List[List[Any]]:
+        with _lock:
+            return [[list(map(list, k)), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+
+    def meta(self) -> Dict[str, Any]:
+        return {"type": self.type, "help": self.help}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not config.metrics_enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._touch()
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not config.metrics_enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._touch()
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        if not config.metrics_enabled:
+            return
+        with _lock:
+            self._values[_label_key(self.labelnames, labels)] = float(value)
+        self._touch()
+
+    @contextmanager
+    def track_inprogress(self, **labels: Any) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not config.metrics_enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            # [count per bucket (non-cumulative)..., +Inf count, sum]
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+                    break
+            else:
+                v[len(self.buckets)] += 1
+            v[-1] += value
+        self._touch()
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Observe the block's duration; labels may be amended through the yielded dict."""
+        t0 = time.perf_counter()
+        labels = dict(labels)
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def meta(self) -> Dict[str, Any]:
+        return {"type": self.type, "help": self.help, "buckets": list(self.buckets)}
+
+
+# -------- the metrics this service exports --------
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+MODEL_LATENCY = Histogram("model_call_duration_seconds", "Model API call latency", ("kind", "model", "stage"))
+MODEL_CALLS = Counter("model_calls_total", "Model API calls", ("kind", "stage", "ok"))
+MODEL_TOKENS = Counter("model_tokens_total", "Model tokens by direction", ("kind", "stage", "direction"))
+
+STORAGE_LATENCY = Histogram(
+    "storage_operation_duration_seconds", "GCS operation latency", ("op",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+STORAGE_BYTES = Counter("storage_bytes_total", "Bytes moved to/from GCS", ("op",))
+STORAGE_ERRORS = Counter("storage_errors_total", "Failed GCS operations", ("op",))
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result (hit rate = hit / all)", ("cache", "result"))
+MANIFEST_WRITES = Counter("manifest_writes_total", "Job manifest.json writes")
+PAGE_RENDER = Histogram(
+    "page_render_duration_seconds", "Wall time per comic page (all attempts)", ("status",),
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600),
+)
+RETRIES = Counter("retries_total", "Retried operations", ("op",))
+TASKS_ENQUEUED = Counter("tasks_enqueued_total", "Cloud Tasks created", ("queue", "ok"))
+SCHEDULER_IN_FLIGHT = Gauge("scheduler_in_flight", "Calls holding a rate-scheduler slot", ("scheduler",))
+SCHEDULER_WAIT = Histogram(
+    "scheduler_wait_seconds", "Time spent queued for a rate-scheduler slot", ("scheduler",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay before the event loop ran a probe callback (time it was blocked)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+@contextmanager
+def storage_op(op: str) -> Iterator[Dict[str, Any]]:
+    """
+    Time a GCS call. Set info["bytes"] inside the block to count payload size.
+        with metrics.storage_op("upload") as info:
+            ...; info["bytes"] = os.path.getsize(path)
+    """
+    info: Dict[str, Any] = {"bytes": 0}
+    t0 = time.perf_counter()
+    try:
+        yield info
+    except Exception:
+        STORAGE_ERRORS.inc(op=op)
+        raise
+    finally:
+        STORAGE_LATENCY.observe(time.perf_counter() - t0, op=op)
+        if info["bytes"]:
+            STORAGE_BYTES.inc(info["bytes"], op=op)
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def observe_model_call(rec: Dict[str, Any]) -> None:
+    """Fold one usage record (see app.lib.usage) into the model metrics."""
+    kind, stage = rec.get("kind") or "-", rec.get("stage") or "-"
+    MODEL_LATENCY.observe((rec.get("latency_ms") or 0.0) / 1000.0, kind=kind, model=rec.get("model") or "-", stage=stage)
+    MODEL_CALLS.inc(kind=kind, stage=stage, ok="true" if rec.get("ok") else "false")
+    if rec.get("prompt_tokens"):
+        MODEL_TOKENS.inc(rec["prompt_tokens"], kind=kind, stage=stage, direction="prompt")
+    if rec.get("completion_tokens"):
+        MODEL_TOKENS.inc(rec["completion_tokens"], kind=kind, stage=stage, direction="completion")
+    if (rec.get("attempt") or 1) > 1:
+        RETRIES.inc(op=f"model:{stage}")
+
+
+# -------- event-loop lag --------
+
+_probed_loop = None
+
+
+def _probe_loop_lag(loop, interval: float) -> None:
+    """
+    Thread body: every `interval` schedule a callback on `loop` and record how
+    long it waited to run. A handler doing blocking work on the loop shows up
+    here as seconds of lag. Ends when the loop closes.
+    """
+    while not loop.is_closed():
+        t0 = time.perf_counter()
+        try:
+            loop.call_soon_threadsafe(lambda t0=t0: EVENT_LOOP_LAG.observe(time.perf_counter() - t0))
+        except RuntimeError:  # closed in between
+            return
+        time.sleep(interval)
+
+
+def watch_event_loop(loop) -> None:
+    """Start lag probing for `loop` (once per loop; no-op when disabled)."""
+    global _probed_loop
+    if config.metrics_loop_lag_interval <= 0 or _probed_loop is loop:
+        return
+    _probed_loop = loop
+    threading.Thread(
+        target=_probe_loop_lag, args=(loop, config.metrics_loop_lag_interval), name="loop-lag", daemon=True,
+    ).start()
+
+
+async def http_middleware(request, call_next):
+    """Per-route latency + in-flight gauge; routes are labelled by template, not raw path."""
+    watch_event_loop(asyncio.get_running_loop())
+    status = 500
+    t0 = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(
+            time.perf_counter() - t0,
+            method=request.method,
+            route=getattr(route, "path", None) or "unmatched",
+            status=str(status),
+        )
+
+
+# -------- snapshots (one file per process) --------
+
+def _snapshot() -> Dict[str, Any]:
+    with _lock:
+        metrics = list(_registry.values())
+    return {"pid": os.getpid(), "ts": time.time(), "metrics": {m.name: {**m.meta(), "samples": m.samples()} for m in metrics}}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = f"{path}.{os.getpid()}.part"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def flush() -> None:
+    global _dirty
+    if not config.metrics_enabled:
+        return
+    try:
+        os.makedirs(_metrics_dir(), exist_ok=True)
+        _dirty = False
+        _write_json(os.path.join(_metrics_dir(), f"live_{os.getpid()}.json"), _snapshot())
+    except OSError as e:
+        log.warning(f"[metrics] flush failed: {e}")
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(max(0.5, config.metrics_flush_seconds))
+        if _dirty:
+            flush()
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_into(acc: Dict[str, Any], snap: Dict[str, Any], *, include_gauges: bool = True) -> None:
+    for name, m in (snap.get("metrics") or {}).items():
+        if m["type"] == "gauge" and not include_gauges:
+            continue
+        dst = acc.setdefault(name, {k: v for k, v in m.items() if k != "samples"} | {"samples": {}})
+        for labels, value in m["samples"]:
+            key = tuple(tuple(p) for p in labels)
+            cur = dst["samples"].get(key)
+            if isinstance(value, list):
+                dst["samples"][key] = value[:] if cur is None else [a + b for a, b in zip(cur, value)]
+            else:
+                dst["samples"][key] = value if cur is None else cur + value
+
+
+@contextmanager
+def _dir_lock() -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(_metrics_dir(), exist_ok=True)
+    with open(os.path.join(_metrics_dir(), ".lock"), "a") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Fold a finished worker's counters/histograms into dead.json (gunicorn child_exit)."""
+    live = os.path.join(_metrics_dir(), f"live_{pid}.json")
+    with _dir_lock():
+        snap = _read(live)
+        if snap is None:
+            return
+        dead_path = os.path.join(_metrics_dir(), "dead.json")
+        acc: Dict[str, Any] = {}
+        _merge_into(acc, _read(dead_path) or {}, include_gauges=False)
+        _merge_into(acc, snap, include_gauges=False)
+        _write_json(dead_path, {"metrics": {
+            name: {**{k: v for k, v in m.items() if k != "samples"},
+                   "samples": [[list(map(list, k)), v] for k, v in m["samples"].items()]}
+            for name, m in acc.items()
+        }})
+        os.remove(live)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def reset_dir() -> None:
+    """Drop snapshots from a previous server run (gunicorn on_starting)."""
+    for p in glob.glob(os.path.join(_metrics_dir(), "*.json")):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def collect() -> Dict[str, Any]:
+    """Merged view over every process (this one flushed first)."""
+    flush()
+    for path in glob.glob(os.path.join(_metrics_dir(), "live_*.json")):
+        pid = int(os.path.basename(path)[5:-5])
+        if pid != os.getpid() and not _alive(pid):
+            mark_process_dead(pid)  # crashed without child_exit
+
+    acc: Dict[str, Any] = {}
+    _merge_into(acc, _read(os.path.join(_metrics_dir(), "dead.json")) or {}, include_gauges=False)
+    for path in glob.glob(os.path.join(_metrics_dir(), "live_*.json")):
+        snap = _read(path)
+        if snap:
+            _merge_into(acc, snap)
+    return acc
+
+
+# -------- exposition --------
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render() -> str:
+    """Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for name, m in sorted(collect().items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        for labels, value in sorted(m["samples"].items()):
+            if m["type"] != "histogram":
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_num(value)}")
+                continue
+            cumulative = 0.0
+            for bound, count in zip(m["buckets"], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', _fmt_num(bound)),))} {_fmt_num(cumulative)}")
+            cumulative += value[len(m["buckets"])]
+            lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {_fmt_num(cumulative)}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_num(value[-1])}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {_fmt_num(cumulative)}")
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,39 @@
 # app/lib/openai_client.py
-from openai import OpenAI
+"""
+Shared OpenAI client, built on first use.
+
+Importing the openai SDK costs ~0.6 s, which every cold start used to pay
+before it could answer anything. `client` is a stand-in that imports the SDK
+and constructs the real client the first time an attribute is read; after
+that it only forwards. Resources come from the real client (`client.images`
+is its cached resource), so `monkeypatch.setattr(client.images, ...)` still
+patches what the services call.
+"""
+import threading
+
 from app.config import config
 
-client = OpenAI(api_key=config.openai_api_key)
+_lock = threading.Lock()
+_real = None
+
+
+def get_client():
+    """The real OpenAI client (imports the SDK on first call)."""
+    global _real
+    if _real is None:
+        with _lock:
+            if _real is None:
+                from openai import OpenAI
+                _real = OpenAI(api_key=config.openai_api_key)
+    return _real
+
+
+class _LazyClient:
+    def __getattr__(self, name):
+        return getattr(get_client(), name)
+
+    def __repr__(self) -> str:
+        return f"<lazy OpenAI client, {'built' if _real is not None else 'not built'}>"
+
+
+client = _LazyClient()
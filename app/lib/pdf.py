@@ -1,13 +1,14 @@
 # app/lib/pdf.py
 from typing import List
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from app import logger
 
 log = logger.get_logger(__name__)
 
 def make_pdf(files: List[str], pdf_name: str = "comic.pdf") -> str:
+    from PIL import Image
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     log.info(f"Combining {len(files)} pages into PDF: {pdf_name}")
     c = canvas.Canvas(pdf_name, pagesize=A4)
     w, h = A4
@@ -0,0 +1,255 @@
+# app/lib/raw_archive.py
+from __future__ import annotations
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import config
+from app import logger
+
+log = logger.get_logger(__name__)
+
+# Raw model outputs, kept for debugging only. Callers enqueue and return;
+# a daemon thread appends batches to rotating gzip JSONL segments
+# (<base_output_dir>/raw_archive/seg-*.jsonl.gz) and enforces the size/age
+# budget. When the queue is full, records are dropped rather than blocking.
+
+_BATCH = 200
+_FLUSH_TIMEOUT = 10.0
+
+
+def _owner_pid(path: str) -> Optional[int]:
+    # seg-<YYYYmmdd>-<HHMMSS>-<pid>-<seq>.jsonl.gz
+    parts = os.path.basename(path).split("-")
+    try:
+        return int(parts[3])
+    except (IndexError, ValueError):
+        return None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class RawArchive:
+    def __init__(
+        self,
+        root: str,
+        *,
+        segment_bytes: int,
+        segment_seconds: int,
+        max_bytes: int,
+        max_age_seconds: int,
+        offload: bool = False,
+        queue_size: int = 1000,
+    ):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.offload = offload
+        self.dropped = 0
+        self._q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self._current: Optional[str] = None
+        self._opened_at = 0.0
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # -------- producer side (hot path) --------
+
+    def record(self, kind: str, job_id: Optional[str], payload: str, **meta: Any) -> bool:
+        self._ensure_thread()
+        rec = {"ts": time.time(), "kind": kind, "job_id": job_id or "", "payload": payload, **meta}
+        try:
+            self._q.put_nowait(rec)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = _FLUSH_TIMEOUT) -> bool:
+        """
+        Wait until every queued record is on disk. Returns False if the writer
+        is gone or didn't catch up within `timeout` seconds, instead of hanging.
+        """
+        t = self._thread
+        if t is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._q.all_tasks_done:
+            while self._q.unfinished_tasks:
+                left = deadline - time.monotonic()
+                if left <= 0 or not t.is_alive():
+                    return False
+                self._q.all_tasks_done.wait(min(left, 0.5))
+        return True
+
+    def find(self, job_id: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.flush()
+        out: List[Dict[str, Any]] = []
+        for path in self._segments():
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        if rec.get("job_id") == job_id and (kind is None or rec.get("kind") == kind):
+                            out.append(rec)
+            except (OSError, EOFError) as e:
+                # a segment pruned mid-scan, or a truncated tail after a crash
+                log.debug(f"[raw-archive] skipping {os.path.basename(path)}: {e}")
+        return out
+
+    # -------- writer thread --------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="raw-archive", daemon=True)
+                t.start()
+                self._thread = t
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=1.0)
+            except queue.Empty:
+                try:
+                    self._maybe_rotate()
+                except Exception as e:
+                    log.warning(f"[raw-archive] rotate failed: {e}")
+                continue
+            batch = [first]
+            while len(batch) < _BATCH:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                log.warning(f"[raw-archive] dropped {len(batch)} records: {e}")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    def _segments(self) -> List[str]:
+        stamped = []
+        for path in glob.glob(os.path.join(self.root, "seg-*.jsonl.gz")):
+            try:
+                stamped.append((os.path.getmtime(path), path))
+            except FileNotFoundError:  # pruned by another worker meanwhile
+                continue
+        return [path for _, path in sorted(stamped)]
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        self._maybe_rotate()
+        if self._current is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._seq += 1
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            self._current = os.path.join(self.root, f"seg-{stamp}-{os.getpid()}-{self._seq}.jsonl.gz")
+            self._opened_at = time.time()
+        # each batch is its own gzip member; readers see one continuous stream
+        with gzip.open(self._current, "at", encoding="utf-8") as f:
+            for rec in batch:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._maybe_rotate()
+
+    def _maybe_rotate(self) -> None:
+        cur = self._current
+        if cur is None:
+            return
+        too_big = os.path.exists(cur) and os.path.getsize(cur) >= self.segment_bytes
+        too_old = time.time() - self._opened_at >= self.segment_seconds
+        if not (too_big or too_old):
+            return
+        self._current = None
+        if self.offload and os.path.exists(cur):
+            try:
+                from app.lib.gcs_inventory import upload_file_to_gcs
+                upload_file_to_gcs(cur, f"raw_archive/{os.path.basename(cur)}", content_type="application/gzip")
+            except Exception as e:
+                log.warning(f"[raw-archive] offload failed for {os.path.basename(cur)}: {e}")
+        self._prune()
+
+    def _prunable(self, path: str) -> bool:
+        # other live workers may still be appending to theirs; they prune their own
+        if path == self._current:
+            return False
+        pid = _owner_pid(path)
+        return pid is None or pid == os.getpid() or not _alive(pid)
+
+    def _prune(self) -> None:
+        now = time.time()
+        sized = []
+        for path in filter(self._prunable, self._segments()):
+            try:
+                if now - os.path.getmtime(path) > self.max_age_seconds:
+                    os.remove(path)
+                else:
+                    sized.append((path, os.path.getsize(path)))
+            except FileNotFoundError:  # another worker got there first
+                continue
+        total = sum(size for _, size in sized)
+        if self._current and os.path.exists(self._current):
+            total += os.path.getsize(self._current)
+        while sized and total > self.max_bytes:
+            oldest, size = sized.pop(0)
+            total -= size
+            try:
+                os.remove(oldest)
+            except FileNotFoundError:
+                pass
+
+
+_archive: Optional[RawArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> RawArchive:
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = RawArchive(
+                    os.path.join(str(config.base_output_dir), "raw_archive"),
+                    segment_bytes=config.raw_archive_segment_bytes,
+                    segment_seconds=config.raw_archive_segment_seconds,
+                    max_bytes=config.raw_archive_max_bytes,
+                    max_age_seconds=config.raw_archive_max_age_hours * 3600,
+                    offload=config.raw_archive_offload,
+                )
+                atexit.register(_archive.flush)
+    return _archive
+
+
+def archive(kind: str, job_id: Optional[str], payload: str, **meta: Any) -> None:
+    """Queue a raw completion for the archive. Never blocks, never raises."""
+    if not config.raw_archive_enabled:
+        return
+    get_archive().record(kind, job_id, payload, **meta)
+
+
+def find_records(job_id: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All archived records for a job still held locally, oldest first."""
+    return get_archive().find(job_id, kind)
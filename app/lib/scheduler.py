@@ -0,0 +1,201 @@
+# app/lib/scheduler.py
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from app.config import config
+from app import logger
+from app.lib import metrics
+
+log = logger.get_logger(__name__)
+
+# Process-wide gate for model calls: a concurrency cap plus request pacing
+# (evenly spaced starts at `per_minute`). slot() is thread-based because the
+# SDK calls block. Async callers go through run()/iterate(), which queue as
+# coroutines on an admission gate of the same size first, and only then take
+# a thread from the scheduler's own pool. So:
+#   - waiting callers hold no thread, neither here nor in the loop's default
+#     executor (uploads, /metrics, the pipeline);
+#   - at most max_concurrency calls are ever in the pool, so an open stream
+#     always finds a thread for its next hop and slot() never blocks for long.
+
+T = TypeVar("T")
+
+_POOL_HEADROOM = 4   # threads beyond max_concurrency, for cache hits and pacing sleeps
+_DONE = object()
+
+
+class _Gate:
+    """
+    Counting semaphore for coroutines on any event loop. asyncio.Semaphore
+    binds to one loop, but the scheduler outlives loops (tests, anyio portals)
+    and is released from pool threads.
+    """
+
+    def __init__(self, permits: int):
+        self._free = permits
+        self._lock = threading.Lock()
+        self._waiters: "deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]]" = deque()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            fut = loop.create_future()
+            self._waiters.append((loop, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, fut))
+                except ValueError:
+                    pass   # already handed a permit; _grant or we pass it on
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, fut: asyncio.Future) -> None:
+        if fut.done():   # cancelled while the permit was on its way
+            self.release()
+        else:
+            fut.set_result(None)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, fut = self._waiters.popleft()
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._grant, fut)
+                return
+            self._free += 1
+
+
+class RateScheduler:
+    def __init__(self, name: str, *, max_concurrency: int, per_minute: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self.in_flight = 0
+        self.started = 0
+        self.waited_s = 0.0
+        self._gate = _Gate(self.max_concurrency)
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _reserve(self) -> float:
+        """Claim the next start slot; returns seconds to sleep until it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+            return start - now
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        t0 = time.monotonic()
+        self._sem.acquire()
+        try:
+            delay = self._reserve()
+            if delay > 0:
+                time.sleep(delay)
+            waited = time.monotonic() - t0
+            with self._lock:
+                self.in_flight += 1
+                self.started += 1
+                self.waited_s += waited
+            metrics.SCHEDULER_WAIT.observe(waited, scheduler=self.name)
+            metrics.SCHEDULER_IN_FLIGHT.inc(scheduler=self.name)
+            try:
+                yield
+            finally:
+                metrics.SCHEDULER_IN_FLIGHT.dec(scheduler=self.name)
+        finally:
+            with self._lock:
+                self.in_flight = max(0, self.in_flight - 1)
+            self._sem.release()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency + _POOL_HEADROOM, thread_name_prefix=f"sched-{self.name}",
+                )
+            return self._pool
+
+    def _submit(self, fn: Callable[[], T], *, release: bool = False) -> "Future[T]":
+        cf = self._executor().submit(fn)
+        if release:
+            # the permit goes back when the thread is done, even if the awaiter was cancelled
+            cf.add_done_callback(lambda _: self._gate.release())
+        return cf
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """asyncio.to_thread for a blocking call that takes slot() itself, on this scheduler's pool."""
+        ctx = contextvars.copy_context()
+        await self._gate.acquire()
+        return await asyncio.wrap_future(self._submit(functools.partial(ctx.run, fn, *args, **kwargs), release=True))
+
+    async def iterate(self, it: Iterator[T]) -> AsyncIterator[T]:
+        """
+        Drive a blocking iterator (a streamed model call) from this pool, one
+        item per hop, so no thread is held between deltas.
+        """
+        ctx = contextvars.copy_context()
+        hop = threading.Lock()   # a hop may still be running when the consumer goes away
+
+        def _next() -> Any:
+            with hop:
+                return ctx.run(next, it, _DONE)
+
+        def _close() -> None:
+            with hop:
+                close = getattr(it, "close", None)
+                if close is not None:
+                    ctx.run(close)   # releases the slot a streamed call holds
+
+        await self._gate.acquire()   # held for the stream's lifetime, like its slot
+        finished = False
+        try:
+            while True:
+                item = await asyncio.wrap_future(self._submit(_next))
+                if item is _DONE:
+                    finished = True
+                    return
+                yield item
+        finally:
+            if finished:
+                self._gate.release()
+            else:
+                self._submit(_close, release=True)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "per_minute": round(60.0 / self.interval) if self.interval else 0,
+                "in_flight": self.in_flight,
+                "started": self.started,
+                "avg_wait_ms": round(1000.0 * self.waited_s / self.started, 1) if self.started else 0.0,
+            }
+
+
+# shared by every text-model call site
+text_scheduler = RateScheduler(
+    "text",
+    max_concurrency=config.text_max_concurrency,
+    per_minute=config.text_requests_per_minute,
+)
@@ -0,0 +1,77 @@
+# app/lib/startup.py
+"""
+Cold-start bookkeeping.
+
+app/main.py imports this module first, so its clock starts with the app's own
+imports; main.py wraps the expensive parts in `phase(...)` and the lifespan
+logs `profile()` once the app is ready to serve. For a per-module breakdown
+run the server under `python -X importtime`.
+
+The heavy SDKs (openai, google-cloud-storage/-tasks, reportlab, PIL) are
+imported where they're used rather than at boot. PRELOAD_SDKS=1 brings the
+old behaviour back in a controlled place: `preload()` imports them and builds
+the OpenAI client during startup, before the first request is accepted.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+_T0 = time.perf_counter()  # before app.config/logger, so they count too
+
+from app import logger  # noqa: E402
+
+log = logger.get_logger(__name__)
+
+_phases: Dict[str, float] = {}
+
+# kept off the boot path; profile() reports any that got imported anyway
+HEAVY_MODULES = ("openai", "google.cloud.storage", "google.cloud.tasks_v2", "reportlab", "PIL")
+
+
+def _ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000.0, 1)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time one boot step into the profile."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = _ms(t)
+
+
+def preload() -> Dict[str, float]:
+    """Import the heavy SDKs and build the OpenAI client now; returns ms per SDK."""
+    from app.lib import openai_client
+
+    steps = {
+        "openai": openai_client.get_client,
+        "google.cloud.storage": lambda: __import__("google.cloud.storage"),
+        "google.cloud.tasks_v2": lambda: __import__("google.cloud.tasks_v2"),
+        "reportlab": lambda: __import__("reportlab.pdfgen.canvas"),
+    }
+    took: Dict[str, float] = {}
+    for name, load in steps.items():
+        t = time.perf_counter()
+        try:
+            load()
+        except Exception as e:  # a missing optional SDK shouldn't stop the app from serving
+            log.warning(f"preload {name} failed: {e}")
+            continue
+        took[name] = _ms(t)
+    return took
+
+
+def profile() -> Dict[str, Any]:
+    """Milliseconds since app import started, per-phase timings and what's loaded."""
+    return {
+        "since_import_ms": _ms(_T0),
+        "phases_ms": dict(_phases),
+        "modules": len(sys.modules),
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
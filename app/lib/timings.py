@@ -0,0 +1,98 @@
+# app/lib/timings.py
+from __future__ import annotations
+
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Wall-clock breakdowns stored in the job manifest (pages.<n>.timings and the
+# job-level "timings"), summarised by GET /api/v1/generate/comic/profile/{job_id}.
+# The renderer opens a collector per page; code underneath just marks stages,
+# which is a no-op when nobody is collecting:
+#     with timings.collect() as t:
+#         with timings.timed("refs"):
+#             ...
+#     mark_page_status(..., {"timings": timings.rounded(t)})
+# Keys end in _ms. Repeated stages add up; timed(..., each=True) keeps one entry
+# per occurrence instead (model latency per attempt). Callers that own the dict
+# (the worker's job-level times) pass into= instead of opening a collector.
+
+_current: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("timings", default=None)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, Any]]:
+    t: Dict[str, Any] = {}
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+
+
+def add(stage: str, ms: float, *, each: bool = False, into: Optional[Dict[str, Any]] = None) -> None:
+    t = into if into is not None else _current.get()
+    if t is None:
+        return
+    key = f"{stage}_ms"
+    if each:
+        t.setdefault(key, []).append(ms)
+    else:
+        t[key] = t.get(key, 0.0) + ms
+
+
+@contextmanager
+def timed(stage: str, *, each: bool = False, into: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+    """Time the block into `into` or the current collector (also when it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(stage, (time.perf_counter() - t0) * 1000.0, each=each, into=into)
+
+
+def rounded(t: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: [round(x, 1) for x in v] if isinstance(v, list) else round(v, 1) for k, v in t.items()}
+
+
+# -------- reporting --------
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles plus count/mean/max/total."""
+    xs = sorted(values)
+    if not xs:
+        return {"count": 0}
+    out: Dict[str, float] = {"count": len(xs)}
+    for p in PERCENTILES:
+        out[f"p{p}"] = round(xs[max(0, math.ceil(p / 100 * len(xs)) - 1)], 1)
+    out["mean"] = round(sum(xs) / len(xs), 1)
+    out["max"] = round(xs[-1], 1)
+    out["total"] = round(sum(xs), 1)
+    return out
+
+
+def profile(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-stage percentiles across the manifest's pages, plus job-level timings."""
+    samples: Dict[str, List[float]] = {}
+    pages = manifest.get("pages") or {}
+    timed_pages = 0
+    for entry in pages.values():
+        t = entry.get("timings")
+        if not t:
+            continue
+        timed_pages += 1
+        for key, v in t.items():
+            if isinstance(v, list):
+                samples.setdefault(key, []).extend(v)  # e.g. every model attempt
+            else:
+                samples.setdefault(key, []).append(v)
+    return {
+        "pages": len(pages),
+        "timed_pages": timed_pages,
+        "job": manifest.get("timings") or {},
+        "stages": {k.removesuffix("_ms"): percentiles(v) for k, v in sorted(samples.items())},
+    }
@@ -0,0 +1,314 @@
+# app/lib/tracing.py
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import config
+from app import logger
+
+log = logger.get_logger(__name__)
+
+# W3C Trace Context tracing without the OpenTelemetry SDK.
+#
+# A comic job crosses processes (enqueue -> Cloud Task -> worker) and threads.
+# Spans carry W3C trace/span ids, so the `traceparent` header we send and
+# accept is understood by Cloud Run, Cloud Trace and any OTel collector:
+#   - the current span lives in a contextvar; asyncio tasks, asyncio.to_thread
+#     and copy_context().run pools inherit it.
+#   - create_task() puts the traceparent in the task's headers and payload; the
+#     worker request continues that trace.
+#   - a new trace is sampled by route (TRACE_SAMPLE_RATE, TRACE_SAMPLE_ROUTES);
+#     children follow their parent. Unsampled spans still propagate ids but are
+#     not exported.
+#   - with TRACE_EXPORTER=file|stdout (default none), finished sampled spans
+#     are exported as JSON lines (OTLP field names), so it all works offline.
+#     A daemon thread does the writing; TRACE_FILE rotates to TRACE_FILE.1 at
+#     TRACE_FILE_MAX_BYTES, since /tmp on Cloud Run is memory.
+#
+#     with tracing.span("page.decode", page=3):
+#         ...
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "attributes",
+                 "start_ns", "end_ns", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def fail(self, message: str) -> None:
+        self.status = "error"
+        self.error = message[:300]
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.end_ns or time.time_ns()
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": end,
+            "durationMs": round((end - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR" if self.status == "error" else "OK", "message": self.error or ""},
+            "resource": {"service.name": "comics-api", "process.pid": os.getpid()},
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    while True:
+        v = random.getrandbits(nbytes * 8)
+        if v:
+            return f"{v:0{nbytes * 2}x}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """'00-<trace>-<span>-<flags>' -> (trace_id, parent_span_id, sampled); None if malformed."""
+    m = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if not m or m.group(1) == "0" * 32 or m.group(2) == "0" * 16:
+        return None
+    return m.group(1), m.group(2), bool(int(m.group(3), 16) & 1)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attributes: Any) -> None:
+    """Set attributes on the current span, if any."""
+    s = _current.get()
+    if s is not None:
+        s.set(**attributes)
+
+
+def traceparent() -> Optional[str]:
+    """Header value for the current span (to hand to another process)."""
+    s = _current.get()
+    return s.traceparent if s is not None else None
+
+
+def sample_rate(route: Optional[str]) -> float:
+    """Longest TRACE_SAMPLE_ROUTES prefix match, else TRACE_SAMPLE_RATE."""
+    best, rate = -1, config.trace_sample_rate
+    for prefix, r in config.trace_sample_routes.items():
+        if route and route.startswith(prefix) and len(prefix) > best:
+            best, rate = len(prefix), r
+    return rate
+
+
+def start(name: str, *, parent: Optional[str] = None, route: Optional[str] = None, **attributes: Any) -> Span:
+    """
+    New span without making it current (see span()); end it with finish().
+    For generators, whose context is the consumer's.
+    """
+    remote = parse_traceparent(parent)
+    cur = _current.get()
+    if remote:
+        trace_id, parent_id, sampled = remote
+    elif cur is not None:
+        trace_id, parent_id, sampled = cur.trace_id, cur.span_id, cur.sampled
+    else:
+        trace_id, parent_id = _new_id(16), None
+        sampled = random.random() < sample_rate(route)
+    return Span(name, trace_id, parent_id, sampled, attributes)
+
+
+def finish(s: Span) -> None:
+    s.end_ns = time.time_ns()
+    if s.sampled:
+        _export(s)
+
+
+@contextmanager
+def span(name: str, *, parent: Optional[str] = None, route: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Child of the current span. `parent` (a traceparent, e.g. from a request
+    header) continues a remote trace instead; with neither, a new trace starts
+    and is sampled by `route`. Exceptions mark the span failed and propagate.
+    """
+    s = start(name, parent=parent, route=route, **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        finish(s)
+
+
+def adopt(parent: Optional[str]) -> bool:
+    """
+    Re-parent the current span onto a remote trace, for when the context only
+    shows up after the span started (a traceparent inside a task payload).
+    Only call before the span has children.
+    """
+    s = _current.get()
+    remote = parse_traceparent(parent)
+    if s is None or remote is None or s.parent_id is not None:
+        return False
+    s.trace_id, s.parent_id, s.sampled = remote
+    return True
+
+
+# -------- export --------
+
+_EXPORT_BATCH = 500
+_export_q: "queue.Queue[Tuple[str, str]]" = queue.Queue(maxsize=10000)
+_export_thread: Optional[threading.Thread] = None
+_export_start_lock = threading.Lock()
+_export_dropped = 0
+
+
+def _export(s: Span) -> None:
+    """Queue a finished span for the writer thread; never blocks the caller."""
+    global _export_dropped
+    exporter = config.trace_exporter
+    if exporter not in ("file", "stdout"):
+        return
+    _ensure_writer()
+    line = json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n"
+    try:
+        _export_q.put_nowait((exporter, line))
+    except queue.Full:
+        _export_dropped += 1
+
+
+def _ensure_writer() -> None:
+    global _export_thread
+    if _export_thread is not None:
+        return
+    with _export_start_lock:
+        if _export_thread is None:
+            t = threading.Thread(target=_write_loop, name="trace-export", daemon=True)
+            t.start()
+            _export_thread = t
+            atexit.register(flush)
+
+
+def _write_loop() -> None:
+    while True:
+        batch = [_export_q.get()]
+        while len(batch) < _EXPORT_BATCH:
+            try:
+                batch.append(_export_q.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write(batch)
+        except Exception as e:
+            log.warning(f"[tracing] dropped {len(batch)} spans: {e}")
+        finally:
+            for _ in batch:
+                _export_q.task_done()
+
+
+def _write(batch: List[Tuple[str, str]]) -> None:
+    to_file = "".join(line for exporter, line in batch if exporter == "file")
+    to_stdout = "".join(line for exporter, line in batch if exporter == "stdout")
+    if to_stdout:
+        sys.stdout.write(to_stdout)
+        sys.stdout.flush()
+    if to_file:
+        path = config.trace_file
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            if os.path.getsize(path) >= config.trace_file_max_bytes:
+                os.replace(path, f"{path}.1")
+        except FileNotFoundError:  # first write, or another worker just rotated it
+            pass
+        with open(path, "a") as f:
+            f.write(to_file)
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Wait until queued spans are written; False if the writer didn't catch up."""
+    t = _export_thread
+    if t is None:
+        return True
+    deadline = time.monotonic() + timeout
+    with _export_q.all_tasks_done:
+        while _export_q.unfinished_tasks:
+            left = deadline - time.monotonic()
+            if left <= 0 or not t.is_alive():
+                return False
+            _export_q.all_tasks_done.wait(min(left, 0.5))
+    return True
+
+
+def load_trace(trace_id: str, path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Spans of one trace from a file export (and its rotated .1), in start order."""
+    flush()
+    path = path or config.trace_file
+    out: List[Dict[str, Any]] = []
+    for p in (f"{path}.1", path):
+        try:
+            with open(p, "r") as f:
+                for line in f:
+                    if trace_id not in line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("traceId") == trace_id:
+                        out.append(rec)
+        except OSError:
+            continue
+    return sorted(out, key=lambda r: r["startTimeUnixNano"])
+
+
+# -------- HTTP --------
+
+async def http_middleware(request, call_next):
+    """Server span per request; continues an incoming traceparent and echoes ours back."""
+    path = request.url.path
+    with span(
+        f"{request.method} {path}",
+        parent=request.headers.get("traceparent"),
+        route=path,
+        **{"http.method": request.method, "http.target": path},
+    ) as s:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if getattr(route, "path", None):
+            s.name = f"{request.method} {route.path}"  # template, not the raw path with ids
+        s.set(**{"http.status_code": response.status_code})
+        if response.status_code >= 500:
+            s.fail(f"HTTP {response.status_code}")
+        response.headers["traceparent"] = s.traceparent
+        return response
@@ -0,0 +1,133 @@
+# app/lib/uploads.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+from app.config import config
+from app import logger
+from app.lib.gcs_inventory import download_gcs_object_to_file, upload_to_gcs
+from app.lib.paths import ensure_job_dir
+
+log = logger.get_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+_ASSET_ID_RE = re.compile(r"^[a-f0-9]{32}$")
+_EXT_BY_CTYPE = {"image/png": ".png", "image/jpeg": ".jpg"}
+
+
+def _uploads_dir(workdir: str) -> str:
+    d = os.path.join(workdir, "uploads")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _sniff_content_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    return None
+
+
+async def save_upload_stream(
+    chunks: AsyncIterator[bytes],
+    *,
+    job_id: str,
+    kind: str = "face",
+) -> dict:
+    """
+    Spool an incoming image stream to jobs/<job_id>/uploads/<asset_id>.<ext>
+    chunk by chunk (never holding the whole body in memory), then upload it
+    to gs://<bucket>/jobs/<job_id>/uploads/<asset_id>.<ext>.
+
+    Returns the asset handle later requests reference via `image_asset_id`.
+    """
+    workdir = ensure_job_dir(job_id)
+    asset_id = uuid.uuid4().hex
+    tmp_path = os.path.join(_uploads_dir(workdir), f"{asset_id}.part")
+
+    size = 0
+    head = b""
+    sha = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > config.max_upload_bytes:
+                    raise HTTPException(413, f"upload exceeds {config.max_upload_bytes} bytes")
+                if len(head) < 16:
+                    head += chunk[: 16 - len(head)]
+                sha.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    content_type = _sniff_content_type(head)
+    if size == 0 or content_type is None:
+        os.remove(tmp_path)
+        raise HTTPException(400, "upload must be a non-empty PNG or JPEG image")
+
+    ext = _EXT_BY_CTYPE[content_type]
+    local_path = os.path.join(_uploads_dir(workdir), f"{asset_id}{ext}")
+    os.replace(tmp_path, local_path)
+
+    object_name = f"jobs/{job_id}/uploads/{asset_id}{ext}"
+    info = await asyncio.to_thread(upload_to_gcs, local_path, object_name=object_name)
+    log.info(f"[{job_id}] stored upload {asset_id} ({size} bytes, {content_type})")
+
+    return {
+        "asset_id": asset_id,
+        "job_id": job_id,
+        "kind": kind,
+        "content_type": content_type,
+        "size": size,
+        "sha256": sha.hexdigest(),
+        "gs_uri": info["gs_uri"],
+        "signed_url": info.get("signed_url"),
+        "expires_in": info.get("expires_in"),
+    }
+
+
+def resolve_upload(asset_id: Optional[str], *, job_id: Optional[str], workdir: str) -> Optional[str]:
+    """
+    Turn an uploaded asset id into a local file path:
+    - reuse jobs/<job_id>/uploads/<asset_id>.<ext> if this instance has it
+    - else download it from GCS (another instance handled the upload)
+    Returns None if the asset cannot be found.
+    """
+    if not asset_id:
+        return None
+    if not _ASSET_ID_RE.match(asset_id):
+        raise HTTPException(400, f"invalid image_asset_id {asset_id!r}")
+
+    folder = _uploads_dir(workdir)
+    for ext in _EXT_BY_CTYPE.values():
+        local = os.path.join(folder, f"{asset_id}{ext}")
+        if os.path.exists(local) and os.path.getsize(local) > 0:
+            return local
+
+    bucket = getattr(config, "gcs_bucket", None)
+    if not (bucket and job_id):
+        return None
+    for ext in _EXT_BY_CTYPE.values():
+        local = os.path.join(folder, f"{asset_id}{ext}")
+        try:
+            download_gcs_object_to_file(f"gs://{bucket}/jobs/{job_id}/uploads/{asset_id}{ext}", local)
+            if os.path.exists(local) and os.path.getsize(local) > 0:
+                return local
+        except Exception as e:
+            log.debug(f"upload {asset_id}{ext} not in GCS: {e}")
+        if os.path.exists(local):
+            os.remove(local)
+    return None
@@ -0,0 +1,215 @@
+# app/lib/usage.py
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import config
+from app import logger
+from app.lib import metrics, tracing
+
+log = logger.get_logger(__name__)
+
+# Per-call accounting for model requests. Call sites wrap the SDK call:
+#     resp = usage.tracked("chat", client.chat.completions.create, model=..., ...)
+# Each record (model, tokens, image size, attempt, latency, ok/error) is tagged
+# with the job/stage/page from the surrounding usage_context(), appended to
+# jobs/<job_id>/usage.jsonl, and folded into process-wide totals.
+
+_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_job", default=None)
+_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_stage", default=None)
+_page: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("usage_page", default=None)
+
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+
+USAGE_FILE = "usage.jsonl"
+
+
+@contextmanager
+def usage_context(*, job_id: Optional[str] = None, stage: Optional[str] = None, page: Optional[int] = None):
+    """Tag every tracked call inside the block; unset arguments keep the outer value."""
+    tokens = []
+    if job_id is not None:
+        tokens.append((_job, _job.set(job_id)))
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    if page is not None:
+        tokens.append((_page, _page.set(page)))
+    try:
+        yield
+    finally:
+        for var, tok in reversed(tokens):
+            var.reset(tok)
+
+
+def _usage_numbers(usage: Any) -> Dict[str, int]:
+    if usage is None:
+        return {}
+    get = (lambda k: usage.get(k)) if isinstance(usage, dict) else (lambda k: getattr(usage, k, None))
+    # chat: prompt/completion_tokens; images (gpt-image-1): input/output_tokens
+    prompt = get("prompt_tokens") or get("input_tokens") or 0
+    completion = get("completion_tokens") or get("output_tokens") or 0
+    total = get("total_tokens") or (prompt + completion)
+    return {"prompt_tokens": int(prompt), "completion_tokens": int(completion), "total_tokens": int(total)}
+
+
+def _price(model: str) -> Dict[str, float]:
+    return config.model_prices.get(model) or config.model_prices.get("default") or {}
+
+
+def estimate_cost(rec: Dict[str, Any]) -> float:
+    p = _price(rec.get("model") or "")
+    cost = (rec.get("prompt_tokens", 0) * p.get("input", 0.0) + rec.get("completion_tokens", 0) * p.get("output", 0.0)) / 1e6
+    if not rec.get("total_tokens") and rec.get("kind", "").startswith("image"):
+        cost += p.get("per_image", 0.0) * rec.get("n", 1)
+    return round(cost, 6)
+
+
+def record(rec: Dict[str, Any]) -> None:
+    rec.setdefault("job_id", _job.get())
+    rec.setdefault("stage", _stage.get())
+    rec.setdefault("page", _page.get())
+    rec["cost_usd"] = estimate_cost(rec)
+    metrics.observe_model_call(rec)
+
+    key = f"{rec['kind']}:{rec.get('model') or '-'}"
+    with _lock:
+        t = _totals.setdefault(key, {"calls": 0, "errors": 0, "latency_ms": 0.0, "prompt_tokens": 0,
+                                     "completion_tokens": 0, "cost_usd": 0.0})
+        t["calls"] += 1
+        t["errors"] += 0 if rec["ok"] else 1
+        t["latency_ms"] += rec["latency_ms"]
+        t["prompt_tokens"] += rec.get("prompt_tokens", 0)
+        t["completion_tokens"] += rec.get("completion_tokens", 0)
+        t["cost_usd"] += rec["cost_usd"]
+
+        if rec["job_id"]:
+            from app.lib.paths import job_dir
+            try:
+                with open(os.path.join(job_dir(rec["job_id"]), USAGE_FILE), "a") as f:
+                    f.write(json.dumps(rec) + "\n")
+            except OSError as e:
+                log.warning(f"[usage] could not append for job {rec['job_id']}: {e}")
+
+
+def _base(kind: str, kwargs: Dict[str, Any], attempt: int, tags: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    rec = {
+        "ts": time.time(),
+        "kind": kind,
+        "model": kwargs.get("model"),
+        "size": kwargs.get("size"),
+        "n": kwargs.get("n", 1),
+        "attempt": attempt,
+    }
+    # explicit tags win over the ambient usage_context()
+    rec.update({k: v for k, v in (tags or {}).items() if v is not None})
+    return rec
+
+
+def tracked(
+    kind: str,
+    fn: Callable[..., Any],
+    *,
+    attempt: int = 1,
+    tags: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Any:
+    """Call `fn(**kwargs)` and record usage/latency (also on failure, then re-raise)."""
+    rec = _base(kind, kwargs, attempt, tags)
+    with tracing.span(f"model.{kind}", model=rec["model"], attempt=attempt, n=rec["n"]) as sp:
+        t0 = time.perf_counter()
+        try:
+            resp = fn(**kwargs)
+        except Exception as e:
+            rec.update(ok=False, error=f"{type(e).__name__}: {e}"[:300], latency_ms=(time.perf_counter() - t0) * 1000.0)
+            record(rec)
+            raise
+        rec.update(ok=True, latency_ms=(time.perf_counter() - t0) * 1000.0, **_usage_numbers(getattr(resp, "usage", None)))
+        record(rec)
+        sp.set(total_tokens=rec.get("total_tokens"))
+        return resp
+
+
+def tracked_stream(
+    kind: str,
+    fn: Callable[..., Any],
+    *,
+    tags: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Iterator[Any]:
+    """
+    Streaming variant: passes chunks through, records when the stream ends
+    (usage arrives on the final chunk with stream_options.include_usage).
+    """
+    rec = _base(kind, kwargs, 1, tags)
+    # not tracing.span(): a generator runs in its consumer's context
+    sp = tracing.start(f"model.{kind}", model=rec["model"], stream=True)
+    t0 = time.perf_counter()
+    usage = None
+    try:
+        for chunk in fn(**kwargs):
+            if rec.get("first_token_ms") is None and getattr(chunk, "choices", None):
+                rec["first_token_ms"] = (time.perf_counter() - t0) * 1000.0
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+    except Exception as e:
+        rec.update(ok=False, error=f"{type(e).__name__}: {e}"[:300], latency_ms=(time.perf_counter() - t0) * 1000.0)
+        record(rec)
+        sp.fail(rec["error"])
+        tracing.finish(sp)
+        raise
+    rec.update(ok=True, latency_ms=(time.perf_counter() - t0) * 1000.0, **_usage_numbers(usage))
+    record(rec)
+    sp.set(first_token_ms=rec.get("first_token_ms"), total_tokens=rec.get("total_tokens"))
+    tracing.finish(sp)
+
+
+# -------- reporting --------
+
+def load_job_usage(workdir: str) -> List[Dict[str, Any]]:
+    path = os.path.join(workdir, USAGE_FILE)
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue
+    return out
+
+
+def _fold(into: Dict[str, Any], rec: Dict[str, Any]) -> None:
+    into["calls"] = into.get("calls", 0) + 1
+    into["errors"] = into.get("errors", 0) + (0 if rec.get("ok") else 1)
+    into["latency_s"] = round(into.get("latency_s", 0.0) + rec.get("latency_ms", 0.0) / 1000.0, 3)
+    into["prompt_tokens"] = into.get("prompt_tokens", 0) + rec.get("prompt_tokens", 0)
+    into["completion_tokens"] = into.get("completion_tokens", 0) + rec.get("completion_tokens", 0)
+    into["cost_usd"] = round(into.get("cost_usd", 0.0) + rec.get("cost_usd", 0.0), 6)
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals plus breakdowns by stage, kind/model and page."""
+    total: Dict[str, Any] = {}
+    by_stage: Dict[str, Dict[str, Any]] = {}
+    by_model: Dict[str, Dict[str, Any]] = {}
+    by_page: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        _fold(total, rec)
+        _fold(by_stage.setdefault(rec.get("stage") or "unknown", {}), rec)
+        _fold(by_model.setdefault(f"{rec.get('kind')}:{rec.get('model') or '-'}", {}), rec)
+        if rec.get("page") is not None:
+            _fold(by_page.setdefault(str(rec["page"]), {}), rec)
+    return {"total": total, "by_stage": by_stage, "by_model": by_model, "by_page": by_page}
+
+
+def process_totals() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {k: dict(v) for k, v in _totals.items()}
@@ -1,21 +1,46 @@
+import asyncio
+
+from app.lib import startup  # first: starts the boot clock
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from app.config import config
-from app.features.story_ideas.router import router as story_ideas_router
-from app.features.cover.router import router as cover_router
-from app.features.cover_script.router import router as cover_script_router
-from app.features.full_script.router import router as full_script_router
-from app.features.pages.router import router as pages_router
-from app.features.admin.router import router as admin_router
-from app.features.lookbook_seed.router import router as lookbook_seed_router
-from app.features.lookbook_ref_assets.router import router as lookbook_ref_assets_router
+from app import logger
+
+with startup.phase("routers"):
+    from app.features.story_ideas.router import router as story_ideas_router
+    from app.features.cover.router import router as cover_router
+    from app.features.cover_script.router import router as cover_script_router
+    from app.features.full_script.router import router as full_script_router
+    from app.features.pages.router import router as pages_router
+    from app.features.admin.router import router as admin_router
+    from app.features.lookbook_seed.router import router as lookbook_seed_router
+    from app.features.lookbook_ref_assets.router import router as lookbook_ref_assets_router
+    from app.features.uploads.router import router as uploads_router
+    from app.features.pipeline.router import router as pipeline_router
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.lib import metrics, tracing
 from app.lib.cleanup import sweep_finished_jobs
 from app.lib.paths import data_dir
 
+log = logger.get_logger(__name__)
+
 
-app = FastAPI(title="Comics API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.preload_sdks:
+        with startup.phase("preload"):
+            preloaded = await asyncio.to_thread(startup.preload)
+        log.info(f"startup: preloaded {preloaded}")
+    if config.sweep_jobs_on_startup:
+        sweep_finished_jobs(data_dir(), ttl_hours=config.sweep_ttl_hours)
+    log.info(f"startup: ready {startup.profile()}")
+    yield
+
+
+app = FastAPI(title="Comics API", lifespan=lifespan)
 
 # set this to your real front-end origins
 ALLOWED_ORIGINS = [
@@ -32,6 +57,10 @@ app.add_middleware(
     expose_headers=["Content-Disposition"],  # for downloads via FileResponse
 )
 
+if config.metrics_enabled:
+    app.middleware("http")(metrics.http_middleware)
+app.middleware("http")(tracing.http_middleware)
+
 app.include_router(story_ideas_router)
 app.include_router(cover_router)
 app.include_router(cover_script_router)
@@ -40,8 +69,11 @@ app.include_router(pages_router)
 app.include_router(admin_router)
 app.include_router(lookbook_seed_router)
 app.include_router(lookbook_ref_assets_router)
+app.include_router(uploads_router)
+app.include_router(pipeline_router)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    if config.sweep_jobs_on_startup:
-        sweep_finished_jobs(data_dir(), ttl_hours=config.sweep_ttl_hours)
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    # merging snapshots reads files; keep it off the event loop
+    body = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,253 @@
+# benchmarks/e2e.py
+"""
+Offline end-to-end throughput benchmark.
+
+Drives the real routers in-process (httpx ASGITransport, no server) with the
+model, storage and Cloud Tasks stand-ins from benchmarks/standins.py. Each job
+goes through the same calls a client makes:
+
+    POST /generate/comic/full-script        script + lookbook delta
+    POST /generate/comic/cover              cover (n=1)
+    POST /lookbook/enqueue-ref-assets       -> task -> worker_ref_assets
+    POST /generate/comic                    -> task -> worker_process
+
+N jobs run concurrently against one app instance (one Cloud Run/gunicorn
+worker). Every scenario of the matrix runs in its own subprocess, so peak RSS
+and module state don't leak between them.
+
+    python -m benchmarks.e2e                                   # 1/8/32 jobs x 4/24/48 pages
+    python -m benchmarks.e2e --jobs 8 --pages 24 --image-latency lognormal:8000:0.3
+    python -m benchmarks.e2e --quick --out bench.json          # 1 job x 4 pages, no latency
+
+Prints (and with --out writes) JSON: jobs/min, page latency percentiles
+(manifest pages.<n>.timings.total_ms), per-stage profile, peak RSS, bytes
+moved and stand-in call counts.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from benchmarks import standins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, "request_examples")
+
+JOBS_MATRIX = (1, 8, 32)
+PAGES_MATRIX = (4, 24, 48)
+
+
+def _example(name: str) -> Dict[str, Any]:
+    with open(os.path.join(EXAMPLES, name), "r") as f:
+        return json.load(f)
+
+
+# -------- one job --------
+
+async def _post(http, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    r = await http.post(f"/api/v1{path}", json=body)
+    if r.status_code >= 400:
+        raise RuntimeError(f"POST {path} -> {r.status_code}: {r.text[:200]}")
+    return r.json()
+
+
+async def _job(http, tasks: standins.FakeTasks, job_id: str, pages: int, timeout: float) -> Dict[str, Any]:
+    from app.lib.jobs import load_manifest, manifest_path
+    from app.lib.paths import job_dir
+
+    full = {**_example("full_script_req.json"), "job_id": job_id, "page_count": pages, "force": True}
+    cover = {**_example("gen_cover_req.json"), "job_id": job_id, "overwrite": True}
+    stages: Dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    def _mark(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        stages[f"{stage}_ms"] = round((now - since) * 1000.0, 1)
+        return now
+
+    try:
+        script = await _post(http, "/generate/comic/full-script", full)
+        t = _mark("full_script", t0)
+        await _post(http, "/generate/comic/cover", cover)
+        t = _mark("cover", t)
+
+        delta = script.get("lookbook_delta") or {}
+        ids = [e["id"] for key in ("characters_to_add", "locations_to_add", "props_to_add") for e in delta.get(key, [])]
+        if ids:
+            await _post(http, "/lookbook/enqueue-ref-assets", {"job_id": job_id, "ids": ids, "user_theme": full["user_theme"]})
+            status = await tasks.wait(f"/api/v1/tasks/worker/lookbook/ref-assets/{job_id}", timeout)
+            if status >= 400:
+                raise RuntimeError(f"ref-assets worker -> {status}")
+        t = _mark("ref_assets", t)
+
+        await _post(http, "/generate/comic", {
+            "job_id": job_id,
+            "comic_title": full["title"],
+            "style": full["user_theme"],
+            "script_gcs_uri": (script.get("script_gcs") or {}).get("gs_uri"),
+        })
+        status = await tasks.wait(f"/api/v1/tasks/worker/comic/{job_id}", timeout)
+        _mark("pages", t)
+        if status >= 400:
+            raise RuntimeError(f"comic worker -> {status}")
+
+        mf = load_manifest(manifest_path(job_dir(job_id)))
+        statuses = Counter(p.get("status") for p in mf.get("pages", {}).values())
+        final = mf.get("final") or {}
+        ok = statuses["done"] == pages and bool(final.get("gcs"))
+        error = None if ok else f"pages {dict(statuses)}, final {'uploaded' if final.get('gcs') else final or 'missing'}"
+    except Exception as e:
+        mf, ok, error = {}, False, str(e)[:300]
+
+    return {
+        "job_id": job_id,
+        "ok": ok,
+        "error": error,
+        "wall_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        "stages": stages,
+        "manifest": mf,
+    }
+
+
+# -------- one scenario (in this process) --------
+
+async def _scenario(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    from app.lib import timings
+    from app.lib.paths import job_dir
+    from app.main import app
+
+    gcs_root = tempfile.mkdtemp(prefix="bench-gcs-")
+    model, gcs, tasks = standins.build(args, gcs_root)
+    undo = standins.install_all(model, gcs, tasks)
+
+    run = uuid.uuid4().hex[:6]
+    job_ids = [f"bench-{run}-{i}" for i in range(args.jobs)]
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            async def _deliver(path: str, body: bytes, headers: Dict[str, str]):
+                return await http.post(path, content=body, headers=headers)
+
+            tasks.bind(asyncio.get_running_loop(), _deliver)
+            t0 = time.perf_counter()
+            results = await asyncio.gather(*(_job(http, tasks, j, args.pages, args.timeout) for j in job_ids))
+            wall = time.perf_counter() - t0
+    finally:
+        undo()
+        shutil.rmtree(gcs_root, ignore_errors=True)
+        if not args.keep:
+            for j in job_ids:
+                shutil.rmtree(job_dir(j), ignore_errors=True)
+
+    # every page of every job as one manifest, so the profile spans the whole run
+    merged = {"pages": {
+        f"{r['job_id']}/{n}": entry
+        for r in results for n, entry in (r.pop("manifest").get("pages") or {}).items()
+    }}
+    profile = timings.profile(merged)
+    ok = [r for r in results if r["ok"]]
+    storage, calls = gcs.counters.snapshot(), model.counters.snapshot()
+
+    return {
+        "scenario": {"jobs": args.jobs, "pages": args.pages},
+        "standins": {
+            "image_latency": args.image_latency, "text_latency": args.text_latency,
+            "storage_latency": args.storage_latency, "queue_latency": args.queue_latency,
+            "image_kb": args.image_kb, "model_failure_rate": args.model_failure_rate,
+            "storage_failure_rate": args.storage_failure_rate,
+        },
+        "jobs_ok": len(ok),
+        "jobs_failed": len(results) - len(ok),
+        "wall_s": round(wall, 2),
+        "jobs_per_min": round(len(ok) / wall * 60.0, 2) if wall > 0 else 0.0,
+        "job_wall_ms": timings.percentiles([r["wall_ms"] for r in ok]),
+        "page_latency_ms": profile["stages"].get("total", {"count": 0}),
+        # summed page render time over wall time: ~1.0 means jobs rendered one page at a time
+        "page_concurrency": round(profile["stages"].get("total", {}).get("total", 0.0) / (wall * 1000.0), 2) if wall > 0 else 0.0,
+        "page_stages_ms": {k: v for k, v in profile["stages"].items() if k != "total"},
+        "job_stages_ms": {
+            k.removesuffix("_ms"): timings.percentiles([r["stages"][k] for r in ok if k in r["stages"]])
+            for k in ("full_script_ms", "cover_ms", "ref_assets_ms", "pages_ms")
+        },
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "bytes": {
+            "storage_up": int(storage.get("bytes_up", 0)),
+            "storage_down": int(storage.get("bytes_down", 0)),
+            "model_in": int(calls.get("bytes_in", 0)),
+            "model_out": int(calls.get("bytes_out", 0)),
+        },
+        "calls": {"model": calls, "storage": storage, "tasks": tasks.counters.snapshot()},
+        "errors": [r["error"] for r in results if r["error"]][:10],
+    }
+
+
+def run_scenario(args: argparse.Namespace) -> Dict[str, Any]:
+    return asyncio.run(_scenario(args))
+
+
+# -------- matrix (one subprocess per scenario) --------
+
+_PASSTHROUGH = (*standins.DEFAULTS, "timeout")
+
+
+def _subprocess(args: argparse.Namespace, jobs: int, pages: int) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "benchmarks.e2e", "--single", "--jobs", str(jobs), "--pages", str(pages)]
+    for name in _PASSTHROUGH:
+        cmd += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    if args.keep:
+        cmd.append("--keep")
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"scenario": {"jobs": jobs, "pages": pages}, "error": proc.stderr.strip()[-2000:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--jobs", type=int, help="concurrent jobs (default: the 1/8/32 matrix)")
+    p.add_argument("--pages", type=int, help="pages per comic (default: the 4/24/48 matrix)")
+    p.add_argument("--quick", action="store_true", help="1 job x 4 pages, zero latency, small images")
+    p.add_argument("--single", action="store_true", help="run one scenario in this process")
+    p.add_argument("--timeout", type=float, default=3600.0, help="per task wait, seconds")
+    p.add_argument("--keep", action="store_true", help="keep the bench job dirs under app/output")
+    p.add_argument("--out", help="also write the JSON report here")
+    standins.add_arguments(p)
+    args = p.parse_args(argv)
+
+    if args.quick:
+        args.jobs, args.pages = args.jobs or 1, args.pages or 4
+        standins.zero_latency(args)
+
+    if args.single:
+        report: Any = run_scenario(argparse.Namespace(**{**vars(args), "jobs": args.jobs or 1, "pages": args.pages or 4}))
+    else:
+        matrix = [(j, n) for j in ([args.jobs] if args.jobs else JOBS_MATRIX) for n in ([args.pages] if args.pages else PAGES_MATRIX)]
+        report = {"runs": [], "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        for jobs, pages in matrix:
+            print(f"[bench] {jobs} jobs x {pages} pages ...", file=sys.stderr, flush=True)
+            report["runs"].append(_subprocess(args, jobs, pages))
+
+    text = json.dumps(report, ensure_ascii=False, indent=None if args.single else 2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    standins.configure_env()
+    sys.exit(main())
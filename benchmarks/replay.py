@@ -0,0 +1,447 @@
+# benchmarks/replay.py
+"""
+Traffic replay / load harness.
+
+Replays a request stream against the app with the stand-in backends from
+benchmarks/standins.py, either in-process (default) or against a running
+server (--url, e.g. gunicorn serving benchmarks.serve:app), and reports per
+endpoint latency and error rates, plus event-loop lag and per-route server
+latency scraped from /metrics.
+
+    python -m benchmarks.replay                            # synthesized stream, see below
+    python -m benchmarks.replay --stream traffic.jsonl --speed 4 --concurrency 1,8,32,80
+    python -m benchmarks.replay --sessions 50 --rate 60 --record traffic.jsonl --dry-run
+
+Stream: JSON lines, one request each:
+
+    {"t": 12.5, "session": "s3", "method": "POST", "path": "/api/v1/generate/comic/cover",
+     "body": {...} | "example": "gen_cover_req.json"}
+
+  t        seconds from the start of the stream ("ts", epoch seconds, also works)
+  session  requests of one session run in order, each after the previous one
+           answered; defaults to body.job_id. The session's job id (and any
+           "{job_id}" in path/body) is replaced by a fresh id on every run.
+  example  body from request_examples/<name>
+Lines without a "path" are skipped and counted (so pointing this at a file of
+something else fails loudly in the report, not at runtime).
+
+Without --stream, sessions are synthesized from request_examples/: story
+ideas, cover script, cover, lookbook seed, full script, ref assets, comic,
+arriving as a Poisson process (--rate sessions/min) with --think seconds
+between a session's requests.
+
+Timing: --speed 2 replays twice as fast, --speed 0 as fast as possible.
+--concurrency is a ramp: the whole stream is replayed once per step with at
+most that many requests in flight (Cloud Run's --concurrency is 80).
+delay_ms is how late a request went out versus its schedule: time spent
+waiting for a slot, or for a blocked event loop when in-process.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import standins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, "request_examples")
+
+# one user's way through the product, in order
+SESSION_FLOW: List[Tuple[str, str, Any]] = [
+    ("POST", "/api/v1/generate/story-ideas", "gen_story_ideas_req.json"),
+    ("POST", "/api/v1/generate/comic/cover-script", "cover_script_req.json"),
+    ("POST", "/api/v1/generate/comic/cover", "gen_cover_req.json"),
+    ("POST", "/api/v1/lookbook/seed-from-cover", "lookbook_seed_req.json"),
+    ("POST", "/api/v1/generate/comic/full-script", "full_script_req.json"),
+    ("POST", "/api/v1/lookbook/enqueue-ref-assets", "ref_asset_req.json"),
+    ("POST", "/api/v1/generate/comic", {
+        "job_id": "{job_id}",
+        "comic_title": "Wingsuit Warrior: High-Flying Hijinks",
+        "style": "Pixar 3D animated cartoon style",
+        "script_gcs_uri": "gs://{bucket}/jobs/{job_id}/script.json",
+    }),
+]
+
+_REPLAY_ID = re.compile(r"replay-[0-9a-f]{6}-\d+-\d+")
+
+
+def _example(name: str) -> Dict[str, Any]:
+    with open(os.path.join(EXAMPLES, name), "r") as f:
+        return json.load(f)
+
+
+# -------- streams --------
+
+def synthesize(sessions: int, rate_per_min: float, think_s: float, seed: int = 0,
+               pages: Optional[int] = None) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    lines: List[Dict[str, Any]] = []
+    start = 0.0
+    for n in range(sessions):
+        if n:
+            start += rng.expovariate(rate_per_min / 60.0) if rate_per_min > 0 else 0.0
+        t = start
+        for method, path, body in SESSION_FLOW:
+            line: Dict[str, Any] = {"t": round(t, 3), "session": f"s{n}", "method": method, "path": path}
+            if isinstance(body, str):
+                line["example"] = body
+            else:
+                line["body"] = body
+            if pages and path.endswith("/full-script"):
+                line["overrides"] = {"page_count": pages}
+            lines.append(line)
+            t += rng.expovariate(1.0 / think_s) if think_s > 0 else 0.0
+    return sorted(lines, key=lambda line: line["t"])
+
+
+def load_stream(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """(replayable lines with t relative to the first, number of skipped lines)."""
+    lines: List[Dict[str, Any]] = []
+    skipped = 0
+    with open(path, "r") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            try:
+                rec = json.loads(raw)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(rec, dict) or not str(rec.get("path") or "").startswith("/"):
+                skipped += 1
+                continue
+            rec.setdefault("t", rec.get("ts", 0.0))
+            lines.append(rec)
+    if lines:
+        t0 = min(float(line["t"]) for line in lines)
+        for line in lines:
+            line["t"] = float(line["t"]) - t0
+    return sorted(lines, key=lambda line: line["t"]), skipped
+
+
+def _body(line: Dict[str, Any]) -> Optional[Any]:
+    body = _example(line["example"]) if line.get("example") else line.get("body")
+    if isinstance(body, dict) and line.get("overrides"):
+        body = {**body, **line["overrides"]}
+    return body
+
+
+def _session_key(i: int, line: Dict[str, Any], body: Any) -> str:
+    if line.get("session"):
+        return str(line["session"])
+    if isinstance(body, dict) and body.get("job_id"):
+        return str(body["job_id"])
+    return f"line-{i}"
+
+
+def _render(obj: Any, subs: Dict[str, str]) -> Any:
+    if isinstance(obj, str):
+        for old, new in subs.items():
+            obj = obj.replace(old, new)
+        return obj
+    if isinstance(obj, dict):
+        return {k: _render(v, subs) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_render(v, subs) for v in obj]
+    return obj
+
+
+# -------- stats --------
+
+class _Endpoint:
+    def __init__(self):
+        self.latency: List[float] = []
+        self.delay: List[float] = []
+        self.statuses: Counter = Counter()
+
+    def add(self, status: Optional[int], ms: float, delay_ms: float = 0.0) -> None:
+        self.statuses["error" if status is None else str(status)] += 1
+        self.latency.append(ms)
+        self.delay.append(delay_ms)
+
+    def report(self) -> Dict[str, Any]:
+        from app.lib.timings import percentiles
+
+        n = sum(self.statuses.values())
+        errors = sum(c for s, c in self.statuses.items() if s == "error" or int(s) >= 500)
+        client_errors = sum(c for s, c in self.statuses.items() if s != "error" and 400 <= int(s) < 500)
+        return {
+            "count": n,
+            "errors": errors,
+            "client_errors": client_errors,
+            "error_rate": round(errors / n, 4) if n else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+            "latency_ms": percentiles(self.latency),
+            "delay_ms": percentiles(self.delay),
+        }
+
+
+def _template(path: str) -> str:
+    return _REPLAY_ID.sub("{job_id}", path)
+
+
+# -------- /metrics --------
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+async def _scrape(http) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    try:
+        r = await http.get("/metrics")
+    except Exception:
+        return {}
+    if r.status_code != 200:
+        return {}
+    out: Dict[str, List[Tuple[Dict[str, str], float]]] = defaultdict(list)
+    for line in r.text.splitlines():
+        m = _SAMPLE.match(line)
+        if m and not line.startswith("#"):
+            out[m.group(1)].append((dict(_LABEL.findall(m.group(2) or "")), float(m.group(3))))
+    return out
+
+
+def _histograms(before, after, name: str, by: Tuple[str, ...] = ()) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Delta of a histogram between two scrapes, grouped by the `by` labels."""
+    def _fold(scrape, suffix):
+        acc: Dict[Tuple[str, ...], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for labels, v in scrape.get(f"{name}{suffix}", []):
+            key = tuple(labels.get(k, "") for k in by)
+            acc[key][labels.get("le", "")] += v
+        return acc
+
+    out = {}
+    b_buckets, a_buckets = _fold(before, "_bucket"), _fold(after, "_bucket")
+    b_sum, a_sum = _fold(before, "_sum"), _fold(after, "_sum")
+    for key, buckets in a_buckets.items():
+        delta = sorted(
+            ((math.inf if le == "+Inf" else float(le)), v - b_buckets.get(key, {}).get(le, 0.0))
+            for le, v in buckets.items()
+        )
+        count = delta[-1][1] if delta else 0.0
+        if count <= 0:
+            continue
+        total = a_sum[key].get("", 0.0) - b_sum.get(key, {}).get("", 0.0)
+        out[key] = {
+            "count": int(count),
+            "mean_ms": round(total / count * 1000.0, 1),
+            **{f"p{q}_ms": _quantile(delta, q / 100.0) for q in (50, 95, 99)},
+        }
+    return out
+
+
+def _quantile(buckets: List[Tuple[float, float]], q: float) -> Optional[float]:
+    """histogram_quantile(): linear interpolation inside the bucket holding the rank."""
+    total = buckets[-1][1]
+    rank = q * total
+    prev_le, prev_c = 0.0, 0.0
+    for le, c in buckets:
+        if c >= rank:
+            if math.isinf(le):
+                return round(prev_le * 1000.0, 1)  # above the largest finite bound
+            frac = (rank - prev_c) / (c - prev_c) if c > prev_c else 1.0
+            return round((prev_le + (le - prev_le) * frac) * 1000.0, 1)
+        prev_le, prev_c = le, c
+    return None
+
+
+def _in_flight(scrape) -> float:
+    return sum(v for _, v in scrape.get("http_requests_in_flight", []))
+
+
+# -------- one step --------
+
+async def _step(http, lines: List[Dict[str, Any]], *, step: int, run: str, concurrency: int, speed: float,
+                tasks: Optional[standins.FakeTasks], bucket: str, timeout: float, settle: float = 0.0) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    endpoints: Dict[str, _Endpoint] = defaultdict(_Endpoint)
+    worker_calls: Dict[str, _Endpoint] = defaultdict(_Endpoint)
+    if tasks is not None:
+        tasks.on_delivered = lambda path, status, ms: worker_calls[f"TASK {_template(path)}"].add(status, ms)
+
+    # sessions get fresh job ids, so steps and reruns never share state
+    sessions: Dict[str, List[Tuple[Dict[str, Any], Any]]] = defaultdict(list)
+    for i, line in enumerate(lines):
+        body = _body(line)
+        sessions[_session_key(i, line, body)].append((line, body))
+
+    sem = asyncio.Semaphore(concurrency)
+    before = await _scrape(http)
+    t0 = loop.time()
+
+    async def _session(n: int, key: str, items) -> None:
+        job_id = f"replay-{run}-{step}-{n}"
+        # every job id recorded in the session's bodies becomes this run's id
+        recorded = {b["job_id"] for _, b in items if isinstance(b, dict) and isinstance(b.get("job_id"), str)}
+        recorded.discard("{job_id}")
+        as_template = {old: "{job_id}" for old in recorded}
+        subs = {"{job_id}": job_id, "{bucket}": bucket, **{old: job_id for old in recorded}}
+        for line, body in items:
+            due = t0 + line["t"] / speed if speed > 0 else loop.time()
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            method = (line.get("method") or ("POST" if body is not None else "GET")).upper()
+            path = _render(line["path"], subs)
+            name = f"{method} {_render(line['path'], as_template)}"
+            async with sem:
+                sent = loop.time()
+                try:
+                    kw = {"json": _render(body, subs)} if body is not None else {}
+                    r = await asyncio.wait_for(http.request(method, path, **kw), timeout)
+                    status: Optional[int] = r.status_code
+                except Exception:
+                    status = None
+                endpoints[name].add(status, (loop.time() - sent) * 1000.0, (sent - due) * 1000.0)
+
+    await asyncio.gather(*(_session(n, k, items) for n, (k, items) in enumerate(sessions.items())))
+    requests_done = loop.time() - t0
+
+    # let fire-and-forget work (Cloud Tasks workers) finish before the final scrape
+    if tasks is not None:
+        await tasks.drain(timeout)
+    else:
+        idle = 0
+        while idle < 2 and loop.time() - t0 < timeout:
+            await asyncio.sleep(1.0)
+            idle = idle + 1 if _in_flight(await _scrape(http)) <= 1 else 0  # 1 = the scrape itself
+        await asyncio.sleep(settle)  # other workers' metric snapshots lag by up to METRICS_FLUSH_SECONDS
+    wall = loop.time() - t0
+    after = await _scrape(http)
+
+    n = sum(sum(e.statuses.values()) for e in endpoints.values())
+    errors = sum(e.report()["errors"] for e in endpoints.values())
+    lag = _histograms(before, after, "event_loop_lag_seconds").get(())
+    routes = _histograms(before, after, "http_request_duration_seconds", ("method", "route"))
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "requests_s": round(requests_done, 2),
+        "wall_s": round(wall, 2),
+        "rps": round(n / requests_done, 2) if requests_done > 0 else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / n, 4) if n else 0.0,
+        "endpoints": {k: e.report() for k, e in sorted(endpoints.items())},
+        "tasks": {k: e.report() for k, e in sorted(worker_calls.items())},
+        "loop_lag": lag,
+        "server_routes": {f"{m} {r}": v for (m, r), v in sorted(routes.items()) if r != "/metrics"},
+    }
+
+
+# -------- run --------
+
+async def replay(lines: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    run = uuid.uuid4().hex[:6]
+    steps = [int(c) for c in str(args.concurrency).split(",") if c.strip()]
+    results: List[Dict[str, Any]] = []
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=None) as http:
+            for i, c in enumerate(steps):
+                results.append(await _step(http, lines, step=i, run=run, concurrency=c, speed=args.speed,
+                                           tasks=None, bucket=args.bucket, timeout=args.timeout, settle=args.settle))
+        return results
+
+    from app.config import config
+    from app.lib.paths import data_dir
+    from app.main import app
+
+    gcs_root = tempfile.mkdtemp(prefix="replay-gcs-")
+    model, gcs, tasks = standins.build(args, gcs_root)
+    undo = standins.install_all(model, gcs, tasks)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=None) as http:
+            async def _deliver(path: str, body: bytes, headers: Dict[str, str]):
+                return await http.post(path, content=body, headers=headers)
+
+            tasks.bind(asyncio.get_running_loop(), _deliver)
+            for i, c in enumerate(steps):
+                results.append(await _step(http, lines, step=i, run=run, concurrency=c, speed=args.speed,
+                                           tasks=tasks, bucket=config.gcs_bucket, timeout=args.timeout))
+    finally:
+        undo()
+        shutil.rmtree(gcs_root, ignore_errors=True)
+        if not args.keep:
+            jobs = os.path.join(data_dir(), "jobs")
+            for name in os.listdir(jobs) if os.path.isdir(jobs) else []:
+                if name.startswith(f"replay-{run}-"):
+                    shutil.rmtree(os.path.join(jobs, name), ignore_errors=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = p.add_argument_group("stream")
+    src.add_argument("--stream", help="recorded JSONL stream (default: synthesize from request_examples)")
+    src.add_argument("--sessions", type=int, default=20, help="synthesized sessions")
+    src.add_argument("--rate", type=float, default=30.0, help="synthesized session arrivals per minute")
+    src.add_argument("--think", type=float, default=2.0, help="mean seconds between a session's requests")
+    src.add_argument("--pages", type=int, help="page_count for synthesized full-script requests")
+    src.add_argument("--record", help="write the stream (as replayed) to this JSONL file")
+    src.add_argument("--dry-run", action="store_true", help="only build/record the stream")
+    run = p.add_argument_group("replay")
+    run.add_argument("--speed", type=float, default=1.0, help="time scale; 0 = as fast as possible")
+    run.add_argument("--concurrency", default="80", help="max in-flight requests, comma list = ramp steps")
+    run.add_argument("--url", help="replay against this server instead of in-process")
+    run.add_argument("--bucket", default=os.getenv("GCS_BUCKET", standins.BENCH_ENV["GCS_BUCKET"]),
+                     help="bucket used in {bucket} placeholders with --url")
+    run.add_argument("--timeout", type=float, default=3600.0, help="per request / drain timeout, seconds")
+    run.add_argument("--settle", type=float, default=2.0,
+                     help="with --url: wait this long after the server goes idle before the last /metrics scrape")
+    run.add_argument("--keep", action="store_true", help="keep replay job dirs under app/output")
+    run.add_argument("--quick", action="store_true", help="zero stand-in latency, small images")
+    run.add_argument("--out", help="also write the JSON report here")
+    standins.add_arguments(p)
+    args = p.parse_args(argv)
+    if args.quick:
+        standins.zero_latency(args)
+
+    if args.stream:
+        lines, skipped = load_stream(args.stream)
+        source: Dict[str, Any] = {"stream": args.stream}
+    else:
+        lines, skipped = synthesize(args.sessions, args.rate, args.think, args.seed, args.pages), 0
+        source = {"synthesized": {"sessions": args.sessions, "rate_per_min": args.rate, "think_s": args.think}}
+    source.update(lines=len(lines), skipped=skipped)
+
+    if args.record:
+        with open(args.record, "w") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    if args.dry_run:
+        print(json.dumps({"source": source}, indent=2))
+        return 0
+    if not lines:
+        print(json.dumps({"source": source, "error": "no replayable lines"}, indent=2))
+        return 1
+
+    steps = asyncio.run(replay(lines, args))
+    report = {
+        "source": source,
+        "target": args.url or "in-process",
+        "speed": args.speed,
+        "standins": None if args.url else {k: getattr(args, k) for k in standins.DEFAULTS},
+        "steps": steps,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    standins.configure_env()
+    sys.exit(main())
@@ -0,0 +1,46 @@
+# benchmarks/serve.py
+"""
+The app with stand-in backends, as an ASGI module for a real server, so load
+can be replayed against actual uvicorn/gunicorn process and concurrency
+settings:
+
+    gunicorn -c gunicorn_conf.py -w 4 --preload benchmarks.serve:app
+    python -m benchmarks.replay --url http://127.0.0.1:8080
+
+(--preload: gunicorn_conf's hooks import app.config in the master, so this
+module has to be imported before them for its env defaults to apply.)
+
+Workers share one stand-in bucket (BENCH_GCS_ROOT) and Cloud Tasks are posted
+back to BENCH_TASKS_URL (default http://127.0.0.1:$PORT), so any worker may
+run a task, as behind Cloud Run. Stand-in knobs are the benchmarks' CLI
+options as BENCH_* variables: BENCH_IMAGE_LATENCY, BENCH_TEXT_LATENCY,
+BENCH_STORAGE_LATENCY, BENCH_QUEUE_LATENCY, BENCH_IMAGE_KB, BENCH_TEXT_CHARS,
+BENCH_MODEL_FAILURE_RATE, BENCH_STORAGE_FAILURE_RATE, BENCH_SEED.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import types
+
+from benchmarks import standins
+
+standins.configure_env()
+
+from app.main import app  # noqa: E402  (env first)
+
+
+def _options() -> types.SimpleNamespace:
+    opts = {k: type(v)(os.getenv(f"BENCH_{k.upper()}", v)) for k, v in standins.DEFAULTS.items()}
+    opts["seed"] += os.getpid()  # workers draw different latencies/failures
+    return types.SimpleNamespace(**opts)
+
+
+_model, _gcs, _tasks = standins.build(
+    _options(),
+    os.getenv("BENCH_GCS_ROOT", os.path.join(tempfile.gettempdir(), "bench-gcs")),
+    base_url=os.getenv("BENCH_TASKS_URL", f"http://127.0.0.1:{os.getenv('PORT', '8080')}"),
+)
+standins.install_all(_model, _gcs, _tasks)
+
+__all__ = ["app"]
@@ -0,0 +1,687 @@
+# benchmarks/standins.py
+"""
+Local stand-ins for everything the app talks to over the network, so the real
+routers can be driven offline:
+
+  - FakeModel   replaces client.images.generate / images.edit /
+                chat.completions.create with schema-shaped responses
+  - FakeGCS     a google.cloud.storage look-alike on a local directory
+                (generations, if_generation_match, copy, list, delete)
+  - FakeTasks   a Cloud Tasks client that delivers each task straight to the
+                app (in-process, or over HTTP to a server)
+
+Each takes a latency distribution and a failure rate and counts calls and
+bytes. install() patches the app and returns a function that undoes it.
+
+Latency specs (milliseconds): "fixed:50", "uniform:20:80",
+"lognormal:400:0.5" (median, sigma).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import fcntl
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import types
+from contextlib import contextmanager, nullcontext
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# -------- env (must run before app is imported) --------
+
+BENCH_ENV = {
+    "OPENAI_API_KEY": "standin",
+    "GCS_BUCKET": "bench-bucket",
+    "BASE_URL": "http://bench",
+    "LLM_CACHE": "false",
+    "RAW_ARCHIVE": "false",
+    "TRACE_EXPORTER": "none",
+    "TEXT_RPM": "0",
+    "LOG_LEVEL": "WARNING",
+    "METRICS_FLUSH_SECONDS": "1",
+    "METRICS_DIR": os.path.join(tempfile.gettempdir(), "bench-metrics"),
+}
+
+
+def configure_env(overrides: Optional[Dict[str, str]] = None) -> None:
+    """Offline defaults; anything already in the environment wins, `overrides` win over both."""
+    for k, v in BENCH_ENV.items():
+        os.environ.setdefault(k, v)
+    os.environ.update(overrides or {})
+
+
+# -------- shared CLI options --------
+
+# roughly production: gpt-image-1 edits take seconds, chat calls ~1-2 s
+DEFAULTS = {
+    "image_latency": "lognormal:6000:0.35",
+    "text_latency": "lognormal:1500:0.4",
+    "storage_latency": "uniform:20:80",
+    "queue_latency": "fixed:50",
+    "image_kb": 256,
+    "text_chars": 200,
+    "model_failure_rate": 0.0,
+    "storage_failure_rate": 0.0,
+    "seed": 0,
+}
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    g = p.add_argument_group("stand-ins")
+    g.add_argument("--image-latency", default=DEFAULTS["image_latency"], help="image call latency spec (ms)")
+    g.add_argument("--text-latency", default=DEFAULTS["text_latency"], help="chat call latency spec (ms)")
+    g.add_argument("--storage-latency", default=DEFAULTS["storage_latency"], help="per storage op latency spec (ms)")
+    g.add_argument("--queue-latency", default=DEFAULTS["queue_latency"], help="Cloud Tasks dispatch delay spec (ms)")
+    g.add_argument("--image-kb", type=int, default=DEFAULTS["image_kb"], help="size of each generated image")
+    g.add_argument("--text-chars", type=int, default=DEFAULTS["text_chars"], help="prose per panel description")
+    g.add_argument("--model-failure-rate", type=float, default=DEFAULTS["model_failure_rate"])
+    g.add_argument("--storage-failure-rate", type=float, default=DEFAULTS["storage_failure_rate"])
+    g.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+
+
+def zero_latency(args: argparse.Namespace) -> None:
+    """Smoke-run settings: no injected latency, small images."""
+    args.image_latency = args.text_latency = args.storage_latency = args.queue_latency = "fixed:0"
+    args.image_kb = 16
+
+
+def build(args: Any, gcs_root: str, **tasks_kw: Any) -> Tuple["FakeModel", "FakeGCS", "FakeTasks"]:
+    """Stand-ins configured from add_arguments() options (any object with those attributes)."""
+    model = FakeModel(
+        image_latency=args.image_latency, text_latency=args.text_latency, image_kb=args.image_kb,
+        text_chars=args.text_chars, failure_rate=args.model_failure_rate, seed=args.seed,
+    )
+    gcs = FakeGCS(gcs_root, latency=args.storage_latency, failure_rate=args.storage_failure_rate, seed=args.seed)
+    tasks = FakeTasks(latency=args.queue_latency, seed=args.seed, **tasks_kw)
+    return model, gcs, tasks
+
+
+# -------- latency / faults / counters --------
+
+class Latency:
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        if kind not in ("fixed", "uniform", "lognormal") or len(self.args) != {"fixed": 1, "uniform": 2, "lognormal": 2}[kind]:
+            raise ValueError(f"bad latency spec {spec!r}")
+        self.rng = rng or random.Random()
+
+    def sample_ms(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.args)
+        median, sigma = self.args
+        return self.rng.lognormvariate(math.log(max(median, 1e-3)), sigma)
+
+    def sleep(self) -> None:
+        ms = self.sample_ms()
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    async def asleep(self) -> None:
+        ms = self.sample_ms()
+        if ms > 0:
+            await asyncio.sleep(ms / 1000.0)
+
+
+class StandInError(RuntimeError):
+    """Injected failure (looks like a transient 5xx to the app)."""
+
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, float] = {}
+
+    def add(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self.values.items()))
+
+
+def _patch(obj: Any, name: str, value: Any, undo: List[Callable[[], None]]) -> None:
+    old = getattr(obj, name)
+    setattr(obj, name, value)
+    undo.append(lambda: setattr(obj, name, old))
+
+
+def _undo_all(undo: List[Callable[[], None]]) -> Callable[[], None]:
+    def _run():
+        for fn in reversed(undo):
+            fn()
+    return _run
+
+
+# -------- model --------
+
+_CAST = {
+    "characters": ["char_main", "char_rival", "char_coach"],
+    "locations": ["loc_city_rooftop", "loc_training_hangar"],
+    "props": ["prop_wingsuit", "prop_trophy"],
+}
+
+
+def _noise_png(kb: int, seed: int) -> bytes:
+    """PNG of about `kb` KB (random pixels barely compress), decodable by PIL."""
+    from PIL import Image
+
+    side = max(8, int(math.sqrt(kb * 1024 / 3)))
+    rng = random.Random(seed)
+    img = Image.frombytes("RGB", (side, side), bytes(rng.getrandbits(8) for _ in range(side * side * 3)))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+class FakeModel:
+    """
+    OpenAI client stand-in. Images are distinct noise PNGs of `image_kb`;
+    chat answers are shaped after the caller's schema / system prompt, with
+    roughly `text_chars` of prose per panel.
+    """
+
+    def __init__(
+        self,
+        *,
+        image_latency: str = "fixed:0",
+        text_latency: str = "fixed:0",
+        image_kb: int = 64,
+        text_chars: int = 200,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.rng = random.Random(seed)
+        self.image_latency = Latency(image_latency, random.Random(seed + 1))
+        self.text_latency = Latency(text_latency, random.Random(seed + 2))
+        self.text_chars = text_chars
+        self.failure_rate = failure_rate
+        self.counters = Counters()
+        self._images = [base64.b64encode(_noise_png(image_kb, seed + i)).decode("ascii") for i in range(8)]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    # -------- calls --------
+
+    def _maybe_fail(self, kind: str) -> None:
+        with self._lock:
+            failed = self.rng.random() < self.failure_rate
+        if failed:
+            self.counters.add(f"{kind}.failures")
+            raise StandInError(f"stand-in {kind} failure (HTTP 503)")
+
+    def _image_response(self, n: int) -> Any:
+        with self._lock:
+            picks = [self._images[(self._next + i) % len(self._images)] for i in range(n)]
+            self._next += n
+        self.counters.add("bytes_out", sum(len(b) for b in picks))
+        return types.SimpleNamespace(
+            data=[types.SimpleNamespace(b64_json=b) for b in picks],
+            usage=types.SimpleNamespace(input_tokens=300, output_tokens=1056 * n, total_tokens=300 + 1056 * n),
+        )
+
+    def images_generate(self, *, prompt: str = "", n: int = 1, **_: Any) -> Any:
+        self.counters.add("images.generate")
+        self.counters.add("bytes_in", len(prompt))
+        self.image_latency.sleep()
+        self._maybe_fail("images.generate")
+        return self._image_response(n)
+
+    def images_edit(self, *, prompt: str = "", image: Any = None, n: int = 1, **_: Any) -> Any:
+        self.counters.add("images.edit")
+        sent = len(prompt)
+        for f in image if isinstance(image, (list, tuple)) else [image]:
+            try:
+                sent += os.fstat(f.fileno()).st_size
+            except (AttributeError, OSError, ValueError):
+                pass
+        self.counters.add("bytes_in", sent)
+        self.image_latency.sleep()
+        self._maybe_fail("images.edit")
+        return self._image_response(n)
+
+    def chat_create(self, *, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any) -> Any:
+        self.counters.add("chat")
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        self.counters.add("bytes_in", prompt_chars)
+        self.text_latency.sleep()
+        self._maybe_fail("chat")
+        content = self.chat_content(messages, kwargs.get("response_format"))
+        self.counters.add("bytes_out", len(content))
+        usage = types.SimpleNamespace(
+            prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4,
+            total_tokens=prompt_chars // 4 + len(content) // 4,
+        )
+        if stream:
+            return self._stream(content, usage)
+        msg = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=msg)], usage=usage)
+
+    def _stream(self, content: str, usage: Any):
+        for i in range(0, len(content), 64):
+            delta = types.SimpleNamespace(content=content[i:i + 64])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=usage)
+
+    # -------- content --------
+
+    def _prose(self, what: str) -> str:
+        words = f"{what} in a bright cartoon style with dramatic lighting and clear staging".split()
+        out: List[str] = []
+        while len(" ".join(out)) < self.text_chars:
+            out.extend(words)
+        return " ".join(out)[: max(self.text_chars, len(what))]
+
+    def chat_content(self, messages: List[Dict[str, str]], response_format: Optional[dict]) -> str:
+        system = messages[0].get("content") or ""
+        user = messages[-1].get("content") or ""
+        schema_name = ((response_format or {}).get("json_schema") or {}).get("name")
+
+        if schema_name == "ScriptOutline":
+            n = _int(r"pages: exactly (\d+)", user, 4)
+            return json.dumps({"pages": [self._outline_page(p) for p in range(1, n + 1)]})
+        if schema_name or "'pages'" in system:
+            m = re.search(r"Write ONLY pages (\d+)\D+(\d+) of", user)
+            start, end = (int(m.group(1)), int(m.group(2))) if m else (1, _int(r"pages: exactly (\d+)", user, 4))
+            panels = _int(r"within \[(\d+),", user, 4)
+            return json.dumps({
+                "pages": [self._page(p, panels) for p in range(start, end + 1)],
+                "lookbook_delta": {"characters_to_add": [], "locations_to_add": [], "props_to_add": []},
+            })
+        if "JSON array of three objects" in system:
+            return json.dumps([{"title": f"Idea {i}", "synopsis": self._prose(f"Pitch {i}")} for i in (1, 2, 3)])
+        if "cover_entities" in system:
+            return json.dumps(self._cover_script())
+        return json.dumps({"ok": True})
+
+    def _outline_page(self, p: int) -> Dict[str, Any]:
+        return {
+            "page_number": p,
+            "beat": self._prose(f"Beat {p}")[:160],
+            "location_id": _CAST["locations"][p % 2],
+            "characters": _CAST["characters"][:2],
+            "props": _CAST["props"][:1],
+        }
+
+    def _page(self, p: int, panels: int) -> Dict[str, Any]:
+        loc = _CAST["locations"][p % 2]
+        return {
+            "page_number": p,
+            "location_id": loc,
+            "characters": _CAST["characters"][:2],
+            "props": [],
+            "panels": [
+                {
+                    "panel_number": i,
+                    "art_description": self._prose(f"Page {p} panel {i}: the hero leaps"),
+                    "dialogue": "Main: 'See you later, chump!'",
+                    "narration": "",
+                    "sfx": "WHOOSH",
+                    "characters": _CAST["characters"][: 1 + i % 3],
+                    "props": _CAST["props"][:1] if i % 2 else [],
+                    "location_id": loc,
+                }
+                for i in range(1, panels + 1)
+            ],
+        }
+
+    def _cover_script(self) -> Dict[str, Any]:
+        ids = {"characters": _CAST["characters"][:2], "locations": _CAST["locations"][:1], "props": _CAST["props"][:1]}
+        hints = {"char_main": "Hero", "char_rival": "Rival", "loc_city_rooftop": "City Rooftop", "prop_wingsuit": "Wingsuit"}
+        return {
+            "title": "Stand-in Title",
+            "tagline": "Stand-in tagline",
+            "cover_art_description": self._prose("The hero soars over the city"),
+            "story_summary": self._prose("A story"),
+            "cover_entities": {**ids, "hints": hints, "notes": {}},
+            "seed_request_template": {"initial_ids": ids, "hints": hints},
+        }
+
+    def install(self) -> Callable[[], None]:
+        from app.lib import openai_client
+
+        client = openai_client.client
+        undo: List[Callable[[], None]] = []
+        _patch(client.images, "generate", self.images_generate, undo)
+        _patch(client.images, "edit", self.images_edit, undo)
+        _patch(client.chat.completions, "create", self.chat_create, undo)
+        return _undo_all(undo)
+
+
+def _int(pattern: str, text: str, default: int) -> int:
+    m = re.search(pattern, text)
+    return int(m.group(1)) if m else default
+
+
+# -------- storage --------
+
+class FakeGCS:
+    """
+    google.cloud.storage stand-in keeping objects under `root/<bucket>/<name>`
+    and their generation/content type in `root/.meta/<bucket>/<name>.json`.
+    Everything lives on disk (writes serialised by a lock file), so several
+    server processes can share one root the way gunicorn workers share a bucket.
+    """
+
+    def __init__(self, root: str, *, latency: str = "fixed:0", failure_rate: float = 0.0, seed: int = 0):
+        self.root = root
+        self.latency = Latency(latency, random.Random(seed + 3))
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed + 4)
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # -------- plumbing --------
+
+    def _op(self, op: str) -> None:
+        self.counters.add(f"ops.{op}")
+        self.latency.sleep()
+        with self._lock:
+            failed = self.rng.random() < self.failure_rate
+        if failed:
+            from google.api_core.exceptions import ServiceUnavailable
+            self.counters.add("failures")
+            raise ServiceUnavailable(f"stand-in storage failure ({op})")
+
+    def _path(self, bucket: str, name: str) -> str:
+        return os.path.join(self.root, bucket, name)
+
+    def _meta_path(self, bucket: str, name: str) -> str:
+        return os.path.join(self.root, ".meta", bucket, f"{name}.json")
+
+    def meta(self, bucket: str, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(bucket, name), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(os.path.join(self.root, ".lock"), "a") as lockf:
+            fcntl.flock(lockf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockf, fcntl.LOCK_UN)
+
+    def _store(self, bucket: str, name: str, data_from: Callable[[str], None], content_type: Optional[str],
+               if_generation_match: Optional[int]) -> int:
+        from google.api_core.exceptions import PreconditionFailed
+
+        path, meta_path = self._path(bucket, name), self._meta_path(bucket, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with self._write_lock():
+            cur = self.meta(bucket, name)
+            if if_generation_match is not None and (cur["generation"] if cur else 0) != if_generation_match:
+                raise PreconditionFailed(f"stand-in: generation mismatch for {name}")
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            data_from(tmp)
+            os.replace(tmp, path)
+            generation = max(time.time_ns() // 1000, (cur["generation"] + 1) if cur else 0)
+            with open(f"{meta_path}.part", "w") as f:
+                json.dump({"generation": generation, "content_type": content_type}, f)
+            os.replace(f"{meta_path}.part", meta_path)
+            return generation
+
+    def _remove(self, bucket: str, name: str) -> None:
+        with self._write_lock():
+            for path in (self._meta_path(bucket, name), self._path(bucket, name)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _names(self, bucket: str, prefix: str) -> List[str]:
+        base = os.path.join(self.root, ".meta", bucket)
+        out: List[str] = []
+        for dirpath, _, files in os.walk(base):
+            for f in files:
+                if f.endswith(".json"):
+                    name = os.path.relpath(os.path.join(dirpath, f), base)[: -len(".json")]
+                    if name.startswith(prefix):
+                        out.append(name)
+        return sorted(out)
+
+    def client(self) -> "_Client":
+        return _Client(self)
+
+    def install(self) -> Callable[[], None]:
+        from app.lib import gcs_inventory
+
+        undo: List[Callable[[], None]] = []
+        client = self.client()
+        _patch(gcs_inventory, "_storage", client, undo)
+        _patch(gcs_inventory, "_signing_creds", lambda: None, undo)
+        _patch(gcs_inventory.storage, "Client", lambda *a, **k: client, undo)
+        return _undo_all(undo)
+
+
+class _Client:
+    def __init__(self, gcs: FakeGCS):
+        self.gcs = gcs
+
+    def bucket(self, name: str) -> "_Bucket":
+        return _Bucket(self.gcs, name)
+
+    def batch(self):
+        return nullcontext()
+
+
+def _not_found(name: str) -> Exception:
+    from google.api_core.exceptions import NotFound
+    return NotFound(f"stand-in: no such object {name}")
+
+
+class _Bucket:
+    def __init__(self, gcs: FakeGCS, name: str):
+        self.gcs = gcs
+        self.name = name
+
+    def blob(self, name: str, generation: Optional[int] = None) -> "_Blob":
+        return _Blob(self, name, generation)
+
+    def get_blob(self, name: str) -> Optional["_Blob"]:
+        self.gcs._op("stat")
+        meta = self.gcs.meta(self.name, name)
+        if meta is None:
+            return None
+        blob = _Blob(self, name, meta["generation"])
+        blob.content_type = meta["content_type"]
+        return blob
+
+    def copy_blob(self, blob: "_Blob", dest: "_Bucket", new_name: str) -> "_Blob":
+        self.gcs._op("copy")
+        meta = self.gcs.meta(self.name, blob.name)
+        if meta is None:
+            raise _not_found(blob.name)
+        src = self.gcs._path(self.name, blob.name)
+        gen = dest.gcs._store(dest.name, new_name, lambda tmp: shutil.copyfile(src, tmp), meta["content_type"], None)
+        out = _Blob(dest, new_name, gen)
+        out.content_type = meta["content_type"]
+        return out
+
+    def list_blobs(self, prefix: str = "") -> List["_Blob"]:
+        self.gcs._op("list")
+        return [_Blob(self, n) for n in self.gcs._names(self.name, prefix)]
+
+
+class _Blob:
+    def __init__(self, bucket: _Bucket, name: str, generation: Optional[int] = None):
+        self.bucket = bucket
+        self.name = name
+        self.generation = generation
+        self.content_type: Optional[str] = None
+        self.cache_control: Optional[str] = None
+
+    @property
+    def _gcs(self) -> FakeGCS:
+        return self.bucket.gcs
+
+    def upload_from_filename(self, filename: str, content_type: Optional[str] = None, **_: Any) -> None:
+        self._gcs._op("upload")
+        self._gcs.counters.add("bytes_up", os.path.getsize(filename))
+        self.generation = self._gcs._store(
+            self.bucket.name, self.name, lambda tmp: shutil.copyfile(filename, tmp), content_type, None,
+        )
+
+    def upload_from_file(self, fileobj: Any, size: Optional[int] = None, content_type: Optional[str] = None,
+                         if_generation_match: Optional[int] = None, **_: Any) -> None:
+        self._gcs._op("upload")
+        data = fileobj.read()
+        self._gcs.counters.add("bytes_up", len(data))
+
+        def _write(tmp: str) -> None:
+            with open(tmp, "wb") as f:
+                f.write(data)
+
+        self.generation = self._gcs._store(self.bucket.name, self.name, _write, content_type, if_generation_match)
+
+    def download_to_filename(self, filename: str, **_: Any) -> None:
+        self._gcs._op("download")
+        if self._gcs.meta(self.bucket.name, self.name) is None:
+            raise _not_found(self.name)
+        try:
+            shutil.copyfile(self._gcs._path(self.bucket.name, self.name), filename)
+        except FileNotFoundError:  # deleted in between
+            raise _not_found(self.name)
+        self._gcs.counters.add("bytes_down", os.path.getsize(filename))
+
+    def generate_signed_url(self, **_: Any) -> str:
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}?X-Goog-Signature=standin"
+
+    def delete(self) -> None:
+        self._gcs._op("delete")
+        self._gcs._remove(self.bucket.name, self.name)
+
+
+# -------- Cloud Tasks --------
+
+Dispatch = Callable[[str, bytes, Dict[str, str]], Awaitable[Any]]
+
+
+class FakeTasks:
+    """
+    CloudTasksClient stand-in. create_task() delivers the task's HTTP request
+    after the queue latency, either
+
+      - in-process: on `loop` through `dispatch(path, body, headers)` (e.g. an
+        httpx client on the app's ASGI transport), see bind(); or
+      - over HTTP to `base_url` from a small thread pool, when the app runs
+        as separate server processes (any worker may pick the task up).
+
+    wait(path) / drain() resolve with the worker's status codes;
+    on_delivered(path, status, ms) is called after every delivery.
+    """
+
+    def __init__(self, *, latency: str = "fixed:0", seed: int = 0, base_url: Optional[str] = None,
+                 on_delivered: Optional[Callable[[str, int, float], None]] = None):
+        self.latency = Latency(latency, random.Random(seed + 5))
+        self.counters = Counters()
+        self.base_url = base_url
+        self.on_delivered = on_delivered
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dispatch: Optional[Dispatch] = None
+        self._futures: Dict[str, Any] = {}
+        self._pool = None
+        self._lock = threading.Lock()
+        self._n = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop, dispatch: Dispatch) -> None:
+        self.loop, self.dispatch = loop, dispatch
+
+    def queue_path(self, project: str, location: str, queue: str) -> str:
+        return f"projects/{project}/locations/{location}/queues/{queue}"
+
+    def create_task(self, parent: str, task: Dict[str, Any]) -> Any:
+        req = task["http_request"]
+        path = urlparse(req["url"]).path
+        body, headers = req["body"], dict(req.get("headers") or {})
+        if self.base_url:
+            fut = self._executor().submit(self._deliver_http, path, body, headers)
+        elif self.loop is not None and self.dispatch is not None:
+            fut = asyncio.run_coroutine_threadsafe(self._deliver(path, body, headers), self.loop)
+        else:
+            raise RuntimeError("FakeTasks has neither a base_url nor a bound event loop")
+        self.counters.add("created")
+        with self._lock:
+            self._futures[path] = fut
+            self._n += 1
+            return types.SimpleNamespace(name=f"{parent}/tasks/standin-{self._n}")
+
+    def delete_task(self, name: str) -> None:
+        self.counters.add("deleted")
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="standin-tasks")
+            return self._pool
+
+    def _delivered(self, path: str, status: int, t0: float) -> int:
+        self.counters.add(f"status.{status}")
+        if self.on_delivered is not None:
+            self.on_delivered(path, status, (time.perf_counter() - t0) * 1000.0)
+        return status
+
+    async def _deliver(self, path: str, body: bytes, headers: Dict[str, str]) -> int:
+        await self.latency.asleep()
+        t0 = time.perf_counter()
+        resp = await self.dispatch(path, body, headers)
+        return self._delivered(path, resp.status_code, t0)
+
+    def _deliver_http(self, path: str, body: bytes, headers: Dict[str, str]) -> int:
+        import httpx
+
+        self.latency.sleep()
+        t0 = time.perf_counter()
+        try:
+            status = httpx.post(f"{self.base_url}{path}", content=body, headers=headers, timeout=None).status_code
+        except httpx.HTTPError:
+            status = 599
+        return self._delivered(path, status, t0)
+
+    async def wait(self, path: str, timeout: Optional[float] = None) -> int:
+        fut = self._futures.get(path)
+        if fut is None:
+            raise KeyError(f"no task was created for {path}")
+        return await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for every task created so far (and any they create in turn)."""
+        while True:
+            with self._lock:
+                pending = [f for f in self._futures.values() if not f.done()]
+            if not pending:
+                return
+            await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True), timeout)
+
+    def install(self) -> Callable[[], None]:
+        from app.lib import cloud_tasks
+
+        undo: List[Callable[[], None]] = []
+        _patch(cloud_tasks.tasks_v2, "CloudTasksClient", lambda *a, **k: self, undo)
+        return _undo_all(undo)
+
+
+def install_all(*parts: Any) -> Callable[[], None]:
+    undo = [p.install() for p in parts]
+    return _undo_all(undo)
@@ -0,0 +1,166 @@
+# benchmarks/startup.py
+"""
+Cold-start benchmark: time from spawning the server to its first response.
+
+Starts `python -m uvicorn app.main:app` on a free port, polls GET --path until
+it answers (any status below 500) and kills it; repeated --runs times per
+variant. Variants:
+
+    lazy        this tree as deployed (SDKs imported on first use)
+    preload     this tree with PRELOAD_SDKS=1 (SDKs imported in the lifespan,
+                i.e. what every cold start paid before they were lazy)
+    ref:<REF>   another commit, checked out into a temporary git worktree
+                (--ref HEAD~1 compares against the tree before a change)
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --ref HEAD~1 --out startup.json
+
+No backend is contacted: the app only needs to boot and route. Each run also
+reports the app's own "startup: ready" profile (app/lib/startup.py) when the
+variant logs one.
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+from benchmarks import standins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_READY_RE = re.compile(r"startup: ready (\{.*\})")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1.0) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def _env(extra: Dict[str, str]) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k != "PRELOAD_SDKS"}
+    env.update({**standins.BENCH_ENV, "LOG_LEVEL": "INFO", "PYTHONDONTWRITEBYTECODE": "1"})
+    env.update(extra)
+    return env
+
+
+def time_to_first_response(cwd: str, env: Dict[str, str], path: str, timeout: float) -> Dict[str, Any]:
+    """Spawn one server, wait for its first answer on `path`, stop it."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    with tempfile.TemporaryFile("w+") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT, text=True)
+        status = None
+        try:
+            while time.perf_counter() - t0 < timeout and proc.poll() is None:
+                status = _get(f"http://127.0.0.1:{port}{path}")
+                if status is not None and status < 500:
+                    break
+                time.sleep(0.005)
+            ttfr = time.perf_counter() - t0
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        log.seek(0)
+        output = log.read()
+
+    out: Dict[str, Any] = {"status": status}
+    if status is None or status >= 500:
+        out["error"] = output.strip()[-1000:] or f"no response within {timeout}s"
+        return out
+    out["ttfr_ms"] = round(ttfr * 1000.0, 1)
+    m = _READY_RE.search(output)
+    if m:
+        try:
+            out["app"] = ast.literal_eval(m.group(1))
+        except (ValueError, SyntaxError):
+            pass
+    return out
+
+
+def _summary(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = sorted(r["ttfr_ms"] for r in runs if "ttfr_ms" in r)
+    out: Dict[str, Any] = {"runs": len(runs), "ok": len(ok)}
+    if ok:
+        out.update({"min_ms": ok[0], "median_ms": ok[len(ok) // 2], "max_ms": ok[-1]})
+    apps = [r["app"] for r in runs if "app" in r]
+    if apps:
+        out["app_since_import_ms"] = sorted(a["since_import_ms"] for a in apps)[len(apps) // 2]
+        out["heavy_loaded"] = apps[-1].get("heavy_loaded")
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        out["error"] = errors[0]
+    return out
+
+
+def _worktree(ref: str) -> str:
+    path = tempfile.mkdtemp(prefix="bench-startup-")
+    subprocess.run(["git", "worktree", "add", "--detach", path, ref], cwd=ROOT, check=True, capture_output=True)
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--runs", type=int, default=5, help="servers started per variant")
+    p.add_argument("--path", default="/docs", help="route polled for the first response")
+    p.add_argument("--ref", action="append", default=[], help="also time this git ref (repeatable)")
+    p.add_argument("--timeout", type=float, default=60.0, help="per server start, seconds")
+    p.add_argument("--out", help="also write the JSON report here")
+    args = p.parse_args(argv)
+
+    variants = [("lazy", ROOT, {}), ("preload", ROOT, {"PRELOAD_SDKS": "1"})]
+    trees: List[str] = []
+    try:
+        for ref in args.ref:
+            trees.append(_worktree(ref))
+            variants.append((f"ref:{ref}", trees[-1], {}))
+
+        report: Dict[str, Any] = {"path": args.path, "variants": {}}
+        for name, cwd, extra in variants:
+            print(f"[startup] {name} x{args.runs} ...", file=sys.stderr, flush=True)
+            env = _env(extra)
+            # the first start of a tree warms the page cache; not counted
+            time_to_first_response(cwd, env, args.path, args.timeout)
+            runs = [time_to_first_response(cwd, env, args.path, args.timeout) for _ in range(args.runs)]
+            report["variants"][name] = _summary(runs)
+    finally:
+        for tree in trees:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=ROOT, capture_output=True)
+            shutil.rmtree(tree, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
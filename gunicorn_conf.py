@@ -18,3 +18,14 @@ max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "100"))
 accesslog = "-"
 errorlog = "-"
 loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+# /metrics merges per-worker snapshots from METRICS_DIR (see app/lib/metrics.py)
+def on_starting(server):
+    from app.lib import metrics
+    metrics.reset_dir()
+
+
+def child_exit(server, worker):
+    from app.lib import metrics
+    metrics.mark_process_dead(worker.pid)
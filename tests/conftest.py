@@ -2,6 +2,7 @@
 import io
 import json
 import base64
+import dataclasses
 import types
 import pytest
 from fastapi.testclient import TestClient
@@ -104,3 +105,37 @@ def mock_openai(monkeypatch):
     monkeypatch.setattr(openai_client.client.images, "generate", _fake_images_generate)
     monkeypatch.setattr(openai_client.client.chat.completions, "create", _fake_chat_create)
     yield
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path, monkeypatch):
+    """
+    Per-test LLM cache: the disk tier under tmp_path and an empty memory tier,
+    so no test replays a completion another test (or an earlier run) stored.
+    """
+    from app.lib import llm_cache
+    monkeypatch.setattr(llm_cache, "config", dataclasses.replace(llm_cache.config, base_output_dir=tmp_path))
+    llm_cache.clear()
+    yield llm_cache
+    llm_cache.clear()
+
+@pytest.fixture(autouse=True)
+def no_raw_archive(tmp_path, monkeypatch):
+    """
+    Raw archiving off by default; a test that turns it back on (or reads it
+    through find_records) gets a fresh archive under its tmp_path.
+    """
+    from app.lib import raw_archive
+    monkeypatch.setattr(raw_archive, "config", dataclasses.replace(
+        raw_archive.config, base_output_dir=tmp_path, raw_archive_enabled=False,
+    ))
+    monkeypatch.setattr(raw_archive, "_archive", None)
+    yield
+
+@pytest.fixture(autouse=True)
+def local_lookbook_store(monkeypatch):
+    """
+    Keep the lookbook store on local disk (no GCS generation checks/uploads).
+    """
+    from app.features.lookbook_seed.store import lookbook_store
+    monkeypatch.setattr(lookbook_store, "remote", False)
+    yield lookbook_store
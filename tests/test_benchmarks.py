@@ -0,0 +1,63 @@
+# tests/test_benchmarks.py
+import argparse
+import asyncio
+import math
+
+from benchmarks import e2e, replay, standins
+
+def test_latency_specs():
+    assert standins.Latency("fixed:5").sample_ms() == 5.0
+    assert 10.0 <= standins.Latency("uniform:10:20").sample_ms() <= 20.0
+    assert standins.Latency("lognormal:100:0.3").sample_ms() > 0
+    for bad in ("fixed", "gamma:1:2", "uniform:1"):
+        try:
+            standins.Latency(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+
+def test_e2e_scenario_runs_offline():
+    # keeps the stand-ins honest against the routers they replace
+    args = argparse.Namespace(
+        jobs=2, pages=4, image_latency="fixed:0", text_latency="fixed:0", storage_latency="fixed:0",
+        queue_latency="fixed:0", image_kb=4, text_chars=40, model_failure_rate=0.0,
+        storage_failure_rate=0.0, seed=1, timeout=60.0, keep=False,
+    )
+    report = e2e.run_scenario(args)
+
+    assert (report["jobs_ok"], report["jobs_failed"]) == (2, 0), report["errors"]
+    assert report["page_latency_ms"]["count"] == 8
+    assert report["calls"]["tasks"] == {"created": 4, "status.200": 4}
+    assert report["bytes"]["storage_up"] > 0 and report["bytes"]["model_out"] > 0
+    assert report["peak_rss_mb"] > 0
+
+def test_replay_stream_parsing(tmp_path):
+    stream = tmp_path / "traffic.jsonl"
+    stream.write_text("\n".join([
+        '{"request_id": "user-001", "title": "not traffic"}',
+        '{"ts": 1700000010.5, "method": "POST", "path": "/api/v1/generate/story-ideas", "example": "gen_story_ideas_req.json"}',
+        '{"ts": 1700000010.0, "path": "/api/v1/generate/comic/plan/abc"}',
+        "garbage",
+    ]))
+    lines, skipped = replay.load_stream(str(stream))
+    assert skipped == 2 and [line["t"] for line in lines] == [0.0, 0.5]
+
+    synth = replay.synthesize(sessions=3, rate_per_min=60, think_s=1, seed=1)
+    assert len(synth) == 3 * len(replay.SESSION_FLOW)
+    assert [line["t"] for line in synth] == sorted(line["t"] for line in synth)
+
+    # prometheus-style quantile: rank 2 of 4 falls halfway through the (0.1, 0.2] bucket
+    assert replay._quantile([(0.1, 1), (0.2, 3), (math.inf, 4)], 0.5) == 150.0
+
+def test_replay_in_process_sessions():
+    args = argparse.Namespace(
+        url=None, concurrency="4", speed=0.0, timeout=60.0, keep=False,
+        image_latency="fixed:0", text_latency="fixed:0", storage_latency="fixed:0", queue_latency="fixed:0",
+        image_kb=4, text_chars=40, model_failure_rate=0.0, storage_failure_rate=0.0, seed=2,
+    )
+    steps = asyncio.run(replay.replay(replay.synthesize(sessions=2, rate_per_min=0, think_s=0), args))
+
+    step = steps[0]
+    assert step["requests"] == 2 * len(replay.SESSION_FLOW) and step["errors"] == 0
+    assert step["endpoints"]["POST /api/v1/generate/comic"]["statuses"] == {"202": 2}
+    assert step["tasks"]["TASK /api/v1/tasks/worker/comic/{job_id}"]["statuses"] == {"200": 2}
@@ -0,0 +1,44 @@
+# tests/test_cover_refs.py
+import threading
+import time
+
+from app.features.cover import service as cover
+from app.features.lookbook_seed.schemas import (
+    LookbookCharacter, LookbookDoc, LookbookLocation, LookbookProp, ReferenceAsset,
+)
+from app.lib import assets
+
+def _ra(t, name):
+    return [ReferenceAsset(type=t, gs_uri=f"gs://b/{name}.png")]
+
+def test_cover_refs_are_ranked_capped_and_fetched_concurrently(tmp_path, monkeypatch):
+    lb = LookbookDoc(
+        characters=[
+            LookbookCharacter(id="char_side", display_name="Bo", reference_assets=_ra("portrait", "bo")),
+            LookbookCharacter(id="char_hero", display_name="Ada", role="protagonist", reference_assets=_ra("turnaround", "ada")),
+            LookbookCharacter(id="char_none", display_name="Cy"),
+        ],
+        locations=[LookbookLocation(id="loc_city", name="Neon City", reference_assets=_ra("wide", "city"))],
+        props=[LookbookProp(id="prop_orb", name="Orb", reference_assets=_ra("detail", "orb"))],
+    )
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def fake_resolve(self, ref=None, **kw):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return f"/cache/{ref.gs_uri.rsplit('/', 1)[-1]}"
+
+    monkeypatch.setattr(assets.AssetResolver, "resolve", fake_resolve)
+
+    paths, chars, locs, props = cover._collect_cover_refs(
+        str(tmp_path), lb, description="Ada leaps over the neon city skyline", cap=3
+    )
+    # mentioned first (Ada, Neon City), then the rest by kind; Cy has no asset
+    assert chars == ["Ada", "Bo"] and locs == ["Neon City"] and props == []
+    assert paths == ["/cache/ada.png", "/cache/bo.png", "/cache/city.png"]
+    assert active["max"] > 1
@@ -19,3 +19,21 @@ async def test_generate_cover_script():
     assert res.tagline
     assert res.cover_art_description
     assert res.story_summary
+
+@pytest.mark.asyncio
+async def test_cover_script_reply_failing_the_model_is_not_cached(monkeypatch):
+    import json
+    from app.lib import openai_client
+    from tests.conftest import _MockChatResponse
+
+    calls = []
+    def _create(**kwargs):
+        calls.append(1)
+        return _MockChatResponse(json.dumps({"title": "T", "tagline": "only half a cover"}))
+    monkeypatch.setattr(openai_client.client.chat.completions, "create", _create)
+
+    req = CoverScriptRequest(title="Half", synopsis="s", name="Roey", gender="male", page_count=6, theme="t")
+    for _ in range(2):
+        with pytest.raises(ValueError, match="failed validation"):
+            await generate_cover_script(req)
+    assert len(calls) == 2
@@ -0,0 +1,157 @@
+# tests/test_full_script_service.py
+import dataclasses
+import json
+import os
+import re
+
+import pytest
+
+from app.features.full_script import router as fs_router
+from app.features.full_script import service as fs_service
+from app.features.full_script.schemas import FullScriptRequest
+
+def _panel(n, chars=None):
+    return {
+        "panel_number": n, "art_description": f"Shot {n}", "dialogue": "", "narration": "",
+        "sfx": "", "characters": chars or [], "props": [], "location_id": "",
+    }
+
+def _script_doc(page_count: int) -> dict:
+    return {
+        "pages": [
+            {"page_number": i, "panels": [_panel(1, ["char_main", "char_sidekick"]), _panel(2)],
+             "location_id": "loc_city", "characters": [], "props": []}
+            for i in range(1, page_count + 1)
+        ],
+        "lookbook_delta": {"characters_to_add": [], "locations_to_add": [], "props_to_add": []},
+    }
+
+def _req(page_count: int, job_id=None) -> FullScriptRequest:
+    return FullScriptRequest(
+        job_id=job_id, title="T", tagline="TL", story_summary="S", user_name="Roey",
+        user_gender="male", page_count=page_count, user_theme="Pixar",
+    )
+
+def test_iter_full_script_yields_pages_before_done(monkeypatch):
+    text = json.dumps(_script_doc(3))
+    monkeypatch.setattr(fs_service, "_stream_llm", lambda prompt, max_tokens, **kw: (text[i:i + 11] for i in range(0, len(text), 11)))
+
+    events = list(fs_service.iter_full_script(_req(3)))
+    assert [k for k, _ in events] == ["page", "page", "page", "done"]
+    script = events[-1][1]
+    assert [p.page_number for p in script.pages] == [1, 2, 3]
+    assert {c.id for c in script.lookbook_delta.characters_to_add} == {"char_main", "char_sidekick"}
+
+def test_full_script_stream_endpoint_emits_ndjson(client, monkeypatch):
+    text = json.dumps(_script_doc(2))
+    monkeypatch.setattr(fs_service, "_stream_llm", lambda prompt, max_tokens, **kw: iter([text[:40], text[40:]]))
+    monkeypatch.setattr(fs_router, "upload_json_to_gcs", lambda **kw: {"gs_uri": f"gs://b/{kw['object_name']}"})
+
+    r = client.post("/api/v1/generate/comic/full-script/stream", json=_req(2, job_id="fsstreamjob").model_dump())
+    assert r.status_code == 201
+    lines = [json.loads(ln) for ln in r.text.splitlines() if ln.strip()]
+    assert [ln["event"] for ln in lines] == ["page", "page", "done"]
+    assert lines[-1]["script_gcs"]["gs_uri"] == "gs://b/jobs/fsstreamjob/script.json"
+
+def test_failed_stream_leaves_no_partial_script(client, monkeypatch):
+    from fastapi import HTTPException
+    from app.features.pages.router import _resolve_pages_or_fail
+    from app.lib.paths import job_dir
+
+    text = json.dumps(_script_doc(2))
+    cut = text.index('{"page_number": 2')
+    seen = {}
+
+    def _dying_stream(prompt, max_tokens, **kw):
+        yield text[:cut]
+        # page 1 is on disk, marked partial: the comic worker must not render it
+        with pytest.raises(HTTPException) as e:
+            _resolve_pages_or_fail(job_id="fsbroken", workdir=job_dir("fsbroken"), req_dict={}, request_gcs_uri=None)
+        seen["status"] = e.value.status_code
+        raise RuntimeError("model went away")
+    monkeypatch.setattr(fs_service, "_stream_llm", _dying_stream)
+
+    r = client.post("/api/v1/generate/comic/full-script/stream", json={**_req(2, job_id="fsbroken").model_dump(), "title": "Uncached"})
+    lines = [json.loads(ln) for ln in r.text.splitlines() if ln.strip()]
+    assert [ln["event"] for ln in lines] == ["page", "error"]
+    assert seen["status"] == 409
+    assert not os.path.exists(os.path.join(job_dir("fsbroken"), "script.json"))
+
+@pytest.mark.asyncio
+async def test_schema_invalid_completion_is_not_cached(monkeypatch):
+    replies = iter(['{"pages": [{"page_number": "not a number"}]}', json.dumps(_script_doc(1))])
+    calls = []
+
+    def _create(**kw):
+        calls.append(kw["max_tokens"])
+        msg = type("M", (), {"content": next(replies)})
+        return type("R", (), {"choices": [type("C", (), {"message": msg})], "usage": None})
+    monkeypatch.setattr(fs_service.client.chat.completions, "create", _create)
+
+    prompt = "schema-validated cache check"
+    first = await fs_service._call_llm(prompt, max_tokens=1000)
+    # valid JSON, invalid script: the next identical call must reach the model again
+    second = await fs_service._call_llm(prompt, max_tokens=1000)
+    assert first != second and calls == [1000, 1000]
+    assert await fs_service._call_llm(prompt, max_tokens=1000) == second and len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_generate_full_script_chunks_long_comics(monkeypatch):
+    monkeypatch.setattr(fs_service, "config", dataclasses.replace(fs_service.config, script_chunk_threshold=4, script_chunk_pages=3))
+    calls = []
+
+    async def _fake_call_llm(prompt, max_tokens, short_mode=False, *, schema=None, schema_name="FullScriptPagesResponse", force=False):
+        if schema_name == "ScriptOutline":
+            calls.append("outline")
+            return json.dumps({"pages": [
+                {"page_number": n, "beat": f"beat {n}", "location_id": "loc_city", "characters": ["char_main"], "props": []}
+                for n in range(1, 8)
+            ]})
+        m = re.search(r"Write ONLY pages (\d+)–(\d+)", prompt)
+        start, end = int(m.group(1)), int(m.group(2))
+        calls.append((start, end))
+        doc = _script_doc(end - start + 1)
+        for i, page in enumerate(doc["pages"]):
+            page["page_number"] = start + i
+        return json.dumps(doc)
+
+    monkeypatch.setattr(fs_service, "_call_llm", _fake_call_llm)
+    script = await fs_service.generate_full_script(_req(7))
+
+    assert calls[0] == "outline"
+    assert sorted(calls[1:]) == [(1, 3), (4, 6), (7, 7)]
+    assert [p.page_number for p in script.pages] == list(range(1, 8))
+    assert {c.id for c in script.lookbook_delta.characters_to_add} == {"char_main", "char_sidekick"}
+
+def test_salvage_fixes_mechanical_problems():
+    from app.features.full_script import service_repair as repair
+
+    doc = _script_doc(3)
+    doc["pages"][1]["page_number"] = 1                      # duplicate numbering
+    doc["pages"][0]["panels"][0]["dialogue"] = None          # null text
+    del doc["pages"][2]["panels"][1]["sfx"]                  # missing key
+    raw = "Sure! Here is the script:\n" + json.dumps(doc, indent=1)[:-1] + ",}"  # stray text + trailing comma
+
+    pages = repair.salvage_pages(raw, 1, 3)
+    assert sorted(pages) == [1, 2, 3]
+    assert pages[1].panels[0].dialogue == "" and pages[3].panels[1].sfx == ""
+
+@pytest.mark.asyncio
+async def test_generate_full_script_regenerates_only_missing_pages(monkeypatch):
+    prompts = []
+    full = json.dumps(_script_doc(4))
+    truncated = full[: full.index('{"page_number": 4')]      # page 4 cut off mid-stream
+
+    async def _fake_call_llm(prompt, max_tokens, short_mode=False, *, schema=None, schema_name="FullScriptPagesResponse", force=False):
+        prompts.append(prompt)
+        if len(prompts) == 1:
+            return truncated
+        doc = _script_doc(1)
+        doc["pages"][0]["page_number"] = 4
+        return json.dumps(doc)
+
+    monkeypatch.setattr(fs_service, "_call_llm", _fake_call_llm)
+    script = await fs_service.generate_full_script(_req(4))
+
+    assert [p.page_number for p in script.pages] == [1, 2, 3, 4]
+    assert len(prompts) == 2 and "Write ONLY pages 4–4" in prompts[1]
@@ -0,0 +1,52 @@
+# tests/test_lib_assets.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.lib import gcs_inventory
+from app.lib.assets import AssetResolver, https_to_gs
+
+def _fake_gcs(monkeypatch, generations):
+    downloads = []
+    lock = threading.Lock()
+
+    def fake_download(gs_uri, dest, *, generation=None):
+        time.sleep(0.05)  # long enough for every thread to pile up on the same key
+        with lock:
+            downloads.append((gs_uri, generation))
+        with open(dest, "wb") as f:
+            f.write(b"png")
+
+    monkeypatch.setattr(gcs_inventory, "gcs_object_generation", lambda gs: generations.get(gs))
+    monkeypatch.setattr(gcs_inventory, "download_gcs_object_to_file", fake_download)
+    return downloads
+
+def test_shared_cover_is_downloaded_once(tmp_path, monkeypatch):
+    downloads = _fake_gcs(monkeypatch, {"gs://b/jobs/j/cover.png": 7})
+    res = AssetResolver(str(tmp_path), retries=1)
+    # same object asked for as gs_uri by some entities, as an (expired) signed URL by others
+    refs = [{"gs_uri": "gs://b/jobs/j/cover.png"}] * 5 + [
+        {"url": "https://storage.googleapis.com/b/jobs/j/cover.png?X-Goog-Signature=abc"}
+    ] * 5
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        paths = list(pool.map(res.resolve, refs))
+
+    assert downloads == [("gs://b/jobs/j/cover.png", 7)]
+    assert len(set(paths)) == 1 and open(paths[0], "rb").read() == b"png"
+
+    # a later run reuses the cached file until the object is overwritten
+    assert AssetResolver(str(tmp_path)).resolve("gs://b/jobs/j/cover.png") == paths[0]
+    assert len(downloads) == 1
+    monkeypatch.setattr(gcs_inventory, "gcs_object_generation", lambda gs: 8)
+    assert AssetResolver(str(tmp_path)).resolve("gs://b/jobs/j/cover.png") != paths[0]
+    assert downloads[-1] == ("gs://b/jobs/j/cover.png", 8)
+
+def test_missing_object_and_mapping(tmp_path, monkeypatch):
+    downloads = _fake_gcs(monkeypatch, {})
+    res = AssetResolver(str(tmp_path), retries=1)
+    assert res.resolve({"gs_uri": "gs://b/missing.png"}) is None
+    assert res.resolve({"gs_uri": "gs://b/missing.png"}) is None
+    assert downloads == [] and res.stats["failures"] == 1
+    assert https_to_gs("https://b.storage.googleapis.com/a/x.png?sig=1") == "gs://b/a/x.png"
+    assert https_to_gs("https://example.com/x.png") is None
@@ -0,0 +1,106 @@
+# tests/test_lib_imaging.py
+import os
+
+import httpx
+import openai
+import pytest
+
+from app.lib import imaging
+
+_PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR4nGNgYAAAAAMAASsJTYQAAAAASUVORK5CYII="
+
+def test_b64_cover_ref_is_content_addressed(tmp_path, monkeypatch):
+    first = imaging.resolve_cover_ref_b64_or_gcs(_PNG_B64, job_id="j", workdir=str(tmp_path))
+    assert first and os.path.getsize(first) > 0
+
+    # a retry with the same payload must not decode again
+    def _boom(*a, **kw):
+        raise AssertionError("decoded twice")
+    monkeypatch.setattr(imaging.base64, "b64decode", _boom)
+    again = imaging.resolve_cover_ref_b64_or_gcs(f"data:image/png;base64,{_PNG_B64}", job_id="j", workdir=str(tmp_path))
+    assert again == first
+    assert imaging.maybe_decode_image_to_path(None, str(tmp_path)) is None
+
+def test_gcs_cover_ref_skips_download_when_generation_unchanged(tmp_path, monkeypatch):
+    calls = []
+
+    def _fake_download(gs_uri, dest, *, generation=None):
+        calls.append(generation)
+        with open(dest, "wb") as f:
+            f.write(b"png-bytes")
+
+    monkeypatch.setattr(imaging, "gcs_object_generation", lambda uri: 42)
+    monkeypatch.setattr(imaging, "download_gcs_object_to_file", _fake_download)
+
+    a = imaging.resolve_cover_ref_b64_or_gcs(None, job_id="j", workdir=str(tmp_path), bucket="b")
+    b = imaging.resolve_cover_ref_b64_or_gcs(None, job_id="j", workdir=str(tmp_path), bucket="b")
+    assert a == b and a.endswith("cover_ref_gcs_42.png")
+    assert calls == [42]
+
+def _api_error(cls, status, message, param=None):
+    req = httpx.Request("POST", "https://api.openai.com/v1/images/edits")
+    return cls(message, response=httpx.Response(status, request=req), body={"message": message, "param": param})
+
+def test_image_candidates_fall_back_to_single_calls():
+    calls = []
+
+    def call(n):
+        calls.append(n)
+        if n > 1:
+            raise _api_error(openai.BadRequestError, 400, "'n' must be 1 for this model", param="n")
+        return type("R", (), {"data": [type("D", (), {"b64_json": f"img{len(calls)}"})()]})()
+
+    out = imaging.image_candidates(call, 3)
+    assert calls[0] == 3 and sorted(calls[1:]) == [1, 1, 1]
+    assert len(out) == 3
+
+@pytest.mark.parametrize("err", [
+    _api_error(openai.RateLimitError, 429, "Rate limit reached"),
+    _api_error(openai.BadRequestError, 400, "Your request was rejected by the safety system"),
+    TimeoutError("read timed out"),
+])
+def test_image_candidates_do_not_fan_out_other_failures(err):
+    calls = []
+
+    def call(n):
+        calls.append(n)
+        raise err
+
+    with pytest.raises(type(err)):
+        imaging.image_candidates(call, 3)
+    assert calls == [3]
+
+def test_contact_sheets_tile_refs_and_are_cached(tmp_path, monkeypatch):
+    from PIL import Image
+    items = []
+    for i in range(8):
+        p = tmp_path / f"ref{i}.png"
+        Image.new("RGB", (64, 96), (i * 30, 0, 0)).save(p)
+        items.append({"path": str(p), "caption": f"{imaging.sheet_label(i)} ref {i}"})
+
+    sheets = imaging.compose_contact_sheets(items, str(tmp_path / "sheets"))
+    assert [(s["letter"], s["tiles"]) for s in sheets] == [("A", [0, 1, 2, 3, 4, 5]), ("B", [6, 7])]
+    with Image.open(sheets[0]["path"]) as im:
+        assert im.size == (imaging.SHEET_COLS * imaging.SHEET_TILE, 2 * (imaging.SHEET_TILE + imaging.SHEET_CAPTION))
+
+    monkeypatch.setattr(imaging, "_render_sheet", lambda *a: (_ for _ in ()).throw(AssertionError("re-rendered")))
+    assert imaging.compose_contact_sheets(items, str(tmp_path / "sheets")) == sheets
+
+def test_signature_memo_is_bounded_lru(tmp_path, monkeypatch):
+    from PIL import Image
+    monkeypatch.setattr(imaging, "_SIG_MEMO_MAX", 2)
+    monkeypatch.setattr(imaging, "_sig_memo", type(imaging._sig_memo)())
+    paths = []
+    for i in range(3):
+        p = str(tmp_path / f"s{i}.png")
+        Image.new("RGB", (16, 16), (i * 80, 0, 0)).save(p)
+        paths.append(p)
+
+    imaging.image_signature(paths[0])
+    imaging.image_signature(paths[1])
+    imaging.image_signature(paths[0])   # most recently used again
+    imaging.image_signature(paths[2])
+    assert list(imaging._sig_memo) == [paths[0], paths[2]]
+    # evicted entries still come back from the sidecar, not a recompute
+    monkeypatch.setattr(imaging, "_compute_signature", lambda p: (_ for _ in ()).throw(AssertionError("recomputed")))
+    assert imaging.image_signature(paths[1]) is not None
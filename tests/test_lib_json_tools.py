@@ -8,6 +8,7 @@ from fastapi.testclient import TestClient
 
 # Import the app instance
 from app.main import app
+from app.lib.json_tools import JsonArrayStreamParser
 
 # -------- Test client --------
 @pytest.fixture(scope="session")
@@ -104,3 +105,39 @@ def mock_openai(monkeypatch):
     monkeypatch.setattr(openai_client.client.images, "generate", _fake_images_generate)
     monkeypatch.setattr(openai_client.client.chat.completions, "create", _fake_chat_create)
     yield
+
+
+# -------- JsonArrayStreamParser --------
+
+def test_stream_parser_yields_objects_as_they_close():
+    doc = json.dumps({
+        "pages": [
+            {"page_number": 1, "panels": [{"dialogue": "He said \"}{\" loudly"}]},
+            {"page_number": 2, "panels": []},
+        ],
+        "lookbook_delta": {"characters_to_add": [{"id": "char_x"}]},
+    })
+    parser = JsonArrayStreamParser("pages")
+    seen = []
+    # feed in small, awkward slices to mimic token deltas
+    for i in range(0, len(doc), 7):
+        seen.extend(parser.feed(doc[i:i + 7]))
+        if len(seen) == 1:
+            # page 1 is available before the stream reaches page 2's close
+            assert '"page_number": 2, "panels": []}' not in parser.text
+    assert [p["page_number"] for p in seen] == [1, 2]
+    assert seen[0]["panels"][0]["dialogue"] == 'He said "}{" loudly'
+    assert parser.done
+    assert json.loads(parser.text) == json.loads(doc)
+
+def test_stream_parser_ignores_other_keys_and_fences():
+    parser = JsonArrayStreamParser("pages")
+    out = parser.feed('```json\n{"title": "pages", "other": [{"a": 1}], "pages": [{"b": 2}]}\n```')
+    assert out == [{"b": 2}]
+
+def test_stream_parser_handles_one_char_deltas():
+    doc = '{"notes": "a \\"pages\\" key", "pages": [{"n": 1, "s": "}"}, {"n": 2}]}'
+    parser = JsonArrayStreamParser("pages")
+    seen = [obj for ch in doc for obj in parser.feed(ch)]
+    assert seen == [{"n": 1, "s": "}"}, {"n": 2}]
+    assert parser.text == doc
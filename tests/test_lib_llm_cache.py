@@ -0,0 +1,50 @@
+# tests/test_lib_llm_cache.py
+import dataclasses
+
+import pytest
+
+from app.lib import llm_cache
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "config", dataclasses.replace(llm_cache.config, base_output_dir=tmp_path))
+    llm_cache.clear()
+    yield llm_cache
+    llm_cache.clear()
+
+def _args(**over):
+    args = dict(model="m", system="sys", prompt="hello  world\n", temperature=0.7)
+    args.update(over)
+    return args
+
+def test_identical_calls_hit_cache_and_force_bypasses(cache):
+    calls = []
+    def call():
+        calls.append(1)
+        return '{"ok": true}'
+
+    assert cache.cached_completion("ns", call=call, **_args()) == '{"ok": true}'
+    # whitespace-only prompt differences normalize to the same key
+    assert cache.cached_completion("ns", call=call, **_args(prompt="hello world")) == '{"ok": true}'
+    assert len(calls) == 1
+
+    cache.cached_completion("ns", call=call, force=True, **_args())
+    assert len(calls) == 2
+
+    cache.cached_completion("ns", call=call, **_args(temperature=0.2))
+    assert len(calls) == 3
+
+    cache.cached_completion("ns", call=call, **_args(temperature=0.2, max_tokens=4096))
+    assert len(calls) == 4
+
+    s = cache.stats()["namespaces"]["ns"]
+    assert s["memory_hits"] == 1 and s["misses"] == 3 and s["bypassed"] == 1
+
+def test_disk_tier_survives_memory_clear_and_skips_invalid(cache):
+    cache.cached_completion("ns", call=lambda: "not json", validate=lambda t: int(t), **_args())
+    cache.cached_completion("ns", call=lambda: "42", validate=lambda t: int(t), **_args(prompt="p2"))
+
+    cache.clear()  # drop the memory tier only
+    assert cache.lookup("ns", cache.cache_key(**_args(prompt="p2"))) == "42"
+    assert cache.lookup("ns", cache.cache_key(**_args())) is None
+    assert cache.stats()["namespaces"]["ns"]["disk_hits"] == 1
@@ -0,0 +1,83 @@
+# tests/test_lib_metrics.py
+import asyncio
+import dataclasses
+import json
+import subprocess
+import sys
+import time
+
+from app.lib import metrics
+
+def _other_worker(tmp_path, pid, value):
+    snap = {"pid": pid, "metrics": {
+        "test_jobs_total": {"type": "counter", "help": "jobs", "samples": [[[["kind", "a"]], value]]},
+        "test_busy": {"type": "gauge", "help": "busy", "samples": [[[], 5.0]]},
+    }}
+    (tmp_path / f"live_{pid}.json").write_text(json.dumps(snap))
+
+def _dead_pid():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+def test_render_merges_workers_and_keeps_dead_totals(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics_dir", lambda: str(tmp_path))
+    jobs = metrics.Counter("test_jobs_total", "jobs", ("kind",))
+    busy = metrics.Gauge("test_busy", "busy")
+    lat = metrics.Histogram("test_latency_seconds", "latency", buckets=(0.1, 1))
+
+    jobs.inc(kind="a")
+    jobs.inc(2, kind="b")
+    busy.set(1)
+    lat.observe(0.05)
+    lat.observe(3)
+
+    dead = _dead_pid()
+    _other_worker(tmp_path, dead, 10)
+    out = metrics.render()
+
+    assert "# TYPE test_jobs_total counter" in out
+    assert 'test_jobs_total{kind="a"} 11' in out and 'test_jobs_total{kind="b"} 2' in out
+    # a dead worker's gauges don't count; its counters are folded into dead.json
+    assert "test_busy 1" in out
+    assert not (tmp_path / f"live_{dead}.json").exists() and (tmp_path / "dead.json").exists()
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in out
+    assert 'test_latency_seconds_bucket{le="1"} 1' in out
+    assert 'test_latency_seconds_bucket{le="+Inf"} 2' in out
+    assert "test_latency_seconds_count 2" in out
+
+    # totals survive the restart of the dead worker's slot
+    jobs.inc(kind="a")
+    assert 'test_jobs_total{kind="a"} 12' in metrics.render()
+
+def test_storage_op_counts_bytes_and_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics_dir", lambda: str(tmp_path))
+    with metrics.storage_op("test_upload") as info:
+        info["bytes"] = 128
+    try:
+        with metrics.storage_op("test_upload"):
+            raise OSError("boom")
+    except OSError:
+        pass
+
+    out = metrics.render()
+    assert 'storage_bytes_total{op="test_upload"} 128' in out
+    assert 'storage_errors_total{op="test_upload"} 1' in out
+    assert 'storage_operation_duration_seconds_count{op="test_upload"} 2' in out
+
+def test_event_loop_lag_probe_sees_blocking(monkeypatch):
+    monkeypatch.setattr(metrics, "config", dataclasses.replace(metrics.config, metrics_loop_lag_interval=0.01))
+    monkeypatch.setattr(metrics, "_probed_loop", None)
+
+    def lag_sum():
+        return sum(v[-1] for _, v in metrics.EVENT_LOOP_LAG.samples())
+
+    async def _handler():
+        metrics.watch_event_loop(asyncio.get_running_loop())
+        await asyncio.sleep(0.03)
+        time.sleep(0.2)  # blocking call on the loop
+        await asyncio.sleep(0.03)
+
+    before = lag_sum()
+    asyncio.run(_handler())
+    assert lag_sum() - before >= 0.15
@@ -0,0 +1,37 @@
+# tests/test_lib_startup.py
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.lib import cloud_tasks, gcs_inventory, openai_client, startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_app_import_leaves_heavy_sdks_unloaded():
+    # a fresh interpreter: this one has long since imported everything
+    code = "import sys, json, app.main; from app.lib import startup; print(json.dumps(startup.profile()))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    prof = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert prof["heavy_loaded"] == []
+    assert prof["phases_ms"]["routers"] > 0 and prof["since_import_ms"] >= prof["phases_ms"]["routers"]
+
+def test_lazy_clients_resolve_on_use():
+    assert cloud_tasks.tasks_v2.CloudTasksClient is not None
+    assert gcs_inventory.storage.Client is not None
+    assert openai_client.client.images is openai_client.get_client().images
+    assert "google.cloud.tasks_v2" in startup.preload()
+
+def test_lifespan_runs_on_startup(monkeypatch):
+    import dataclasses
+    from app import main
+
+    swept = []
+    monkeypatch.setattr(main, "config", dataclasses.replace(main.config, sweep_jobs_on_startup=True))
+    monkeypatch.setattr(main, "sweep_finished_jobs", lambda base, ttl_hours: swept.append(ttl_hours))
+    with TestClient(main.app):
+        pass
+    assert swept == [main.config.sweep_ttl_hours]
@@ -0,0 +1,60 @@
+# tests/test_lib_timings.py
+import uuid
+
+from app.features.full_script.schemas import Page, Panel
+from app.features.pages import service as pages_service
+from app.features.pages.schemas import ComicRequest
+from app.lib import timings
+from app.lib.jobs import load_manifest, manifest_path, save_manifest, seed_manifest_pending
+from app.lib.paths import ensure_job_dir
+
+from tests.conftest import _MockImagesResponse, _tiny_png_base64
+
+def test_collector_and_percentiles():
+    with timings.collect() as t:
+        with timings.timed("refs"):
+            pass
+        timings.add("model", 100.0, each=True)
+        timings.add("model", 300.0, each=True)
+        timings.add("upload", 5.0)
+        timings.add("upload", 7.0)
+    timings.add("refs", 1.0)  # nobody collecting: ignored
+
+    assert t["model_ms"] == [100.0, 300.0] and t["upload_ms"] == 12.0 and t["refs_ms"] < 1.0
+    p = timings.percentiles([float(x) for x in range(1, 101)])
+    assert (p["count"], p["p50"], p["p90"], p["p99"], p["max"]) == (100, 50.0, 90.0, 99.0, 100.0)
+    assert timings.percentiles([]) == {"count": 0}
+
+def test_render_records_page_timings_and_profile(client, monkeypatch):
+    job_id = f"timings-{uuid.uuid4().hex[:8]}"
+    workdir = ensure_job_dir(job_id)
+    mf_path = manifest_path(workdir)
+    seed_manifest_pending(mf_path, total_pages=2)
+    monkeypatch.setattr(pages_service.client.images, "edit", lambda **kw: _MockImagesResponse(_tiny_png_base64()), raising=False)
+
+    panel = Panel(panel_number=1, art_description="x", dialogue="", narration="", sfx="")
+    pages = [Page(page_number=i, panels=[panel]) for i in (1, 2)]
+    empty = {"ids": [], "blocked": {}, "slice": {"characters": [], "locations": [], "props": []}}
+    out = pages_service.render_pages_chained(
+        job_id=job_id,
+        req=ComicRequest(job_id=job_id, comic_title="T", style="s", pages=pages),
+        workdir=workdir,
+        cover_image_ref="",
+        manifest_file=mf_path,
+        plan={"pages": [empty, empty]},
+    )
+    assert len(out) == 2
+
+    mf = load_manifest(mf_path)
+    t = mf["pages"]["1"]["timings"]
+    assert {"refs_ms", "prompt_ms", "model_ms", "decode_ms", "total_ms"} <= set(t)
+    assert len(t["model_ms"]) == 1  # one entry per attempt
+
+    mf["timings"] = {"plan_ms": 12.0, "total_ms": 99.0}
+    save_manifest(mf_path, mf)
+    r = client.get(f"/api/v1/generate/comic/profile/{job_id}")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["timed_pages"] == 2 and body["job"]["plan_ms"] == 12.0
+    assert body["stages"]["model"]["count"] == 2 and "p95" in body["stages"]["total"]
+    assert client.get("/api/v1/generate/comic/profile/nope-404").status_code == 404
@@ -0,0 +1,91 @@
+# tests/test_lib_tracing.py
+import dataclasses
+import json
+import os
+import types
+
+import pytest
+
+from app.lib import cloud_tasks, tracing
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "config", dataclasses.replace(
+        tracing.config, trace_exporter="file", trace_file=str(path), trace_sample_rate=1.0,
+        trace_sample_routes={"/metrics": 0.0},
+    ))
+    return str(path)
+
+def test_spans_nest_and_export(trace_file):
+    with tracing.span("job") as root:
+        with tracing.span("page.decode", page=3):
+            pass
+        with pytest.raises(ValueError):
+            with tracing.span("upload"):
+                raise ValueError("nope")
+
+    spans = tracing.load_trace(root.trace_id, trace_file)
+    by_name = {s["name"]: s for s in spans}
+    assert [s["name"] for s in spans] == ["job", "page.decode", "upload"]
+    assert by_name["page.decode"]["parentSpanId"] == root.span_id
+    assert by_name["page.decode"]["attributes"] == {"page": 3}
+    assert by_name["upload"]["status"] == {"code": "ERROR", "message": "ValueError: nope"}
+    assert tracing.current_span() is None
+
+def test_remote_parent_and_sampling(trace_file):
+    parent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    with tracing.span("worker", parent=parent) as s:
+        assert (s.trace_id, s.parent_id, s.sampled) == ("a" * 32, "b" * 16, True)
+    with tracing.span("worker", parent=parent[:-2] + "00") as s:
+        assert not s.sampled
+    with tracing.span("GET /metrics", route="/metrics") as s:
+        assert not s.sampled
+    assert tracing.parse_traceparent("garbage") is None
+    assert [r["name"] for r in tracing.load_trace("a" * 32, trace_file)] == ["worker"]
+
+def test_task_carries_trace_to_worker(trace_file, monkeypatch, client):
+    sent = {}
+
+    class FakeTasks:
+        def queue_path(self, *parts):
+            return "/".join(parts)
+
+        def create_task(self, parent, task):
+            sent.update(task["http_request"])
+            return types.SimpleNamespace(name="t1")
+
+    monkeypatch.setattr(cloud_tasks.tasks_v2, "CloudTasksClient", FakeTasks)
+    with tracing.span("POST /api/v1/generate/comic") as root:
+        cloud_tasks.create_task(queue="q", url="http://w/x", payload={"job_id": "j"})
+
+    tp = sent["headers"]["traceparent"]
+    assert json.loads(sent["body"])["traceparent"] == tp
+    assert tracing.parse_traceparent(tp)[0] == root.trace_id
+
+    # the worker request continues the same trace; its span is named by route template
+    r = client.get("/api/v1/generate/comic/plan/no-such-job", headers={"traceparent": tp})
+    assert r.status_code == 404
+    assert tracing.parse_traceparent(r.headers["traceparent"])[0] == root.trace_id
+    names = [s["name"] for s in tracing.load_trace(root.trace_id, trace_file)]
+    assert "tasks.enqueue" in names and "GET /api/v1/generate/comic/plan/{job_id}" in names
+
+def test_file_export_rotates_at_size_cap(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "config", dataclasses.replace(tracing.config, trace_file_max_bytes=2000))
+    with tracing.span("job") as root:
+        for i in range(60):
+            with tracing.span("page", page=i):
+                pass
+            tracing.flush()  # one write per span, so every write checks the cap
+
+    assert os.path.getsize(trace_file) < 2000 + 1000
+    assert os.path.exists(trace_file + ".1")
+    # the newest spans survive; the oldest were rotated away with .1's predecessor
+    pages = [s["attributes"]["page"] for s in tracing.load_trace(root.trace_id, trace_file) if s["name"] == "page"]
+    assert pages and pages[-1] == 59
+
+def test_export_defaults_off(monkeypatch):
+    from app.config import load_config
+
+    monkeypatch.delenv("TRACE_EXPORTER", raising=False)
+    assert load_config().trace_exporter == "none"
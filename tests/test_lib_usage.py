@@ -0,0 +1,36 @@
+# tests/test_lib_usage.py
+import types
+import uuid
+
+import pytest
+
+from app.lib import usage
+from app.lib.paths import job_dir
+
+def _resp(prompt_tokens, completion_tokens):
+    return types.SimpleNamespace(usage=types.SimpleNamespace(
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens,
+    ))
+
+def test_tracked_calls_are_tagged_and_summarized():
+    job_id = f"usage-{uuid.uuid4().hex[:8]}"
+
+    with usage.usage_context(job_id=job_id, stage="full_script"):
+        usage.tracked("chat", lambda **kw: _resp(1000, 500), model="gpt-4o-mini")
+        with usage.usage_context(stage="page", page=2):
+            with pytest.raises(RuntimeError):
+                usage.tracked("image.edit", _boom, attempt=2, model="gpt-image-1", size="1024x1536")
+    usage.tracked("chat", lambda **kw: _resp(1, 1), model="gpt-4o-mini")  # no job: process totals only
+
+    records = usage.load_job_usage(job_dir(job_id))
+    assert [(r["stage"], r["page"], r["ok"]) for r in records] == [("full_script", None, True), ("page", 2, False)]
+    assert records[1]["attempt"] == 2 and records[1]["size"] == "1024x1536"
+
+    report = usage.summarize(records)
+    assert report["total"]["calls"] == 2 and report["total"]["errors"] == 1
+    assert report["by_stage"]["full_script"]["prompt_tokens"] == 1000
+    assert report["by_stage"]["full_script"]["cost_usd"] == pytest.approx(0.00045)
+    assert report["by_page"]["2"]["calls"] == 1
+
+def _boom(**kw):
+    raise RuntimeError("rate limited")
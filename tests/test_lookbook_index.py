@@ -0,0 +1,42 @@
+# tests/test_lookbook_index.py
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.schemas import LookbookCharacter, LookbookDoc, LookbookLocation, ReferenceAsset
+
+def _doc():
+    return LookbookDoc(
+        characters=[LookbookCharacter(
+            id="char_a", display_name="Ann",
+            visual_canon={"face": "round", "hair": "red", "backstory": "long text"},
+            reference_assets=[ReferenceAsset(type="cover", gs_uri="gs://b/cover.png")],
+        )],
+        locations=[LookbookLocation(id="loc_x", name="")],
+    )
+
+def test_lookups_and_compact_canon():
+    lbx = LookbookIndex(_doc())
+    assert lbx.kind("char_a") == "character" and lbx.entity("char_a", "location") is None
+    assert lbx.name("char_a") == "Ann" and lbx.name("loc_x") == "loc_x" and lbx.name("nope") == "nope"
+    assert lbx.compact_canon("char_a") == {"face": "round", "hair": "red"}
+    assert lbx.best_asset("char_a", ["portrait", "cover"]).type == "cover"
+    assert lbx.has_any_assets("char_a") and not lbx.has_any_assets("loc_x")
+
+def test_mutations_keep_doc_and_maps_in_step():
+    doc = _doc()
+    lbx = LookbookIndex(doc)
+
+    lbx.put_asset("char_a", ReferenceAsset(type="portrait", gs_uri="gs://b/p1.png"))
+    lbx.put_asset("char_a", ReferenceAsset(type="portrait", gs_uri="gs://b/p2.png"))
+    assert [a.type for a in doc.characters[0].reference_assets] == ["cover", "portrait"]
+    assert lbx.asset("char_a", "portrait").gs_uri == "gs://b/p2.png"
+
+    assert lbx.remove_asset_types("char_a", {"cover"}) and not lbx.has_type("char_a", "cover")
+    assert not lbx.remove_asset_types("char_a", {"cover"})
+
+    lbx.set_canon("char_a", {"face": "square"})
+    assert lbx.compact_canon("char_a") == {"face": "square"}
+
+    added = lbx.add("location", LookbookLocation(id="loc_y", name="Yard"))
+    assert lbx.add("location", LookbookLocation(id="loc_y", name="Dup")) is added
+    assert [loc.id for loc in doc.locations] == ["loc_x", "loc_y"]
+
+    assert lbx.remove("loc_x") and "loc_x" not in lbx and [loc.id for loc in doc.locations] == ["loc_y"]
@@ -0,0 +1,58 @@
+# tests/test_lookbook_store.py
+from google.api_core.exceptions import PreconditionFailed
+
+from app.features.lookbook_seed.schemas import LookbookCharacter, LookbookDoc, ReferenceAsset
+from app.features.lookbook_seed.store import LookbookStore
+
+def _char(cid, *types):
+    return LookbookCharacter(id=cid, display_name=cid, reference_assets=[ReferenceAsset(type=t) for t in types])
+
+def test_load_reuses_parsed_doc_until_file_changes(tmp_path, monkeypatch):
+    store = LookbookStore()
+    store.remote = False
+    (tmp_path / "lookbook.json").write_text(LookbookDoc(characters=[_char("char_a")]).model_dump_json())
+
+    parses = []
+    real = LookbookDoc.model_validate
+    monkeypatch.setattr(LookbookDoc, "model_validate", lambda data: parses.append(1) or real(data))
+
+    a = store.load("job", workdir=str(tmp_path))
+    a.characters.clear()                       # callers get a private copy
+    b = store.load("job", workdir=str(tmp_path))
+    assert len(parses) == 1 and [c.id for c in b.characters] == ["char_a"]
+
+    doc, info = store.update("job", lambda d: d.characters.append(_char("char_b")), workdir=str(tmp_path))
+    assert info is None and doc.revision == 1
+    assert [c.id for c in store.load("job", workdir=str(tmp_path)).characters] == ["char_a", "char_b"]
+    assert store.update("job", lambda d: False, workdir=str(tmp_path))[0].revision == 1
+
+def test_conflicting_remote_write_is_merged_not_lost(tmp_path, monkeypatch):
+    # "GCS": one object with a generation counter
+    remote = {"gen": 1, "doc": LookbookDoc(characters=[_char("char_a", "cover")])}
+    pushes = []
+
+    store = LookbookStore()
+    store.remote = True
+    monkeypatch.setattr(store, "_remote_generation", lambda job_id: (True, remote["gen"]))
+    monkeypatch.setattr(store, "_pull", lambda job_id, path, gen: (
+        open(path, "w").write(remote["doc"].model_dump_json()), store._synced.__setitem__(path, gen)))
+
+    def _push(job_id, doc, if_generation_match):
+        pushes.append(if_generation_match)
+        if len(pushes) == 1:
+            # another instance lands a portrait between our read and our write
+            remote["doc"] = LookbookDoc(revision=1, characters=[_char("char_a", "cover", "portrait")])
+            remote["gen"] = 2
+            raise PreconditionFailed("generation mismatch")
+        remote["doc"], remote["gen"] = doc, remote["gen"] + 1
+        return {"gs_uri": "gs://b/jobs/job/lookbook.json", "generation": remote["gen"]}
+    monkeypatch.setattr(store, "_push", _push)
+
+    def _add_turnaround(doc):
+        doc.characters[0].reference_assets.append(ReferenceAsset(type="turnaround"))
+
+    doc, info = store.update("job", _add_turnaround, workdir=str(tmp_path))
+
+    assert pushes == [1, 2]
+    assert [a.type for a in doc.characters[0].reference_assets] == ["cover", "portrait", "turnaround"]
+    assert doc.revision == 2 and info["generation"] == 3
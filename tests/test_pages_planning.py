@@ -0,0 +1,59 @@
+# tests/test_pages_planning.py
+import json
+
+from app.features.full_script.schemas import Page, Panel
+from app.features.lookbook_seed.index import LookbookIndex
+from app.features.lookbook_seed.schemas import LookbookCharacter, LookbookDoc, LookbookLocation, ReferenceAsset
+from app.features.lookbook_seed.store import lookbook_store
+from app.features.pages import planning
+
+def _page(n, chars, loc=None):
+    return Page(page_number=n, location_id=loc, panels=[
+        Panel(panel_number=1, art_description="x", dialogue="", narration="", sfx="", characters=chars),
+    ])
+
+def _setup(tmp_path, monkeypatch):
+    doc = LookbookDoc(
+        characters=[
+            LookbookCharacter(id="char_a", display_name="A", reference_assets=[ReferenceAsset(type="portrait", gs_uri="gs://b/a.png")]),
+            LookbookCharacter(id="char_b", display_name="B"),
+        ],
+        locations=[LookbookLocation(id="loc_x", name="X")],
+    )
+    (tmp_path / "lookbook.json").write_text(doc.model_dump_json())
+    calls = []
+
+    def fake_generate(req):
+        calls.append(sorted(req.ids))
+        def _add(d):
+            lbx = LookbookIndex(d)
+            for _id in req.ids:
+                lbx.put_asset(_id, ReferenceAsset(type="ref", gs_uri=f"gs://b/{_id}.png"))
+        lookbook_store.update(req.job_id, _add, workdir=str(tmp_path))
+    monkeypatch.setattr(planning, "generate_ref_assets", fake_generate)
+    return calls
+
+def test_plan_generates_all_missing_refs_in_one_batch(tmp_path, monkeypatch):
+    calls = _setup(tmp_path, monkeypatch)
+    pages = [_page(1, ["char_a"]), _page(2, ["char_b"], loc="loc_x"), _page(3, ["char_a", "char_zed"])]
+
+    plan = planning.build_plan("job", str(tmp_path), pages)
+
+    assert calls == [["char_b", "loc_x"]]
+    assert sorted(plan["generated"]) == ["char_b", "loc_x"]
+    assert plan["problems"] == {"char_zed": "not_found_in_lookbook"}
+    assert plan["blocked_pages"] == [3] and plan["first_blocked_page"] == 3
+    assert plan["pages"][1]["slice"]["characters"][0]["reference_assets"][0]["gs_uri"] == "gs://b/char_b.png"
+    assert json.loads((tmp_path / "plan.json").read_text())["lookbook_revision"] == plan["lookbook_revision"]
+
+def test_plan_is_reused_until_lookbook_or_pages_change(tmp_path, monkeypatch):
+    calls = _setup(tmp_path, monkeypatch)
+    pages = [_page(1, ["char_a", "char_b"])]
+
+    first = planning.build_plan("job", str(tmp_path), pages)
+    assert planning.build_plan("job", str(tmp_path), pages)["created_at"] == first["created_at"]
+    assert len(calls) == 1
+
+    changed = planning.build_plan("job", str(tmp_path), pages + [_page(2, ["char_a"])])
+    assert changed["created_at"] != first["created_at"] and len(changed["pages"]) == 2
+    assert len(calls) == 1  # refs already there
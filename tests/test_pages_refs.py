@@ -0,0 +1,52 @@
+# tests/test_pages_refs.py
+import os
+
+from PIL import Image
+
+from app.features.pages.service import _collect_ref_paths_for_slice
+
+class _Local:
+    def resolve(self, ref):
+        return ref.get("url")
+
+def test_contact_sheet_mode_binds_tiles(tmp_path):
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"r{i}.png"
+        Image.frombytes("L", (32, 32), os.urandom(32 * 32)).save(p)
+        paths.append(str(p))
+    slice_obj = {
+        "characters": [{"id": "char_a", "display_name": "Ada", "reference_assets": [
+            {"type": "portrait", "url": paths[0]}, {"type": "turnaround", "url": paths[1]}]}],
+        "locations": [{"id": "loc_x", "display_name": "X", "reference_assets": [{"type": "wide", "url": paths[2]}]}],
+    }
+
+    files, block = _collect_ref_paths_for_slice(assets=_Local(), lookbook_slice=slice_obj)
+    assert files == paths and "[1] char_a" in block
+
+    sheets, block = _collect_ref_paths_for_slice(assets=_Local(), lookbook_slice=slice_obj, sheets_dir=str(tmp_path / "s"))
+    assert len(sheets) == 1 and sheets[0].startswith(str(tmp_path / "s"))
+    assert "[A1] char_a" in block and "[A3] loc_x" in block
+    assert "use refs [A1,A2]" in block
+
+def test_shared_cover_and_same_picture_via_other_url_count_once(tmp_path):
+    noise = os.urandom(64 * 64)
+    cover = tmp_path / "cover.png"
+    Image.frombytes("L", (64, 64), noise).save(cover)
+    Image.frombytes("L", (64, 64), noise).resize((128, 128)).save(tmp_path / "cover_big.png")  # same picture, other file
+    portraits = []
+    for cid in ("a", "b"):
+        p = tmp_path / f"portrait_{cid}.png"
+        Image.frombytes("L", (64, 64), os.urandom(64 * 64)).save(p)
+        portraits.append(str(p))
+    slice_obj = {"characters": [
+        {"id": "char_a", "display_name": "A", "reference_assets": [
+            {"type": "cover", "url": str(cover)}, {"type": "portrait", "url": portraits[0]}]},
+        {"id": "char_b", "display_name": "B", "reference_assets": [
+            {"type": "cover", "url": str(tmp_path / "cover_big.png")}, {"type": "portrait", "url": portraits[1]}]},
+    ]}
+
+    files, block = _collect_ref_paths_for_slice(assets=_Local(), lookbook_slice=slice_obj, total_cap=3)
+    # both portraits win a slot before the cover; the cover is attached once
+    assert files == [str(cover), portraits[0], portraits[1]]
+    assert os.path.exists(portraits[0] + ".sig.json")
@@ -0,0 +1,57 @@
+# tests/test_pipeline_dag.py
+import asyncio
+
+import pytest
+
+from app.features.pipeline import service as pl
+from app.features.pipeline.schemas import PipelineRequest
+
+def _ctx(tmp_path):
+    req = PipelineRequest(title="T", synopsis="S", name="Roey", page_count=4, theme="Pixar")
+    return pl.PipelineContext("job", str(tmp_path), req, upload=False)
+
+def _stage(name, deps, log, delay=0.05, fail=False):
+    async def fn(ctx):
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} broke")
+        log.append(("end", name))
+        return {"from": name, "deps": {d: ctx.output(d)["from"] for d in deps}}
+    return pl.Stage(name, tuple(deps), fn)
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap_and_outputs_flow(tmp_path):
+    log = []
+    stages = [
+        _stage("a", [], log),
+        _stage("b", ["a"], log),
+        _stage("c", ["a"], log),
+        _stage("d", ["b", "c"], log),
+    ]
+    ctx = _ctx(tmp_path)
+    state = await pl.run_dag(stages, ctx, {}, save_state=lambda s: None)
+
+    assert state["status"] == "done"
+    # b and c both start before either ends
+    assert log.index(("start", "c")) < log.index(("end", "b"))
+    assert ctx.output("d")["deps"] == {"b": "b", "c": "c"}
+
+@pytest.mark.asyncio
+async def test_failed_stage_resumes_without_rerunning_done_stages(tmp_path):
+    log = []
+    saved = {}
+    state = await pl.run_dag(
+        [_stage("a", [], log), _stage("b", ["a"], log, fail=True), _stage("c", ["b"], log)],
+        _ctx(tmp_path), {}, save_state=saved.update,
+    )
+    assert state["status"] == "failed"
+    assert state["stages"]["b"]["status"] == "failed" and state["stages"]["c"]["status"] == "pending"
+
+    log.clear()
+    state = await pl.run_dag(
+        [_stage("a", [], log), _stage("b", ["a"], log), _stage("c", ["b"], log)],
+        _ctx(tmp_path), dict(saved), save_state=saved.update,
+    )
+    assert state["status"] == "done"
+    assert [n for ev, n in log if ev == "start"] == ["b", "c"]  # "a" came from disk
@@ -0,0 +1,83 @@
+# tests/test_ref_assets_service.py
+import threading
+import time
+
+from app.features.lookbook_ref_assets import service as ra
+from app.features.lookbook_ref_assets.schemas import GenerateRefAssetsRequest
+from app.features.lookbook_seed.schemas import LookbookCharacter, LookbookDoc, LookbookLocation
+from app.features.lookbook_seed.store import lookbook_store
+
+def test_entities_render_in_parallel_and_keep_request_order(monkeypatch, tmp_path):
+    doc = LookbookDoc(
+        characters=[LookbookCharacter(id="char_a", display_name="A"), LookbookCharacter(id="char_b", display_name="B")],
+        locations=[LookbookLocation(id="loc_x", name="X")],
+    )
+    (tmp_path / "lookbook.json").write_text(doc.model_dump_json())
+    calls = []
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def fake_gen(prompt, ref):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            calls.append((prompt, ref))
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return ra.base64.b64encode(b"png").decode()
+
+    monkeypatch.setattr(ra, "job_dir", lambda job_id: str(tmp_path))
+    monkeypatch.setattr(ra, "_gen_image_with_optional_ref", fake_gen)
+    monkeypatch.setattr(ra, "_upload_image", lambda path, obj: {"gs_uri": f"gs://b/{obj}"})
+
+    req = GenerateRefAssetsRequest(job_id="job", ids=["loc_x", "char_b", "char_a", "char_missing"])
+    resp = ra.generate_ref_assets(req)
+
+    assert [r.id for r in resp.results] == ["loc_x", "char_b", "char_a", "char_missing"]
+    assert resp.results[3].message == "ID not found in lookbook"
+    assert active["max"] > 1
+    # one lookbook write for the whole run
+    saved = lookbook_store.load("job", workdir=str(tmp_path))
+    assert saved.revision == 1
+    # each turnaround is referenced on its own entity's fresh portrait
+    turnarounds = [ref for _, ref in calls if ref and ref.endswith("portrait.png")]
+    assert sorted(turnarounds) == sorted(str(tmp_path / "lookbook" / c / "portrait.png") for c in ("char_a", "char_b"))
+    assert [a.type for a in saved.characters[0].reference_assets] == ["portrait", "turnaround"]
+
+class _Resp:
+    def __init__(self, payloads):
+        self.data = [type("D", (), {"b64_json": ra.base64.b64encode(p).decode()})() for p in payloads]
+
+def test_candidates_are_versioned_and_selectable_without_regenerating(monkeypatch, tmp_path):
+    doc = LookbookDoc(locations=[LookbookLocation(id="loc_x", name="X")])
+    (tmp_path / "lookbook.json").write_text(doc.model_dump_json())
+    requests_n = []
+
+    def fake_request(prompt, ref, n):
+        requests_n.append(n)
+        return _Resp([f"img{i}".encode() for i in range(n)])
+
+    copies = []
+    monkeypatch.setattr(ra, "job_dir", lambda job_id: str(tmp_path))
+    monkeypatch.setattr(ra, "_image_request", fake_request)
+    monkeypatch.setattr(ra, "_upload_image", lambda path, obj: {"gs_uri": f"gs://b/{obj}"})
+    monkeypatch.setattr(ra, "copy_gcs_object", lambda src, dst: copies.append((src, dst)) or {"gs_uri": f"gs://b/{dst}"})
+
+    resp = ra.generate_ref_assets(GenerateRefAssetsRequest(job_id="job", ids=["loc_x"], candidates=3))
+
+    assert requests_n == [3]  # one request for all candidates
+    assert [c.version for c in resp.results[0].candidates] == [1, 2, 3]
+    folder = tmp_path / "lookbook" / "loc_x"
+    assert (folder / "wide.png").read_bytes() == b"img0" == (folder / "wide_v1.png").read_bytes()
+    saved = lookbook_store.load("job", workdir=str(tmp_path))
+    assert saved.locations[0].reference_assets[0].version == 1
+    assert len(saved.locations[0].candidates) == 3
+
+    from app.features.lookbook_ref_assets.schemas import SelectCandidateRequest
+    sel = ra.select_candidate(SelectCandidateRequest(job_id="job", id="loc_x", type="wide", version=2))
+    assert requests_n == [3]
+    assert copies[-1] == ("jobs/job/lookbook/loc_x/wide_v2.png", "jobs/job/lookbook/loc_x/wide.png")
+    assert sel.selected.version == 2 and (folder / "wide.png").read_bytes() == b"img1"
+    saved = lookbook_store.load("job", workdir=str(tmp_path))
+    assert [(a.type, a.version) for a in saved.locations[0].reference_assets] == [("wide", 2)]
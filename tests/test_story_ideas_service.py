@@ -1,6 +1,6 @@
 # tests/test_story_ideas_service.py
 import pytest
-from app.features.story_ideas.schemas import StoryIdeasRequest
+from app.features.story_ideas.schemas import StoryIdeasRequest, StoryIdeasResponse, StoryIdea
 from app.features.story_ideas.service import generate_story_ideas
 
 @pytest.mark.asyncio
@@ -15,3 +15,112 @@ async def test_generate_story_ideas_basic():
     res = await generate_story_ideas(req)
     assert len(res.ideas) == 3
     assert all(hasattr(i, "title") and hasattr(i, "synopsis") for i in res.ideas)
+
+@pytest.mark.asyncio
+async def test_generate_story_ideas_batch_keeps_order_and_item_errors(monkeypatch):
+    from app.features.story_ideas import service
+
+    def _fake(req):
+        if req.name == "bad":
+            raise ValueError("boom")
+        return StoryIdeasResponse(ideas=[StoryIdea(title=req.name, synopsis="s")] * 3)
+    monkeypatch.setattr(service, "_story_ideas_sync", _fake)
+
+    names = ["a", "bad", "c", "d"]
+    res = await service.generate_story_ideas_batch(
+        [StoryIdeasRequest(name=n, theme="t") for n in names], concurrency=2
+    )
+    assert [it.index for it in res.results] == [0, 1, 2, 3]
+    assert [it.result.ideas[0].title if it.ok else None for it in res.results] == ["a", None, "c", "d"]
+    assert res.succeeded == 3 and res.failed == 1 and "boom" in res.results[1].error
+
+@pytest.mark.asyncio
+async def test_story_ideas_reply_failing_the_model_is_not_cached(monkeypatch):
+    from app.lib import openai_client
+    from tests.conftest import _MockChatResponse
+
+    calls = []
+    def _create(**kwargs):
+        calls.append(1)
+        return _MockChatResponse('[{"title": "No synopsis"}]')
+    monkeypatch.setattr(openai_client.client.chat.completions, "create", _create)
+
+    req = StoryIdeasRequest(name="Half", theme="t")
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await generate_story_ideas(req)
+    assert len(calls) == 2
+
+def test_rate_scheduler_paces_starts():
+    import threading
+    import time
+    from app.lib.scheduler import RateScheduler
+
+    sched = RateScheduler("t", max_concurrency=2, per_minute=1200)  # one start per 50ms
+    starts = []
+    def work():
+        with sched.slot():
+            starts.append(time.monotonic())
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    starts.sort()
+    assert starts[-1] - starts[0] >= 0.14
+    assert sched.stats()["started"] == 4 and sched.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_rate_scheduler_keeps_model_calls_off_default_executor():
+    import asyncio
+    import contextlib
+    import threading
+    from app.lib.scheduler import RateScheduler
+
+    sched = RateScheduler("t", max_concurrency=1, per_minute=0)
+
+    def call():
+        with sched.slot():
+            return threading.current_thread().name
+    assert (await sched.run(call)).startswith("sched-t")
+
+    def stream():
+        with sched.slot():
+            yield from range(10)
+    seen = []
+    async with contextlib.aclosing(sched.iterate(stream())) as it:
+        async for n in it:
+            seen.append(n)
+            if n == 2:
+                break
+    assert seen == [0, 1, 2]
+    # the abandoned stream is closed on the pool, which frees its slot
+    assert await asyncio.wait_for(sched.run(call), 5)
+    assert sched.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_rate_scheduler_open_stream_survives_saturated_pool():
+    import asyncio
+    import contextlib
+    from app.lib.scheduler import RateScheduler
+
+    sched = RateScheduler("t", max_concurrency=1, per_minute=0)
+
+    def call():
+        with sched.slot():
+            return True
+
+    def stream():
+        with sched.slot():
+            yield from range(3)
+
+    async with contextlib.aclosing(sched.iterate(stream())) as it:
+        assert await it.__anext__() == 0
+        # more waiting calls than the pool has threads, while the stream holds the only slot
+        waiting = [asyncio.ensure_future(sched.run(call)) for _ in range(sched.max_concurrency + 8)]
+        await asyncio.sleep(0.05)
+        rest = await asyncio.wait_for(_drain(it), 5)
+    assert rest == [1, 2]
+    assert all(await asyncio.wait_for(asyncio.gather(*waiting), 5))
+    assert sched.stats()["in_flight"] == 0
+
+async def _drain(it):
+    return [n async for n in it]
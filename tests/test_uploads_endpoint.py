@@ -0,0 +1,34 @@
+# tests/test_uploads_endpoint.py
+import base64
+import os
+
+from app.lib import uploads
+from app.lib.paths import job_dir
+
+_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR4nGNgYAAAAAMAASsJTYQAAAAASUVORK5CYII="
+)
+
+def _fake_upload(local_path, *, object_name=None, subdir="covers"):
+    return {"gs_uri": f"gs://test-bucket/{object_name}", "signed_url": "https://signed", "expires_in": 60}
+
+def test_upload_multipart_returns_asset_handle(client, monkeypatch):
+    monkeypatch.setattr(uploads, "upload_to_gcs", _fake_upload)
+    r = client.post(
+        "/api/v1/assets/upload",
+        files={"image": ("face.png", _PNG, "image/png")},
+        data={"job_id": "uploadtestjob"},
+    )
+    assert r.status_code == 201
+    body = r.json()
+    assert body["content_type"] == "image/png"
+    assert body["size"] == len(_PNG)
+    assert body["gs_uri"].endswith(f"jobs/uploadtestjob/uploads/{body['asset_id']}.png")
+
+    path = uploads.resolve_upload(body["asset_id"], job_id="uploadtestjob", workdir=job_dir("uploadtestjob"))
+    assert path and os.path.getsize(path) == len(_PNG)
+
+def test_upload_raw_body_rejects_non_image(client, monkeypatch):
+    monkeypatch.setattr(uploads, "upload_to_gcs", _fake_upload)
+    r = client.put("/api/v1/assets/upload/uploadtestjob", content=b"not an image")
+    assert r.status_code == 400